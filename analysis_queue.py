@@ -0,0 +1,228 @@
+"""
+Bounded background job queue for LLM log analysis.
+
+Webhook requests enqueue a job and return immediately; a small pool of
+worker threads drains the queue and runs the (slow) Gemini analysis.
+AsyncAnalysisQueue does the same with asyncio tasks for the ASGI app.
+"""
+
+import asyncio
+import logging
+import os
+import queue
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFullError(Exception):
+    """Raised when the analysis queue has reached its configured depth"""
+
+
+class _Slots:
+    """
+    Capacity accounting shared by both queues: jobs queued plus slots
+    reserved for jobs that will be submitted later (coalescing windows)
+    never exceed max_depth.
+    """
+
+    def __init__(self, max_depth):
+        self.max_depth = max_depth
+        self._slots_lock = threading.Lock()
+        self._queued = 0
+        self._reserved = 0
+
+    def _full_error(self):
+        return QueueFullError(f"Analysis queue is full ({self.max_depth} pending jobs)")
+
+    def reserve(self):
+        """
+        Hold a slot for a job submitted later with submit(..., reserved=True),
+        raising QueueFullError when the queue has no capacity left
+        """
+        with self._slots_lock:
+            if self._queued + self._reserved >= self.max_depth:
+                raise self._full_error()
+            self._reserved += 1
+
+    def release(self):
+        """Give back a reserve()d slot whose job will not be submitted"""
+        with self._slots_lock:
+            self._reserved -= 1
+
+    def _claim(self, reserved):
+        with self._slots_lock:
+            if reserved:
+                self._reserved -= 1
+            elif self._queued + self._reserved >= self.max_depth:
+                raise self._full_error()
+            self._queued += 1
+
+    def _unclaim(self, reserved):
+        """Undo _claim for a job that could not be enqueued"""
+        with self._slots_lock:
+            self._queued -= 1
+            if reserved:
+                self._reserved += 1
+
+    def _taken(self):
+        with self._slots_lock:
+            self._queued -= 1
+
+    def is_full(self):
+        """True when a non-blocking submit would be rejected"""
+        with self._slots_lock:
+            return self._queued + self._reserved >= self.max_depth
+
+    def depth(self):
+        """Number of jobs waiting to be picked up by a worker"""
+        return self._queued
+
+    def reserved(self):
+        """Slots held for jobs that have not been submitted yet"""
+        return self._reserved
+
+
+class AnalysisQueue(_Slots):
+    """
+    Fixed-size worker pool fed by a bounded FIFO queue.
+
+    Worker threads are started lazily on the first submit so that each
+    gunicorn worker process gets its own pool after forking.
+    """
+
+    def __init__(self, handler, workers=2, max_depth=100):
+        super().__init__(max_depth)
+        self.handler = handler
+        self.workers = max(1, workers)
+        self._queue = queue.Queue()
+        self._threads = []
+        self._lock = threading.Lock()
+        self._pid = None
+        self._active = 0
+
+    def _ensure_started(self):
+        """Start worker threads once per process"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._threads = []
+            for i in range(self.workers):
+                thread = threading.Thread(
+                    target=self._run, name=f"analysis-worker-{i}", daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+            self._pid = os.getpid()
+            logger.info(
+                f"🧵 Started {self.workers} analysis workers (queue limit {self.max_depth})"
+            )
+
+    def submit(self, analysis_id, payload, reserved=False):
+        """
+        Enqueue a job without blocking, raising QueueFullError when the queue
+        is at capacity; a job for a reserve()d slot is always accepted
+        """
+        self._ensure_started()
+        self._claim(reserved)
+        self._queue.put((analysis_id, payload))
+
+    def active(self):
+        """Number of jobs currently being processed"""
+        return self._active
+
+    def _run(self):
+        while True:
+            analysis_id, payload = self._queue.get()
+            with self._lock:
+                self._taken()
+                self._active += 1
+            try:
+                self.handler(analysis_id, payload)
+            except Exception as e:
+                logger.error(f"❌ Analysis job {analysis_id} crashed: {str(e)}")
+            finally:
+                with self._lock:
+                    self._active -= 1
+                self._queue.task_done()
+
+
+class AsyncAnalysisQueue(_Slots):
+    """
+    asyncio counterpart of AnalysisQueue for the ASGI serving mode.
+
+    `concurrency` worker tasks await an async handler, so a single process
+    can keep that many analyses in flight while they wait on the LLM.
+    start() must be awaited inside the serving loop; submit() may be
+    called from the loop or from any other thread (e.g. the coalescer's
+    flusher or a thread-pool helper).
+    """
+
+    def __init__(self, handler, concurrency=100, max_depth=100):
+        super().__init__(max_depth)
+        self.handler = handler
+        self.workers = max(1, concurrency)
+        self._queue = None
+        self._loop = None
+        self._tasks = []
+        self._active = 0
+
+    async def start(self):
+        """Create the queue and worker tasks on the running loop"""
+        self._loop = asyncio.get_running_loop()
+        self._queue = asyncio.Queue()
+        self._tasks = [self._loop.create_task(self._run()) for _ in range(self.workers)]
+        logger.info(
+            f"🧵 Started {self.workers} async analysis workers (queue limit {self.max_depth})"
+        )
+
+    async def stop(self):
+        """Cancel the worker tasks"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _in_loop(self):
+        try:
+            return asyncio.get_running_loop() is self._loop
+        except RuntimeError:
+            return False
+
+    def submit(self, analysis_id, payload, reserved=False):
+        """
+        Enqueue a job without blocking, from the loop or any other thread,
+        raising QueueFullError when the queue is at capacity; a job for a
+        reserve()d slot is always accepted
+        """
+        if self._queue is None:
+            raise RuntimeError("AsyncAnalysisQueue.start() has not been awaited")
+        self._claim(reserved)
+        item = (analysis_id, payload)
+        try:
+            if self._in_loop():
+                self._queue.put_nowait(item)
+            else:
+                self._loop.call_soon_threadsafe(self._queue.put_nowait, item)
+        except Exception:
+            self._unclaim(reserved)  # e.g. the loop has been closed
+            raise
+
+    def active(self):
+        """Number of jobs currently being processed"""
+        return self._active
+
+    async def _run(self):
+        while True:
+            analysis_id, payload = await self._queue.get()
+            self._taken()
+            self._active += 1
+            try:
+                await self.handler(analysis_id, payload)
+            except Exception as e:
+                logger.error(f"❌ Analysis job {analysis_id} crashed: {str(e)}")
+            finally:
+                self._active -= 1
+                self._queue.task_done()
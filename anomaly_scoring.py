@@ -0,0 +1,388 @@
+"""
+Vectorized statistical anomaly scoring of a log batch.
+
+Cheap quantitative evidence computed before (and alongside) the LLM:
+
+* numeric fields - robust z-scores from the median and MAD (falling back
+  to mean/standard deviation when more than half the values are equal);
+  values beyond ``z_threshold`` are outliers, but only within the top
+  ``max_outlier_share`` of the batch (a heavy tail is not an outlier);
+* categorical fields - values seen in at most ``rare_share`` of the
+  batch, for fields whose rare values together stay below that share
+  (ID-like and long-tailed fields such as client IPs are skipped);
+* timestamps - ``burst_window``-second buckets holding far more events
+  than the batch's average rate.
+
+Each field is pulled out of the events once into a NumPy array and all
+statistics run over whole columns. The findings are combined into a 0-10
+score, which the webhook uses to escalate batches the rule pre-filter
+would have skipped, and described in an evidence note for the prompt.
+
+Fields are detected from a sample of the batch unless configured:
+numbers (not booleans) are numeric, strings are categorical, and time
+fields are only used for burst detection.
+"""
+
+import math
+import os
+
+import numpy as np
+
+from event_aggregation import DEFAULT_TIME_FIELDS
+from event_archive import MAX_EVENT_TIME, event_time
+
+SAMPLE_SIZE = 256
+MAX_REPORTED_VALUES = 5
+
+# Batches spread over more burst windows than this have no meaningful average rate
+MAX_BURST_BUCKETS = 1_000_000
+
+
+def _sample_fields(events):
+    """(numeric, categorical) fields present in at least half of a sample of the batch"""
+    sample = events[:SAMPLE_SIZE]
+    numeric, categorical = {}, {}
+    for event in sample:
+        for name, value in event.items():
+            if name in DEFAULT_TIME_FIELDS or isinstance(value, bool):
+                continue
+            if isinstance(value, (int, float)):
+                numeric[name] = numeric.get(name, 0) + 1
+            elif isinstance(value, str):
+                categorical[name] = categorical.get(name, 0) + 1
+    half = len(sample) / 2
+    return (
+        [name for name, count in numeric.items() if count >= half],
+        [name for name, count in categorical.items() if count >= half],
+    )
+
+
+def _as_number(value):
+    """Finite float of an int/float value, else NaN"""
+    if type(value) not in (int, float):
+        return math.nan
+    try:
+        value = float(value)
+    except OverflowError:
+        return math.nan
+    return value if math.isfinite(value) else math.nan
+
+
+def _numeric_column(events, field):
+    """Values of a numeric field; missing, non-numeric and non-finite values are NaN"""
+    try:
+        values = np.fromiter(
+            (
+                value if type(value) in (int, float) else math.nan
+                for value in (event.get(field) for event in events)
+            ),
+            dtype=float,
+            count=len(events),
+        )
+    except OverflowError:  # an integer too large for a float
+        return np.fromiter(
+            (_as_number(event.get(field)) for event in events),
+            dtype=float,
+            count=len(events),
+        )
+    values[np.isinf(values)] = math.nan
+    return values
+
+
+def _categorical_column(events, field):
+    """Dictionary codes of a string field (0 = missing) and the values they stand for"""
+    index = {"": 0}
+    codes = np.fromiter(
+        (
+            index.setdefault(value if isinstance(value, str) else "", len(index))
+            for value in (event.get(field) for event in events)
+        ),
+        dtype=np.int64,
+        count=len(events),
+    )
+    return codes, list(index)
+
+
+def _time_column(events):
+    """
+    Event times in epoch seconds, vectorized for numeric _time and ISO
+    timestamp fields; like event_time(), non-finite or out-of-range values
+    are not used (a batch with any falls back to event_time() per event)
+    """
+    values = [event.get("_time") for event in events]
+    if all(type(value) in (int, float) for value in values):
+        try:
+            times = np.asarray(values, dtype=float)
+        except OverflowError:
+            times = None
+        if times is not None and _valid_times(times):
+            return times
+    else:
+        values = [event.get("timestamp") for event in events]
+        if all(isinstance(value, str) for value in values):
+            try:
+                # Second resolution is enough for bursts; offsets are ignored (relative spacing is what matters)
+                stamps = np.array(
+                    [value[:19] for value in values], dtype="datetime64[s]"
+                )
+                times = stamps.astype("int64").astype(float)
+                if _valid_times(times):
+                    return times
+            except ValueError:
+                pass
+    return np.fromiter(
+        (event_time(event, math.nan) for event in events),
+        dtype=float,
+        count=len(events),
+    )
+
+
+def _valid_times(times):
+    with np.errstate(invalid="ignore"):
+        return bool(((times >= 0) & (times <= MAX_EVENT_TIME)).all())
+
+
+class AnomalyScorer:
+    """
+    Per-batch statistical scoring; empty field lists mean "detect from the batch"
+    """
+
+    def __init__(
+        self,
+        numeric_fields=(),
+        categorical_fields=(),
+        z_threshold=3.5,
+        rare_share=0.01,
+        max_cardinality_share=0.2,
+        max_outlier_share=0.02,
+        burst_window=60,
+        burst_factor=5.0,
+        min_events=20,
+    ):
+        self.numeric_fields = list(numeric_fields)
+        self.categorical_fields = list(categorical_fields)
+        self.z_threshold = z_threshold
+        self.rare_share = rare_share
+        self.max_cardinality_share = max_cardinality_share
+        self.max_outlier_share = max_outlier_share
+        self.burst_window = burst_window
+        self.burst_factor = burst_factor
+        self.min_events = min_events
+
+    def _numeric(self, field, values):
+        """Outlier finding for one numeric column (or None) and its outlier mask"""
+        present = ~np.isnan(values)
+        finite = values[present]
+        if len(finite) < self.min_events:
+            return None, None
+        median = np.median(finite)
+        mad = np.median(np.abs(finite - median))
+        if mad > 0:
+            z = 0.6745 * (values - median) / mad
+            method = "mad"
+        else:
+            std = finite.std()
+            if std == 0:
+                return None, None
+            z = (values - finite.mean()) / std
+            method = "zscore"
+        z = np.where(present, np.abs(z), 0.0)
+        mask = (z > self.z_threshold) & (z > np.quantile(z, 1 - self.max_outlier_share))
+        count = int(mask.sum())
+        if not count:
+            return None, None
+        top = np.argsort(-z[mask])[:MAX_REPORTED_VALUES]
+        return {
+            "field": field,
+            "method": method,
+            "outliers": count,
+            "median": float(median),
+            "max_z": round(float(z[mask].max()), 1),
+            "values": [float(value) for value in values[mask][top]],
+        }, mask
+
+    def _categorical(self, field, column, total):
+        """Rare-value finding for one categorical column (or None) and its mask"""
+        codes, values = column
+        counts = np.bincount(codes, minlength=len(values))
+        counts[0] = 0  # missing values are never rare
+        distinct = len(values) - 1
+        if distinct < 2 or distinct > self.max_cardinality_share * total:
+            return None, None
+        rare = (counts > 0) & (counts <= self.rare_share * total)
+        if not rare.any() or counts[rare].sum() > self.rare_share * total:
+            return None, None
+        rare_codes = np.flatnonzero(rare)
+        rare_codes = rare_codes[np.argsort(counts[rare_codes], kind="stable")]
+        return {
+            "field": field,
+            "distinct": distinct,
+            "rare_values": [
+                {"value": values[code], "count": int(counts[code])}
+                for code in rare_codes[:MAX_REPORTED_VALUES].tolist()
+            ],
+            "rare_events": int(counts[rare_codes].sum()),
+        }, rare[codes]
+
+    def _bursts(self, times):
+        """Burst findings over event times and the mask of events inside bursts"""
+        present = ~np.isnan(times)
+        if present.sum() < self.min_events:
+            return [], None
+        start = times[present].min()
+        span = times[present].max() - start
+        if span < 5 * self.burst_window:
+            return [], None
+        if span // self.burst_window >= MAX_BURST_BUCKETS:
+            return [], None
+        # Only occupied buckets are counted, so memory follows the batch size rather than its time span
+        buckets = ((times[present] - start) // self.burst_window).astype(np.int64)
+        occupied, inverse, counts = np.unique(
+            buckets, return_inverse=True, return_counts=True
+        )
+        rate = present.sum() / (occupied[-1] + 1)
+        threshold = max(
+            self.min_events / 2, self.burst_factor * rate, rate + 4 * math.sqrt(rate)
+        )
+        hot = counts >= threshold
+        if not hot.any():
+            return [], None
+
+        # Runs of adjacent hot buckets form one burst
+        hot_buckets, hot_counts = occupied[hot], counts[hot]
+        breaks = np.flatnonzero(np.diff(hot_buckets) != 1) + 1
+        bursts = []
+        for run, run_counts in zip(
+            np.split(hot_buckets, breaks), np.split(hot_counts, breaks)
+        ):
+            first, last = int(run[0]), int(run[-1]) + 1
+            events = int(run_counts.sum())
+            bursts.append(
+                {
+                    "start": float(start + first * self.burst_window),
+                    "end": float(start + last * self.burst_window),
+                    "events": events,
+                    "rate_ratio": round(events / ((last - first) * rate), 1),
+                }
+            )
+        bursts.sort(key=lambda burst: -burst["events"])
+        mask = np.zeros(len(times), dtype=bool)
+        mask[present] = hot[inverse.reshape(-1)]
+        return bursts[:MAX_REPORTED_VALUES], mask
+
+    def score(self, events):
+        """
+        Statistical findings for a batch: numeric outliers, rare categorical
+        values and bursts, the number of events involved and a 0-10 score
+        """
+        events = [event for event in events if isinstance(event, dict)]
+        report = {
+            "events": len(events),
+            "score": 0.0,
+            "numeric": [],
+            "rare": [],
+            "bursts": [],
+            "anomalous_events": 0,
+        }
+        if len(events) < self.min_events:
+            return report
+
+        numeric, categorical = self.numeric_fields, self.categorical_fields
+        if not numeric or not categorical:
+            detected_numeric, detected_categorical = _sample_fields(events)
+            numeric = numeric or detected_numeric
+            categorical = categorical or detected_categorical
+
+        flagged = np.zeros(len(events), dtype=bool)
+        for field in numeric:
+            finding, mask = self._numeric(field, _numeric_column(events, field))
+            if finding:
+                report["numeric"].append(finding)
+                flagged |= mask
+        for field in categorical:
+            finding, mask = self._categorical(
+                field, _categorical_column(events, field), len(events)
+            )
+            if finding:
+                report["rare"].append(finding)
+                flagged |= mask
+        report["bursts"], mask = self._bursts(_time_column(events))
+        if mask is not None:
+            flagged |= mask
+        report["anomalous_events"] = int(flagged.sum())
+
+        components = []
+        if report["numeric"]:
+            components.append(
+                min(
+                    1.0,
+                    max(f["max_z"] for f in report["numeric"]) / (4 * self.z_threshold),
+                )
+            )
+        if report["rare"]:
+            components.append(
+                min(1.0, 0.2 * sum(len(f["rare_values"]) for f in report["rare"]))
+            )
+        if report["bursts"]:
+            components.append(
+                min(1.0, math.log2(max(b["rate_ratio"] for b in report["bursts"])) / 4)
+            )
+        usual = 1.0
+        for value in components:
+            usual *= 1 - min(value, 0.9)
+        report["score"] = round(10 * (1 - usual), 1)
+        return report
+
+
+def _clock(epoch):
+    return np.datetime_as_string(np.datetime64(int(epoch), "s")) + "Z"
+
+
+def evidence_note(report, min_score):
+    """Prompt note describing a report whose score reaches `min_score`, or None"""
+    if report["score"] < min_score:
+        return None
+    lines = [
+        f"ANOMALY EVIDENCE (statistical scoring of this batch: {report['score']:g}/10, "
+        f"{report['anomalous_events']} of {report['events']} events involved):"
+    ]
+    for finding in report["numeric"]:
+        values = ", ".join(f"{value:g}" for value in finding["values"])
+        lines.append(
+            f"- {finding['field']}: {finding['outliers']} outlier(s) up to z={finding['max_z']:g} "
+            f"(batch median {finding['median']:g}; values {values})"
+        )
+    for finding in report["rare"]:
+        values = ", ".join(
+            f"{item['value']} ({item['count']}x)" for item in finding["rare_values"]
+        )
+        lines.append(f"- rare {finding['field']} values: {values}")
+    for burst in report["bursts"]:
+        lines.append(
+            f"- burst of {burst['events']} events between {_clock(burst['start'])} and "
+            f"{_clock(burst['end'])} ({burst['rate_ratio']:g}x the batch's average rate)"
+        )
+    return "\n".join(lines)
+
+
+def create_anomaly_scorer():
+    """Build the scorer from the ANOMALY_* environment variables, or None when disabled"""
+    if os.environ.get("ANOMALY_SCORING", "True").lower() != "true":
+        return None
+    return AnomalyScorer(
+        numeric_fields=[
+            f.strip()
+            for f in os.environ.get("ANOMALY_NUMERIC_FIELDS", "").split(",")
+            if f.strip()
+        ],
+        categorical_fields=[
+            f.strip()
+            for f in os.environ.get("ANOMALY_CATEGORICAL_FIELDS", "").split(",")
+            if f.strip()
+        ],
+        z_threshold=float(os.environ.get("ANOMALY_Z_THRESHOLD", 3.5)),
+        rare_share=float(os.environ.get("ANOMALY_RARE_SHARE", 0.01)),
+        burst_window=float(os.environ.get("ANOMALY_BURST_WINDOW", 60)),
+        burst_factor=float(os.environ.get("ANOMALY_BURST_FACTOR", 5)),
+        min_events=int(os.environ.get("ANOMALY_MIN_EVENTS", 20)),
+    )
@@ -0,0 +1,115 @@
+"""
+Coalescing of small webhook batches into larger analysis jobs.
+
+Events arriving for the same group key (e.g. the same Cribl source)
+within a time window are merged into one pending job. The job is flushed
+when its window expires or when it reaches the configured size, so the
+number of LLM calls follows the number of windows rather than the number
+of webhook calls. Flushes always run on the coalescer's own thread, so
+a webhook request never waits for one.
+"""
+
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingGroup:
+    __slots__ = ("analysis_id", "events", "requests", "deadline")
+
+    def __init__(self, analysis_id, deadline):
+        self.analysis_id = analysis_id
+        self.events = []
+        self.requests = 0
+        self.deadline = deadline
+
+
+class BatchCoalescer:
+    """
+    Time/size windowed merge of event batches, per group key.
+
+    flush_handler(analysis_id, events, requests) is called from the
+    flusher thread, for size-triggered flushes as well as expired windows.
+    """
+
+    def __init__(self, flush_handler, window_seconds=2.0, max_events=1000):
+        self.flush_handler = flush_handler
+        self.window_seconds = window_seconds
+        self.max_events = max_events
+        self._groups = {}
+        self._ready = []  # groups closed by size, waiting for the flusher
+        self._cond = threading.Condition()
+        self._pid = None
+
+    def _ensure_started(self):
+        """Start the flusher thread once per process"""
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(
+                target=self._run, name="batch-coalescer", daemon=True
+            ).start()
+            self._pid = os.getpid()
+
+    def add(self, group_key, events, open_group):
+        """
+        Merge events into the open group for group_key and return its analysis_id.
+
+        open_group(events) is called under the coalescer lock when a new
+        group has to be opened and must return the analysis_id for it; an
+        exception it raises (e.g. a full queue) propagates and opens no group.
+        """
+        self._ensure_started()
+        with self._cond:
+            group = self._groups.get(group_key)
+            if group is None:
+                group = _PendingGroup(
+                    open_group(events), time.monotonic() + self.window_seconds
+                )
+                self._groups[group_key] = group
+                self._cond.notify()
+            group.events.extend(events)
+            group.requests += 1
+            if len(group.events) >= self.max_events:
+                self._ready.append(self._groups.pop(group_key))
+                self._cond.notify()
+        return group.analysis_id
+
+    def pending(self):
+        """Number of open or closed but not yet flushed groups and the events they hold"""
+        with self._cond:
+            groups = list(self._groups.values()) + self._ready
+            return len(groups), sum(len(g.events) for g in groups)
+
+    def _flush(self, group):
+        try:
+            self.flush_handler(group.analysis_id, group.events, group.requests)
+        except Exception as e:
+            logger.error(
+                f"❌ Failed to flush coalesced batch {group.analysis_id}: {str(e)}"
+            )
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._groups and not self._ready:
+                    self._cond.wait()
+                now = time.monotonic()
+                due = [
+                    key for key, group in self._groups.items() if group.deadline <= now
+                ]
+                ready = self._ready + [self._groups.pop(key) for key in due]
+                self._ready = []
+                if not ready:
+                    next_deadline = min(
+                        group.deadline for group in self._groups.values()
+                    )
+                    self._cond.wait(max(0.0, next_deadline - now))
+                    continue
+            for group in ready:
+                self._flush(group)
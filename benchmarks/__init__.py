@@ -0,0 +1 @@
+"""Benchmarks for the Cribl log analysis pipeline (run with ``python -m benchmarks.<name>``)"""
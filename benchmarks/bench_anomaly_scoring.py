@@ -0,0 +1,114 @@
+"""
+Measure the statistical anomaly scorer on synthetic Cribl batches.
+
+Each batch gets a few planted anomalies (an extreme failed_attempts
+value, a never-seen action and a one-minute burst), and the benchmark
+reports the time per phase (column extraction, numeric outliers, rare
+values, bursts), total events/s, and whether every planted anomaly was
+found.
+
+    python -m benchmarks.bench_anomaly_scoring --sizes 10000 100000 1000000
+"""
+
+import argparse
+import time
+
+from anomaly_scoring import (
+    AnomalyScorer,
+    _categorical_column,
+    _numeric_column,
+    _sample_fields,
+    _time_column,
+)
+from benchmarks.cribl_batches import make_batch
+
+PLANTED_ACTION = "mimikatz_run"
+
+
+def planted_batch(size):
+    """A synthetic batch with an outlier, a rare value and a burst of 2% of the events"""
+    events = make_batch(size, duplicate_ratio=0.3, seed=size)
+    events[size // 3]["failed_attempts"] = 500
+    events[size // 2]["action"] = PLANTED_ACTION
+    burst_at = events[0]["_time"] + 3600
+    for event in events[-max(50, size // 50) :]:
+        event["_time"] = burst_at + (hash(id(event)) % 60)
+    return events
+
+
+def time_phase(function, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(sizes, repeat):
+    print(
+        f"{'events':>9} {'extract ms':>11} {'numeric ms':>11} {'rare ms':>8} {'burst ms':>9} "
+        f"{'total ms':>9} {'events/s':>11} {'score':>6} {'found':>6}"
+    )
+    scorer = AnomalyScorer()
+    for size in sizes:
+        events = planted_batch(size)
+        numeric, categorical = _sample_fields(events)
+        extract, columns = time_phase(
+            lambda: (
+                {field: _numeric_column(events, field) for field in numeric},
+                {field: _categorical_column(events, field) for field in categorical},
+                _time_column(events),
+            ),
+            repeat,
+        )
+        numeric_columns, categorical_columns, times = columns
+        numeric_time, _ = time_phase(
+            lambda: [
+                scorer._numeric(field, values)
+                for field, values in numeric_columns.items()
+            ],
+            repeat,
+        )
+        rare_time, _ = time_phase(
+            lambda: [
+                scorer._categorical(field, values, size)
+                for field, values in categorical_columns.items()
+            ],
+            repeat,
+        )
+        burst_time, _ = time_phase(lambda: scorer._bursts(times), repeat)
+        total, report = time_phase(lambda: scorer.score(events), repeat)
+
+        found = (
+            any(
+                f["field"] == "failed_attempts" and 500.0 in f["values"]
+                for f in report["numeric"]
+            )
+            and any(
+                item["value"] == PLANTED_ACTION
+                for f in report["rare"]
+                for item in f["rare_values"]
+            )
+            and bool(report["bursts"])
+        )
+        print(
+            f"{size:>9} {extract * 1000:>11.1f} {numeric_time * 1000:>11.1f} {rare_time * 1000:>8.1f} "
+            f"{burst_time * 1000:>9.1f} {total * 1000:>9.1f} {size / total:>11,.0f} {report['score']:>6g} "
+            f"{'yes' if found else 'NO':>6}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[10000, 100000, 1000000]
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
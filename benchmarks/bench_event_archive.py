@@ -0,0 +1,116 @@
+"""
+Measure event archive write throughput and indexed query cost.
+
+Archives ``--batches`` synthetic batches (one analysis id each, batch
+times advancing by five minutes), then runs typical analyst queries and
+reports how many frames the sidecar index let the query skip, compared
+with decompressing and filtering the whole archive.
+
+    python -m benchmarks.bench_event_archive --batches 500 --batch-size 200
+"""
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import tempfile
+import time
+
+from benchmarks.cribl_batches import make_batch
+from event_archive import EventArchive, event_time
+
+
+def full_scan(directory, predicate):
+    """Matching records by decompressing every segment (what the index avoids)"""
+    matches = []
+    for path in glob.glob(os.path.join(directory, "segment-*.ndjson.gz")):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            matches.extend(record for record in map(json.loads, f) if predicate(record))
+    return matches
+
+
+def write_archive(directory, batches, batch_size, frame_events):
+    archive = EventArchive(
+        directory,
+        frame_events=frame_events,
+        fsync_interval=0.5,
+        retention_days=0,
+        max_pending=batches,
+    )
+    ids = []
+    raw_bytes = 0
+    start = time.perf_counter()
+    for k in range(batches):
+        events = make_batch(batch_size, duplicate_ratio=0.3, seed=k)
+        for event in events:
+            event["_time"] = 1705276800 + k * 300 + (event["_time"] % 300)
+        raw_bytes += sum(len(json.dumps(event)) + 1 for event in events)
+        ids.append(f"bench_{k:05d}")
+        archive.append(ids[-1], events)
+    while archive.snapshot()["events"] < batches * batch_size:
+        time.sleep(0.01)
+    elapsed = time.perf_counter() - start
+    stored = sum(
+        os.path.getsize(path)
+        for path in glob.glob(os.path.join(directory, "segment-*"))
+    )
+    print(
+        f"wrote {batches * batch_size} events in {elapsed:.2f}s ({batches * batch_size / elapsed:,.0f} events/s), "
+        f"{raw_bytes / 1048576:.1f} MiB raw -> {stored / 1048576:.1f} MiB on disk incl. index"
+    )
+    return archive, ids
+
+
+def run(batches, batch_size, frame_events):
+    with tempfile.TemporaryDirectory() as directory:
+        archive, ids = write_archive(directory, batches, batch_size, frame_events)
+        middle = 1705276800 + batches // 2 * 300
+        sample = make_batch(batch_size, seed=batches // 2)[0]
+        queries = {
+            "analysis_id": (
+                {"analysis_id": ids[len(ids) // 2]},
+                lambda r: r["analysis_id"] == ids[len(ids) // 2],
+            ),
+            "source_ip": (
+                {"source_ip": sample["source_ip"]},
+                lambda r: r["event"].get("source_ip") == sample["source_ip"],
+            ),
+            "user+1h": (
+                {"user": "admin", "start": middle, "end": middle + 3600},
+                lambda r: r["event"].get("user") == "admin"
+                and middle <= event_time(r["event"], 0) <= middle + 3600,
+            ),
+        }
+        print(
+            f"{'query':>12} {'matches':>8} {'frames read':>12} {'indexed ms':>11} {'full scan ms':>13}"
+        )
+        for name, (filters, predicate) in queries.items():
+            start = time.perf_counter()
+            found = archive.query(limit=batches * batch_size, **filters)
+            indexed = time.perf_counter() - start
+            start = time.perf_counter()
+            expected = full_scan(directory, predicate)
+            scanned = time.perf_counter() - start
+            assert len(found["events"]) == len(expected), (
+                name,
+                len(found["events"]),
+                len(expected),
+            )
+            print(
+                f"{name:>12} {len(expected):>8} {found['frames_scanned']:>5}/{found['frames_total']:<6} "
+                f"{indexed * 1000:>11.1f} {scanned * 1000:>13.1f}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batches", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--frame-events", type=int, default=1000)
+    args = parser.parse_args()
+    run(args.batches, args.batch_size, args.frame_events)
+
+
+if __name__ == "__main__":
+    main()
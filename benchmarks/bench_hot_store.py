@@ -0,0 +1,147 @@
+"""
+Compare the columnar hot store with dict-of-dicts storage of recent events.
+
+Loads the same events, reduced to the hot store's columns, into either a
+dict of per-batch lists of dicts (how ``analysis_results`` holds records)
+or a ``ColumnarHotStore``, each in a fresh subprocess, and reports the
+resident memory added (anonymous heap and file-backed mapped pages
+separately) and the time of a "this user in the last hour" query.
+
+    python -m benchmarks.bench_hot_store --events 100000 1000000
+"""
+
+import argparse
+import json
+import subprocess
+import sys
+import tempfile
+import time
+
+BATCH_SIZE = 500
+HOUR = 3600
+
+
+def memory_kib():
+    """(RssAnon, RssFile) of this process in KiB"""
+    fields = {}
+    with open("/proc/self/status") as f:
+        for line in f:
+            name, _, value = line.partition(":")
+            fields[name] = value.split()[0] if value.split() else "0"
+    return int(fields.get("RssAnon", 0)), int(fields.get("RssFile", 0))
+
+
+def batches(count):
+    """(analysis_id, events) batches spread over the last day, newest last"""
+    from benchmarks.cribl_batches import make_batch
+
+    now = time.time()
+    for k in range(0, count, BATCH_SIZE):
+        events = make_batch(min(BATCH_SIZE, count - k), seed=k)
+        for i, event in enumerate(events):
+            event["_time"] = now - 86400 + (k + i) * 86400 / count
+        yield f"bench_{k // BATCH_SIZE:06d}", events
+
+
+def run_variant(variant, count):
+    from event_archive import event_time, first_field
+    from hot_store import STRING_COLUMNS, ColumnarHotStore
+
+    before = memory_kib()
+    start = time.time() - HOUR
+    if variant == "dicts":
+        store = {}
+        for analysis_id, events in batches(count):
+            store[analysis_id] = {
+                "events": [
+                    dict(
+                        {
+                            name: (
+                                analysis_id
+                                if name == "analysis_id"
+                                else first_field(event, aliases)
+                            )
+                            for name, aliases in STRING_COLUMNS.items()
+                        },
+                        time=event_time(event, 0),
+                    )
+                    for event in events
+                ]
+            }
+        after = memory_kib()
+        started = time.perf_counter()
+        found = [
+            event
+            for record in store.values()
+            for event in record["events"]
+            if event["user"] == "admin" and event["time"] >= start
+        ]
+        query_ms = (time.perf_counter() - started) * 1000
+        matches = len(found)
+    else:
+        with tempfile.TemporaryDirectory() as directory:
+            store = ColumnarHotStore(
+                directory, segment_rows=1 << 20, retention_seconds=0, max_bytes=0
+            )
+            for analysis_id, events in batches(count):
+                store.append(analysis_id, events)
+            store.query({"user": "admin"}, limit=0)  # map the segments before measuring
+            after = memory_kib()
+            started = time.perf_counter()
+            matches = store.query({"user": "admin"}, start=start, limit=1000)["total"]
+            query_ms = (time.perf_counter() - started) * 1000
+    print(
+        json.dumps(
+            {
+                "anon_kib": after[0] - before[0],
+                "file_kib": after[1] - before[1],
+                "query_ms": query_ms,
+                "matches": matches,
+            }
+        )
+    )
+
+
+def run(sizes):
+    print(
+        f"{'events':>9} {'storage':>9} {'heap MiB':>9} {'mapped MiB':>11} {'bytes/event':>12} {'query ms':>9} {'matches':>8}"
+    )
+    for count in sizes:
+        for variant in ("dicts", "columnar"):
+            output = subprocess.run(
+                [
+                    sys.executable,
+                    "-m",
+                    "benchmarks.bench_hot_store",
+                    "--variant",
+                    variant,
+                    "--events",
+                    str(count),
+                ],
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout
+            result = json.loads(output.strip().splitlines()[-1])
+            total = (result["anon_kib"] + result["file_kib"]) * 1024
+            print(
+                f"{count:>9} {variant:>9} {result['anon_kib'] / 1024:>9.1f} {result['file_kib'] / 1024:>11.1f} "
+                f"{total / count:>12.0f} {result['query_ms']:>9.1f} {result['matches']:>8}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--events", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument(
+        "--variant", choices=["dicts", "columnar"], help=argparse.SUPPRESS
+    )
+    args = parser.parse_args()
+    if args.variant:
+        run_variant(args.variant, args.events[0])
+    else:
+        run(args.events)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,56 @@
+"""
+Compare prompt encodings on synthetic Cribl batches.
+
+Reports encoded size in bytes, estimated tokens and encode time for
+each format, with and without dropping Cribl metadata fields.
+
+    python -m benchmarks.bench_prompt_encoding --sizes 100 1000 10000
+"""
+
+import argparse
+import time
+
+from benchmarks.cribl_batches import make_batch
+from log_chunking import estimate_tokens
+from prompt_encoding import PROMPT_FORMATS, encode_events
+
+NOISY_FIELDS = ["_time", "cribl_pipe", "sourcetype", "source"]
+
+
+def run(sizes, repeat):
+    print(
+        f"{'events':>8} {'format':>8} {'drop':>5} {'bytes':>12} {'~tokens':>10} {'vs pretty':>10} {'encode ms':>10}"
+    )
+    for size in sizes:
+        events = make_batch(size, duplicate_ratio=0.5)
+        baseline = None
+        for drop_fields in ([], NOISY_FIELDS):
+            for fmt in PROMPT_FORMATS:
+                best = None
+                for _ in range(repeat):
+                    start = time.perf_counter()
+                    header, rows = encode_events(events, fmt, drop_fields)
+                    text = (
+                        header + "\n" + "\n".join(rows) if header else "\n".join(rows)
+                    )
+                    elapsed = time.perf_counter() - start
+                    best = elapsed if best is None else min(best, elapsed)
+                size_bytes = len(text.encode("utf-8"))
+                if baseline is None:
+                    baseline = size_bytes
+                print(
+                    f"{size:>8} {fmt:>8} {'yes' if drop_fields else 'no':>5} {size_bytes:>12} "
+                    f"{estimate_tokens(text):>10} {size_bytes / baseline:>9.2f}x {best * 1000:>10.2f}"
+                )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Compare model-response parsers on the response corpus.
+
+Reports, per parser, the share of responses parsed correctly (threat
+level, risk score and every section present in the response recovered)
+and parse throughput. ``legacy`` is the line-by-line startswith parser
+that ``llm_response`` replaced, kept here as the baseline; ``text`` is
+the tolerant single-pass section parser and ``auto`` adds JSON decoding
+and validation in front of it.
+
+    python -m benchmarks.bench_response_parsing --fuzz 2000
+"""
+
+import argparse
+import time
+
+from benchmarks.llm_response_corpus import RESPONSES, fuzz_corpus
+from llm_response import parse_analysis, parse_text_analysis
+from log_chunking import normalize_risk_score, normalize_threat_level
+
+
+def legacy_parse(response_text):
+    """The original parse_llm_response: exact upper-case headers, fixed section order"""
+    parsed = {
+        "threat_level": "UNKNOWN",
+        "risk_score": "N/A",
+        "summary": "Analysis in progress...",
+        "key_findings": "Processing...",
+        "immediate_actions": "Under review...",
+        "recommendations": "Pending analysis...",
+    }
+    current_section = None
+    content_buffer = []
+    for line in response_text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("THREAT_LEVEL:"):
+            parsed["threat_level"] = line.split(":", 1)[1].strip()
+        elif line.startswith("RISK_SCORE:"):
+            parsed["risk_score"] = line.split(":", 1)[1].strip()
+        elif line.startswith("SUMMARY:"):
+            parsed["summary"] = line.split(":", 1)[1].strip()
+        elif line.startswith("KEY_FINDINGS:"):
+            current_section = "key_findings"
+            content_buffer = (
+                [line.split(":", 1)[1].strip()] if line.split(":", 1)[1].strip() else []
+            )
+        elif line.startswith("IMMEDIATE_ACTIONS:"):
+            if current_section == "key_findings" and content_buffer:
+                parsed["key_findings"] = "\n".join(content_buffer)
+            current_section = "immediate_actions"
+            content_buffer = (
+                [line.split(":", 1)[1].strip()] if line.split(":", 1)[1].strip() else []
+            )
+        elif line.startswith("RECOMMENDATIONS:"):
+            if current_section == "immediate_actions" and content_buffer:
+                parsed["immediate_actions"] = "\n".join(content_buffer)
+            current_section = "recommendations"
+            content_buffer = (
+                [line.split(":", 1)[1].strip()] if line.split(":", 1)[1].strip() else []
+            )
+        elif current_section and line:
+            content_buffer.append(line)
+    if current_section == "recommendations" and content_buffer:
+        parsed["recommendations"] = "\n".join(content_buffer)
+    return parsed
+
+
+PARSERS = {
+    "legacy": legacy_parse,
+    "text": parse_text_analysis,
+    "auto": parse_analysis,
+}
+
+
+def is_correct(case, parsed):
+    """True when the parse recovered everything the corpus entry expects"""
+    if normalize_threat_level(parsed.get("threat_level")) != case["threat_level"]:
+        return False
+    score = normalize_risk_score(parsed.get("risk_score"))
+    if str(score) != case["risk_score"]:
+        return False
+    return all(
+        snippet in str(parsed.get(field, ""))
+        for field, snippet in case["sections"].items()
+    )
+
+
+def run(cases, repeat, show_failures):
+    total_bytes = sum(len(case["text"].encode("utf-8")) for case in cases)
+    print(f"{len(cases)} responses, {total_bytes / 1024:.1f} KiB")
+    print(f"{'parser':>8} {'correct':>9} {'rate':>7} {'responses/s':>12} {'MiB/s':>8}")
+    for name, parse in PARSERS.items():
+        failures = [
+            case["name"] for case in cases if not is_correct(case, parse(case["text"]))
+        ]
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for case in cases:
+                parse(case["text"])
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        correct = len(cases) - len(failures)
+        print(
+            f"{name:>8} {correct:>9} {correct / len(cases):>6.1%} {len(cases) / best:>12.0f} "
+            f"{total_bytes / best / 1048576:>8.2f}"
+        )
+        if show_failures and failures:
+            print(
+                f"{'':>8} failed: {', '.join(failures[:10])}{' ...' if len(failures) > 10 else ''}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--fuzz", type=int, default=2000, help="fuzzed variants added to the corpus"
+    )
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--show-failures", action="store_true")
+    args = parser.parse_args()
+    run(RESPONSES + fuzz_corpus(args.fuzz, args.seed), args.repeat, args.show_failures)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""
+Measure the BM25 retrieval index on synthetic Cribl events.
+
+Indexes each size of event stream (with a few planted events of a user
+who appears nowhere else), then reports indexing events/s, the memory
+the index added, search latency for a targeted and a broad question,
+and whether the planted events come first.
+
+    python -m benchmarks.bench_retrieval --sizes 10000 50000 --embeddings
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from benchmarks.cribl_batches import make_batch
+from retrieval_index import RetrievalIndex
+
+PLANTED_USER = "mallory"
+PLANTED_EVENTS = 5
+QUERIES = {
+    "targeted": f"what did {PLANTED_USER} do with /etc/shadow",
+    "broad": "recent failed login patterns",
+}
+
+
+def planted_events(size):
+    events = make_batch(size, duplicate_ratio=0.3, seed=size)
+    for i in range(PLANTED_EVENTS):
+        event = events[(i + 1) * size // (PLANTED_EVENTS + 1)]
+        event["user"] = PLANTED_USER
+        event["file_path"] = "/etc/shadow"
+    return events
+
+
+def search_ms(index, query, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        hits = index.search(query, 20)
+        elapsed = (time.perf_counter() - started) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best, hits
+
+
+def run(sizes, embeddings, repeat):
+    print(
+        f"{'events':>8} {'index ev/s':>11} {'MiB':>6} {'targeted ms':>12} {'broad ms':>9} {'planted first':>14}"
+    )
+    for size in sizes:
+        events = planted_events(size)
+        index = RetrievalIndex(max_docs=size, embeddings=embeddings)
+        started = time.perf_counter()
+        for event in events:
+            index.add_event("bench", event, 0)
+        index_seconds = time.perf_counter() - started
+
+        # Memory is measured on a second build; tracing slows indexing down severalfold
+        tracemalloc.start()
+        traced = RetrievalIndex(max_docs=size, embeddings=embeddings)
+        for event in events:
+            traced.add_event("bench", event, 0)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del traced
+
+        targeted, hits = search_ms(index, QUERIES["targeted"], repeat)
+        broad, _ = search_ms(index, QUERIES["broad"], repeat)
+        found = all(PLANTED_USER in hit["text"] for hit in hits[:PLANTED_EVENTS])
+        print(
+            f"{size:>8} {size / index_seconds:>11,.0f} {memory / 2 ** 20:>6.1f} {targeted:>12.1f} "
+            f"{broad:>9.1f} {'yes' if found else 'NO':>14}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 50000])
+    parser.add_argument(
+        "--embeddings",
+        action="store_true",
+        help="also build trigram vectors and fuse rankings",
+    )
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    run(args.sizes, args.embeddings, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
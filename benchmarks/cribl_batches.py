@@ -0,0 +1,72 @@
+"""
+Synthetic Cribl Stream batches for benchmarks.
+
+Events mimic the auth/file-access records the pipeline sees in
+production: a handful of users, actions and source IPs, Cribl metadata
+fields, and a configurable share of exact repeats.
+"""
+
+import random
+from datetime import datetime, timedelta
+
+USERS = ["john.doe", "jane.smith", "svc_backup", "admin", "m.lee", "r.patel", "guest"]
+ACTIONS = [
+    "login",
+    "login_failure",
+    "file_access",
+    "privilege_change",
+    "logout",
+    "vpn_connect",
+]
+DEPARTMENTS = ["IT", "Finance", "HR", "Engineering", "Sales"]
+FILES = [
+    "/sensitive/financial_data.xlsx",
+    "/home/shared/notes.txt",
+    "/etc/passwd",
+    "/hr/salaries.csv",
+]
+
+
+def make_event(rng, base_time):
+    """One synthetic security event"""
+    ts = base_time + timedelta(seconds=rng.randint(0, 86400))
+    action = rng.choice(ACTIONS)
+    event = {
+        "_time": ts.timestamp(),
+        "timestamp": ts.strftime("%Y-%m-%dT%H:%M:%SZ"),
+        "host": f"srv-{rng.randint(1, 20):02d}",
+        "source": "auth",
+        "sourcetype": "linux_secure",
+        "cribl_pipe": "ai-log-analysis",
+        "user": rng.choice(USERS),
+        "action": action,
+        "source_ip": f"192.168.{rng.randint(0, 3)}.{rng.randint(1, 254)}",
+        "department": rng.choice(DEPARTMENTS),
+        "status": "failure" if action == "login_failure" else "success",
+        "failed_attempts": rng.choice([0, 0, 0, 1, 2, 5, 12]),
+    }
+    if action == "file_access":
+        event["file_path"] = rng.choice(FILES)
+    if action == "privilege_change":
+        event["escalated_privileges"] = True
+    return event
+
+
+def make_batch(size, duplicate_ratio=0.0, seed=0):
+    """
+    A list of `size` events where roughly `duplicate_ratio` of them are
+    repeats of earlier events apart from their timestamps
+    """
+    rng = random.Random(seed)
+    base_time = datetime(2024, 1, 15)
+    events = []
+    for _ in range(size):
+        if events and rng.random() < duplicate_ratio:
+            event = dict(rng.choice(events))
+            ts = base_time + timedelta(seconds=rng.randint(0, 86400))
+            event["_time"] = ts.timestamp()
+            event["timestamp"] = ts.strftime("%Y-%m-%dT%H:%M:%SZ")
+        else:
+            event = make_event(rng, base_time)
+        events.append(event)
+    return events
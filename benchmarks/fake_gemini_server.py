@@ -0,0 +1,255 @@
+"""
+Local stand-in for the Gemini generateContent REST API.
+
+Answers ``POST /v1beta/models/<model>:generateContent`` (and
+``:streamGenerateContent?alt=sse``) with a canned structured analysis
+after a configurable latency, and can inject 429/500 errors at given
+rates. Requests asking for JSON output (``generationConfig.responseMimeType``)
+get the same analysis as a JSON object. ``GET /stats`` returns call counters.
+
+    python -m benchmarks.fake_gemini_server --port 8089 --latency-ms 800 --error-rate 0.05
+    GEMINI_API_BASE=http://127.0.0.1:8089/v1beta GEMINI_API_KEY=fake python log_api.py
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+CANNED_RESPONSE = """THREAT_LEVEL: {level}
+RISK_SCORE: {score}
+SUMMARY: Synthetic analysis of {chars} characters of log data from the fake Gemini server.
+KEY_FINDINGS:
+- {findings}
+IMMEDIATE_ACTIONS:
+- Review the flagged accounts
+RECOMMENDATIONS:
+- Keep monitoring authentication and file access patterns
+"""
+
+
+class FakeGeminiConfig:
+    """Latency and error profile of the fake server"""
+
+    def __init__(
+        self,
+        latency_ms=500,
+        jitter_ms=0,
+        error_rate=0.0,
+        rate_limit_rate=0.0,
+        stream_chunks=8,
+        seed=None,
+    ):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.stream_chunks = stream_chunks
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "errors": 0, "rate_limited": 0, "prompt_chars": 0}
+
+
+def canned_analysis(prompt, as_json=False):
+    """Deterministic structured answer whose severity follows the prompt's content"""
+    text = prompt.lower()
+    if "escalated_privileges" in text or "malware" in text:
+        level, score, findings = (
+            "CRITICAL",
+            9,
+            "Privilege escalation indicators present",
+        )
+    elif "failed_attempts" in text or "failure" in text:
+        level, score, findings = "HIGH", 7, "Repeated authentication failures"
+    else:
+        level, score, findings = "LOW", 2, "No notable anomalies"
+    if as_json:
+        return json.dumps(
+            {
+                "threat_level": level,
+                "risk_score": score,
+                "summary": f"Synthetic analysis of {len(prompt)} characters of log data from the fake Gemini server.",
+                "key_findings": [findings],
+                "immediate_actions": ["Review the flagged accounts"],
+                "recommendations": [
+                    "Keep monitoring authentication and file access patterns"
+                ],
+            },
+            indent=2,
+        )
+    return CANNED_RESPONSE.format(
+        level=level, score=score, chars=len(prompt), findings=findings
+    )
+
+
+def _make_handler(config):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body, headers=None):
+            data = json.dumps(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/") == "/stats":
+                with config.lock:
+                    self._send_json(200, dict(config.stats))
+            else:
+                self._send_json(404, {"error": {"message": "not found"}})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            prompt = "".join(
+                part.get("text", "")
+                for content in body.get("contents", [])
+                for part in content.get("parts", [])
+            )
+            with config.lock:
+                config.stats["requests"] += 1
+                config.stats["prompt_chars"] += len(prompt)
+                roll = config.random.random()
+                jitter = (
+                    config.random.uniform(0, config.jitter_ms)
+                    if config.jitter_ms
+                    else 0
+                )
+
+            time.sleep((config.latency_ms + jitter) / 1000.0)
+
+            if roll < config.rate_limit_rate:
+                with config.lock:
+                    config.stats["rate_limited"] += 1
+                self._send_json(
+                    429,
+                    {"error": {"code": 429, "message": "Resource has been exhausted"}},
+                    {"Retry-After": "1"},
+                )
+                return
+            if roll < config.rate_limit_rate + config.error_rate:
+                with config.lock:
+                    config.stats["errors"] += 1
+                self._send_json(
+                    500, {"error": {"code": 500, "message": "Internal error"}}
+                )
+                return
+
+            as_json = (
+                body.get("generationConfig", {}).get("responseMimeType")
+                == "application/json"
+            )
+            text = canned_analysis(prompt, as_json)
+            if ":streamGenerateContent" in self.path:
+                self._stream(text)
+            else:
+                self._send_json(
+                    200,
+                    {
+                        "candidates": [
+                            {"content": {"role": "model", "parts": [{"text": text}]}}
+                        ]
+                    },
+                )
+
+        def _stream(self, text):
+            """Send text as server-sent events, one candidate fragment per event"""
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            step = max(1, len(text) // max(1, config.stream_chunks))
+            for start in range(0, len(text), step):
+                fragment = {
+                    "candidates": [
+                        {
+                            "content": {
+                                "role": "model",
+                                "parts": [{"text": text[start : start + step]}],
+                            }
+                        }
+                    ]
+                }
+                self.wfile.write(
+                    f"data: {json.dumps(fragment)}\r\n\r\n".encode("utf-8")
+                )
+                self.wfile.flush()
+                time.sleep(config.latency_ms / 1000.0 / max(1, config.stream_chunks))
+            self.close_connection = True
+
+    return Handler
+
+
+class _FakeServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The stdlib default backlog of 5 drops connections under concurrent load
+    request_queue_size = 512
+
+
+def start_fake_server(host="127.0.0.1", port=0, **profile):
+    """
+    Start the fake server in a background thread.
+
+    Returns (server, config); the base URL for GEMINI_API_BASE is
+    f"http://{host}:{server.server_address[1]}/v1beta".
+    """
+    config = FakeGeminiConfig(**profile)
+    server = _FakeServer((host, port), _make_handler(config))
+    threading.Thread(
+        target=server.serve_forever, name="fake-gemini", daemon=True
+    ).start()
+    return server, config
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local fake Gemini REST server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=500)
+    parser.add_argument("--jitter-ms", type=float, default=0)
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="share of requests answered with 500",
+    )
+    parser.add_argument(
+        "--rate-limit-rate",
+        type=float,
+        default=0.0,
+        help="share of requests answered with 429",
+    )
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    server, _ = start_fake_server(
+        args.host,
+        args.port,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    )
+    print(
+        f"Fake Gemini listening on http://{args.host}:{server.server_address[1]}/v1beta"
+    )
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,378 @@
+"""
+Model analysis responses for parser benchmarks and fuzzing.
+
+``RESPONSES`` holds outputs in the shapes Gemini actually produces for the
+analysis prompts: the requested section format, markdown-decorated and
+reordered variants, numbered headers, and JSON (bare, fenced, wrapped in
+prose). Each entry records what a correct parse must recover: the threat
+level, the risk score, and a snippet every present section must contain.
+
+``fuzz_corpus`` derives many more cases by applying the decorations models
+add (bold and heading markers, spaced or lower-case names, CRLF line
+endings, preambles, shuffled sections) to the section-format entries.
+"""
+
+import json
+import random
+
+SECTION_NAMES = [
+    "THREAT_LEVEL",
+    "RISK_SCORE",
+    "SUMMARY",
+    "KEY_FINDINGS",
+    "IMMEDIATE_ACTIONS",
+    "RECOMMENDATIONS",
+]
+
+
+def _case(name, text, threat_level, risk_score, **sections):
+    return {
+        "name": name,
+        "text": text,
+        "threat_level": threat_level,
+        "risk_score": risk_score,
+        "sections": sections,
+    }
+
+
+RESPONSES = [
+    _case(
+        "plain",
+        """THREAT_LEVEL: HIGH
+RISK_SCORE: 8
+SUMMARY: Fifteen failed logins for admin from 203.0.113.7 within five minutes, followed by a success.
+KEY_FINDINGS:
+- 15 consecutive login_failure events for admin
+- Successful login from the same IP at 02:35
+IMMEDIATE_ACTIONS:
+- Lock the admin account
+- Block 203.0.113.7 at the firewall
+RECOMMENDATIONS:
+- Enforce MFA for privileged accounts
+- Alert on more than 5 failures per minute
+""",
+        "HIGH",
+        "8",
+        summary="Fifteen failed logins",
+        key_findings="15 consecutive",
+        immediate_actions="Lock the admin account",
+        recommendations="Enforce MFA",
+    ),
+    _case(
+        "markdown_bold",
+        """**THREAT_LEVEL:** CRITICAL
+**RISK_SCORE:** 9
+
+**SUMMARY:** svc_backup was granted domain admin rights and immediately read /etc/shadow.
+
+**KEY_FINDINGS:**
+* privilege_change with escalated_privileges=true for svc_backup
+* file_access to /etc/shadow 40 seconds later
+
+**IMMEDIATE_ACTIONS:**
+* Revoke the new group membership
+* Rotate svc_backup credentials
+
+**RECOMMENDATIONS:**
+* Require change tickets for privilege grants
+""",
+        "CRITICAL",
+        "9",
+        summary="svc_backup was granted",
+        key_findings="privilege_change",
+        immediate_actions="Revoke the new group",
+        recommendations="change tickets",
+    ),
+    _case(
+        "bold_values",
+        """THREAT_LEVEL: **MEDIUM**
+RISK_SCORE: **5/10**
+SUMMARY: **Unusual after-hours file access by jane.smith to the HR salary export.**
+KEY_FINDINGS:
+- Access at 03:12 local time, outside normal hours
+IMMEDIATE_ACTIONS:
+- Confirm the access with jane.smith's manager
+RECOMMENDATIONS:
+- Restrict /hr/salaries.csv to the HR group
+""",
+        "MEDIUM",
+        "5",
+        summary="Unusual after-hours",
+        key_findings="outside normal hours",
+        immediate_actions="Confirm the access",
+        recommendations="Restrict /hr/salaries.csv",
+    ),
+    _case(
+        "headings",
+        """## Threat Level
+HIGH
+
+## Risk Score
+7
+
+## Summary
+Repeated VPN connections for m.lee from three countries in one hour.
+
+## Key Findings
+- vpn_connect from DE, BR and SG within 52 minutes
+- No MFA challenge recorded
+
+## Immediate Actions
+- Terminate active VPN sessions for m.lee
+
+## Recommendations
+- Enable impossible-travel detection
+""",
+        "HIGH",
+        "7",
+        summary="Repeated VPN connections",
+        key_findings="vpn_connect from DE",
+        immediate_actions="Terminate active VPN",
+        recommendations="impossible-travel",
+    ),
+    _case(
+        "reordered",
+        """THREAT_LEVEL: LOW
+RISK_SCORE: 2
+SUMMARY: Routine logins and logouts during business hours.
+RECOMMENDATIONS:
+- Keep current monitoring thresholds
+KEY_FINDINGS:
+- All logins succeeded on the first attempt
+IMMEDIATE_ACTIONS:
+- None required
+""",
+        "LOW",
+        "2",
+        summary="Routine logins",
+        key_findings="first attempt",
+        immediate_actions="None required",
+        recommendations="current monitoring",
+    ),
+    _case(
+        "spaced_names",
+        """Threat Level: MEDIUM
+Risk Score: 6
+Summary: A guest account accessed /etc/passwd twice.
+Key Findings:
+- guest read /etc/passwd from srv-04
+Immediate Actions:
+- Disable the guest account on srv-04
+Recommendations:
+- Remove interactive shells from guest accounts
+""",
+        "MEDIUM",
+        "6",
+        summary="A guest account",
+        key_findings="guest read /etc/passwd",
+        immediate_actions="Disable the guest account",
+        recommendations="interactive shells",
+    ),
+    _case(
+        "numbered",
+        """1. **Threat Level:** HIGH
+2. **Risk Score:** 8
+3. **Summary:** Brute-force pattern against r.patel from a Tor exit node.
+4. **Key Findings:**
+   - 42 failures in 3 minutes
+   - Source IP listed as a Tor exit node
+5. **Immediate Actions:**
+   - Block the source IP
+6. **Recommendations:**
+   - Block Tor exit nodes at the edge
+""",
+        "HIGH",
+        "8",
+        summary="Brute-force pattern",
+        key_findings="42 failures",
+        immediate_actions="Block the source IP",
+        recommendations="Tor exit nodes",
+    ),
+    _case(
+        "preamble_and_inline_mentions",
+        """Here is my analysis of the provided logs.
+
+THREAT_LEVEL: HIGH - possible credential stuffing
+RISK_SCORE: 7 (elevated)
+SUMMARY: Many accounts saw single failed logins from one IP.
+KEY_FINDINGS:
+- 30 distinct users with one failure each from 198.51.100.23
+- Recommendations: see the section below
+IMMEDIATE_ACTIONS:
+- Block 198.51.100.23
+RECOMMENDATIONS:
+- Rate-limit logins per source IP
+
+Let me know if you need more detail.
+""",
+        "HIGH",
+        "7",
+        summary="Many accounts",
+        key_findings="30 distinct users",
+        immediate_actions="Block 198.51.100.23",
+        recommendations="Rate-limit logins",
+    ),
+    _case(
+        "inline_lists",
+        """THREAT_LEVEL: LOW
+RISK_SCORE: 1
+SUMMARY: Only logout events.
+KEY_FINDINGS: No anomalies in 12 logout events.
+IMMEDIATE_ACTIONS: None.
+RECOMMENDATIONS: No changes needed.
+""",
+        "LOW",
+        "1",
+        summary="Only logout events",
+        key_findings="No anomalies",
+        immediate_actions="None.",
+        recommendations="No changes needed",
+    ),
+    _case(
+        "json",
+        json.dumps(
+            {
+                "threat_level": "CRITICAL",
+                "risk_score": 10,
+                "summary": "Malware beacon pattern from srv-12 to a known C2 domain.",
+                "key_findings": [
+                    "Outbound connections every 60s",
+                    "Domain on threat-intel blocklist",
+                ],
+                "immediate_actions": ["Isolate srv-12"],
+                "recommendations": ["Add egress filtering for servers"],
+            },
+            indent=2,
+        ),
+        "CRITICAL",
+        "10",
+        summary="Malware beacon",
+        key_findings="Outbound connections",
+        immediate_actions="Isolate srv-12",
+        recommendations="egress filtering",
+    ),
+    _case(
+        "json_fenced",
+        """```json
+{
+  "threat_level": "high",
+  "risk_score": "7",
+  "summary": "Admin password changed from an unmanaged host.",
+  "key_findings": ["Change made from 10.9.8.7, not in the asset inventory"],
+  "immediate_actions": ["Verify the change with the admin"],
+  "recommendations": ["Allow admin changes only from jump hosts"]
+}
+```""",
+        "HIGH",
+        "7",
+        summary="Admin password changed",
+        key_findings="not in the asset inventory",
+        immediate_actions="Verify the change",
+        recommendations="jump hosts",
+    ),
+    _case(
+        "json_in_prose",
+        """Sure! Here is the analysis:
+{"threat_level": "LOW", "risk_score": 3, "summary": "Single failed login followed by success.",
+ "key_findings": ["One typo-like failure"], "immediate_actions": [], "recommendations": ["None"]}
+Hope this helps.""",
+        "LOW",
+        "3",
+        summary="Single failed login",
+        key_findings="typo-like",
+    ),
+    _case(
+        "crlf",
+        "THREAT_LEVEL: MEDIUM\r\nRISK_SCORE: 4\r\nSUMMARY: Several file reads of shared notes "
+        "at night.\r\nKEY_FINDINGS:\r\n- 6 reads after midnight\r\nIMMEDIATE_ACTIONS:\r\n- Review with the "
+        "team lead\r\nRECOMMENDATIONS:\r\n- Tag sensitive shares\r\n",
+        "MEDIUM",
+        "4",
+        summary="Several file reads",
+        key_findings="6 reads",
+        immediate_actions="Review with the team lead",
+        recommendations="Tag sensitive",
+    ),
+    _case(
+        "truncated",
+        """THREAT_LEVEL: HIGH
+RISK_SCORE: 8
+SUMMARY: Privilege change for john.doe outside a change window.
+KEY_FINDINGS:
+- privilege_change at 01:14 with no ticket reference
+IMMEDIATE_ACTIONS:
+- Roll back the""",
+        "HIGH",
+        "8",
+        summary="Privilege change",
+        key_findings="no ticket reference",
+        immediate_actions="Roll back",
+    ),
+]
+
+
+def _split_sections(text):
+    """Section-format text as [(name, body)] in order, or None if it does not follow the format"""
+    sections = []
+    for line in text.split("\n"):
+        head, sep, rest = line.partition(":")
+        if sep and head in SECTION_NAMES:
+            sections.append([head, rest.strip()])
+        elif sections:
+            sections[-1][1] = f"{sections[-1][1]}\n{line}".strip("\n")
+        else:
+            return None
+    return sections if [name for name, _ in sections] == SECTION_NAMES else None
+
+
+def _header(rng, name):
+    """One of the ways models decorate a section header"""
+    words = name.replace("_", " ")
+    style = rng.randrange(7)
+    if style == 0:
+        return f"{name}:"
+    if style == 1:
+        return f"**{name}:**"
+    if style == 2:
+        return f"**{name}**:"
+    if style == 3:
+        return f"{words.title()}:"
+    if style == 4:
+        return f"**{words.title()}:**"
+    if style == 5:
+        return f"{name.lower()}:"
+    return f"### {words.title()}\n"
+
+
+def fuzz_corpus(count=1000, seed=7):
+    """`count` decorated variants of the section-format responses, with the same expectations"""
+    rng = random.Random(seed)
+    bases = [(case, _split_sections(case["text"])) for case in RESPONSES]
+    bases = [(case, sections) for case, sections in bases if sections]
+    cases = []
+    for i in range(count):
+        case, sections = rng.choice(bases)
+        sections = [list(section) for section in sections]
+        head, tail = sections[:2], sections[2:]
+        if rng.random() < 0.3:
+            rng.shuffle(tail)  # headers stay first, the rest may come in any order
+        lines = []
+        if rng.random() < 0.3:
+            lines.append(
+                rng.choice(
+                    ["Here is my analysis:", "Analysis of the provided logs", "Sure."]
+                )
+                + "\n"
+            )
+        for name, body in head + tail:
+            if name in ("THREAT_LEVEL", "RISK_SCORE") and rng.random() < 0.3:
+                body = f"**{body}**"
+            header = _header(rng, name)
+            lines.append(header + body if header.endswith("\n") else f"{header} {body}")
+            if rng.random() < 0.3:
+                lines.append("")
+        text = "\n".join(lines)
+        if rng.random() < 0.2:
+            text = text.replace("\n", "\r\n")
+        cases.append(dict(case, name=f"fuzz-{i}-{case['name']}", text=text))
+    return cases
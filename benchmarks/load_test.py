@@ -0,0 +1,529 @@
+"""
+End-to-end load test of ``/log-to-chatbot`` against the fake Gemini server.
+
+Starts the fake model server in-process with the given latency/error
+profile, runs the app under gunicorn (or hypercorn with ``--asgi``) in
+a scratch directory, and drives it from concurrent clients with a pool
+of synthetic Cribl batches (JSON array, NDJSON and gzip, several sizes
+and duplicate ratios). After the load it waits for the analysis queue
+to drain, then reports requests/s, p50/p95/p99 latency, peak RSS of the
+server's process tree, model calls per event and the mean time of every
+phase recorded in ``/metrics``.
+
+    python -m benchmarks.load_test --concurrency 16 --duration 30 --latency-ms 800 --error-rate 0.02
+    python -m benchmarks.load_test --json results.json
+    python -m benchmarks.load_test --baseline results.json --tolerance 0.15
+
+With ``--baseline`` the exit code is 1 when throughput drops, or p95
+latency, peak RSS or model calls per event grow, by more than the
+tolerance. Peak RSS is read from /proc, so it is only reported on Linux.
+"""
+
+import argparse
+import gzip
+import itertools
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import requests
+
+from benchmarks.cribl_batches import make_batch
+from benchmarks.fake_gemini_server import start_fake_server
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FORMATS = ("json", "ndjson", "gzip")
+METRIC_LINE = re.compile(
+    r"^(?P<name>[a-zA-Z_:][\w:]*)(?:\{(?P<labels>[^}]*)\})? (?P<value>\S+)$"
+)
+# Higher is better for throughput; lower is better for everything else
+REGRESSION_CHECKS = {
+    "requests_per_second": -1,
+    "p95_ms": 1,
+    "peak_rss_mib": 1,
+    "llm_calls_per_event": 1,
+}
+
+
+def encode_body(events, fmt):
+    """(body, headers) of one webhook request in the given format"""
+    if fmt == "json":
+        return json.dumps(events).encode("utf-8"), {"Content-Type": "application/json"}
+    body = "\n".join(json.dumps(event) for event in events).encode("utf-8")
+    headers = {"Content-Type": "application/x-ndjson"}
+    if fmt == "gzip":
+        body = gzip.compress(body)
+        headers["Content-Encoding"] = "gzip"
+    return body, headers
+
+
+def request_pool(formats, sizes, duplicate_ratios, variants):
+    """Every combination of format, size and duplicate ratio, `variants` distinct batches each"""
+    pool = []
+    seeds = itertools.count()
+    for fmt, size, ratio in itertools.product(formats, sizes, duplicate_ratios):
+        for _ in range(variants):
+            body, headers = encode_body(
+                make_batch(size, duplicate_ratio=ratio, seed=next(seeds)), fmt
+            )
+            pool.append({"body": body, "headers": headers, "events": size})
+    return pool
+
+
+def wait_for(url, timeout, process=None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(
+                f"Server exited with code {process.returncode} before answering {url}"
+            )
+        try:
+            if requests.get(url, timeout=2).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"{url} did not answer within {timeout:.0f}s")
+
+
+def start_app(args, port, workdir, gemini_base):
+    """Start the app in a subprocess with all state under `workdir`"""
+    env = dict(os.environ)
+    env.update(
+        {
+            "GEMINI_API_BASE": gemini_base,
+            "GEMINI_API_KEY": "fake",
+            "FLASK_DEBUG": "false",
+            "RESULT_STORE": "sqlite",
+            "RESULT_STORE_PATH": os.path.join(workdir, "analysis_results.db"),
+            "LLM_CACHE_PATH": os.path.join(workdir, "llm_cache.db"),
+            "ARCHIVE_DIR": os.path.join(workdir, "archive"),
+            "HOT_STORE_DIR": os.path.join(workdir, "hot_store"),
+            "METRICS_DIR": os.path.join(workdir, "metrics"),
+            "BASELINE_PATH": os.path.join(workdir, "entity_baselines.db"),
+            "ANALYSIS_WORKERS": str(args.analysis_workers),
+            "ANALYSIS_QUEUE_MAX": str(args.queue_max),
+            # Quotas would measure the limiter rather than the app
+            "LLM_REQUESTS_PER_MINUTE": "1000000",
+            "LLM_TOKENS_PER_MINUTE": "1000000000",
+        }
+    )
+    for assignment in args.env:
+        key, _, value = assignment.partition("=")
+        env[key] = value
+    bind = f"127.0.0.1:{port}"
+    if args.asgi:
+        command = [
+            sys.executable,
+            "-m",
+            "hypercorn",
+            "--bind",
+            bind,
+            "log_api_asgi:app",
+        ]
+    else:
+        command = [
+            sys.executable,
+            "-m",
+            "gunicorn",
+            "--bind",
+            bind,
+            "--workers",
+            str(args.workers),
+            "--worker-class",
+            "gthread",
+            "--threads",
+            str(args.threads),
+            "--timeout",
+            "120",
+            "log_api:app",
+        ]
+    log = open(os.path.join(workdir, "server.log"), "wb")
+    return subprocess.Popen(
+        command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT
+    )
+
+
+def _children(pid):
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            return [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+
+
+def _rss_bytes(pid):
+    try:
+        with open(f"/proc/{pid}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, IndexError, ValueError):
+        return 0
+
+
+def tree_rss(pid):
+    """Resident memory of a process and all its descendants, in bytes"""
+    total, pending = 0, [pid]
+    while pending:
+        current = pending.pop()
+        total += _rss_bytes(current)
+        pending.extend(_children(current))
+    return total
+
+
+class RssSampler:
+    """Background thread recording the peak RSS of a process tree"""
+
+    def __init__(self, pid, interval=0.2):
+        self.pid = pid
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="rss-sampler", daemon=True
+        )
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, tree_rss(self.pid))
+            self._stop.wait(self.interval)
+
+    def start(self):
+        if os.path.isdir(f"/proc/{self.pid}"):
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        return self.peak
+
+
+def drive(url, pool, concurrency, duration, total_requests):
+    """
+    Post batches from `pool` from `concurrency` threads until `duration`
+    seconds pass or `total_requests` are sent; returns the samples and wall time
+    """
+    samples = []
+    lock = threading.Lock()
+    counter = itertools.count()
+    deadline = time.monotonic() + duration if duration else None
+
+    def client():
+        session = requests.Session()
+        local = []
+        while True:
+            n = next(counter)
+            if (total_requests and n >= total_requests) or (
+                deadline and time.monotonic() >= deadline
+            ):
+                break
+            item = pool[n % len(pool)]
+            started = time.perf_counter()
+            try:
+                status = session.post(
+                    url, data=item["body"], headers=item["headers"], timeout=120
+                ).status_code
+            except requests.RequestException:
+                status = "error"
+            local.append((time.perf_counter() - started, status, item["events"]))
+        with lock:
+            samples.extend(local)
+
+    threads = [
+        threading.Thread(target=client, name=f"load-{i}") for i in range(concurrency)
+    ]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return samples, time.perf_counter() - started
+
+
+def parse_metrics(text):
+    """{(name, labels): value} of a Prometheus text exposition"""
+    values = {}
+    for line in text.splitlines():
+        match = METRIC_LINE.match(line)
+        if match:
+            values[(match.group("name"), match.group("labels") or "")] = float(
+                match.group("value")
+            )
+    return values
+
+
+def metric_total(values, name):
+    return sum(value for (metric, _), value in values.items() if metric == name)
+
+
+def wait_for_drain(base_url, timeout):
+    """Poll /metrics until no analysis is queued or running on two polls in a row"""
+    deadline = time.monotonic() + timeout
+    idle = 0
+    while time.monotonic() < deadline:
+        values = parse_metrics(requests.get(f"{base_url}/metrics", timeout=10).text)
+        busy = metric_total(values, "cribl_analysis_queue_depth") + metric_total(
+            values, "cribl_analysis_queue_active"
+        )
+        idle = idle + 1 if busy == 0 else 0
+        if idle >= 2:
+            return True
+        time.sleep(1)
+    return False
+
+
+def phase_times(values):
+    """Mean milliseconds and count of every *_seconds histogram, per label set"""
+    phases = {}
+    for (name, labels), total in values.items():
+        if not name.endswith("_seconds_sum"):
+            continue
+        count = values.get((name[:-4] + "_count", labels), 0)
+        if count:
+            key = name[len("cribl_") : -len("_seconds_sum")] + (
+                f"{{{labels}}}" if labels else ""
+            )
+            phases[key] = {
+                "count": int(count),
+                "mean_ms": round(total / count * 1000, 2),
+            }
+    return phases
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[
+        min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    ]
+
+
+def summarize(samples, wall, peak_rss, fake_stats, values, drained):
+    latencies = sorted(latency for latency, _, _ in samples)
+    statuses = {}
+    for _, status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    accepted_events = sum(
+        events for _, status, events in samples if status in (200, 202)
+    )
+    outcomes = {
+        labels.split('"')[1]: int(value)
+        for (name, labels), value in values.items()
+        if name == "cribl_analyses_total" and labels
+    }
+    return {
+        "requests": len(samples),
+        "seconds": round(wall, 2),
+        "requests_per_second": round(len(samples) / wall, 1) if wall else 0.0,
+        "events_per_second": (
+            round(sum(events for _, _, events in samples) / wall, 1) if wall else 0.0
+        ),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "statuses": statuses,
+        "peak_rss_mib": round(peak_rss / 2**20, 1) if peak_rss else None,
+        "accepted_events": accepted_events,
+        "llm_calls": fake_stats.get("requests", 0),
+        "llm_calls_per_event": (
+            round(fake_stats.get("requests", 0) / accepted_events, 5)
+            if accepted_events
+            else 0.0
+        ),
+        "llm_errors": fake_stats.get("errors", 0),
+        "llm_rate_limited": fake_stats.get("rate_limited", 0),
+        "analyses": outcomes,
+        "drained": drained,
+        "phases": phase_times(values),
+    }
+
+
+def print_report(report):
+    print(
+        f"\nRequests        {report['requests']} in {report['seconds']}s "
+        f"({report['requests_per_second']} req/s, {report['events_per_second']} events/s)"
+    )
+    print(
+        f"Latency         p50 {report['p50_ms']} ms, p95 {report['p95_ms']} ms, p99 {report['p99_ms']} ms"
+    )
+    print(
+        f"Statuses        {', '.join(f'{status}: {count}' for status, count in sorted(report['statuses'].items()))}"
+    )
+    peak = (
+        f"{report['peak_rss_mib']} MiB" if report["peak_rss_mib"] is not None else "n/a"
+    )
+    print(f"Peak RSS        {peak}")
+    print(
+        f"LLM calls       {report['llm_calls']} for {report['accepted_events']} accepted events "
+        f"({report['llm_calls_per_event']} per event; {report['llm_errors']} errors, "
+        f"{report['llm_rate_limited']} rate limited)"
+    )
+    print(
+        f"Analyses        {', '.join(f'{k}: {v}' for k, v in sorted(report['analyses'].items())) or 'none'}"
+        f"{'' if report['drained'] else ' (queue did not drain)'}"
+    )
+    print(f"\n{'phase':<60} {'count':>8} {'mean ms':>10}")
+    for phase, stats in sorted(report["phases"].items()):
+        print(f"{phase:<60} {stats['count']:>8} {stats['mean_ms']:>10.2f}")
+
+
+def regressions(report, baseline, tolerance):
+    """Descriptions of the checked figures that are worse than `baseline` by more than `tolerance`"""
+    found = []
+    for key, direction in REGRESSION_CHECKS.items():
+        old, new = baseline.get(key), report.get(key)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        if change * direction > tolerance:
+            found.append(f"{key}: {old} -> {new} ({change:+.0%})")
+    return found
+
+
+def run(args):
+    fake, fake_config = start_fake_server(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed,
+    )
+    fake_url = f"http://127.0.0.1:{fake.server_address[1]}"
+    workdir = tempfile.mkdtemp(prefix="cribl-load-")
+    process = start_app(args, args.port, workdir, f"{fake_url}/v1beta")
+    base_url = f"http://127.0.0.1:{args.port}"
+    try:
+        wait_for(f"{base_url}/health", args.startup_timeout, process)
+        pool = request_pool(
+            args.formats, args.sizes, args.duplicate_ratios, args.variants
+        )
+        print(
+            f"🚀 {len(pool)} distinct batches, {args.concurrency} clients, "
+            f"{f'{args.duration}s' if not args.requests else f'{args.requests} requests'} "
+            f"against {'hypercorn' if args.asgi else f'gunicorn ({args.workers}x{args.threads})'}"
+        )
+
+        sampler = RssSampler(process.pid).start()
+        samples, wall = drive(
+            f"{base_url}/log-to-chatbot",
+            pool,
+            args.concurrency,
+            None if args.requests else args.duration,
+            args.requests,
+        )
+        drained = wait_for_drain(base_url, args.drain_timeout)
+        peak_rss = sampler.stop()
+
+        # Let every worker flush its last metrics snapshot
+        time.sleep(float(os.environ.get("METRICS_FLUSH_INTERVAL", 1)) + 0.5)
+        values = parse_metrics(requests.get(f"{base_url}/metrics", timeout=10).text)
+        with fake_config.lock:
+            fake_stats = dict(fake_config.stats)
+        return summarize(samples, wall, peak_rss, fake_stats, values, drained)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        fake.shutdown()
+        if args.keep_workdir:
+            print(f"📁 Server state and log kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    load = parser.add_argument_group("load")
+    load.add_argument("--concurrency", type=int, default=8)
+    load.add_argument(
+        "--duration",
+        type=float,
+        default=20,
+        help="seconds of load (ignored with --requests)",
+    )
+    load.add_argument(
+        "--requests", type=int, default=0, help="send exactly this many requests"
+    )
+    load.add_argument("--formats", nargs="+", choices=FORMATS, default=list(FORMATS))
+    load.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    load.add_argument(
+        "--duplicate-ratios", type=float, nargs="+", default=[0.0, 0.5, 0.9]
+    )
+    load.add_argument(
+        "--variants", type=int, default=2, help="distinct batches per format/size/ratio"
+    )
+    model = parser.add_argument_group("fake model")
+    model.add_argument("--latency-ms", type=float, default=500)
+    model.add_argument("--jitter-ms", type=float, default=200)
+    model.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="share of model calls answered with 500",
+    )
+    model.add_argument(
+        "--rate-limit-rate",
+        type=float,
+        default=0.0,
+        help="share of model calls answered with 429",
+    )
+    model.add_argument("--seed", type=int, default=0)
+    server = parser.add_argument_group("server")
+    server.add_argument("--port", type=int, default=5099)
+    server.add_argument(
+        "--asgi",
+        action="store_true",
+        help="serve log_api_asgi under hypercorn instead of gunicorn",
+    )
+    server.add_argument("--workers", type=int, default=2)
+    server.add_argument("--threads", type=int, default=16)
+    server.add_argument("--analysis-workers", type=int, default=4)
+    server.add_argument("--queue-max", type=int, default=1000)
+    server.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="extra environment for the server, e.g. --env LLM_STREAMING=true",
+    )
+    server.add_argument("--startup-timeout", type=float, default=60)
+    server.add_argument("--drain-timeout", type=float, default=300)
+    server.add_argument("--keep-workdir", action="store_true")
+    output = parser.add_argument_group("output")
+    output.add_argument("--json", help="write the report to this file")
+    output.add_argument(
+        "--baseline", help="report from an earlier run to compare against"
+    )
+    output.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.2,
+        help="allowed relative regression (default 0.2)",
+    )
+    args = parser.parse_args()
+
+    report = run(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            found = regressions(report, json.load(f), args.tolerance)
+        if found:
+            print("\n❌ Regressions beyond the tolerance:\n  " + "\n  ".join(found))
+            sys.exit(1)
+        print("\n✅ No regressions beyond the tolerance")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""
+Token-bounded conversation memory for the Streamlit chatbot.
+
+Resending the whole chat history on every turn makes latency and token
+cost grow with the session, and a single pasted log dump stays in every
+later prompt. ``BoundedChatHistory`` wraps the full history (which the
+UI keeps displaying) and gives the model a bounded view instead:
+
+* the most recent messages that fit ``max_tokens - summary_tokens``;
+* messages over ``payload_tokens`` (log dumps, long analyses) cut down to
+  their first lines plus a reference (analysis ID or content hash);
+* a rolling summary of everything older, for the system prompt, updated
+  in a background thread so no turn waits for it. Until an update lands,
+  the first lines of the not yet summarized messages stand in for it.
+"""
+
+import hashlib
+import logging
+import os
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.chat_history import BaseChatMessageHistory
+
+from log_chunking import CHARS_PER_TOKEN, estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_ID_PATTERN = re.compile(r"#?\b((?:cribl|auto|test)_[A-Za-z0-9-]+)")
+# Characters of each message kept while its summary is still being written
+FALLBACK_LINE_CHARS = 160
+
+SUMMARY_PROMPT = """You maintain the running summary of a security analyst's chat with an insider-threat assistant.
+Update the summary with the new messages. Keep analysis IDs, users, hosts, IP addresses, threat levels,
+decisions and open questions; drop pleasantries and raw log lines. Answer with the summary only,
+in at most {max_words} words.
+
+CURRENT SUMMARY:
+{summary}
+
+NEW MESSAGES:
+{messages}
+"""
+
+# Summaries of all sessions share a few threads; a session has at most one update in flight
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="chat-summary")
+
+
+def _reference(content):
+    match = ANALYSIS_ID_PATTERN.search(content)
+    if match:
+        return f"analysis {match.group(1)}"
+    return "sha1 " + hashlib.sha1(content.encode("utf-8")).hexdigest()[:10]
+
+
+def compact_content(content, max_tokens):
+    """`content` itself when it fits `max_tokens`, else its first lines and a reference to the rest"""
+    tokens = estimate_tokens(content)
+    if tokens <= max_tokens:
+        return content
+    head = content[: max(0, max_tokens - 40) * CHARS_PER_TOKEN]
+    if "\n" in head:
+        head = head[: head.rindex("\n")]
+    omitted = content[len(head) :]
+    return (
+        f"{head}\n[... {omitted.count(chr(10)) + 1} more lines (~{estimate_tokens(omitted)} tokens) "
+        f"omitted; {_reference(content)}]"
+    )
+
+
+def _speaker(message):
+    return "Analyst" if message.type == "human" else "Assistant"
+
+
+class BoundedChatHistory(BaseChatMessageHistory):
+    """
+    Chat history whose `messages` stay within a token budget; `store` keeps
+    every message and `summarize(prompt) -> text` condenses older turns
+    """
+
+    def __init__(
+        self,
+        store,
+        summarize=None,
+        max_tokens=4000,
+        summary_tokens=800,
+        payload_tokens=400,
+    ):
+        self.store = store
+        self.summarize = summarize
+        self.max_tokens = max_tokens
+        self.summary_tokens = summary_tokens
+        self.payload_tokens = payload_tokens
+        self.summary = ""
+        self.summarized = 0  # leading messages of `store` covered by `summary`
+        self._generation = (
+            0  # bumped by clear() so late summaries of a cleared chat are dropped
+        )
+        self._pending = False
+        self._lock = threading.Lock()
+
+    def _compact(self, message):
+        content = (
+            message.content
+            if isinstance(message.content, str)
+            else str(message.content)
+        )
+        compacted = compact_content(content, self.payload_tokens)
+        if compacted is content:
+            return message
+        return type(message)(content=compacted)
+
+    def _split(self):
+        """(summary text, recent compacted messages) for the current history"""
+        messages = self.store.messages
+        with self._lock:
+            if len(messages) < self.summarized:
+                # The store was cleared behind our back
+                self.summary, self.summarized = "", 0
+            summary, summarized = self.summary, self.summarized
+
+        budget = self.max_tokens - self.summary_tokens
+        window = []
+        start = len(messages)
+        while start > summarized:
+            message = self._compact(messages[start - 1])
+            tokens = estimate_tokens(message.content)
+            if window and tokens > budget:
+                break
+            window.append(message)
+            budget -= tokens
+            start -= 1
+        window.reverse()
+        if window and window[0].type != "human":
+            # Gemini expects the conversation to open with an analyst turn
+            window.pop(0)
+            start += 1
+
+        unsummarized = messages[summarized:start]
+        if unsummarized:
+            self._schedule_summary(messages, start)
+            fallback = "\n".join(
+                f"{_speaker(message)}: {message.content[:FALLBACK_LINE_CHARS]}"
+                for message in unsummarized
+            )
+            summary = f"{summary}\n{fallback}".strip()
+        summary = compact_content(summary, self.summary_tokens) if summary else ""
+        return summary, window
+
+    def _schedule_summary(self, messages, upto):
+        with self._lock:
+            if self.summarize is None or self._pending:
+                return
+            self._pending = True
+            generation, summary, summarized = (
+                self._generation,
+                self.summary,
+                self.summarized,
+            )
+        new_messages = "\n".join(
+            f"{_speaker(message)}: {compact_content(message.content, self.payload_tokens)}"
+            for message in messages[summarized:upto]
+        )
+        prompt = SUMMARY_PROMPT.format(
+            max_words=self.summary_tokens * 3 // 4,
+            summary=summary or "(none)",
+            messages=new_messages,
+        )
+        _summary_executor.submit(self._update_summary, prompt, generation, upto)
+
+    def _update_summary(self, prompt, generation, upto):
+        try:
+            summary = self.summarize(prompt).strip()
+        except Exception as e:
+            summary = None
+            logger.warning(f"⚠️ Could not summarize older chat turns: {str(e)}")
+        with self._lock:
+            self._pending = False
+            if summary and generation == self._generation and upto > self.summarized:
+                self.summary, self.summarized = summary, upto
+
+    @property
+    def messages(self):
+        """The most recent messages that fit the budget, large payloads cut down"""
+        return self._split()[1]
+
+    def summary_prompt(self):
+        """Summary of the turns outside `messages`, for the system prompt ("" when there are none)"""
+        summary = self._split()[0]
+        return f"\n\nSUMMARY OF THE EARLIER CONVERSATION:\n{summary}" if summary else ""
+
+    def usage(self):
+        """Token use of the view sent to the model"""
+        summary, window = self._split()
+        return {
+            "messages": len(self.store.messages),
+            "window_messages": len(window),
+            "window_tokens": sum(
+                estimate_tokens(message.content) for message in window
+            ),
+            "summary_tokens": estimate_tokens(summary),
+            "summarized_messages": self.summarized,
+        }
+
+    def add_message(self, message):
+        self.store.add_message(message)
+
+    def add_messages(self, messages):
+        for message in messages:
+            self.store.add_message(message)
+
+    def clear(self):
+        self.store.clear()
+        with self._lock:
+            self.summary, self.summarized = "", 0
+            self._generation += 1
+
+
+def create_chat_memory(store, summarize=None):
+    """Wrap `store` per the CHAT_MEMORY* environment variables, or None for the full history"""
+    if os.environ.get("CHAT_MEMORY", "bounded").lower() != "bounded":
+        return None
+    return BoundedChatHistory(
+        store,
+        summarize=summarize,
+        max_tokens=int(os.environ.get("CHAT_MEMORY_MAX_TOKENS", 4000)),
+        summary_tokens=int(os.environ.get("CHAT_SUMMARY_MAX_TOKENS", 800)),
+        payload_tokens=int(os.environ.get("CHAT_PAYLOAD_MAX_TOKENS", 400)),
+    )
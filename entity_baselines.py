@@ -0,0 +1,725 @@
+"""
+Incremental per-entity behavioral baselines.
+
+Every analysis otherwise sees only its own batch, so "admin logged in at
+3am from a new IP and read /etc/shadow" looks the same for an admin who
+does that nightly and one who never has. ``EntityBaselines`` keeps, for
+each user and host, streaming statistics in bounded memory:
+
+* exponentially decayed event and failure counts and a decayed
+  hour-of-day histogram (half-life ``half_life`` seconds, so old habits
+  fade);
+* a HyperLogLog sketch of the distinct resources the entity touched;
+* first/last seen times.
+
+A count-min sketch shared by all entities remembers which
+(entity, resource) and (entity, source IP) pairs have been seen, so new
+resources and new source IPs can be recognized without storing the
+pairs. Entities beyond ``max_entities`` are evicted least recently seen
+first.
+
+``SQLiteEntityBaselines`` keeps the same profiles, plus a table of seen
+pair hashes, in a SQLite file shared by every gunicorn worker. Each batch
+is scored and learned in one write transaction, so a batch gets the same
+scores whichever worker handles it, and history survives restarts. The
+transaction reads the batch's profiles and pairs with a few ``IN`` queries
+and writes them back with ``executemany``.
+
+``observe_later`` hands a batch that only needs to be learned (not
+scored) to a background writer thread, which learns whatever has queued
+up in one session, so request threads never wait for the write lock.
+
+``assess`` scores a batch against the baselines before adding it to
+them: per entity with enough history, the share of events at hours it is
+rarely active, its failure rate against its usual rate, resources and
+source IPs it has never used and its event rate against its usual rate
+are each turned into a 0-1 deviation and combined into a 0-10 score.
+"""
+
+import hashlib
+import json
+import logging
+import math
+import os
+import queue
+import sqlite3
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from event_archive import SOURCE_IP_FIELDS, USER_FIELDS, event_time, first_field
+
+ENTITY_FIELDS = {"user": USER_FIELDS, "host": ("host", "hostname")}
+RESOURCE_FIELDS = ("file_path", "resource", "object", "url", "dest_host", "destination")
+FAILURE_VALUES = {"failure", "failed", "fail", "denied", "error", "blocked"}
+
+# An hour holding less than this share of an entity's activity counts as "rarely active"
+RARE_HOUR_SHARE = 0.02
+# A batch rate is measured over at least this many seconds
+MIN_RATE_WINDOW = 300
+# Seen (entity, resource/source IP) pairs are forgotten after this many half-lives unused (SQLite store)
+PAIR_TTL_HALF_LIVES = 4
+# Queued batches the background writer learns in one session at most
+MAX_OBSERVE_BATCHES = 64
+# Values bound in one SQLite IN (...) list
+SQL_IN_CHUNK = 500
+
+logger = logging.getLogger(__name__)
+
+
+def _hash64(text):
+    return int.from_bytes(
+        hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big"
+    )
+
+
+def is_failure(event):
+    """True for failed or denied events (status/outcome value, or an action naming a failure)"""
+    for name in ("status", "outcome", "result"):
+        if str(event.get(name, "")).lower() in FAILURE_VALUES:
+            return True
+    action = str(event.get("action") or event.get("event_type") or "").lower()
+    return "fail" in action or "denied" in action
+
+
+class HyperLogLog:
+    """Distinct-count sketch with 2**precision one-byte registers"""
+
+    __slots__ = ("precision", "registers")
+
+    def __init__(self, precision=8):
+        self.precision = precision
+        self.registers = bytearray(1 << precision)
+
+    def add(self, value):
+        h = _hash64(value)
+        index = h >> (64 - self.precision)
+        rest = h & ((1 << (64 - self.precision)) - 1)
+        rank = (64 - self.precision) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        m = len(self.registers)
+        estimate = (
+            0.7213 / (1 + 1.079 / m) * m * m / sum(2.0**-r for r in self.registers)
+        )
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            estimate = m * math.log(
+                m / zeros
+            )  # linear counting for small cardinalities
+        return estimate
+
+
+class CountMinSketch:
+    """
+    Approximate counts of string keys; estimates never undercount, so an
+    estimate of 0 means the key was not added since the last aging
+    """
+
+    def __init__(self, width=1 << 16, depth=4, age_every=1000000):
+        self.width = width
+        self.depth = depth
+        self.age_every = age_every
+        self.tables = [array("I", bytes(4 * width)) for _ in range(depth)]
+        self._added = 0
+
+    def _indexes(self, key):
+        digest = hashlib.blake2b(
+            key.encode("utf-8"), digest_size=4 * self.depth
+        ).digest()
+        return [
+            int.from_bytes(digest[4 * i : 4 * i + 4], "big") % self.width
+            for i in range(self.depth)
+        ]
+
+    def add(self, key):
+        for table, index in zip(self.tables, self._indexes(key)):
+            if table[index] < 0xFFFFFFFF:
+                table[index] += 1
+        self._added += 1
+        if self._added >= self.age_every:
+            # Halve every counter so pairs unused for long enough are forgotten again
+            for table in self.tables:
+                for index, value in enumerate(table):
+                    if value:
+                        table[index] = value >> 1
+            self._added = 0
+
+    def estimate(self, key):
+        return min(
+            table[index] for table, index in zip(self.tables, self._indexes(key))
+        )
+
+
+class _Profile:
+    """Decayed statistics of one entity; all counters share one decay timestamp"""
+
+    __slots__ = (
+        "events",
+        "failures",
+        "hours",
+        "resources",
+        "first_seen",
+        "last_seen",
+        "updated",
+        "total",
+    )
+
+    def __init__(self, now):
+        self.events = 0.0
+        self.failures = 0.0
+        self.hours = [0.0] * 24
+        self.resources = HyperLogLog()
+        self.first_seen = now
+        self.last_seen = now
+        self.updated = now
+        self.total = 0
+
+    def decay(self, now, half_life):
+        if now <= self.updated:
+            return
+        factor = 0.5 ** ((now - self.updated) / half_life)
+        self.events *= factor
+        self.failures *= factor
+        self.hours = [count * factor for count in self.hours]
+        self.updated = now
+
+
+class _BatchStats:
+    """What one entity did in the batch being assessed"""
+
+    __slots__ = (
+        "events",
+        "failures",
+        "hours",
+        "resources",
+        "source_ips",
+        "first",
+        "last",
+    )
+
+    def __init__(self):
+        self.events = 0
+        self.failures = 0
+        self.hours = [0] * 24
+        self.resources = set()
+        self.source_ips = set()
+        self.first = None
+        self.last = None
+
+
+class EntityBaselines:
+    """
+    Bounded per-user/per-host baselines with deviation scoring
+    """
+
+    def __init__(
+        self, half_life=7 * 86400, max_entities=10000, min_events=30, max_pending=1000
+    ):
+        self.half_life = half_life
+        self.max_entities = max_entities
+        self.min_events = min_events
+        self.max_pending = max_pending
+        self._lock = threading.Lock()
+        self._writer_lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+        self.stats = {"events": 0, "batches": 0, "evicted": 0, "dropped_batches": 0}
+        self._init_storage()
+
+    # Storage: profiles in an LRU dict and seen pairs in a count-min sketch
+
+    def _init_storage(self):
+        self.pairs = CountMinSketch()
+        self._profiles = OrderedDict()
+
+    @contextmanager
+    def _session(self):
+        """Scope in which one batch is scored and learned"""
+        with self._lock:
+            yield
+
+    def _load(self, entities):
+        """Read the profiles of a batch's entities ahead of _profile/_touch"""
+
+    def _profile(self, entity):
+        return self._profiles.get(entity)
+
+    def _touch(self, entity, now):
+        """Profile of `entity` for updating, created (evicting the least recently seen) if new"""
+        profile = self._profiles.get(entity)
+        if profile is None:
+            profile = self._profiles[entity] = _Profile(now)
+            if len(self._profiles) > self.max_entities:
+                self._profiles.popitem(last=False)
+                self.stats["evicted"] += 1
+        else:
+            self._profiles.move_to_end(entity)
+        return profile
+
+    def _known_pairs(self, keys):
+        return {key for key in keys if self.pairs.estimate(key) > 0}
+
+    def _remember_pair(self, key, now):
+        self.pairs.add(key)
+
+    def _entity_count(self):
+        return len(self._profiles)
+
+    def _batch_stats(self, events, now):
+        stats = {}
+        for event in events:
+            if not isinstance(event, dict):
+                continue
+            entities = [
+                (kind, first_field(event, fields))
+                for kind, fields in ENTITY_FIELDS.items()
+            ]
+            entities = [f"{kind}:{name}" for kind, name in entities if name is not None]
+            if not entities:
+                continue
+            ts = event_time(event, now)
+            hour = time.localtime(ts).tm_hour
+            failed = is_failure(event)
+            resource = first_field(event, RESOURCE_FIELDS)
+            source_ip = first_field(event, SOURCE_IP_FIELDS)
+            for entity in entities:
+                batch = stats.get(entity)
+                if batch is None:
+                    batch = stats[entity] = _BatchStats()
+                batch.events += 1
+                batch.failures += failed
+                batch.hours[hour] += 1
+                batch.first = ts if batch.first is None else min(batch.first, ts)
+                batch.last = ts if batch.last is None else max(batch.last, ts)
+                if resource is not None:
+                    batch.resources.add(resource)
+                if source_ip is not None:
+                    batch.source_ips.add(source_ip)
+        return stats
+
+    def _score(self, entity, profile, batch, now):
+        """Deviation report of one entity's batch activity against its profile"""
+        profile.decay(now, self.half_life)
+        components = {}
+        reasons = []
+
+        rare_hours = [
+            hour
+            for hour in range(24)
+            if batch.hours[hour]
+            and profile.hours[hour] < RARE_HOUR_SHARE * profile.events
+        ]
+        if rare_hours:
+            share = sum(batch.hours[hour] for hour in rare_hours) / batch.events
+            components["hours"] = share
+            reasons.append(
+                f"{share:.0%} of events at hours it is rarely active "
+                f"({', '.join(f'{hour:02d}:00' for hour in rare_hours[:4])})"
+            )
+
+        usual_rate = profile.failures / profile.events if profile.events else 0.0
+        batch_rate = batch.failures / batch.events
+        spread = math.sqrt(max(usual_rate * (1 - usual_rate), 0.01) / batch.events)
+        z = (batch_rate - usual_rate) / spread
+        if z > 1:
+            components["failures"] = min(1.0, z / 4)
+            reasons.append(f"failure rate {batch_rate:.0%} vs usual {usual_rate:.0%}")
+
+        for kind, values in (
+            ("resources", batch.resources),
+            ("source_ips", batch.source_ips),
+        ):
+            known = self._known_pairs([f"{entity}|{kind}|{value}" for value in values])
+            new = sorted(
+                value for value in values if f"{entity}|{kind}|{value}" not in known
+            )
+            if new:
+                components[f"new_{kind}"] = len(new) / len(values)
+                label = "resource" if kind == "resources" else "source IP"
+                reasons.append(
+                    f"{len(new)} new {label}{'s' if len(new) > 1 else ''}: {', '.join(new[:3])}"
+                    f"{' ...' if len(new) > 3 else ''}"
+                )
+
+        # Steady-state decayed count is rate * half_life / ln 2
+        window = min(
+            max(now - profile.first_seen, MIN_RATE_WINDOW), self.half_life / math.log(2)
+        )
+        usual_per_hour = profile.events / window * 3600
+        batch_per_hour = (
+            batch.events / max(batch.last - batch.first, MIN_RATE_WINDOW) * 3600
+        )
+        ratio = batch_per_hour / usual_per_hour if usual_per_hour else 0.0
+        if ratio > 2:
+            components["volume"] = min(1.0, math.log2(ratio) / 4)
+            reasons.append(f"{ratio:.0f}x its usual event rate")
+
+        unusual = 1.0
+        for value in components.values():
+            unusual *= 1 - min(value, 0.9)
+        return {
+            "entity": entity,
+            "score": round(10 * (1 - unusual), 1),
+            "events": batch.events,
+            "history_events": profile.total,
+            "distinct_resources": round(profile.resources.count()),
+            "components": {name: round(value, 2) for name, value in components.items()},
+            "reasons": reasons,
+        }
+
+    def _observe(self, stats, now):
+        for entity, batch in stats.items():
+            profile = self._touch(entity, now)
+            profile.decay(now, self.half_life)
+            profile.events += batch.events
+            profile.failures += batch.failures
+            for hour, count in enumerate(batch.hours):
+                if count:
+                    profile.hours[hour] += count
+            for resource in batch.resources:
+                profile.resources.add(resource)
+                self._remember_pair(f"{entity}|resources|{resource}", now)
+            for source_ip in batch.source_ips:
+                self._remember_pair(f"{entity}|source_ips|{source_ip}", now)
+            profile.last_seen = now
+            profile.total += batch.events
+
+    def assess(self, events):
+        """
+        Score a batch against the baselines, then learn from it. Returns one
+        report per entity in the batch, most unusual first; entities with
+        less than `min_events` of history get a null score.
+        """
+        with self._session():
+            now = time.time()
+            stats = self._batch_stats(events, now)
+            self._load(list(stats))
+            reports = []
+            for entity, batch in stats.items():
+                profile = self._profile(entity)
+                if profile is None or profile.total < self.min_events:
+                    reports.append(
+                        {
+                            "entity": entity,
+                            "score": None,
+                            "events": batch.events,
+                            "history_events": profile.total if profile else 0,
+                            "reasons": ["not enough history for a baseline"],
+                        }
+                    )
+                else:
+                    reports.append(self._score(entity, profile, batch, now))
+            self._observe(stats, now)
+            self.stats["batches"] += 1
+            self.stats["events"] += len(events)
+        reports.sort(
+            key=lambda report: -1 if report["score"] is None else report["score"],
+            reverse=True,
+        )
+        return reports
+
+    def observe(self, events):
+        """Learn from a batch without scoring it"""
+        self._observe_batches([events])
+
+    def _observe_batches(self, batches):
+        with self._session():
+            now = time.time()
+            stats = self._batch_stats(
+                [event for events in batches for event in events], now
+            )
+            self._load(list(stats))
+            self._observe(stats, now)
+            self.stats["batches"] += len(batches)
+            self.stats["events"] += sum(len(events) for events in batches)
+
+    def _ensure_writer(self):
+        """Start the writer thread once per process (gunicorn workers fork after import)"""
+        if self._pid == os.getpid():
+            return
+        with self._writer_lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_pending)
+            threading.Thread(
+                target=self._run, name="entity-baselines", daemon=True
+            ).start()
+            self._pid = os.getpid()
+
+    def observe_later(self, events):
+        """Queue a batch to be learned on the writer thread; never blocks the caller"""
+        if not events:
+            return
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(events)
+        except queue.Full:
+            with self._lock:
+                self.stats["dropped_batches"] += 1
+            logger.warning("⚠️ Entity baseline backlog full, not learning a batch")
+
+    def _run(self):
+        while True:
+            batches = [self._queue.get()]
+            while len(batches) < MAX_OBSERVE_BATCHES:
+                try:
+                    batches.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._observe_batches(batches)
+            except Exception as e:
+                logger.error(f"❌ Could not update entity baselines: {str(e)}")
+
+    def snapshot(self):
+        with self._lock:
+            return dict(self.stats, entities=self._entity_count())
+
+
+class SQLiteEntityBaselines(EntityBaselines):
+    """
+    Baselines in a SQLite file (WAL mode) shared by every process; seen
+    pairs are stored as 64-bit hashes and forgotten after `pair_ttl` seconds unused
+    """
+
+    shared = True
+
+    def __init__(self, path, pair_ttl=None, **kwargs):
+        self.path = path
+        self.pair_ttl = pair_ttl
+        super().__init__(**kwargs)
+        if self.pair_ttl is None:
+            self.pair_ttl = PAIR_TTL_HALF_LIVES * self.half_life
+
+    def _init_storage(self):
+        self._local = threading.local()
+        self._loaded = None  # profiles read or created in the current session
+        self._dirty = None
+        self._created = False
+        self._pruned_at = 0.0
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS baseline_profiles (
+                entity TEXT PRIMARY KEY,
+                last_seen REAL NOT NULL,
+                stats TEXT NOT NULL,
+                resources BLOB NOT NULL
+            )
+        """)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_baseline_profiles_seen ON baseline_profiles (last_seen)"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS baseline_pairs (key INTEGER PRIMARY KEY, seen REAL NOT NULL)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_baseline_pairs_seen ON baseline_pairs (seen)"
+        )
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(
+            self.path, timeout=30, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    @contextmanager
+    def _session(self):
+        """One write transaction per batch, so workers score and learn batches one at a time"""
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            self._loaded, self._dirty, self._created, self._seen_pairs = (
+                {},
+                set(),
+                False,
+                {},
+            )
+            try:
+                yield
+                self._save(conn)
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._loaded = self._dirty = self._seen_pairs = None
+
+    def _save(self, conn):
+        now = time.time()
+        rows = []
+        for entity in self._dirty:
+            profile = self._loaded[entity]
+            stats = [
+                profile.events,
+                profile.failures,
+                profile.hours,
+                profile.first_seen,
+                profile.last_seen,
+                profile.updated,
+                profile.total,
+            ]
+            rows.append(
+                (
+                    entity,
+                    profile.last_seen,
+                    json.dumps(stats),
+                    bytes(profile.resources.registers),
+                )
+            )
+        conn.executemany(
+            "INSERT INTO baseline_profiles (entity, last_seen, stats, resources) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (entity) DO UPDATE SET last_seen = excluded.last_seen, "
+            "stats = excluded.stats, resources = excluded.resources",
+            rows,
+        )
+        conn.executemany(
+            "INSERT INTO baseline_pairs (key, seen) VALUES (?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET seen = excluded.seen",
+            self._seen_pairs.items(),
+        )
+        if self._created:
+            excess = (
+                conn.execute("SELECT COUNT(*) FROM baseline_profiles").fetchone()[0]
+                - self.max_entities
+            )
+            if excess > 0:
+                conn.execute(
+                    "DELETE FROM baseline_profiles WHERE entity IN "
+                    "(SELECT entity FROM baseline_profiles ORDER BY last_seen LIMIT ?)",
+                    (excess,),
+                )
+                self.stats["evicted"] += excess
+        if now - self._pruned_at > 3600:
+            conn.execute(
+                "DELETE FROM baseline_pairs WHERE seen < ?", (now - self.pair_ttl,)
+            )
+            self._pruned_at = now
+
+    def _select_in(self, sql, values):
+        """Rows of `sql` (one IN (...) placeholder for `values`), queried in chunks"""
+        conn = self._connect()
+        rows = []
+        for start in range(0, len(values), SQL_IN_CHUNK):
+            chunk = values[start : start + SQL_IN_CHUNK]
+            rows.extend(
+                conn.execute(sql.format(",".join("?" * len(chunk))), chunk).fetchall()
+            )
+        return rows
+
+    def _load(self, entities):
+        entities = [entity for entity in entities if entity not in self._loaded]
+        for entity in entities:
+            self._loaded[entity] = None
+        rows = self._select_in(
+            "SELECT entity, stats, resources FROM baseline_profiles WHERE entity IN ({})",
+            entities,
+        )
+        for entity, stats, resources in rows:
+            events, failures, hours, first_seen, last_seen, updated, total = json.loads(
+                stats
+            )
+            profile = _Profile(first_seen)
+            profile.events, profile.failures, profile.hours = events, failures, hours
+            profile.last_seen, profile.updated, profile.total = (
+                last_seen,
+                updated,
+                total,
+            )
+            profile.resources.registers[:] = resources
+            self._loaded[entity] = profile
+
+    def _profile(self, entity):
+        if entity not in self._loaded:
+            self._load([entity])
+        return self._loaded[entity]
+
+    def _touch(self, entity, now):
+        profile = self._profile(entity)
+        if profile is None:
+            profile = self._loaded[entity] = _Profile(now)
+            self._created = True
+        self._dirty.add(entity)
+        return profile
+
+    @staticmethod
+    def _pair_key(key):
+        return _hash64(key) - (1 << 63)  # as a signed SQLite integer
+
+    def _known_pairs(self, keys):
+        hashed = {self._pair_key(key): key for key in keys}
+        rows = self._select_in(
+            "SELECT key FROM baseline_pairs WHERE key IN ({})", list(hashed)
+        )
+        return {hashed[key] for (key,) in rows}
+
+    def _remember_pair(self, key, now):
+        self._seen_pairs[self._pair_key(key)] = now
+
+    def _entity_count(self):
+        return (
+            self._connect()
+            .execute("SELECT COUNT(*) FROM baseline_profiles")
+            .fetchone()[0]
+        )
+
+
+def deviation_note(reports, min_score):
+    """Prompt note describing entities whose score reaches `min_score`, or None"""
+    unusual = [
+        report
+        for report in reports
+        if report["score"] is not None and report["score"] >= min_score
+    ]
+    if not unusual:
+        return None
+    lines = [
+        "BEHAVIORAL BASELINE DEVIATIONS (0-10, compared with each entity's own history; higher is more unusual):"
+    ]
+    for report in unusual:
+        lines.append(
+            f"- {report['entity']}: {report['score']:g} - {'; '.join(report['reasons'])} "
+            f"({report['history_events']} past events)"
+        )
+    return "\n".join(lines)
+
+
+def create_entity_baselines():
+    """Build the baselines from the BASELINE_* environment variables, or None when disabled"""
+    if os.environ.get("BASELINE_ENABLED", "True").lower() != "true":
+        return None
+    settings = {
+        "half_life": float(os.environ.get("BASELINE_HALF_LIFE_DAYS", 7)) * 86400,
+        "max_entities": int(os.environ.get("BASELINE_MAX_ENTITIES", 10000)),
+        "min_events": int(os.environ.get("BASELINE_MIN_EVENTS", 30)),
+    }
+    backend = os.environ.get("BASELINE_STORE", "sqlite").lower()
+    if backend == "sqlite":
+        path = os.environ.get(
+            "BASELINE_PATH", os.path.join("logs", "entity_baselines.db")
+        )
+        try:
+            baselines = SQLiteEntityBaselines(path, **settings)
+            logger.info(f"📈 Entity baselines shared through {path}")
+            return baselines
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(
+                f"⚠️ Baseline store {path} unavailable ({str(e)}); keeping baselines per process"
+            )
+    elif backend != "memory":
+        logger.warning(
+            f"⚠️ Unknown BASELINE_STORE '{backend}', keeping baselines per process"
+        )
+    return EntityBaselines(**settings)
@@ -0,0 +1,119 @@
+"""
+Pre-LLM aggregation of repetitive log events.
+
+Events sharing the same grouping key are collapsed into one record with
+an ``event_count``, ``first_seen``/``last_seen`` times and a few sample
+values for fields that differ inside the group. The grouping key is a
+list of field names; when it is empty, events are grouped on every field
+except the time fields (i.e. exact repeats apart from their timestamp).
+"""
+
+import json
+
+DEFAULT_TIME_FIELDS = ("timestamp", "_time", "time", "@timestamp")
+
+AGGREGATION_NOTE = (
+    "NOTE: repeated events are collapsed; event_count is the number of occurrences, "
+    "first_seen/last_seen bound their times and sample_values lists example values of fields that varied."
+)
+
+
+def _freeze(value):
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, sort_keys=True)
+    return value
+
+
+def _group_key(event, key_fields, time_fields):
+    if key_fields:
+        return tuple(_freeze(event.get(field)) for field in key_fields)
+    return tuple(
+        sorted((k, _freeze(v)) for k, v in event.items() if k not in time_fields)
+    )
+
+
+def _bound(values, pick):
+    """min/max over values, tolerating mixed types by comparing like with like"""
+    try:
+        return pick(values)
+    except TypeError:
+        return pick(values, key=str)
+
+
+def aggregate_events(
+    events, key_fields=(), time_fields=DEFAULT_TIME_FIELDS, max_samples=3
+):
+    """
+    Collapse repeated dict events; non-dict events pass through untouched.
+
+    Returns a new list that keeps the order of first appearance. Groups of
+    a single event are emitted unchanged.
+    """
+    key_fields = list(key_fields)
+    time_fields = tuple(time_fields)
+    groups = {}
+    order = []
+
+    for event in events:
+        if not isinstance(event, dict):
+            order.append(("raw", event))
+            continue
+        key = _group_key(event, key_fields, time_fields)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = []
+            order.append(("group", key))
+        group.append(event)
+
+    condensed = []
+    for kind, item in order:
+        if kind == "raw":
+            condensed.append(item)
+            continue
+        group = groups[item]
+        if len(group) == 1:
+            condensed.append(group[0])
+            continue
+        condensed.append(_collapse(group, time_fields, max_samples))
+    return condensed
+
+
+def _collapse(group, time_fields, max_samples):
+    fields = {}
+    for event in group:
+        for key in event:
+            fields.setdefault(key, None)
+
+    # first_seen/last_seen come from the preferred time field present in the group
+    time_field = next((field for field in time_fields if field in fields), None)
+    times = (
+        [event[time_field] for event in group if event.get(time_field) is not None]
+        if time_field
+        else []
+    )
+
+    record = {}
+    samples = {}
+    for field in fields:
+        if field in time_fields:
+            continue
+        values = [event.get(field) for event in group]
+        distinct = []
+        seen = set()
+        for value in values:
+            frozen = _freeze(value)
+            if frozen not in seen:
+                seen.add(frozen)
+                distinct.append(value)
+        if len(distinct) == 1:
+            record[field] = distinct[0]
+        else:
+            samples[field] = distinct[:max_samples]
+
+    record["event_count"] = len(group)
+    if times:
+        record["first_seen"] = _bound(times, min)
+        record["last_seen"] = _bound(times, max)
+    if samples:
+        record["sample_values"] = samples
+    return record
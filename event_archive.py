@@ -0,0 +1,469 @@
+"""
+Append-only, compressed archive of raw webhook events with an indexed search.
+
+Every accepted batch is appended to a segment file as gzip-framed NDJSON:
+each frame is an independent gzip member holding up to ``frame_events``
+records ``{"analysis_id", "ingested_at", "event"}``, so a concatenated
+segment is still a valid ``.gz`` file and any frame can be decompressed
+on its own. Next to each segment an append-only sidecar index
+(``<segment>.idx``, one JSON line per frame) records the frame's byte
+range, analysis id, event-time range and the distinct users and source
+IPs it contains. Queries read the indexes, pick the frames that can match
+and decompress only those.
+
+Each process writes its own segments (the pid is part of the name), so
+gunicorn workers never contend for a file, while queries read the
+segments of all workers. Appends are handed to a writer thread that
+flushes every frame immediately and fsyncs at most every
+``fsync_interval`` seconds, so one fsync covers many batches.
+"""
+
+import glob
+import gzip
+import json
+import logging
+import math
+import os
+import queue
+import threading
+import time
+import zlib
+from datetime import datetime
+
+logger = logging.getLogger(__name__)
+
+USER_FIELDS = ("user", "username", "user_name")
+SOURCE_IP_FIELDS = ("source_ip", "src_ip", "client_ip")
+TIME_FIELDS = ("_time", "timestamp", "@timestamp", "time")
+# Event times outside 1970..9999 (and nan/inf, which JSON bodies can carry) are ignored
+MAX_EVENT_TIME = 253402300799.0
+
+# Distinct values kept per frame and field; larger frames are indexed as "any value"
+MAX_INDEXED_VALUES = 256
+
+
+def first_field(event, names):
+    """First non-empty value of the `names` fields as text, else None"""
+    for name in names:
+        value = event.get(name)
+        if value not in (None, ""):
+            return str(value)
+    return None
+
+
+def event_time(event, default):
+    """
+    Epoch seconds of an event from _time/timestamp fields, else `default`;
+    non-finite or out-of-range values are skipped
+    """
+    if not isinstance(event, dict):
+        return default
+    for name in TIME_FIELDS:
+        value = event.get(name)
+        if value in (None, "") or isinstance(value, bool):
+            continue
+        try:
+            seconds = float(value)
+        except OverflowError:
+            continue
+        except (TypeError, ValueError):
+            try:
+                seconds = datetime.fromisoformat(
+                    str(value).replace("Z", "+00:00")
+                ).timestamp()
+            except (ValueError, OverflowError, OSError):
+                continue
+        if math.isfinite(seconds) and 0 <= seconds <= MAX_EVENT_TIME:
+            return seconds
+    return default
+
+
+def _index_values(values):
+    """Sorted distinct values, or None ("any") when there are too many to index"""
+    distinct = {value for value in values if value is not None}
+    if len(distinct) > MAX_INDEXED_VALUES:
+        return None
+    return sorted(distinct)
+
+
+class _Segment:
+    """An open segment file of this process and its sidecar index"""
+
+    def __init__(self, path):
+        self.path = path
+        self.data = open(path, "ab")
+        self.index = open(f"{path}.idx", "a", encoding="utf-8")
+        self.size = self.data.tell()
+        self.dirty = False
+
+    def fsync(self):
+        if self.dirty:
+            os.fsync(self.data.fileno())
+            os.fsync(self.index.fileno())
+            self.dirty = False
+
+    def close(self):
+        self.fsync()
+        self.data.close()
+        self.index.close()
+
+
+class EventArchive:
+    """
+    Append-only segment archive shared by all worker processes through `directory`
+    """
+
+    def __init__(
+        self,
+        directory,
+        segment_bytes=64 * 1024 * 1024,
+        frame_events=1000,
+        fsync_interval=1.0,
+        retention_days=30,
+        max_pending=1000,
+    ):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.frame_events = frame_events
+        self.fsync_interval = fsync_interval
+        self.retention_days = retention_days
+        self.max_pending = max_pending
+        self.stats = {"batches": 0, "events": 0, "frames": 0, "dropped_batches": 0}
+        self._lock = threading.Lock()
+        self._queue = None
+        self._pid = None
+        self._segment = None
+        self._sequence = 0
+        self._index_cache = {}  # index path -> (bytes read, [frame entries])
+        self._index_lock = (
+            threading.Lock()
+        )  # guards only the cache; files are read without a lock
+        os.makedirs(directory, exist_ok=True)
+
+    # Writing
+
+    def _ensure_writer(self):
+        """Start the writer thread once per process (gunicorn workers fork after import)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._queue = queue.Queue(maxsize=self.max_pending)
+            self._segment = None
+            threading.Thread(
+                target=self._run, name="event-archive", daemon=True
+            ).start()
+            self._pid = os.getpid()
+
+    def append(self, analysis_id, events):
+        """Queue a batch for archiving; never blocks the caller"""
+        if not events:
+            return
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((analysis_id, time.time(), events))
+        except queue.Full:
+            with self._lock:
+                self.stats["dropped_batches"] += 1
+            logger.warning(
+                f"⚠️ Event archive backlog full, not archiving batch #{analysis_id}"
+            )
+
+    def _run(self):
+        last_fsync = time.monotonic()
+        while True:
+            timeout = max(0.0, self.fsync_interval - (time.monotonic() - last_fsync))
+            try:
+                item = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+            try:
+                if item is not None:
+                    self._write_batch(*item)
+                if time.monotonic() - last_fsync >= self.fsync_interval:
+                    if self._segment is not None:
+                        self._segment.fsync()
+                    last_fsync = time.monotonic()
+            except Exception as e:
+                logger.error(f"❌ Event archive write failed: {str(e)}")
+
+    def _open_segment(self):
+        if self._segment is not None:
+            self._segment.close()
+        self._sequence += 1
+        name = f"segment-{int(time.time() * 1000)}-{os.getpid()}-{self._sequence}.ndjson.gz"
+        self._segment = _Segment(os.path.join(self.directory, name))
+        self._expire_segments()
+
+    def _write_batch(self, analysis_id, ingested_at, events):
+        for start in range(0, len(events), self.frame_events):
+            if self._segment is None or self._segment.size >= self.segment_bytes:
+                self._open_segment()
+            self._write_frame(
+                analysis_id, ingested_at, events[start : start + self.frame_events]
+            )
+        with self._lock:
+            self.stats["batches"] += 1
+            self.stats["events"] += len(events)
+
+    def _write_frame(self, analysis_id, ingested_at, events):
+        lines = []
+        times, users, source_ips = [], [], []
+        for event in events:
+            lines.append(
+                json.dumps(
+                    {
+                        "analysis_id": analysis_id,
+                        "ingested_at": ingested_at,
+                        "event": event,
+                    }
+                )
+            )
+            times.append(event_time(event, ingested_at))
+            if isinstance(event, dict):
+                users.append(first_field(event, USER_FIELDS))
+                source_ips.append(first_field(event, SOURCE_IP_FIELDS))
+        frame = gzip.compress(
+            ("\n".join(lines) + "\n").encode("utf-8"), compresslevel=6
+        )
+
+        segment = self._segment
+        offset = segment.size
+        segment.data.write(frame)
+        segment.data.flush()
+        segment.size += len(frame)
+        # The index entry is written after its frame, so readers never see a dangling offset
+        segment.index.write(
+            json.dumps(
+                {
+                    "offset": offset,
+                    "length": len(frame),
+                    "count": len(events),
+                    "analysis_id": analysis_id,
+                    "min_ts": min(times),
+                    "max_ts": max(times),
+                    "users": _index_values(users),
+                    "source_ips": _index_values(source_ips),
+                }
+            )
+            + "\n"
+        )
+        segment.index.flush()
+        segment.dirty = True
+        with self._lock:
+            self.stats["frames"] += 1
+
+    def _expire_segments(self):
+        """Delete segments (of any worker) not written to within the retention period"""
+        if not self.retention_days:
+            return
+        cutoff = time.time() - self.retention_days * 86400
+        for path in glob.glob(os.path.join(self.directory, "segment-*.ndjson.gz")):
+            try:
+                if os.path.getmtime(path) < cutoff:
+                    os.remove(path)
+                    os.remove(f"{path}.idx")
+                    logger.info(f"🗑️ Expired archive segment {os.path.basename(path)}")
+            except OSError:
+                continue
+
+    # Reading
+
+    def _frames(self, index_path):
+        """Index entries of one segment, reading only what was appended since the last call"""
+        with self._index_lock:
+            read, entries = self._index_cache.get(index_path, (0, []))
+        try:
+            with open(index_path, "rb") as f:
+                f.seek(read)
+                data = f.read()
+        except OSError:
+            with self._index_lock:
+                self._index_cache.pop(index_path, None)
+            return []
+        # Ignore a trailing line that is still being written
+        complete = data[: data.rfind(b"\n") + 1]
+        if complete:
+            entries = entries + self._parse_index(index_path, complete)
+            with self._index_lock:
+                # A concurrent reader may have cached more of the file meanwhile
+                if self._index_cache.get(index_path, (0,))[0] < read + len(complete):
+                    self._index_cache[index_path] = (read + len(complete), entries)
+        return entries
+
+    @staticmethod
+    def _parse_index(index_path, data):
+        entries = []
+        for line in data.splitlines():
+            if not line.strip():
+                continue
+            try:
+                entries.append(json.loads(line))
+            except ValueError:
+                logger.warning(
+                    f"⚠️ Skipping corrupt index entry in {os.path.basename(index_path)}"
+                )
+        return entries
+
+    @staticmethod
+    def _frame_matches(frame, analysis_id, user, source_ip, start, end):
+        if analysis_id is not None and frame["analysis_id"] != analysis_id:
+            return False
+        if start is not None and frame["max_ts"] < start:
+            return False
+        if end is not None and frame["min_ts"] > end:
+            return False
+        if (
+            user is not None
+            and frame["users"] is not None
+            and user not in frame["users"]
+        ):
+            return False
+        if (
+            source_ip is not None
+            and frame["source_ips"] is not None
+            and source_ip not in frame["source_ips"]
+        ):
+            return False
+        return True
+
+    @staticmethod
+    def _read_frame(segment_path, frame):
+        """Archive records of one frame, or None when it is missing, torn or corrupt"""
+        try:
+            with open(segment_path, "rb") as f:
+                f.seek(frame["offset"])
+                data = gzip.decompress(f.read(frame["length"]))
+            return [json.loads(line) for line in data.splitlines()]
+        except (OSError, EOFError, zlib.error, ValueError) as e:
+            logger.warning(
+                f"⚠️ Unreadable archive frame in {os.path.basename(segment_path)}: {str(e)}"
+            )
+            return None
+
+    def read_new(self, positions=None, max_events=None):
+        """
+        Records archived by any worker after `positions`, oldest segment first.
+        Returns (records, positions); pass the positions back to read only
+        what was added since. Without positions, reading starts at the
+        newest `max_events` events (all of them when None).
+        """
+        index_paths = sorted(
+            glob.glob(os.path.join(self.directory, "segment-*.ndjson.gz.idx"))
+        )
+        frames = {index_path: self._frames(index_path) for index_path in index_paths}
+        if positions is None:
+            positions = {}
+            budget = max_events
+            for index_path in reversed(index_paths):
+                start = len(frames[index_path])
+                while start and (budget is None or budget > 0):
+                    start -= 1
+                    if budget is not None:
+                        budget -= frames[index_path][start]["count"]
+                positions[index_path] = start
+
+        records = []
+        new_positions = {}
+        for index_path in index_paths:
+            entries = frames[index_path]
+            for frame in entries[positions.get(index_path, 0) :]:
+                records.extend(
+                    self._read_frame(index_path[: -len(".idx")], frame) or []
+                )
+            new_positions[index_path] = len(entries)
+        return records, new_positions
+
+    def query(
+        self,
+        analysis_id=None,
+        user=None,
+        source_ip=None,
+        start=None,
+        end=None,
+        limit=100,
+    ):
+        """
+        Archived events matching every given filter, newest frames first.
+        Returns {"events": [...], "frames_scanned", "frames_total", "truncated"}.
+        """
+        candidates = []
+        frames_total = 0
+        index_paths = glob.glob(os.path.join(self.directory, "segment-*.ndjson.gz.idx"))
+        for index_path in index_paths:
+            frames = self._frames(index_path)
+            frames_total += len(frames)
+            segment_path = index_path[: -len(".idx")]
+            candidates.extend(
+                (frame, segment_path)
+                for frame in frames
+                if self._frame_matches(frame, analysis_id, user, source_ip, start, end)
+            )
+        live = set(glob.glob(os.path.join(self.directory, "segment-*.ndjson.gz.idx")))
+        with self._index_lock:
+            for stale in set(self._index_cache) - live:
+                del self._index_cache[stale]
+        candidates.sort(key=lambda candidate: candidate[0]["max_ts"], reverse=True)
+
+        events = []
+        frames_scanned = 0
+        truncated = False
+        for frame, segment_path in candidates:
+            if len(events) >= limit:
+                truncated = True
+                break
+            records = self._read_frame(segment_path, frame)
+            if records is None:
+                continue
+            frames_scanned += 1
+            for record in records:
+                event = record["event"]
+                fields = event if isinstance(event, dict) else {}
+                if user is not None and first_field(fields, USER_FIELDS) != user:
+                    continue
+                if (
+                    source_ip is not None
+                    and first_field(fields, SOURCE_IP_FIELDS) != source_ip
+                ):
+                    continue
+                ts = event_time(event, record["ingested_at"])
+                if (start is not None and ts < start) or (end is not None and ts > end):
+                    continue
+                events.append(record)
+                if len(events) >= limit:
+                    break
+        return {
+            "events": events,
+            "frames_scanned": frames_scanned,
+            "frames_total": frames_total,
+            "truncated": truncated,
+        }
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats["pending"] = self._queue.qsize() if self._queue is not None else 0
+        return stats
+
+
+def create_event_archive():
+    """Build the archive from the ARCHIVE_* environment variables, or None when disabled"""
+    if os.environ.get("ARCHIVE_ENABLED", "True").lower() != "true":
+        return None
+    directory = os.environ.get("ARCHIVE_DIR", os.path.join("logs", "archive"))
+    try:
+        archive = EventArchive(
+            directory,
+            segment_bytes=int(os.environ.get("ARCHIVE_SEGMENT_MB", 64)) * 1024 * 1024,
+            frame_events=int(os.environ.get("ARCHIVE_FRAME_EVENTS", 1000)),
+            fsync_interval=float(os.environ.get("ARCHIVE_FSYNC_INTERVAL", 1.0)),
+            retention_days=float(os.environ.get("ARCHIVE_RETENTION_DAYS", 30)),
+        )
+    except OSError as e:
+        logger.warning(
+            f"⚠️ Event archive directory {directory} unavailable ({str(e)}); archiving disabled"
+        )
+        return None
+    logger.info(f"🗃️ Archiving raw events to {directory}")
+    return archive
@@ -0,0 +1,13 @@
+"""
+Gunicorn settings picked up from the working directory; command-line
+flags (bind, workers, threads) still take precedence.
+"""
+
+from job_journal import release_pending_jobs
+from metrics import clear_metrics_directory
+
+
+def on_starting(server):
+    """Drop metrics snapshots of earlier runs and hand their journaled jobs to the new workers"""
+    clear_metrics_directory()
+    release_pending_jobs()
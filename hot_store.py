@@ -0,0 +1,463 @@
+"""
+Memory-mapped columnar store of recently ingested events.
+
+Interactive questions ("all events for this user in the last hour") are
+answered from a compact column layout instead of Python dicts: every
+event becomes one row of fixed-width columns in a memory-mapped segment
+file,
+
+* ``time`` - float64 event time (epoch seconds),
+* ``analysis_id``, ``user``, ``source_ip``, ``action``, ``host``,
+  ``status`` - uint32 codes into per-segment string dictionaries,
+
+so a row costs 32 bytes and repeated strings are stored once per segment.
+Filters and aggregations run as NumPy operations over whole columns.
+
+Each process appends to its own segments (the pid is part of the name)
+and every process maps all of them read-only, so a query sees events
+ingested by any gunicorn worker; the pages live in the shared page cache
+rather than in each worker's heap. A segment file is a 16-byte header
+(magic, capacity, row count) followed by the columns at fixed offsets; its
+dictionary is an append-only ``<segment>.dict`` file of JSON
+``[column, value]`` lines. Writers append dictionary entries and column
+values before bumping the row count, so readers never see a row whose
+codes they cannot decode. Segments older than the retention window or
+beyond the byte budget are deleted, oldest first, except the segment each
+live process is still appending to (its newest).
+"""
+
+import glob
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+from event_archive import SOURCE_IP_FIELDS, USER_FIELDS, event_time, first_field
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"CHS1"
+HEADER = struct.Struct("<4sIQ")  # magic, capacity, rows
+
+# Dictionary-encoded columns and the event fields they are read from (analysis_id comes from the batch)
+STRING_COLUMNS = {
+    "analysis_id": (),
+    "user": USER_FIELDS,
+    "source_ip": SOURCE_IP_FIELDS,
+    "action": ("action", "event_type"),
+    "host": ("host", "hostname"),
+    "status": ("status", "outcome"),
+}
+
+
+def _layout(capacity):
+    """Byte offset of each column in a segment of `capacity` rows, and the file size"""
+    offsets = {"time": HEADER.size}
+    offset = HEADER.size + 8 * capacity
+    for name in STRING_COLUMNS:
+        offsets[name] = offset
+        offset += 4 * capacity
+    return offsets, offset
+
+
+def _segment_owner(path):
+    """(pid, opened at ms, sequence) from a segment file name"""
+    _, opened, pid, sequence = os.path.basename(path)[: -len(".seg")].split("-")
+    return int(pid), int(opened), int(sequence)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _columns(buffer, capacity):
+    """NumPy views of a segment's columns over a (memory-mapped) buffer"""
+    offsets, _ = _layout(capacity)
+    columns = {
+        "time": np.frombuffer(
+            buffer, dtype="<f8", count=capacity, offset=offsets["time"]
+        )
+    }
+    for name in STRING_COLUMNS:
+        columns[name] = np.frombuffer(
+            buffer, dtype="<u4", count=capacity, offset=offsets[name]
+        )
+    return columns
+
+
+class _Writer:
+    """The segment this process is appending to"""
+
+    def __init__(self, path, capacity):
+        self.path = path
+        self.capacity = capacity
+        _, size = _layout(capacity)
+        with open(path, "wb") as f:
+            f.truncate(size)
+        self.file = open(path, "r+b")
+        self.map = mmap.mmap(self.file.fileno(), size)
+        HEADER.pack_into(self.map, 0, MAGIC, capacity, 0)
+        self.columns = _columns(self.map, capacity)
+        self.dict_file = open(f"{path}.dict", "a", encoding="utf-8")
+        self.codes = {name: {"": 0} for name in STRING_COLUMNS}
+        self.rows = 0
+
+    def encode(self, name, values):
+        """Dictionary codes of `values`, appending unseen values to the dictionary file"""
+        codes = self.codes[name]
+        encoded = []
+        for value in values:
+            code = codes.get(value)
+            if code is None:
+                code = codes[value] = len(codes)
+                self.dict_file.write(json.dumps([name, value]) + "\n")
+            encoded.append(code)
+        return encoded
+
+    def append(self, times, values):
+        """Write rows; `values` maps every string column to a list of strings"""
+        encoded = {name: self.encode(name, values[name]) for name in STRING_COLUMNS}
+        self.dict_file.flush()
+        start, end = self.rows, self.rows + len(times)
+        self.columns["time"][start:end] = times
+        for name in STRING_COLUMNS:
+            self.columns[name][start:end] = encoded[name]
+        # Publishing the row count last makes the rows visible to readers in one step
+        HEADER.pack_into(self.map, 0, MAGIC, self.capacity, end)
+        self.rows = end
+        os.utime(
+            self.path
+        )  # mmap writes do not reliably update mtime, which retention relies on
+
+    def close(self):
+        self.columns = None
+        self.map.flush()
+        self.map.close()
+        self.file.close()
+        self.dict_file.close()
+
+
+class _Reader:
+    """Read-only view of a segment written by any process"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.capacity, _ = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{os.path.basename(path)} is not a hot store segment")
+        self.columns = _columns(self.map, self.capacity)
+        self.values = {name: [""] for name in STRING_COLUMNS}
+        self.codes = {name: {"": 0} for name in STRING_COLUMNS}
+        self._dict_read = 0
+
+    def rows(self):
+        """Rows published so far; the dictionary is loaded up to them"""
+        rows = HEADER.unpack_from(self.map, 0)[2]
+        with open(f"{self.path}.dict", "rb") as f:
+            f.seek(self._dict_read)
+            data = f.read()
+        complete = data[: data.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            name, value = json.loads(line)
+            self.codes[name][value] = len(self.values[name])
+            self.values[name].append(value)
+        self._dict_read += len(complete)
+        return rows
+
+
+class ColumnarHotStore:
+    """
+    Columnar store of recent events in memory-mapped segments under `directory`
+    """
+
+    def __init__(
+        self,
+        directory,
+        segment_rows=131072,
+        retention_seconds=86400,
+        max_bytes=512 * 1024 * 1024,
+    ):
+        self.directory = directory
+        self.segment_rows = segment_rows
+        self.retention_seconds = retention_seconds
+        self.max_bytes = max_bytes
+        self._write_lock = threading.Lock()
+        self._read_lock = threading.Lock()
+        self._writer = None
+        self._pid = None
+        self._sequence = 0
+        self._readers = {}
+        self.stats = {"rows": 0, "segments": 0}
+        os.makedirs(directory, exist_ok=True)
+
+    # Writing
+
+    def _open_segment(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._sequence += 1
+        name = f"hot-{int(time.time() * 1000)}-{os.getpid()}-{self._sequence}.seg"
+        self._writer = _Writer(os.path.join(self.directory, name), self.segment_rows)
+        self.stats["segments"] += 1
+        self._expire_segments()
+
+    def append(self, analysis_id, events):
+        """Add a batch of events as rows"""
+        ingested_at = time.time()
+        times = [event_time(event, ingested_at) for event in events]
+        values = {name: [] for name in STRING_COLUMNS}
+        for event in events:
+            fields = event if isinstance(event, dict) else {}
+            for name, aliases in STRING_COLUMNS.items():
+                values[name].append(
+                    analysis_id
+                    if name == "analysis_id"
+                    else first_field(fields, aliases) or ""
+                )
+
+        with self._write_lock:
+            if self._pid != os.getpid():
+                # gunicorn workers fork after import; each needs its own segment
+                self._writer, self._pid = None, os.getpid()
+            elif self._writer is not None and not os.path.exists(self._writer.path):
+                # Expired while this process was idle; rows written to it would never be read
+                self._writer.close()
+                self._writer = None
+            start = 0
+            while start < len(events):
+                if self._writer is None or self._writer.rows >= self._writer.capacity:
+                    self._open_segment()
+                end = min(
+                    len(events), start + self._writer.capacity - self._writer.rows
+                )
+                self._writer.append(
+                    times[start:end],
+                    {name: column[start:end] for name, column in values.items()},
+                )
+                start = end
+            self.stats["rows"] += len(events)
+
+    def _active_segments(self, paths):
+        """Segments a live process may still be appending to: the newest of each live pid"""
+        newest = {}
+        for path in paths:
+            try:
+                pid, opened, sequence = _segment_owner(path)
+            except ValueError:
+                continue
+            if pid not in newest or (opened, sequence) > newest[pid][0]:
+                newest[pid] = ((opened, sequence), path)
+        active = {
+            path
+            for pid, (_, path) in newest.items()
+            if pid == os.getpid() or _pid_alive(pid)
+        }
+        active.add(self._writer.path)
+        return active
+
+    def _expire_segments(self):
+        """
+        Delete sealed segments (of any process) past the retention window or
+        the byte budget, oldest first
+        """
+        paths = sorted(
+            glob.glob(os.path.join(self.directory, "hot-*.seg")),
+            key=lambda path: int(os.path.basename(path).split("-")[1]),
+        )
+        active = self._active_segments(paths)
+        cutoff = (
+            time.time() - self.retention_seconds if self.retention_seconds else None
+        )
+        total = 0
+        for path in reversed(paths):
+            try:
+                size = os.path.getsize(path)
+                total += size
+                expired = cutoff is not None and os.path.getmtime(path) < cutoff
+                if (
+                    expired or (self.max_bytes and total > self.max_bytes)
+                ) and path not in active:
+                    os.remove(path)
+                    os.remove(f"{path}.dict")
+                    logger.info(
+                        f"🗑️ Expired hot store segment {os.path.basename(path)}"
+                    )
+            except OSError:
+                continue
+
+    # Reading
+
+    def _segments(self):
+        """(reader, rows) for every live segment, mapping new ones and dropping deleted ones"""
+        paths = glob.glob(os.path.join(self.directory, "hot-*.seg"))
+        segments = []
+        with self._read_lock:
+            for path in set(self._readers) - set(paths):
+                del self._readers[path]
+            for path in paths:
+                try:
+                    reader = self._readers.get(path)
+                    if reader is None:
+                        reader = self._readers[path] = _Reader(path)
+                    segments.append((reader, reader.rows()))
+                except (OSError, ValueError) as e:
+                    # A segment being created or deleted right now
+                    logger.debug(
+                        f"Skipping hot store segment {os.path.basename(path)}: {str(e)}"
+                    )
+        return segments
+
+    @staticmethod
+    def _mask(reader, rows, filters, start, end):
+        """Boolean row mask of the filters over the first `rows` rows, or None if nothing can match"""
+        times = reader.columns["time"][:rows]
+        mask = np.ones(rows, dtype=bool)
+        if start is not None:
+            mask &= times >= start
+        if end is not None:
+            mask &= times <= end
+        for name, value in filters.items():
+            code = reader.codes[name].get(value)
+            if code is None:
+                return None
+            mask &= reader.columns[name][:rows] == code
+        return mask
+
+    def query(
+        self,
+        filters=None,
+        start=None,
+        end=None,
+        limit=100,
+        group_by=None,
+        interval=None,
+    ):
+        """
+        Events whose string columns equal `filters` and whose time is within
+        [start, end]. Returns the match count, the `limit` newest rows, and
+        optionally match counts per `group_by` column value and per
+        `interval`-second time bucket.
+        """
+        filters = {
+            name: value for name, value in (filters or {}).items() if value is not None
+        }
+        unknown = [name for name in filters if name not in STRING_COLUMNS]
+        if group_by is not None and group_by not in STRING_COLUMNS:
+            unknown.append(group_by)
+        if unknown:
+            raise ValueError(f"Unknown column: {', '.join(unknown)}")
+
+        total = 0
+        matches = []  # (reader, row indices, times)
+        groups = {}
+        buckets = {}
+        for reader, rows in self._segments():
+            if not rows:
+                continue
+            mask = self._mask(reader, rows, filters, start, end)
+            if mask is None:
+                continue
+            indices = np.flatnonzero(mask)
+            if not len(indices):
+                continue
+            total += len(indices)
+            times = reader.columns["time"][indices]
+            matches.append((reader, indices, times))
+            if group_by is not None:
+                counts = np.bincount(reader.columns[group_by][indices])
+                for code in np.flatnonzero(counts):
+                    value = reader.values[group_by][code]
+                    groups[value] = groups.get(value, 0) + int(counts[code])
+            if interval:
+                keys, counts = np.unique(
+                    np.floor(times / interval) * interval, return_counts=True
+                )
+                for key, count in zip(keys.tolist(), counts.tolist()):
+                    buckets[key] = buckets.get(key, 0) + count
+
+        result = {"total": total, "events": self._newest(matches, limit)}
+        if group_by is not None:
+            result["groups"] = [
+                {"value": value, "count": count}
+                for value, count in sorted(groups.items(), key=lambda item: -item[1])
+            ]
+        if interval:
+            result["histogram"] = [
+                {"start": key, "count": buckets[key]} for key in sorted(buckets)
+            ]
+        return result
+
+    @staticmethod
+    def _newest(matches, limit):
+        """Decode the `limit` newest matching rows across segments"""
+        if not matches or limit <= 0:
+            return []
+        times = np.concatenate([segment_times for _, _, segment_times in matches])
+        owners = np.concatenate(
+            [np.full(len(indices), i) for i, (_, indices, _) in enumerate(matches)]
+        )
+        rows = np.concatenate([indices for _, indices, _ in matches])
+        if len(times) > limit:
+            picked = np.argpartition(-times, limit - 1)[:limit]
+        else:
+            picked = np.arange(len(times))
+        picked = picked[np.argsort(-times[picked], kind="stable")]
+
+        events = []
+        for position in picked.tolist():
+            reader, row = matches[owners[position]][0], int(rows[position])
+            event = {"time": float(times[position])}
+            for name in STRING_COLUMNS:
+                event[name] = (
+                    reader.values[name][int(reader.columns[name][row])] or None
+                )
+            events.append(event)
+        return events
+
+    def snapshot(self):
+        segments = self._segments()
+        return {
+            "rows_written": self.stats["rows"],
+            "rows": sum(rows for _, rows in segments),
+            "segments": len(segments),
+            "bytes": sum(
+                os.path.getsize(reader.path)
+                for reader, _ in segments
+                if os.path.exists(reader.path)
+            ),
+        }
+
+
+def create_hot_store():
+    """Build the hot store from the HOT_STORE_* environment variables, or None when disabled"""
+    if os.environ.get("HOT_STORE_ENABLED", "True").lower() != "true":
+        return None
+    directory = os.environ.get("HOT_STORE_DIR", os.path.join("logs", "hot_store"))
+    try:
+        store = ColumnarHotStore(
+            directory,
+            segment_rows=int(os.environ.get("HOT_STORE_SEGMENT_ROWS", 131072)),
+            retention_seconds=float(os.environ.get("HOT_STORE_RETENTION_HOURS", 24))
+            * 3600,
+            max_bytes=int(os.environ.get("HOT_STORE_MAX_MB", 512)) * 1024 * 1024,
+        )
+    except OSError as e:
+        logger.warning(
+            f"⚠️ Hot store directory {directory} unavailable ({str(e)}); hot store disabled"
+        )
+        return None
+    logger.info(f"🧊 Columnar hot store of recent events in {directory}")
+    return store
@@ -0,0 +1,178 @@
+"""
+Durable journal of accepted analysis jobs.
+
+Batches acknowledged with 202 wait in an in-process queue until a worker
+analyzes them. With the SQLite result store, every job is also written to
+a ``pending_jobs`` table in the same database file and deleted once its
+result is stored, so a restart, deploy or crash no longer loses them:
+
+* ``release()`` runs once at server start, before any worker, and hands
+  every job left by the previous run back to the pool;
+* ``recover()`` runs in each worker and claims released jobs and jobs of
+  workers that are no longer running. Jobs recovered ``MAX_ATTEMPTS``
+  times and coalescing windows that never closed (no events were
+  journaled yet) are returned as abandoned, so their records can be
+  marked failed instead of staying queued forever.
+
+Owners are process ids, which is enough for the gunicorn workers of one
+host sharing the database file.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobJournal:
+    """Journal that keeps nothing (in-memory result store: results do not survive a restart either)"""
+
+    def save(self, analysis_id, job):
+        """Record a job for analysis_id; a None job is a coalescing window that has not closed yet"""
+
+    def finish(self, analysis_id):
+        """Forget a job once its result is stored (or it was never queued)"""
+
+    def release(self, analysis_id=None):
+        """Hand a claimed job, or every journaled job (server start), back for recovery"""
+
+    def recover(self, limit):
+        """
+        Claim up to `limit` jobs of stopped processes for this one.
+        Returns (jobs, abandoned): (analysis_id, job) pairs to queue again
+        and analysis_ids that will not be retried.
+        """
+        return [], []
+
+
+class SQLiteJobJournal(JobJournal):
+    """Job journal in a SQLite file (the result store's), shared by every worker"""
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS pending_jobs (
+                analysis_id TEXT PRIMARY KEY,
+                owner INTEGER,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                created_at REAL NOT NULL,
+                job TEXT
+            )
+        """)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(
+            self.path, timeout=10, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def save(self, analysis_id, job):
+        self._connect().execute(
+            "INSERT INTO pending_jobs (analysis_id, owner, created_at, job) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (analysis_id) DO UPDATE SET owner = excluded.owner, job = excluded.job",
+            (
+                analysis_id,
+                os.getpid(),
+                time.time(),
+                None if job is None else json.dumps(job),
+            ),
+        )
+
+    def finish(self, analysis_id):
+        self._connect().execute(
+            "DELETE FROM pending_jobs WHERE analysis_id = ?", (analysis_id,)
+        )
+
+    def release(self, analysis_id=None):
+        if analysis_id is None:
+            self._connect().execute("UPDATE pending_jobs SET owner = NULL")
+        else:
+            self._connect().execute(
+                "UPDATE pending_jobs SET owner = NULL WHERE analysis_id = ?",
+                (analysis_id,),
+            )
+
+    def recover(self, limit):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            owners = [
+                owner
+                for (owner,) in conn.execute("SELECT DISTINCT owner FROM pending_jobs")
+            ]
+            stopped = [
+                owner for owner in owners if owner is None or not _pid_alive(owner)
+            ]
+            jobs, abandoned = [], []
+            for owner in stopped:
+                rows = conn.execute(
+                    "SELECT analysis_id, attempts, job FROM pending_jobs WHERE owner IS ? ORDER BY created_at",
+                    (owner,),
+                ).fetchall()
+                for analysis_id, attempts, job in rows:
+                    if job is None or attempts >= MAX_ATTEMPTS:
+                        conn.execute(
+                            "DELETE FROM pending_jobs WHERE analysis_id = ?",
+                            (analysis_id,),
+                        )
+                        abandoned.append(analysis_id)
+                    elif len(jobs) < limit:
+                        conn.execute(
+                            "UPDATE pending_jobs SET owner = ?, attempts = attempts + 1 "
+                            "WHERE analysis_id = ?",
+                            (os.getpid(), analysis_id),
+                        )
+                        jobs.append((analysis_id, json.loads(job)))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return jobs, abandoned
+
+
+def create_job_journal(results):
+    """
+    Journal stored next to `results` when it is a SQLite result store
+    (JOB_JOURNAL=False disables it), else one that keeps nothing
+    """
+    path = getattr(results, "path", None)
+    if path is None or os.environ.get("JOB_JOURNAL", "True").lower() != "true":
+        return JobJournal()
+    logger.info(f"📒 Journaling queued analysis jobs in {path}")
+    return SQLiteJobJournal(path)
+
+
+def release_pending_jobs():
+    """Server-start hook: hand the previous run's jobs back to the new workers"""
+    if os.environ.get("RESULT_STORE", "memory").lower() != "sqlite":
+        return
+    if os.environ.get("JOB_JOURNAL", "True").lower() != "true":
+        return
+    SQLiteJobJournal(
+        os.environ.get("RESULT_STORE_PATH", "logs/analysis_results.db")
+    ).release()
@@ -0,0 +1,245 @@
+"""
+Content-addressed cache for LLM analysis results.
+
+Cribl often re-sends identical batches (retries, replays, heartbeats).
+Results are keyed on a hash of the normalized log payload, the prompt
+template and the model name, and kept in two tiers:
+
+* memory - LRU bounded by total bytes, per process
+* disk   - SQLite file shared by all workers and surviving restarts
+
+Both tiers honour the same TTL.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_payload(log_data, ignore_fields=()):
+    """
+    Canonicalize a log payload so cosmetically different batches hash equally.
+
+    Whitespace is trimmed per line, blank lines are dropped, and the values
+    of any JSON fields listed in ignore_fields (e.g. volatile timestamps)
+    are masked.
+    """
+    text = "\n".join(line.strip() for line in log_data.splitlines() if line.strip())
+    for field in ignore_fields:
+        pattern = r'("%s"\s*:\s*)("(?:[^"\\]|\\.)*"|[-\d.eE+]+)' % re.escape(field)
+        text = re.sub(pattern, r'\1"*"', text)
+    return text
+
+
+def cache_key(log_data, prompt_template, model_name, ignore_fields=()):
+    """SHA-256 over the normalized payload, prompt template and model name"""
+    digest = hashlib.sha256()
+    for part in (
+        model_name,
+        prompt_template,
+        normalize_payload(log_data, ignore_fields),
+    ):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+class LLMResponseCache:
+    """Two-tier (memory + optional SQLite) cache of parsed LLM analyses"""
+
+    def __init__(
+        self,
+        ttl_seconds=3600,
+        max_bytes=16 * 1024 * 1024,
+        disk_path=None,
+        disk_max_bytes=256 * 1024 * 1024,
+        ignore_fields=(),
+    ):
+        self.ignore_fields = tuple(ignore_fields)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.disk_path = disk_path
+        self.disk_max_bytes = disk_max_bytes
+        self._memory = OrderedDict()  # key -> (created_at, size, value_json)
+        self._memory_bytes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "stores": 0,
+        }
+
+        if disk_path:
+            os.makedirs(os.path.dirname(os.path.abspath(disk_path)), exist_ok=True)
+            conn = self._connect()
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    created_at REAL NOT NULL,
+                    size INTEGER NOT NULL,
+                    value TEXT NOT NULL
+                )
+            """)
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_llm_cache_created ON llm_cache (created_at)"
+            )
+
+    def key_for(self, log_data, prompt_template, model_name):
+        """Cache key for a payload using this cache's ignored fields"""
+        return cache_key(log_data, prompt_template, model_name, self.ignore_fields)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(
+            self.disk_path, timeout=10, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _fresh(self, created_at):
+        return not self.ttl_seconds or time.time() - created_at <= self.ttl_seconds
+
+    def _remember(self, key, created_at, value_json):
+        """Insert into the memory tier, evicting LRU entries past max_bytes"""
+        size = len(value_json)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._memory.pop(key, None)
+            if old is not None:
+                self._memory_bytes -= old[1]
+            self._memory[key] = (created_at, size, value_json)
+            self._memory_bytes += size
+            while self._memory_bytes > self.max_bytes:
+                _, (_, evicted_size, _) = self._memory.popitem(last=False)
+                self._memory_bytes -= evicted_size
+
+    def get(self, key):
+        """Return the cached analysis dict for key, or None"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None and not self._fresh(entry[0]):
+                self._memory.pop(key)
+                self._memory_bytes -= entry[1]
+                entry = None
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.stats["hits"] += 1
+                self.stats["memory_hits"] += 1
+                return json.loads(entry[2])
+
+        if self.disk_path:
+            try:
+                row = (
+                    self._connect()
+                    .execute(
+                        "SELECT created_at, value FROM llm_cache WHERE cache_key = ?",
+                        (key,),
+                    )
+                    .fetchone()
+                )
+            except sqlite3.Error as e:
+                logger.warning(f"⚠️ LLM cache disk read failed: {str(e)}")
+                row = None
+            if row is not None and self._fresh(row[0]):
+                self._remember(key, row[0], row[1])
+                with self._lock:
+                    self.stats["hits"] += 1
+                    self.stats["disk_hits"] += 1
+                return json.loads(row[1])
+
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def set(self, key, value):
+        """Store an analysis dict under key in both tiers"""
+        value_json = json.dumps(value)
+        now = time.time()
+        self._remember(key, now, value_json)
+        with self._lock:
+            self.stats["stores"] += 1
+
+        if not self.disk_path:
+            return
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache (cache_key, created_at, size, value) VALUES (?, ?, ?, ?)",
+                (key, now, len(value_json), value_json),
+            )
+            if self.ttl_seconds:
+                conn.execute(
+                    "DELETE FROM llm_cache WHERE created_at < ?",
+                    (now - self.ttl_seconds,),
+                )
+            total = conn.execute(
+                "SELECT COALESCE(SUM(size), 0) FROM llm_cache"
+            ).fetchone()[0]
+            if total > self.disk_max_bytes:
+                # Drop the oldest entries until we are back under budget
+                rows = conn.execute(
+                    "SELECT cache_key, size FROM llm_cache ORDER BY created_at"
+                ).fetchall()
+                for old_key, size in rows:
+                    if total <= self.disk_max_bytes:
+                        break
+                    conn.execute(
+                        "DELETE FROM llm_cache WHERE cache_key = ?", (old_key,)
+                    )
+                    total -= size
+            conn.execute("COMMIT")
+        except sqlite3.Error as e:
+            logger.warning(f"⚠️ LLM cache disk write failed: {str(e)}")
+            try:
+                self._connect().execute("ROLLBACK")
+            except sqlite3.Error:
+                pass
+
+    def snapshot(self):
+        """Counters and sizes for health/metrics reporting"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["memory_bytes"] = self._memory_bytes
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+        return stats
+
+
+def create_llm_cache():
+    """Build the LLM response cache from environment settings, or None if disabled"""
+    if os.environ.get("LLM_CACHE_ENABLED", "True").lower() != "true":
+        return None
+    disk_path = os.environ.get("LLM_CACHE_PATH", "logs/llm_cache.db") or None
+    ignore_fields = [
+        f.strip()
+        for f in os.environ.get("LLM_CACHE_IGNORE_FIELDS", "").split(",")
+        if f.strip()
+    ]
+    return LLMResponseCache(
+        ttl_seconds=int(os.environ.get("LLM_CACHE_TTL", 3600)),
+        max_bytes=int(os.environ.get("LLM_CACHE_MAX_BYTES", 16 * 1024 * 1024)),
+        disk_path=disk_path,
+        disk_max_bytes=int(
+            os.environ.get("LLM_CACHE_DISK_MAX_BYTES", 256 * 1024 * 1024)
+        ),
+        ignore_fields=ignore_fields,
+    )
@@ -0,0 +1,525 @@
+"""
+Gemini REST client with connection reuse, rate limiting, retries and a
+circuit breaker.
+
+* One ``requests.Session`` per client keeps a pool of keep-alive
+  connections shared by every analysis thread in the process.
+* Two token buckets enforce requests/min and tokens/min quotas.
+* Each call has a connect/read timeout; 429, 5xx, timeouts and connection
+  errors are retried with exponential backoff and full jitter, honouring
+  ``Retry-After``.
+* A circuit breaker opens after consecutive failures and fails fast until
+  a cool-down has passed, then lets a single trial call through.
+
+``generate_stream`` uses streamGenerateContent and yields text fragments
+as the model produces them; retries only happen before the first byte.
+
+AsyncGeminiClient applies the same policies on top of httpx for the
+ASGI serving mode. The base URL is configurable so tests and benchmarks can point the client
+at a local fake model server.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:  # only needed by AsyncGeminiClient
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BASE_URL = "https://generativelanguage.googleapis.com/v1beta"
+
+SAFETY_SETTINGS = [
+    {"category": category, "threshold": "BLOCK_NONE"}
+    for category in (
+        "HARM_CATEGORY_HARASSMENT",
+        "HARM_CATEGORY_HATE_SPEECH",
+        "HARM_CATEGORY_SEXUALLY_EXPLICIT",
+        "HARM_CATEGORY_DANGEROUS_CONTENT",
+    )
+]
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+# Connections per httpx client in AsyncGeminiClient (see AsyncGeminiClient._http)
+POOL_SHARD_SIZE = 16
+
+
+class LLMError(Exception):
+    """The model call failed"""
+
+
+class LLMRateLimitedError(LLMError):
+    """The local rate limiter could not grant capacity in time"""
+
+
+class LLMUnavailableError(LLMError):
+    """The circuit breaker is open; the provider is considered degraded"""
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `rate_per_minute`"""
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.tokens = float(rate_per_minute)
+        self.fill_rate = rate_per_minute / 60.0
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.updated) * self.fill_rate
+        )
+        self.updated = now
+
+    def reserve(self, amount):
+        """
+        Take `amount` tokens, going into debt if needed; returns how many
+        seconds the caller has to wait before the reservation is covered
+        """
+        amount = min(float(amount), self.capacity)
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.fill_rate
+
+    def refund(self, amount):
+        """Return tokens from a reservation that was not used"""
+        with self._lock:
+            self.tokens = min(
+                self.capacity, self.tokens + min(float(amount), self.capacity)
+            )
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker with a half-open trial call"""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return "closed"
+            if time.monotonic() - self.opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def acquire(self):
+        """
+        (allowed, trial): whether a call may proceed and whether it is the
+        half-open trial, which the caller must settle with record_success,
+        record_failure or release_trial
+        """
+        with self._lock:
+            if self.opened_at is None:
+                return True, False
+            if (
+                time.monotonic() - self.opened_at < self.reset_timeout
+                or self._trial_in_flight
+            ):
+                return False, False
+            self._trial_in_flight = True
+            return True, True
+
+    def allow(self):
+        """True if a call may proceed"""
+        return self.acquire()[0]
+
+    def release_trial(self):
+        """Give up a trial call that ended without a verdict on the provider"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_in_flight or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self._trial_in_flight:
+                    logger.warning(
+                        f"🔌 LLM circuit opened after {self.failures} consecutive failures"
+                    )
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+def estimate_prompt_tokens(text):
+    """Rough token count used for the tokens/min bucket (~4 chars per token)"""
+    return max(1, len(text) // 4)
+
+
+class _BaseGeminiClient:
+    """Quota, retry and breaker state shared by the sync and async clients"""
+
+    def __init__(
+        self,
+        api_key,
+        model_name,
+        base_url=DEFAULT_BASE_URL,
+        timeout=60.0,
+        max_retries=3,
+        backoff_base=1.0,
+        backoff_max=30.0,
+        requests_per_minute=60,
+        tokens_per_minute=1000000,
+        max_queue_wait=60.0,
+        pool_size=10,
+        breaker_threshold=5,
+        breaker_reset=30.0,
+    ):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_queue_wait = max_queue_wait
+        self.pool_size = pool_size
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_reset)
+        self.stats = {
+            "calls": 0,
+            "retries": 0,
+            "failures": 0,
+            "rate_limited": 0,
+            "short_circuited": 0,
+        }
+        self._stats_lock = threading.Lock()
+        self.headers = {"x-goog-api-key": api_key, "Content-Type": "application/json"}
+
+    def _count(self, key):
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def _url(self, method, stream=False):
+        return f"{self.base_url}/models/{self.model_name}:{method}" + (
+            "?alt=sse" if stream else ""
+        )
+
+    def _payload(self, prompt, response_schema=None):
+        payload = {
+            "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+            "safetySettings": SAFETY_SETTINGS,
+        }
+        if response_schema is not None:
+            # Structured output: the model must answer with JSON matching the schema
+            payload["generationConfig"] = {
+                "responseMimeType": "application/json",
+                "responseSchema": response_schema,
+            }
+        return payload
+
+    def _admit(self, prompt):
+        """
+        Check the breaker and reserve request and token quota; returns how
+        long to wait before sending and whether the call is the breaker's
+        half-open trial, or raises LLMUnavailableError/LLMRateLimitedError
+        """
+        allowed, trial = self.breaker.acquire()
+        if not allowed:
+            self._count("short_circuited")
+            raise LLMUnavailableError(
+                "LLM circuit breaker is open; provider marked as degraded"
+            )
+
+        prompt_tokens = estimate_prompt_tokens(prompt)
+        wait = max(
+            self.request_bucket.reserve(1), self.token_bucket.reserve(prompt_tokens)
+        )
+        if wait > self.max_queue_wait:
+            self.request_bucket.refund(1)
+            self.token_bucket.refund(prompt_tokens)
+            if trial:
+                self.breaker.release_trial()
+            self._count("rate_limited")
+            raise LLMRateLimitedError(f"Local LLM rate limit: next slot in {wait:.1f}s")
+        self._count("calls")
+        return wait, trial
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        delay = random.uniform(
+            0, min(self.backoff_max, self.backoff_base * (2**attempt))
+        )
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        return delay
+
+    def _check_status(self, status_code, text):
+        """
+        Classify a non-200 response: returns the LLMError to retry with, or
+        raises it straight away for client errors
+        """
+        error = LLMError(f"HTTP {status_code}: {text[:200]}")
+        if status_code not in RETRYABLE_STATUS:
+            # Client errors (bad key, bad request) still show the provider is reachable
+            self.breaker.record_success()
+            self._count("failures")
+            raise error
+        return error
+
+    def _should_retry(self, attempt, error):
+        if attempt < self.max_retries:
+            logger.warning(
+                f"🔁 LLM call failed ({error}), retry {attempt + 1}/{self.max_retries}"
+            )
+            return True
+        return False
+
+    def _exhausted(self, error):
+        self.breaker.record_failure()
+        self._count("failures")
+        return error
+
+    def snapshot(self):
+        """Counters and breaker state for health/metrics reporting"""
+        with self._stats_lock:
+            stats = dict(self.stats)
+        stats["circuit"] = self.breaker.state
+        return stats
+
+
+class GeminiClient(_BaseGeminiClient):
+    """Thread-safe client for the Gemini generateContent REST API"""
+
+    def __init__(self, api_key, model_name, **kwargs):
+        super().__init__(api_key, model_name, **kwargs)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(self.headers)
+
+    def _call(self, method, prompt, stream=False, response_schema=None):
+        """
+        POST to the model with breaker, rate limiting and retries applied;
+        returns the successful requests.Response
+        """
+        wait, trial = self._admit(prompt)
+        try:
+            if wait > 0:
+                time.sleep(wait)
+            url = self._url(method, stream)
+            last_error = None
+
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self._count("retries")
+                retry_after = None
+                try:
+                    response = self.session.post(
+                        url,
+                        data=json.dumps(self._payload(prompt, response_schema)),
+                        timeout=self.timeout,
+                        stream=stream,
+                    )
+                except (requests.Timeout, requests.ConnectionError) as e:
+                    last_error = LLMError(f"{type(e).__name__}: {str(e)}")
+                else:
+                    if response.status_code == 200:
+                        self.breaker.record_success()
+                        return response
+                    last_error = self._check_status(response.status_code, response.text)
+                    retry_after = response.headers.get("Retry-After")
+                if self._should_retry(attempt, last_error):
+                    time.sleep(self._backoff_delay(attempt, retry_after))
+
+            raise self._exhausted(last_error)
+        finally:
+            if trial:
+                # No-op when the outcome was recorded; otherwise the breaker would stay half-open
+                self.breaker.release_trial()
+
+    def generate(self, prompt, response_schema=None):
+        """
+        Generate a completion for prompt and return its text ('' if the model
+        returned none); with response_schema the text is JSON matching it
+        """
+        response = self._call(
+            "generateContent", prompt, response_schema=response_schema
+        )
+        try:
+            return _candidate_text(response.json())
+        except ValueError as e:
+            raise LLMError(f"Invalid JSON from model: {str(e)}")
+
+    def generate_stream(self, prompt, response_schema=None):
+        """Generate a completion for prompt, yielding its text fragments as they arrive"""
+        response = self._call(
+            "streamGenerateContent",
+            prompt,
+            stream=True,
+            response_schema=response_schema,
+        )
+        # text/event-stream is UTF-8; requests would decode it as ISO-8859-1 when no charset is sent
+        response.encoding = "utf-8"
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                fragment = _sse_text(line)
+                if fragment:
+                    yield fragment
+        except requests.RequestException as e:
+            raise LLMError(f"Stream interrupted: {type(e).__name__}: {str(e)}")
+        finally:
+            response.close()
+
+
+class AsyncGeminiClient(_BaseGeminiClient):
+    """
+    asyncio client for the same API on an httpx.AsyncClient connection pool.
+
+    Quota waits and backoff use asyncio.sleep, so one event loop can keep
+    hundreds of calls in flight. The httpx clients are created lazily inside
+    the running loop and must be closed with aclose() on shutdown.
+    """
+
+    def __init__(self, api_key, model_name, **kwargs):
+        if httpx is None:
+            raise ImportError("AsyncGeminiClient requires httpx (pip install httpx)")
+        super().__init__(api_key, model_name, **kwargs)
+        self._clients = []
+        self._next = 0
+
+    def _http(self):
+        """
+        Next httpx client, round-robin. httpcore scans every connection of a
+        pool on each request, which gets expensive past a few dozen
+        connections, so large pools are split into shards of POOL_SHARD_SIZE.
+        """
+        if not self._clients:
+            shards = max(1, -(-self.pool_size // POOL_SHARD_SIZE))
+            per_shard = -(-self.pool_size // shards)
+            self._clients = [
+                httpx.AsyncClient(
+                    headers=self.headers,
+                    timeout=self.timeout,
+                    limits=httpx.Limits(
+                        max_connections=per_shard, max_keepalive_connections=per_shard
+                    ),
+                )
+                for _ in range(shards)
+            ]
+        self._next = (self._next + 1) % len(self._clients)
+        return self._clients[self._next]
+
+    async def _call(self, method, prompt, stream=False, response_schema=None):
+        """
+        Async counterpart of GeminiClient._call; returns the successful
+        httpx.Response, unread when `stream` is set (close it with aclose())
+        """
+        wait, trial = self._admit(prompt)
+        try:
+            if wait > 0:
+                await asyncio.sleep(wait)
+            client = self._http()
+            request = client.build_request(
+                "POST",
+                self._url(method, stream),
+                content=json.dumps(self._payload(prompt, response_schema)),
+            )
+            last_error = None
+
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self._count("retries")
+                retry_after = None
+                try:
+                    response = await client.send(request, stream=stream)
+                except (httpx.TimeoutException, httpx.TransportError) as e:
+                    last_error = LLMError(f"{type(e).__name__}: {str(e)}")
+                else:
+                    if response.status_code == 200:
+                        self.breaker.record_success()
+                        return response
+                    try:
+                        await response.aread()
+                    finally:
+                        await response.aclose()
+                    last_error = self._check_status(response.status_code, response.text)
+                    retry_after = response.headers.get("Retry-After")
+                if self._should_retry(attempt, last_error):
+                    await asyncio.sleep(self._backoff_delay(attempt, retry_after))
+
+            raise self._exhausted(last_error)
+        finally:
+            if trial:
+                self.breaker.release_trial()
+
+    async def generate(self, prompt, response_schema=None):
+        """Async counterpart of GeminiClient.generate"""
+        response = await self._call(
+            "generateContent", prompt, response_schema=response_schema
+        )
+        try:
+            return _candidate_text(response.json())
+        except ValueError as e:
+            raise LLMError(f"Invalid JSON from model: {str(e)}")
+
+    async def generate_stream(self, prompt, response_schema=None):
+        """Async counterpart of GeminiClient.generate_stream"""
+        response = await self._call(
+            "streamGenerateContent",
+            prompt,
+            stream=True,
+            response_schema=response_schema,
+        )
+        try:
+            async for line in response.aiter_lines():
+                fragment = _sse_text(line)
+                if fragment:
+                    yield fragment
+        except (httpx.TimeoutException, httpx.TransportError) as e:
+            raise LLMError(f"Stream interrupted: {type(e).__name__}: {str(e)}")
+        finally:
+            await response.aclose()
+
+    async def aclose(self):
+        clients, self._clients = self._clients, []
+        for client in clients:
+            await client.aclose()
+
+
+def _candidate_text(body):
+    parts = []
+    for candidate in body.get("candidates", [])[:1]:
+        for part in candidate.get("content", {}).get("parts", []):
+            parts.append(part.get("text", ""))
+    return "".join(parts)
+
+
+def _sse_text(line):
+    """Text carried by one line of a streamGenerateContent?alt=sse response ('' for other lines)"""
+    if not line or not line.startswith("data:"):
+        return ""
+    try:
+        return _candidate_text(json.loads(line[5:]))
+    except ValueError as e:
+        raise LLMError(f"Invalid JSON in model stream: {str(e)}")
@@ -0,0 +1,220 @@
+"""
+Parsing of model analyses into structured result fields.
+
+Two output formats are supported:
+
+* ``json`` - the model is asked for a JSON object matching
+  ``ANALYSIS_SCHEMA`` (sent to Gemini as the response schema), which is
+  decoded and validated in one pass;
+* ``text`` - the ``THREAT_LEVEL: ... RECOMMENDATIONS: ...`` section format.
+  One regex pass finds every section header, so sections may come in any
+  order, headers may carry markdown (``**THREAT_LEVEL:**``,
+  ``## Key Findings``) and may be written with spaces or in any case.
+
+``parse_analysis`` tries JSON first when JSON was requested or the text
+looks like JSON, and falls back to the text parser, so a response that
+ignores the requested format still yields a result. Threat levels and
+risk scores are normalized (``"**HIGH** - lateral movement"`` -> ``HIGH``,
+``"8/10"`` -> ``"8"``).
+"""
+
+import json
+import re
+
+from log_chunking import THREAT_LEVELS, normalize_risk_score, normalize_threat_level
+
+OUTPUT_FORMATS = ("text", "json")
+
+TEXT_FIELDS = ("summary", "key_findings", "immediate_actions", "recommendations")
+
+DEFAULT_ANALYSIS = {
+    "threat_level": "UNKNOWN",
+    "risk_score": "N/A",
+    "summary": "Analysis in progress...",
+    "key_findings": "Processing...",
+    "immediate_actions": "Under review...",
+    "recommendations": "Pending analysis...",
+}
+
+# Gemini responseSchema (OpenAPI subset); propertyOrdering keeps the threat level first for streaming
+ANALYSIS_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "threat_level": {"type": "STRING", "enum": list(THREAT_LEVELS)},
+        "risk_score": {"type": "INTEGER", "minimum": 1, "maximum": 10},
+        "summary": {"type": "STRING"},
+        "key_findings": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "immediate_actions": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "recommendations": {"type": "ARRAY", "items": {"type": "STRING"}},
+    },
+    "required": [
+        "threat_level",
+        "risk_score",
+        "summary",
+        "key_findings",
+        "immediate_actions",
+        "recommendations",
+    ],
+    "propertyOrdering": [
+        "threat_level",
+        "risk_score",
+        "summary",
+        "key_findings",
+        "immediate_actions",
+        "recommendations",
+    ],
+}
+
+# A section header at the start of a line, optionally decorated with markdown
+# (bullets, numbering, headings, bold/italic, quotes, an emoji marker such as "🚨 *THREAT LEVEL*:"),
+# followed by a colon or the end of the line
+HEADER_PATTERN = re.compile(
+    r"^[ \t>#*_\-\u2600-\u27bf\ufe0f\U0001f300-\U0001faff]*(?:\d+[.)][ \t]*)?[ \t*_]*"
+    r"(threat[ _]level|risk[ _]score|summary|key[ _]findings|immediate[ _]actions|recommendations)"
+    r"[ \t*_]*(?::[ \t*_]*|\r?$)",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+_CODE_FENCE = re.compile(r"^\s*```[a-zA-Z]*\s*\n?(.*?)\n?\s*```\s*$", re.DOTALL)
+
+
+def header_field(name):
+    """Result field for a matched header name ('Key Findings' -> 'key_findings')"""
+    return name.lower().replace(" ", "_")
+
+
+def _strip_emphasis(line):
+    """Drop bold markers around a value ('**HIGH**') or left over from the header ('**SUMMARY: text**')"""
+    for marker in ("**", "__"):
+        count = line.count(marker)
+        if count == 2 and line.startswith(marker) and line.endswith(marker):
+            line = line[2:-2]
+        elif count % 2 and line.startswith(marker):
+            line = line[2:]
+        elif count % 2 and line.endswith(marker):
+            line = line[:-2]
+    return line.strip()
+
+
+def _clean_section(value):
+    """Strip blank lines, indentation and stray markdown emphasis from a section body"""
+    lines = [line.strip() for line in value.split("\n")]
+    lines = [line for line in lines if line]
+    if lines:
+        lines[0] = _strip_emphasis(lines[0])
+        lines[-1] = _strip_emphasis(lines[-1])
+    return "\n".join(line for line in lines if line)
+
+
+def normalize_field(field, value):
+    """Canonical threat level / risk score text; other fields pass through"""
+    if field == "threat_level":
+        return normalize_threat_level(value)
+    if field == "risk_score":
+        score = normalize_risk_score(value)
+        return str(score) if score is not None else "N/A"
+    return value
+
+
+def _is_bullet(text, match):
+    """True when a header is written as a list item ('- Recommendations: ...')"""
+    decoration = text[match.start() : match.start(1)].strip()
+    return decoration[:1] in ("-", "+") or (
+        decoration.startswith("*") and not decoration.startswith("**")
+    )
+
+
+def parse_text_analysis(text):
+    """Parse the section format in one pass; sections missing from text keep their defaults"""
+    # One header per field: the first one, unless a later one is not a list item
+    # (a finding like "- Recommendations: ..." should not cut its section short)
+    headers = {}
+    for match in HEADER_PATTERN.finditer(text):
+        field = header_field(match.group(1))
+        current = headers.get(field)
+        if current is None or (
+            _is_bullet(text, current) and not _is_bullet(text, match)
+        ):
+            headers[field] = match
+
+    parsed = dict(DEFAULT_ANALYSIS)
+    ordered = sorted(headers.items(), key=lambda item: item[1].start())
+    for i, (field, match) in enumerate(ordered):
+        end = ordered[i + 1][1].start() if i + 1 < len(ordered) else len(text)
+        value = _clean_section(text[match.end() : end])
+        if value:
+            parsed[field] = normalize_field(field, value)
+    return parsed
+
+
+def _section_text(field, value):
+    """JSON section value as display text; lists become '- item' lines"""
+    if isinstance(value, list):
+        if not all(isinstance(item, (str, int, float)) for item in value):
+            raise ValueError(f"'{field}' must be a list of strings")
+        return "\n".join(
+            f"- {str(item).strip()}" for item in value if str(item).strip()
+        )
+    if isinstance(value, str):
+        return value.strip()
+    raise ValueError(f"'{field}' must be a string or a list of strings")
+
+
+def parse_json_analysis(text):
+    """
+    Decode and validate a JSON analysis against ANALYSIS_SCHEMA; raises
+    ValueError if the response is not a conforming JSON object
+    """
+    fenced = _CODE_FENCE.match(text)
+    if fenced:
+        text = fenced.group(1)
+    start, end = text.find("{"), text.rfind("}")
+    if start == -1 or end < start:
+        raise ValueError("No JSON object in response")
+    data = json.loads(text[start : end + 1])
+    if not isinstance(data, dict):
+        raise ValueError("Response is not a JSON object")
+
+    missing = [field for field in ("threat_level", "risk_score") if field not in data]
+    if missing:
+        raise ValueError(f"Missing required fields: {', '.join(missing)}")
+
+    threat_level = str(data["threat_level"]).strip().upper()
+    if threat_level not in THREAT_LEVELS:
+        raise ValueError(f"Invalid threat_level: {data['threat_level']!r}")
+    risk_score = data["risk_score"]
+    if isinstance(risk_score, str) and risk_score.strip().isdigit():
+        risk_score = int(risk_score)
+    if (
+        not isinstance(risk_score, int)
+        or isinstance(risk_score, bool)
+        or not 1 <= risk_score <= 10
+    ):
+        raise ValueError(f"Invalid risk_score: {data['risk_score']!r}")
+
+    parsed = dict(
+        DEFAULT_ANALYSIS, threat_level=threat_level, risk_score=str(risk_score)
+    )
+    for field in TEXT_FIELDS:
+        if data.get(field) is not None:
+            parsed[field] = _section_text(field, data[field]) or parsed[field]
+    return parsed
+
+
+def parse_analysis(text, output_format="text"):
+    """
+    Parse a model analysis; `response_format` in the result records which
+    parser succeeded ("json", "text", or "text_fallback" when JSON was
+    requested but the response was not valid JSON)
+    """
+    looks_like_json = text.lstrip().startswith(("{", "```")) or '"threat_level"' in text
+    if output_format == "json" or looks_like_json:
+        try:
+            parsed = parse_json_analysis(text)
+            parsed["response_format"] = "json"
+            return parsed
+        except ValueError:
+            pass
+    parsed = parse_text_analysis(text)
+    parsed["response_format"] = "text_fallback" if output_format == "json" else "text"
+    return parsed
@@ -0,0 +1,125 @@
+"""
+Incremental parsing of a streamed model analysis.
+
+Both analysis formats put the threat level and risk score first (the
+text format's first two lines, the JSON schema's first two properties),
+so a streamed response reveals the severity long before the model has
+finished writing its findings. ``StreamingAnalysisParser`` accumulates
+the fragments, picks those fields up as soon as they arrive (a text
+threat level even before its line ends, once it spells out a known
+level) and decides when a partial analysis is worth publishing:
+
+* immediately when a header field is first seen, so alerting on CRITICAL
+  does not wait for the rest of the response;
+* otherwise at most every ``update_interval`` seconds, and only when new
+  complete lines have arrived (text format only; a JSON object cannot be
+  parsed before it is complete).
+
+Partial analyses are built with the same parser as the final one, applied
+to the complete lines received so far, and carry ``status: streaming``.
+"""
+
+import re
+import time
+
+from llm_response import HEADER_PATTERN, header_field, normalize_field
+from log_chunking import THREAT_LEVELS
+
+HEADER_FIELDS = ("threat_level", "risk_score")
+
+# A complete "threat_level"/"risk_score" member of a streamed JSON object
+JSON_HEADER_PATTERN = re.compile(
+    r'"(threat_level|risk_score)"\s*:\s*(?:"([^"]*)"|(\d+)\s*[,}\n])'
+)
+
+
+class StreamingAnalysisParser:
+    """
+    Accumulates a streamed response; `parse` turns text into an analysis dict
+    and `on_threat_level(level, seconds)` is called once when the level is known
+    """
+
+    def __init__(self, parse, update_interval=0.5, on_threat_level=None):
+        self.parse = parse
+        self.update_interval = update_interval
+        self.on_threat_level = on_threat_level
+        self.fields = {}
+        self.started = time.monotonic()
+        self._parts = []
+        self._line = ""
+        self._new_lines = False
+        self._published_at = None
+        self._json = None  # whether the response is a JSON object, once known
+
+    @property
+    def text(self):
+        return "".join(self._parts)
+
+    def _record(self, field, value):
+        """Record a header field; True if it is new"""
+        if field not in HEADER_FIELDS or field in self.fields or not value:
+            return False
+        self.fields[field] = value = normalize_field(field, value)
+        if field == "threat_level" and self.on_threat_level is not None:
+            self.on_threat_level(value, time.monotonic() - self.started)
+        return True
+
+    def _header(self, line, complete):
+        """Record a header field from a (possibly incomplete) text line; True if it is new"""
+        match = HEADER_PATTERN.match(line)
+        if match is None:
+            return False
+        field = header_field(match.group(1))
+        value = line[match.end() :].strip(" *_")
+        # Known threat levels are not prefixes of each other, so they can be taken mid-line
+        if complete or (field == "threat_level" and value.upper() in THREAT_LEVELS):
+            return self._record(field, value)
+        return False
+
+    def _json_headers(self):
+        """Record header fields from a streamed JSON object; True if any is new"""
+        found = False
+        for match in JSON_HEADER_PATTERN.finditer(self.text):
+            value = match.group(2) if match.group(2) is not None else match.group(3)
+            found = self._record(match.group(1), value.strip()) or found
+        return found
+
+    def feed(self, fragment):
+        """Add a fragment; returns a partial analysis when one should be published, else None"""
+        self._parts.append(fragment)
+        lines = (self._line + fragment).split("\n")
+        self._line = lines.pop()
+        found = False
+        if self._json is None and self.text.strip():
+            self._json = self.text.lstrip().startswith(("{", "```"))
+        if self._json:
+            if len(self.fields) < len(HEADER_FIELDS):
+                found = self._json_headers()
+        else:
+            for line in lines:
+                found = self._header(line, complete=True) or found
+            found = self._header(self._line, complete=False) or found
+        self._new_lines = self._new_lines or bool(lines)
+
+        now = time.monotonic()
+        due = (
+            self._new_lines
+            and not self._json
+            and (
+                self._published_at is None
+                or now - self._published_at >= self.update_interval
+            )
+        )
+        if not (found or due):
+            return None
+        self._published_at = now
+        self._new_lines = False
+        return self.snapshot()
+
+    def snapshot(self):
+        """Partial analysis of the complete lines received so far"""
+        text = self.text
+        partial = self.parse(text[: text.rfind("\n") + 1])
+        partial.update(self.fields)
+        partial["status"] = "streaming"
+        return partial
@@ -1,15 +1,37 @@
-from flask import Flask, request, jsonify, render_template_string
+from flask import Flask, Response, g, request, jsonify
 from dotenv import load_dotenv
+import jinja2
+import math
 import requests
 import os
 import uuid
 from datetime import datetime
 import json
-import gzip
 import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import urllib.parse
-import google.generativeai as genai
-from google.generativeai.types import HarmCategory, HarmBlockThreshold
+from analysis_queue import AnalysisQueue, QueueFullError
+from anomaly_scoring import create_anomaly_scorer, evidence_note
+from batch_coalescer import BatchCoalescer
+from event_aggregation import AGGREGATION_NOTE, aggregate_events
+from entity_baselines import create_entity_baselines, deviation_note
+from event_archive import create_event_archive
+from hot_store import STRING_COLUMNS, create_hot_store
+from job_journal import create_job_journal, release_pending_jobs
+from retrieval_index import IndexFollower, create_retrieval_index, pack_context
+from prefilter_rules import RuleEngine
+from result_broadcast import ResultBroadcaster
+from result_store import SQLiteResultStore, create_result_store
+from llm_cache import create_llm_cache
+from metrics import SIZE_BUCKETS, clear_metrics_directory, create_metrics
+from llm_client import DEFAULT_BASE_URL, GeminiClient
+from llm_response import ANALYSIS_SCHEMA, OUTPUT_FORMATS, parse_analysis
+from llm_streaming import StreamingAnalysisParser
+from log_chunking import chunk_entries, estimate_tokens, format_chunk_findings, merge_analyses
+from log_ingest import PayloadTooLargeError, iter_body_bytes, iter_body_text, iter_json_events
+from prompt_encoding import encode_event, encode_events
 
 # Load environment variables BEFORE creating the app
 load_dotenv()
@@ -22,11 +44,29 @@ logger = logging.getLogger(__name__)
 
 # Configure Gemini AI with better error handling
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY")
-model = None
+GEMINI_MODEL_NAME = 'gemini-1.5-flash'
+GEMINI_API_BASE = os.environ.get("GEMINI_API_BASE", DEFAULT_BASE_URL)
+llm_client = None
+
+def llm_client_settings():
+    """Connection, retry, quota and breaker settings for the Gemini client"""
+    return {
+        "base_url": GEMINI_API_BASE,
+        "timeout": float(os.environ.get("LLM_TIMEOUT_SECONDS", 60)),
+        "max_retries": int(os.environ.get("LLM_MAX_RETRIES", 3)),
+        "backoff_base": float(os.environ.get("LLM_BACKOFF_BASE", 1.0)),
+        "backoff_max": float(os.environ.get("LLM_BACKOFF_MAX", 30.0)),
+        "requests_per_minute": float(os.environ.get("LLM_REQUESTS_PER_MINUTE", 60)),
+        "tokens_per_minute": float(os.environ.get("LLM_TOKENS_PER_MINUTE", 1000000)),
+        "max_queue_wait": float(os.environ.get("LLM_MAX_QUEUE_WAIT", 60)),
+        "pool_size": int(os.environ.get("LLM_POOL_SIZE", 10)),
+        "breaker_threshold": int(os.environ.get("LLM_BREAKER_THRESHOLD", 5)),
+        "breaker_reset": float(os.environ.get("LLM_BREAKER_RESET", 30))
+    }
 
 def initialize_gemini():
     """Initialize Gemini AI with proper error handling"""
-    global model
+    global llm_client
     
     if not GEMINI_API_KEY:
         logger.warning("⚠️ GEMINI_API_KEY not found in environment variables")
@@ -38,44 +78,190 @@ def initialize_gemini():
         return False
     
     try:
-        genai.configure(api_key=GEMINI_API_KEY)
-        # Test the API key by trying to create a model
-        model = genai.GenerativeModel('gemini-1.5-flash')
+        llm_client = GeminiClient(GEMINI_API_KEY.strip(), GEMINI_MODEL_NAME, **llm_client_settings())
         logger.info("✅ Gemini AI initialized successfully")
         return True
     except Exception as e:
         logger.error(f"❌ Failed to initialize Gemini AI: {str(e)}")
         logger.error("Please check your GEMINI_API_KEY is valid")
-        model = None
+        llm_client = None
         return False
 
 # Initialize Gemini on startup
 gemini_available = initialize_gemini()
 
-# In-memory storage for analysis results (use Redis/DB in production)
-analysis_results = {}
+# Bounded storage for analysis results (RESULT_STORE=memory|sqlite)
+analysis_results = create_result_store()
 
-# STREAMLIT URL - Update this with your actual URL
-STREAMLIT_APP_URL = "https://criblchatbot-ksbwyaufrk8t2lt6dmhdgc.streamlit.app"
+# Background analysis queue settings
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", 2))
+ANALYSIS_QUEUE_MAX = int(os.environ.get("ANALYSIS_QUEUE_MAX", 100))
+ANALYSIS_RETRY_AFTER = int(os.environ.get("ANALYSIS_RETRY_AFTER", 30))
 
-def analyze_logs_with_llm(log_data, analysis_id):
-    """
-    Analyze log data using Gemini AI and return a structured summary
-    """
-    if not model:
-        return {
-            "status": "error",
-            "summary": "LLM analysis unavailable - API key not configured or invalid",
-            "threat_level": "UNKNOWN",
-            "risk_score": "N/A",
-            "key_findings": "LLM service unavailable",
-            "recommendations": "Configure valid GEMINI_API_KEY to enable AI analysis",
-            "error": "Gemini API not available"
-        }
-    
-    try:
-        # Enhanced prompt for structured analysis
-        prompt = f"""
+# Accepted jobs are journaled next to a SQLite result store, so a restart or crash does not lose them
+job_journal = create_job_journal(analysis_results)
+JOB_RECOVERY_INTERVAL = float(os.environ.get("JOB_RECOVERY_INTERVAL", 30))
+job_recovery = {"next": 0.0}
+job_recovery_lock = threading.Lock()
+
+# Coalescing of small webhook batches (0 disables)
+COALESCE_WINDOW_SECONDS = float(os.environ.get("COALESCE_WINDOW_SECONDS", 0))
+COALESCE_MAX_EVENTS = int(os.environ.get("COALESCE_MAX_EVENTS", 1000))
+COALESCE_GROUP_HEADER = os.environ.get("COALESCE_GROUP_HEADER", "")
+
+# Upper bound on a (decompressed) webhook body, protects against gzip bombs
+MAX_DECOMPRESSED_BYTES = int(os.environ.get("MAX_DECOMPRESSED_BYTES", 50 * 1024 * 1024))
+
+# How events are serialized into prompts (pretty|json|table) and which noisy fields are dropped
+PROMPT_FORMAT = os.environ.get("PROMPT_FORMAT", "json").lower()
+PROMPT_DROP_FIELDS = [f.strip() for f in os.environ.get("PROMPT_DROP_FIELDS", "").split(",") if f.strip()]
+
+# Local rule-based pre-filter (benign batches skip the LLM)
+PREFILTER_ENABLED = os.environ.get("PREFILTER_ENABLED", "True").lower() == "true"
+PREFILTER_RULES_PATH = os.environ.get("PREFILTER_RULES_PATH",
+                                      os.path.join(os.path.dirname(os.path.abspath(__file__)), "prefilter_rules.json"))
+prefilter = RuleEngine(PREFILTER_RULES_PATH,
+                       reload_interval=float(os.environ.get("PREFILTER_RELOAD_INTERVAL", 5))) if PREFILTER_ENABLED else None
+
+# Collapse repeated events before prompting (empty key = all fields except timestamps)
+AGGREGATE_EVENTS = os.environ.get("AGGREGATE_EVENTS", "True").lower() == "true"
+AGGREGATE_KEY_FIELDS = [f.strip() for f in os.environ.get("AGGREGATE_KEY_FIELDS", "").split(",") if f.strip()]
+AGGREGATE_MAX_SAMPLES = int(os.environ.get("AGGREGATE_MAX_SAMPLES", 3))
+
+# Statistical anomaly scoring: escalates batches the rules would skip, and adds evidence to prompts
+anomaly_scorer = create_anomaly_scorer()
+ANOMALY_ESCALATE_SCORE = float(os.environ.get("ANOMALY_ESCALATE_SCORE", 6))
+ANOMALY_NOTE_MIN_SCORE = float(os.environ.get("ANOMALY_NOTE_MIN_SCORE", 3))
+
+# Per-user/per-host behavioral baselines; deviations at or above the note score are described in prompts
+entity_baselines = create_entity_baselines()
+BASELINE_NOTE_MIN_SCORE = float(os.environ.get("BASELINE_NOTE_MIN_SCORE", 3))
+BASELINE_REPORT_ENTITIES = 10
+
+# Map-reduce analysis of large batches
+LLM_CHUNK_MAX_TOKENS = int(os.environ.get("LLM_CHUNK_MAX_TOKENS", 8000))
+LLM_CHUNK_CONCURRENCY = int(os.environ.get("LLM_CHUNK_CONCURRENCY", 4))
+LLM_REDUCE_STRATEGY = os.environ.get("LLM_REDUCE_STRATEGY", "merge").lower()
+chunk_executor = ThreadPoolExecutor(max_workers=LLM_CHUNK_CONCURRENCY,
+                                    thread_name_prefix="llm-chunk")
+
+# Stream model output and publish partial analyses (threat level first) while it arrives
+LLM_STREAMING = os.environ.get("LLM_STREAMING", "false").lower() == "true"
+LLM_STREAM_UPDATE_INTERVAL = float(os.environ.get("LLM_STREAM_UPDATE_INTERVAL", 0.5))
+
+# Model output format: "text" sections or "json" structured output validated against ANALYSIS_SCHEMA
+LLM_OUTPUT_FORMAT = os.environ.get("LLM_OUTPUT_FORMAT", "text").lower()
+if LLM_OUTPUT_FORMAT not in OUTPUT_FORMATS:
+    logger.warning(f"⚠️ Unknown LLM_OUTPUT_FORMAT '{LLM_OUTPUT_FORMAT}', falling back to text")
+    LLM_OUTPUT_FORMAT = "text"
+LLM_RESPONSE_SCHEMA = ANALYSIS_SCHEMA if LLM_OUTPUT_FORMAT == "json" else None
+
+# Cache of LLM analyses keyed on normalized payload + prompt + model
+llm_cache = create_llm_cache()
+
+# Append-only, indexed archive of every accepted raw event (searchable through /api/archive)
+event_archive = create_event_archive()
+ARCHIVE_QUERY_DEFAULT_LIMIT = 100
+ARCHIVE_QUERY_MAX_LIMIT = 1000
+
+# Memory-mapped columnar store of recent events for interactive queries (/api/events)
+hot_store = create_hot_store()
+HOT_QUERY_DEFAULT_LIMIT = 100
+HOT_QUERY_MAX_LIMIT = 1000
+
+# BM25 index of recent events and analyses that chatbot questions are answered from (/api/search).
+# It follows the archive and result store, so every worker searches all workers' batches.
+retrieval_index = create_retrieval_index()
+retrieval_follower = None
+if retrieval_index is not None:
+    retrieval_follower = IndexFollower(retrieval_index, event_archive, analysis_results,
+                                       interval=float(os.environ.get("RETRIEVAL_REFRESH_INTERVAL", 2)))
+RETRIEVAL_DEFAULT_K = 20
+RETRIEVAL_MAX_K = 100
+RETRIEVAL_CONTEXT_TOKENS = int(os.environ.get("RETRIEVAL_CONTEXT_TOKENS", 2000))
+
+# Prometheus-style metrics, aggregated across workers through METRICS_DIR
+metrics = create_metrics()
+REQUEST_PARSE_SECONDS = metrics.histogram("request_parse_seconds",
+                                          "Time to read, decompress and parse a webhook body")
+HTTP_REQUESTS = metrics.counter("http_requests_total", "HTTP requests by endpoint, method and status",
+                                ("endpoint", "method", "status"))
+HTTP_REQUEST_SECONDS = metrics.histogram("http_request_duration_seconds", "HTTP request latency by endpoint",
+                                         ("endpoint",))
+ANALYSES = metrics.counter("analyses_total", "Log batches by outcome (prefiltered, rejected, success, error)",
+                           ("outcome",))
+PROMPT_BYTES = metrics.histogram("prompt_bytes", "Size of prompts sent to Gemini in bytes", buckets=SIZE_BUCKETS)
+PROMPT_TOKENS = metrics.histogram("prompt_tokens", "Estimated tokens of prompts sent to Gemini", buckets=SIZE_BUCKETS)
+LLM_LATENCY_SECONDS = metrics.histogram("llm_latency_seconds", "Gemini call latency including retries and quota waits",
+                                        ("outcome",))
+LLM_PARSE_SECONDS = metrics.histogram("llm_response_parse_seconds", "Time spent in parse_llm_response")
+LLM_RESPONSE_FORMATS = metrics.counter("llm_response_formats_total",
+                                       "Parsed model responses by parser (json, text, text_fallback)", ("format",))
+LLM_TIME_TO_THREAT_LEVEL = metrics.histogram("llm_time_to_threat_level_seconds",
+                                             "Time from the start of a streamed response to its threat level")
+ANOMALY_SCORES = metrics.histogram("anomaly_score", "Statistical anomaly score of scored batches (0-10)",
+                                   buckets=(1, 2, 3, 4, 5, 6, 7, 8, 9, 10))
+ANOMALY_ESCALATIONS = metrics.counter("anomaly_escalations_total",
+                                      "Batches escalated to the LLM by their anomaly score against the pre-filter's verdict")
+QUEUE_DEPTH = metrics.gauge("analysis_queue_depth", "Analysis jobs waiting for a worker")
+QUEUE_ACTIVE = metrics.gauge("analysis_queue_active", "Analysis jobs being processed")
+RESULT_STORE_ITEMS = metrics.gauge("result_store_items", "Analyses held in the result store",
+                                   mode="max" if isinstance(analysis_results, SQLiteResultStore) else "sum")
+LLM_CACHE_HITS = metrics.counter("llm_cache_hits_total", "LLM cache lookups answered from the cache")
+LLM_CACHE_MISSES = metrics.counter("llm_cache_misses_total", "LLM cache lookups that needed a model call")
+LLM_CLIENT_EVENTS = metrics.counter("llm_client_events_total",
+                                    "Gemini client calls, retries, failures, rate limits and short circuits",
+                                    ("event",))
+metrics.ratio("llm_cache_hit_ratio", "Share of LLM cache lookups answered from the cache",
+              "llm_cache_hits_total", ("llm_cache_hits_total", "llm_cache_misses_total"))
+ARCHIVED_EVENTS = metrics.counter("archived_events_total", "Raw events written to the event archive")
+ARCHIVE_DROPPED_BATCHES = metrics.counter("archive_dropped_batches_total",
+                                          "Batches not archived because the archive writer fell behind")
+ARCHIVE_QUERY_SECONDS = metrics.histogram("archive_query_seconds", "Time spent answering /api/archive queries")
+HOT_STORE_ROWS = metrics.counter("hot_store_rows_total", "Events added to the columnar hot store")
+HOT_QUERY_SECONDS = metrics.histogram("hot_store_query_seconds", "Time spent answering /api/events queries")
+RETRIEVAL_DOCUMENTS = metrics.gauge("retrieval_documents", "Events and analyses in the retrieval index", mode="max")
+RETRIEVAL_SEARCH_SECONDS = metrics.histogram("retrieval_search_seconds",
+                                             "Time spent answering /api/search")
+RESULT_STORE_ITEMS.set_function(lambda: len(analysis_results))
+if event_archive is not None:
+    ARCHIVED_EVENTS.set_function(lambda: event_archive.snapshot()["events"])
+    ARCHIVE_DROPPED_BATCHES.set_function(lambda: event_archive.snapshot()["dropped_batches"])
+if hot_store is not None:
+    HOT_STORE_ROWS.set_function(lambda: hot_store.stats["rows"])
+if retrieval_index is not None:
+    RETRIEVAL_DOCUMENTS.set_function(lambda: retrieval_index.snapshot()["documents"])
+if llm_cache is not None:
+    LLM_CACHE_HITS.set_function(lambda: llm_cache.snapshot()["hits"])
+    LLM_CACHE_MISSES.set_function(lambda: llm_cache.snapshot()["misses"])
+
+# Dashboard paging and live-update polling
+DASHBOARD_PAGE_SIZE = int(os.environ.get("DASHBOARD_PAGE_SIZE", 25))
+DASHBOARD_MAX_PAGE_SIZE = 200
+DASHBOARD_POLL_SECONDS = float(os.environ.get("DASHBOARD_POLL_SECONDS", 10))
+RESULTS_DELTA_MAX_LIMIT = 500
+
+# Server-Sent Events stream of result changes (/api/results/stream)
+RESULT_STREAM_MAX_SECONDS = float(os.environ.get("RESULT_STREAM_MAX_SECONDS", 300))
+RESULT_STREAM_HEARTBEAT = float(os.environ.get("RESULT_STREAM_HEARTBEAT", 15))
+RESULT_STREAM_POLL_INTERVAL = float(os.environ.get("RESULT_STREAM_POLL_INTERVAL", 0.25))
+RESULT_STREAM_RETRY_MS = 3000
+RESULT_STREAM_BATCH = 100
+# Each open stream holds a worker thread under gunicorn's gthread workers; 0 disables the cap
+RESULT_STREAM_MAX_CLIENTS = int(os.environ.get("RESULT_STREAM_MAX_CLIENTS", 4))
+result_stream_slots = threading.BoundedSemaphore(RESULT_STREAM_MAX_CLIENTS) if RESULT_STREAM_MAX_CLIENTS > 0 else None
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+# Wakes result streams when analyses finish in this or (with SQLite) any other worker
+result_broadcaster = ResultBroadcaster(analysis_results, poll_interval=RESULT_STREAM_POLL_INTERVAL)
+THREAT_LEVEL_OPTIONS = ("CRITICAL", "HIGH", "MEDIUM", "LOW", "UNKNOWN")
+STATUS_OPTIONS = ("queued", "processing", "success", "error")
+
+# Streamlit chatbot; analyses are linked there by ID (?analysis_id=), empty disables the links
+STREAMLIT_APP_URL = os.environ.get("STREAMLIT_APP_URL", "https://criblchatbot-ksbwyaufrk8t2lt6dmhdgc.streamlit.app").rstrip("/")
+
+# Enhanced prompt for structured analysis
+ANALYSIS_TEXT_PROMPT_TEMPLATE = """
         As a cybersecurity expert, analyze the following log data and provide a structured summary:
 
         LOG DATA:
@@ -93,113 +279,210 @@ def analyze_logs_with_llm(log_data, analysis_id):
         Focus on security implications, anomalies, and actionable insights.
         """
 
-        # Generate content with safety settings
-        safety_settings = {
-            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
-            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
-        }
+# Prompt for merging per-chunk analyses of a large batch
+REDUCE_TEXT_PROMPT_TEMPLATE = """
+        As a cybersecurity expert, you analyzed a large log batch in several chunks.
+        Consolidate the per-chunk findings below into one assessment of the whole batch:
 
-        response = model.generate_content(
-            prompt,
-            safety_settings=safety_settings
-        )
+        CHUNK ANALYSES:
+        {log_data}
 
-        if response.text:
-            # Parse the structured response
-            analysis_text = response.text
-            
-            # Extract structured data
+        Please provide analysis in this EXACT format:
+
+        THREAT_LEVEL: [LOW/MEDIUM/HIGH/CRITICAL]
+        RISK_SCORE: [1-10]
+        SUMMARY: [2-3 sentence overview of what happened]
+        KEY_FINDINGS: [Bullet points of important observations]
+        IMMEDIATE_ACTIONS: [What should be done right now]
+        RECOMMENDATIONS: [Long-term security improvements]
+
+        Correlate findings across chunks and keep the most severe threat level.
+        """
+
+# Structured-output counterparts; the response schema itself is sent with the request
+ANALYSIS_JSON_PROMPT_TEMPLATE = """
+        As a cybersecurity expert, analyze the following log data and provide a structured summary:
+
+        LOG DATA:
+        {log_data}
+
+        Respond with a single JSON object with these fields:
+
+        threat_level: one of LOW, MEDIUM, HIGH, CRITICAL
+        risk_score: integer from 1 to 10
+        summary: 2-3 sentence overview of what happened
+        key_findings: list of important observations
+        immediate_actions: list of what should be done right now
+        recommendations: list of long-term security improvements
+
+        Focus on security implications, anomalies, and actionable insights.
+        """
+
+REDUCE_JSON_PROMPT_TEMPLATE = """
+        As a cybersecurity expert, you analyzed a large log batch in several chunks.
+        Consolidate the per-chunk findings below into one assessment of the whole batch:
+
+        CHUNK ANALYSES:
+        {log_data}
+
+        Respond with a single JSON object with these fields:
+
+        threat_level: one of LOW, MEDIUM, HIGH, CRITICAL
+        risk_score: integer from 1 to 10
+        summary: 2-3 sentence overview of what happened
+        key_findings: list of important observations
+        immediate_actions: list of what should be done right now
+        recommendations: list of long-term security improvements
+
+        Correlate findings across chunks and keep the most severe threat level.
+        """
+
+PROMPT_TEMPLATES = {
+    "text": (ANALYSIS_TEXT_PROMPT_TEMPLATE, REDUCE_TEXT_PROMPT_TEMPLATE),
+    "json": (ANALYSIS_JSON_PROMPT_TEMPLATE, REDUCE_JSON_PROMPT_TEMPLATE),
+}
+ANALYSIS_PROMPT_TEMPLATE, REDUCE_PROMPT_TEMPLATE = PROMPT_TEMPLATES[LLM_OUTPUT_FORMAT]
+
+def unavailable_llm_analysis():
+    """
+    Result returned when no Gemini client is configured
+    """
+    return {
+        "status": "error",
+        "summary": "LLM analysis unavailable - API key not configured or invalid",
+        "threat_level": "UNKNOWN",
+        "risk_score": "N/A",
+        "key_findings": "LLM service unavailable",
+        "recommendations": "Configure valid GEMINI_API_KEY to enable AI analysis",
+        "error": "Gemini API not available"
+    }
+
+def lookup_cached_analysis(log_data, analysis_id, prompt_template):
+    """
+    Return (cache_key, cached_analysis) for a prompt; both None when caching is off
+    """
+    if llm_cache is None:
+        return None, None
+    cache_key = llm_cache.key_for(log_data, prompt_template, GEMINI_MODEL_NAME)
+    cached = llm_cache.get(cache_key)
+    if cached is not None:
+        logger.info(f"♻️ LLM cache hit for {analysis_id}")
+        cached["cached"] = True
+    return cache_key, cached
+
+def build_llm_analysis(analysis_text, analysis_id, cache_key=None):
+    """
+    Turn raw model output into the structured analysis and cache successful results
+    """
+    if analysis_text:
+        # Extract structured data
+        with LLM_PARSE_SECONDS.time():
             parsed_analysis = parse_llm_response(analysis_text)
-            parsed_analysis["status"] = "success"
-            parsed_analysis["full_response"] = analysis_text
-            
-            logger.info(f"✅ LLM analysis completed for {analysis_id}")
-            return parsed_analysis
-        else:
-            logger.warning(f"⚠️ Empty response from LLM for {analysis_id}")
-            return {
-                "status": "error",
-                "summary": "LLM returned empty response",
-                "threat_level": "UNKNOWN",
-                "risk_score": "N/A",
-                "key_findings": "No analysis available",
-                "recommendations": "Manual review required"
-            }
+        parsed_analysis["status"] = "success"
+        parsed_analysis["full_response"] = analysis_text
+        if "response_format" in parsed_analysis:
+            LLM_RESPONSE_FORMATS.inc(format=parsed_analysis["response_format"])
+        
+        if cache_key is not None:
+            llm_cache.set(cache_key, parsed_analysis)
+        
+        logger.info(f"✅ LLM analysis completed for {analysis_id}")
+        return parsed_analysis
+    
+    logger.warning(f"⚠️ Empty response from LLM for {analysis_id}")
+    return {
+        "status": "error",
+        "summary": "LLM returned empty response",
+        "threat_level": "UNKNOWN",
+        "risk_score": "N/A",
+        "key_findings": "No analysis available",
+        "recommendations": "Manual review required"
+    }
 
+def failed_llm_analysis(error, analysis_id):
+    """
+    Result returned when the model call raised
+    """
+    logger.error(f"❌ LLM analysis failed for {analysis_id}: {str(error)}")
+    return {
+        "status": "error",
+        "summary": f"LLM analysis failed: {str(error)}",
+        "threat_level": "UNKNOWN",
+        "risk_score": "N/A",
+        "key_findings": "Analysis error occurred",
+        "recommendations": "Manual review required",
+        "error": str(error)
+    }
+
+def observe_prompt(prompt):
+    """Record the size of a prompt about to be sent"""
+    PROMPT_BYTES.observe(len(prompt.encode("utf-8")))
+    PROMPT_TOKENS.observe(estimate_tokens(prompt))
+
+def create_stream_parser(analysis_id):
+    """Incremental parser for one streamed response, reporting its threat level as soon as it appears"""
+    def on_threat_level(threat_level, seconds):
+        LLM_TIME_TO_THREAT_LEVEL.observe(seconds)
+        if threat_level.upper() in ("HIGH", "CRITICAL"):
+            logger.warning(f"🚨 {threat_level} threat level for {analysis_id} after {seconds:.2f}s of streaming")
+    return StreamingAnalysisParser(parse_llm_response, LLM_STREAM_UPDATE_INTERVAL, on_threat_level)
+
+def partial_analysis_publisher(analysis_id):
+    """on_partial callback that stores a streaming analysis in the result record"""
+    def publish(partial):
+        analysis_results.update(analysis_id, ai_analysis=partial)
+    return publish
+
+def stream_llm_response(prompt, analysis_id, on_partial):
+    """
+    Stream the model's answer, passing partial analyses to on_partial as it
+    arrives; returns the complete text
+    """
+    parser = create_stream_parser(analysis_id)
+    for fragment in llm_client.generate_stream(prompt, response_schema=LLM_RESPONSE_SCHEMA):
+        partial = parser.feed(fragment)
+        if partial is not None:
+            on_partial(partial)
+    return parser.text
+
+def analyze_logs_with_llm(log_data, analysis_id, prompt_template=ANALYSIS_PROMPT_TEMPLATE, on_partial=None):
+    """
+    Analyze log data using Gemini AI and return a structured summary. With
+    LLM_STREAMING and an on_partial callback the response is streamed and
+    partial analyses are published while it arrives.
+    """
+    if not llm_client:
+        return unavailable_llm_analysis()
+    
+    cache_key, cached = lookup_cached_analysis(log_data, analysis_id, prompt_template)
+    if cached is not None:
+        return cached
+    
+    try:
+        prompt = prompt_template.format(log_data=log_data)
+        observe_prompt(prompt)
+        
+        # Generate content (safety settings, retries and rate limits live in the client)
+        started = time.perf_counter()
+        try:
+            if LLM_STREAMING and on_partial is not None:
+                analysis_text = stream_llm_response(prompt, analysis_id, on_partial)
+            else:
+                analysis_text = llm_client.generate(prompt, response_schema=LLM_RESPONSE_SCHEMA)
+        except Exception:
+            LLM_LATENCY_SECONDS.observe(time.perf_counter() - started, outcome="error")
+            raise
+        LLM_LATENCY_SECONDS.observe(time.perf_counter() - started, outcome="success")
+        return build_llm_analysis(analysis_text, analysis_id, cache_key)
     except Exception as e:
-        logger.error(f"❌ LLM analysis failed for {analysis_id}: {str(e)}")
-        return {
-            "status": "error",
-            "summary": f"LLM analysis failed: {str(e)}",
-            "threat_level": "UNKNOWN",
-            "risk_score": "N/A",
-            "key_findings": "Analysis error occurred",
-            "recommendations": "Manual review required",
-            "error": str(e)
-        }
+        return failed_llm_analysis(e, analysis_id)
 
 def parse_llm_response(response_text):
     """
-    Parse the structured LLM response into components
+    Parse the structured LLM response (JSON or section text, see llm_response) into components
     """
     try:
-        lines = response_text.split('\n')
-        parsed = {
-            "threat_level": "UNKNOWN",
-            "risk_score": "N/A",
-            "summary": "Analysis in progress...",
-            "key_findings": "Processing...",
-            "immediate_actions": "Under review...",
-            "recommendations": "Pending analysis..."
-        }
-
-        current_section = None
-        content_buffer = []
-
-        for line in lines:
-            line = line.strip()
-            if not line:
-                continue
-
-            # Check for section headers
-            if line.startswith("THREAT_LEVEL:"):
-                parsed["threat_level"] = line.split(":", 1)[1].strip()
-            elif line.startswith("RISK_SCORE:"):
-                parsed["risk_score"] = line.split(":", 1)[1].strip()
-            elif line.startswith("SUMMARY:"):
-                parsed["summary"] = line.split(":", 1)[1].strip()
-            elif line.startswith("KEY_FINDINGS:"):
-                current_section = "key_findings"
-                content_buffer = []
-                remaining = line.split(":", 1)[1].strip()
-                if remaining:
-                    content_buffer.append(remaining)
-            elif line.startswith("IMMEDIATE_ACTIONS:"):
-                if current_section == "key_findings" and content_buffer:
-                    parsed["key_findings"] = '\n'.join(content_buffer)
-                current_section = "immediate_actions"
-                content_buffer = []
-                remaining = line.split(":", 1)[1].strip()
-                if remaining:
-                    content_buffer.append(remaining)
-            elif line.startswith("RECOMMENDATIONS:"):
-                if current_section == "immediate_actions" and content_buffer:
-                    parsed["immediate_actions"] = '\n'.join(content_buffer)
-                current_section = "recommendations"
-                content_buffer = []
-                remaining = line.split(":", 1)[1].strip()
-                if remaining:
-                    content_buffer.append(remaining)
-            elif current_section and line:
-                content_buffer.append(line)
-
-        # Handle the last section
-        if current_section == "recommendations" and content_buffer:
-            parsed["recommendations"] = '\n'.join(content_buffer)
-
-        return parsed
+        return parse_analysis(response_text, LLM_OUTPUT_FORMAT)
 
     except Exception as e:
         logger.error(f"Error parsing LLM response: {str(e)}")
@@ -213,8 +496,383 @@ def parse_llm_response(response_text):
             "parse_error": str(e)
         }
 
+def local_prefilter_analysis(verdict):
+    """
+    Structured LOW result for a batch the pre-filter decided not to escalate
+    """
+    matched = verdict["matched_rules"]
+    findings = '\n'.join(f"- {name}: {count} event(s)" for name, count in matched.items())
+    return {
+        "status": "success",
+        "threat_level": "LOW",
+        "risk_score": "1",
+        "summary": (f"Local pre-filter scored this batch of {verdict['events']} events at "
+                    f"{verdict['score']:g} (escalation threshold {verdict['threshold']:g}); "
+                    f"no AI analysis was needed."),
+        "key_findings": findings or "No suspicious indicators matched",
+        "immediate_actions": "None required",
+        "recommendations": "Review pre-filter rules periodically to keep escalation thresholds current",
+        "full_response": "",
+        "prefilter": verdict
+    }
+
+def build_prompt_chunks(events, note=None):
+    """
+    Encode events for the prompt and pack them into token-budgeted chunks
+    """
+    header, rows = encode_events(events, PROMPT_FORMAT, PROMPT_DROP_FIELDS)
+    if note:
+        header = f"{note}\n{header}" if header else note
+    budget = max(1, LLM_CHUNK_MAX_TOKENS - estimate_tokens(header))
+    chunks = chunk_entries(rows, budget)
+    if header:
+        chunks = [f"{header}\n{chunk}" for chunk in chunks]
+    return chunks
+
+def analyze_prompt_chunks(chunks, analysis_id, on_partial=None):
+    """
+    Analyze prompt chunks concurrently and reduce them into one result.
+    Partial results are only published for single-chunk batches.
+    """
+    if len(chunks) <= 1:
+        return analyze_logs_with_llm(chunks[0] if chunks else '', analysis_id, on_partial=on_partial)
+    
+    logger.info(f"✂️ Split {analysis_id} into {len(chunks)} chunks "
+                f"(~{sum(estimate_tokens(c) for c in chunks)} tokens)")
+    futures = [
+        chunk_executor.submit(analyze_logs_with_llm, chunk, f"{analysis_id}#{i + 1}")
+        for i, chunk in enumerate(chunks)
+    ]
+    chunk_analyses = [future.result() for future in futures]
+    merged = merge_analyses(chunk_analyses)
+    
+    if LLM_REDUCE_STRATEGY == "llm" and merged["status"] == "success":
+        reduced = analyze_logs_with_llm(format_chunk_findings(chunk_analyses),
+                                        f"{analysis_id}#reduce",
+                                        prompt_template=REDUCE_PROMPT_TEMPLATE)
+        if reduced["status"] == "success":
+            reduced["chunks"] = merged["chunks"]
+            return reduced
+        logger.warning(f"⚠️ LLM reduce failed for {analysis_id}, using merged chunk results")
+    
+    return merged
+
+def condense_log_batch(events, analysis_id):
+    """
+    Collapse repeated events when aggregation is enabled; returns the events
+    to prompt with and the note explaining the aggregated records (or None)
+    """
+    if not AGGREGATE_EVENTS:
+        return events, None
+    aggregated = aggregate_events(events, AGGREGATE_KEY_FIELDS, max_samples=AGGREGATE_MAX_SAMPLES)
+    if len(aggregated) < len(events):
+        logger.info(f"🧮 Aggregated {len(events)} events into {len(aggregated)} for {analysis_id}")
+        return aggregated, AGGREGATION_NOTE
+    return aggregated, None
+
+def score_anomalies(events):
+    """Statistical anomaly report for a batch, or None when scoring is disabled"""
+    if anomaly_scorer is None:
+        return None
+    report = anomaly_scorer.score(events)
+    ANOMALY_SCORES.observe(report["score"])
+    return report
+
+def prefilter_verdict(events, analysis_id):
+    """
+    Rule pre-filter verdict for a batch (None when the pre-filter is off) and
+    the anomaly report computed for it, if any; a batch the rules would skip
+    is still escalated when its anomaly score reaches ANOMALY_ESCALATE_SCORE
+    """
+    if prefilter is None:
+        return None, None
+    verdict = prefilter.evaluate(events)
+    anomalies = None
+    if not verdict["escalate"]:
+        anomalies = score_anomalies(events)
+        if anomalies is not None:
+            verdict["anomaly_score"] = anomalies["score"]
+            if anomalies["score"] >= ANOMALY_ESCALATE_SCORE:
+                verdict["escalate"] = True
+                ANOMALY_ESCALATIONS.inc()
+                logger.info(f"📊 Anomaly score {anomalies['score']:g} escalates #{analysis_id} past the pre-filter")
+    return verdict, anomalies
+
+def assess_anomalies(events, analysis_id, report=None):
+    """
+    Anomaly report for a batch being analyzed and its prompt evidence note
+    (or None); `report` is one already computed for the batch by the pre-filter
+    """
+    if report is None:
+        report = score_anomalies(events)
+    if report is None:
+        return None, None
+    note = evidence_note(report, ANOMALY_NOTE_MIN_SCORE)
+    if note:
+        logger.info(f"📊 {analysis_id}: anomaly score {report['score']:g}, "
+                    f"{report['anomalous_events']} of {report['events']} events involved")
+    return report, note
+
+def assess_baselines(events, analysis_id):
+    """
+    Score a batch against the entity baselines (and learn from it); returns
+    the most unusual entity reports and the prompt note for them (or None)
+    """
+    if entity_baselines is None:
+        return None, None
+    try:
+        reports = entity_baselines.assess(events)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not score {analysis_id} against the entity baselines: {str(e)}")
+        return None, None
+    note = deviation_note(reports, BASELINE_NOTE_MIN_SCORE)
+    if note:
+        top = reports[0]
+        logger.info(f"📈 {analysis_id}: {top['entity']} deviates from its baseline (score {top['score']:g})")
+    return reports[:BASELINE_REPORT_ENTITIES], note
+
+def analyze_log_batch(events, analysis_id, on_partial=None, anomalies=None):
+    """
+    Analyze a batch of log events: score it statistically (unless `anomalies`
+    already holds its report) and against entity baselines, collapse repeats,
+    split the condensed view into token-budgeted chunks, analyze them and
+    reduce into one result
+    """
+    events_received = len(events)
+    anomalies, anomaly_note = assess_anomalies(events, analysis_id, anomalies)
+    deviations, baseline_note = assess_baselines(events, analysis_id)
+    events, note = condense_log_batch(events, analysis_id)
+    note = "\n".join(part for part in (anomaly_note, baseline_note, note) if part) or None
+    
+    analysis = analyze_prompt_chunks(build_prompt_chunks(events, note), analysis_id, on_partial)
+    analysis["events_received"] = events_received
+    analysis["events_analyzed"] = len(events)
+    if anomalies is not None:
+        analysis["anomaly_evidence"] = anomalies
+    if deviations is not None:
+        analysis["baseline_deviations"] = deviations
+    return analysis
+
+def job_result_fields(ai_analysis):
+    """Result-store fields recording a finished analysis"""
+    update = {
+        "ai_analysis": ai_analysis,
+        "status": "success" if ai_analysis["status"] == "success" else "error"
+    }
+    if ai_analysis["status"] == "error":
+        update["error"] = ai_analysis.get("error", "AI analysis failed")
+    return update
+
+def run_analysis_job(analysis_id, job):
+    """
+    Worker-side job: run the LLM analysis for a queued batch and store the outcome;
+    `job` holds the batch's "events" and, when the pre-filter scored it, its "anomalies" report
+    """
+    try:
+        if analysis_results.update(analysis_id, status="processing") is None:
+            logger.warning(f"⚠️ Result record for {analysis_id} was evicted before processing")
+            return
+
+        logger.info(f"🤖 Starting AI analysis for {analysis_id}")
+        try:
+            ai_analysis = analyze_log_batch(job["events"], analysis_id, partial_analysis_publisher(analysis_id),
+                                            job.get("anomalies"))
+        except Exception as e:
+            # Never leave the record in "processing"
+            ai_analysis = failed_llm_analysis(e, analysis_id)
+        analysis_results.update(analysis_id, **job_result_fields(ai_analysis))
+        ANALYSES.inc(outcome=ai_analysis["status"])
+
+        logger.info(f"✅ Analysis #{analysis_id} completed")
+    finally:
+        job_journal.finish(analysis_id)
+
+def recover_pending_jobs(queue):
+    """
+    Queue again the journaled jobs of stopped workers (as far as `queue` has
+    room) and fail the records of jobs that will not be retried; runs at
+    most every JOB_RECOVERY_INTERVAL seconds
+    """
+    now = time.monotonic()
+    with job_recovery_lock:
+        if now < job_recovery["next"]:
+            return
+        job_recovery["next"] = now + JOB_RECOVERY_INTERVAL
+    try:
+        jobs, abandoned = job_journal.recover(queue.max_depth - queue.depth() - queue.reserved())
+    except Exception as e:
+        logger.warning(f"⚠️ Could not recover journaled analysis jobs: {str(e)}")
+        return
+    for analysis_id in abandoned:
+        if analysis_results.update(analysis_id, status="error", ai_analysis=None,
+                                   error="The worker stopped before this batch was analyzed") is not None:
+            ANALYSES.inc(outcome="error")
+        logger.warning(f"⚠️ Gave up on analysis #{analysis_id} of a stopped worker")
+    for analysis_id, job in jobs:
+        if analysis_results.update(analysis_id, status="queued") is None:
+            job_journal.finish(analysis_id)
+            continue
+        try:
+            queue.submit(analysis_id, job)
+        except QueueFullError:
+            job_journal.release(analysis_id)
+            continue
+        logger.info(f"♻️ Queued analysis #{analysis_id} again after its worker stopped")
+
+analysis_queue = AnalysisQueue(run_analysis_job,
+                               workers=ANALYSIS_WORKERS,
+                               max_depth=ANALYSIS_QUEUE_MAX)
+
+def make_flush_handler(queue):
+    """
+    Coalescer flush handler that hands a coalesced batch to `queue` once its
+    window closes, into the slot reserved when the window opened
+    """
+    def flush_coalesced_batch(analysis_id, events, requests_merged):
+        try:
+            result = analysis_results.get(analysis_id)
+            if result is not None:
+                debug_info = dict(result.get("debug_info") or {})
+                debug_info["events"] = len(events)
+                debug_info["coalesced_requests"] = requests_merged
+                analysis_results.update(analysis_id,
+                                        log_preview=build_log_preview(events),
+                                        debug_info=debug_info)
+            # The merged batch is scored afresh; its statistics differ from each request's
+            job = {"events": events}
+            job_journal.save(analysis_id, job)
+            queue.submit(analysis_id, job, reserved=True)
+        except Exception as e:
+            # Give the window's slot back rather than shrinking the queue for good
+            queue.release()
+            fail_unqueued_job(analysis_id, e)
+            raise
+        logger.info(f"📥 Queued coalesced analysis #{analysis_id} "
+                    f"({len(events)} events from {requests_merged} requests)")
+    return flush_coalesced_batch
+
+def fail_unqueued_job(analysis_id, error):
+    """Best effort: record a job that could not be queued as failed and drop it from the journal"""
+    try:
+        analysis_results.update(analysis_id, status="error", error=f"Could not queue the analysis: {str(error)}")
+        job_journal.finish(analysis_id)
+    except Exception as e:
+        logger.warning(f"⚠️ Could not record the failure of #{analysis_id}: {str(e)}")
+
+def create_batch_coalescer(queue):
+    """BatchCoalescer feeding `queue`, or None when coalescing is disabled"""
+    if COALESCE_WINDOW_SECONDS <= 0:
+        return None
+    return BatchCoalescer(make_flush_handler(queue),
+                          window_seconds=COALESCE_WINDOW_SECONDS,
+                          max_events=COALESCE_MAX_EVENTS)
+
+batch_coalescer = create_batch_coalescer(analysis_queue)
+
+def instrument_runtime(queue, client):
+    """Point the queue and LLM client metrics at the serving mode's instances"""
+    QUEUE_DEPTH.set_function(queue.depth)
+    QUEUE_ACTIVE.set_function(queue.active)
+    if client is not None:
+        LLM_CLIENT_EVENTS.set_function(
+            lambda: {(event,): value for event, value in client.snapshot().items() if event != "circuit"})
+
+instrument_runtime(analysis_queue, llm_client)
+
+# Result card, shared by the dashboard page and the delta API's pre-rendered fragments
+RESULT_CARD_TEMPLATE = """
+{% macro result_card(result_id, result) %}
+<div class="result-card" id="card-{{ result_id }}">
+    <h3>Analysis {{ result_id }} - {{ result.timestamp }}</h3>
+
+    <div class="status {{ result.status }}">
+        <strong>Status:</strong>
+        {% if result.status == 'success' %}
+            ✅ Analysis Complete with AI Insights
+        {% elif result.status == 'processing' %}
+            ⏳ Processing with AI...
+        {% elif result.status == 'queued' %}
+            🕒 Queued for AI analysis...
+        {% else %}
+            ❌ Error occurred
+        {% endif %}
+    </div>
+
+    {% if result.ai_analysis %}
+    <div class="ai-analysis">
+        <div class="ai-header">
+            AI Security Analysis
+            <span class="threat-level {{ result.ai_analysis.threat_level }}">{{ result.ai_analysis.threat_level }}</span>
+            {% if result.ai_analysis.risk_score != 'N/A' %}
+            <span class="risk-score">{{ result.ai_analysis.risk_score }}</span>
+            {% endif %}
+        </div>
+
+        <div class="analysis-section">
+            <h4>📋 Summary</h4>
+            <div class="analysis-content">{{ result.ai_analysis.summary }}</div>
+        </div>
+
+        <div class="analysis-section">
+            <h4>🔍 Key Findings</h4>
+            <div class="analysis-content">{{ result.ai_analysis.key_findings }}</div>
+        </div>
+
+        <div class="analysis-section">
+            <h4>⚡ Immediate Actions</h4>
+            <div class="analysis-content">{{ result.ai_analysis.immediate_actions }}</div>
+        </div>
+
+        <div class="analysis-section">
+            <h4>🛡️ Recommendations</h4>
+            <div class="analysis-content">{{ result.ai_analysis.recommendations }}</div>
+        </div>
+
+        {% set anomalies = result.ai_analysis.anomaly_evidence %}
+        {% if anomalies and anomalies.score >= anomaly_note_min_score %}
+        <div class="analysis-section">
+            <h4>📊 Anomaly Evidence ({{ anomalies.score }}/10, {{ anomalies.anomalous_events }} of {{ anomalies.events }} events)</h4>
+            <div class="analysis-content">{% for finding in anomalies.numeric %}{{ finding.field }}: {{ finding.outliers }} outlier(s) up to z={{ finding.max_z }} (median {{ finding.median }})
+{% endfor %}{% for finding in anomalies.rare %}rare {{ finding.field }}: {% for item in finding.rare_values %}{{ item.value }} ({{ item.count }}x){% if not loop.last %}, {% endif %}{% endfor %}
+{% endfor %}{% for burst in anomalies.bursts %}burst: {{ burst.events }} events at {{ burst.rate_ratio }}x the batch's average rate
+{% endfor %}</div>
+        </div>
+        {% endif %}
+
+        {% set deviations = (result.ai_analysis.baseline_deviations or [])
+                            | rejectattr("score", "none") | selectattr("score", ">=", baseline_note_min_score) | list %}
+        {% if deviations %}
+        <div class="analysis-section">
+            <h4>📈 Baseline Deviations</h4>
+            <div class="analysis-content">{% for report in deviations %}{{ report.entity }} ({{ report.score }}/10): {{ report.reasons | join("; ") }}
+{% endfor %}</div>
+        </div>
+        {% endif %}
+    </div>
+    {% endif %}
+
+    <details>
+        <summary style="cursor: pointer; color: #0369a1; font-weight: bold;">📄 View Raw Log Data</summary>
+        <div class="log-preview">{{ result.log_preview }}</div>
+        {% if archive_enabled %}
+        <a class="archive-link" href="api/archive?analysis_id={{ result_id | urlencode }}" target="_blank">🗃️ All archived events for this batch</a>
+        {% endif %}
+    </details>
+    {% if streamlit_url %}
+    <a class="archive-link" href="{{ streamlit_url }}/?analysis_id={{ result_id | urlencode }}" target="_blank">💬 Discuss in the chatbot</a>
+    {% endif %}
+
+    {% if result.error %}
+    <div class="status error">
+        <strong>Error:</strong> {{ result.error }}
+    </div>
+    {% endif %}
+</div>
+{% endmacro %}
+"""
+
 # Enhanced HTML template with LLM analysis display
-HTML_TEMPLATE = """
+HTML_TEMPLATE = """{% from "result_card.html" import result_card %}
 <!DOCTYPE html>
 <html>
 <head>
@@ -227,6 +885,7 @@ HTML_TEMPLATE = """
         .status { padding: 10px; border-radius: 5px; margin-bottom: 10px; }
         .status.success { background-color: #f0fdf4; border-left: 4px solid #22c55e; color: #16a34a; }
         .status.processing { background-color: #fef3c7; border-left: 4px solid #f59e0b; color: #92400e; }
+        .status.queued { background-color: #eff6ff; border-left: 4px solid #3b82f6; color: #1e40af; }
         .status.error { background-color: #fef2f2; border-left: 4px solid #ef4444; color: #dc2626; }
         
         .ai-analysis { background: linear-gradient(135deg, #f0f9ff, #e0f2fe); border: 2px solid #0ea5e9; border-radius: 12px; padding: 20px; margin: 15px 0; }
@@ -245,6 +904,7 @@ HTML_TEMPLATE = """
         .analysis-section h4 { color: #0369a1; margin: 8px 0 4px 0; }
         .analysis-content { background: white; padding: 10px; border-radius: 6px; border-left: 3px solid #0ea5e9; white-space: pre-wrap; }
         
+        .archive-link { color: #0369a1; font-size: 0.9em; }
         .log-preview { background-color: #f3f4f6; padding: 15px; border-radius: 8px; font-family: monospace; white-space: pre-wrap; max-height: 200px; overflow-y: auto; margin: 10px 0; }
         .refresh-btn { background-color: #14b8a6; color: white; padding: 10px 20px; border: none; border-radius: 8px; cursor: pointer; margin: 10px 0; }
         .refresh-btn:hover { background-color: #0d9488; }
@@ -252,11 +912,12 @@ HTML_TEMPLATE = """
         .api-status { padding: 10px; border-radius: 5px; margin-bottom: 10px; }
         .api-status.available { background-color: #f0fdf4; color: #16a34a; }
         .api-status.unavailable { background-color: #fef2f2; color: #dc2626; }
+        .filters { background: white; border: 1px solid #a7f3d0; border-radius: 10px; padding: 15px; margin-bottom: 20px; display: flex; flex-wrap: wrap; gap: 12px; align-items: flex-end; }
+        .filters label { display: flex; flex-direction: column; font-size: 0.85em; color: #0f766e; }
+        .filters select, .filters input { margin-top: 4px; padding: 6px; border: 1px solid #99f6e4; border-radius: 6px; }
+        .pagination { display: flex; gap: 12px; align-items: center; margin: 10px 0 20px 0; color: #0f766e; }
+        .pagination a { color: #0d9488; font-weight: bold; text-decoration: none; }
     </style>
-    <script>
-        function refreshPage() { location.reload(); }
-        setTimeout(function() { location.reload(); }, 60000); // Auto-refresh every minute
-    </script>
 </head>
 <body>
     <div class="container">
@@ -274,247 +935,809 @@ HTML_TEMPLATE = """
             {% endif %}
         </div>
         
-        <button class="refresh-btn" onclick="refreshPage()">🔄 Refresh Results</button>
+        <form class="filters" method="get" action="">
+            <label>Threat level
+                <select name="threat_level">
+                    <option value="">Any</option>
+                    {% for level in threat_level_options %}
+                    <option value="{{ level }}" {{ 'selected' if level in filters.threat_levels }}>{{ level }}</option>
+                    {% endfor %}
+                </select>
+            </label>
+            <label>Status
+                <select name="status">
+                    <option value="">Any</option>
+                    {% for status in status_options %}
+                    <option value="{{ status }}" {{ 'selected' if status in filters.statuses }}>{{ status }}</option>
+                    {% endfor %}
+                </select>
+            </label>
+            <label>From <input type="datetime-local" name="start" value="{{ filter_args.start }}"></label>
+            <label>To <input type="datetime-local" name="end" value="{{ filter_args.end }}"></label>
+            <label>Per page <input type="number" name="per_page" min="1" max="{{ max_page_size }}" value="{{ per_page }}"></label>
+            <button class="refresh-btn" type="submit">🔍 Apply</button>
+        </form>
         
-        {% if results %}
-            {% for result_id, result in results.items() %}
-            <div class="result-card">
-                <h3>Analysis {{ result_id }} - {{ result.timestamp }}</h3>
-                
-                <div class="status {{ result.status }}">
-                    <strong>Status:</strong>
-                    {% if result.status == 'success' %}
-                        ✅ Analysis Complete with AI Insights
-                    {% elif result.status == 'processing' %}
-                        ⏳ Processing with AI...
-                    {% else %}
-                        ❌ Error occurred
-                    {% endif %}
-                </div>
-                
-                {% if result.ai_analysis %}
-                <div class="ai-analysis">
-                    <div class="ai-header">
-                        AI Security Analysis
-                        <span class="threat-level {{ result.ai_analysis.threat_level }}">{{ result.ai_analysis.threat_level }}</span>
-                        {% if result.ai_analysis.risk_score != 'N/A' %}
-                        <span class="risk-score">{{ result.ai_analysis.risk_score }}</span>
-                        {% endif %}
-                    </div>
-                    
-                    <div class="analysis-section">
-                        <h4>📋 Summary</h4>
-                        <div class="analysis-content">{{ result.ai_analysis.summary }}</div>
-                    </div>
-                    
-                    <div class="analysis-section">
-                        <h4>🔍 Key Findings</h4>
-                        <div class="analysis-content">{{ result.ai_analysis.key_findings }}</div>
-                    </div>
-                    
-                    <div class="analysis-section">
-                        <h4>⚡ Immediate Actions</h4>
-                        <div class="analysis-content">{{ result.ai_analysis.immediate_actions }}</div>
-                    </div>
-                    
-                    <div class="analysis-section">
-                        <h4>🛡️ Recommendations</h4>
-                        <div class="analysis-content">{{ result.ai_analysis.recommendations }}</div>
-                    </div>
-                </div>
-                {% endif %}
-                
-                <details>
-                    <summary style="cursor: pointer; color: #0369a1; font-weight: bold;">📄 View Raw Log Data</summary>
-                    <div class="log-preview">{{ result.log_preview }}</div>
-                </details>
-                
-                {% if result.error %}
-                <div class="status error">
-                    <strong>Error:</strong> {{ result.error }}
-                </div>
-                {% endif %}
-            </div>
-            {% endfor %}
+        <div class="pagination">
+            <span>{{ total }} result{{ '' if total == 1 else 's' }} · page {{ page }} of {{ pages }}</span>
+            {% if prev_url %}<a href="{{ prev_url }}">← Newer</a>{% endif %}
+            {% if next_url %}<a href="{{ next_url }}">Older →</a>{% endif %}
+        </div>
+        
+        <div id="results">
+        {% for result_id, result in results %}
+            {{ result_card(result_id, result) }}
         {% else %}
-            <div class="result-card">
+            <div class="result-card" id="empty-state">
                 <h3>No Analysis Results Yet</h3>
                 <p>Waiting for log analysis requests from Cribl Stream...</p>
                 <p><strong>Webhook URL:</strong> <code>{{ webhook_url }}/log-to-chatbot</code></p>
             </div>
-        {% endif %}
+        {% endfor %}
+        </div>
     </div>
+    <script>
+        // Patch new and changed cards in place as results are pushed over SSE,
+        // falling back to polling the delta API where EventSource is unavailable
+        var cursor = {{ cursor }};
+        var firstPage = {{ 'true' if page == 1 else 'false' }};
+        var perPage = {{ per_page }};
+        var deltaUrl = {{ delta_url|tojson }};
+        var streamUrl = {{ stream_url|tojson }};
+        function applyResult(item) {
+            var container = document.getElementById('results');
+            var existing = document.getElementById('card-' + item.analysis_id);
+            var wrapper = document.createElement('div');
+            wrapper.innerHTML = item.html.trim();
+            var card = wrapper.firstChild;
+            if (existing) {
+                existing.replaceWith(card);
+            } else if (firstPage) {
+                var empty = document.getElementById('empty-state');
+                if (empty) { empty.remove(); }
+                container.insertBefore(card, container.firstChild);
+                while (container.children.length > perPage) { container.removeChild(container.lastChild); }
+            }
+        }
+        function poll() {
+            fetch(deltaUrl + '&since=' + cursor)
+                .then(function(response) { return response.json(); })
+                .then(function(delta) {
+                    delta.results.forEach(applyResult);
+                    cursor = delta.cursor;
+                    if (delta.has_more) { poll(); }
+                })
+                .catch(function() {});
+        }
+        if (window.EventSource) {
+            var source = new EventSource(streamUrl + '&since=' + cursor);
+            source.addEventListener('result', function(event) { applyResult(JSON.parse(event.data)); });
+            source.onerror = function() {
+                // A refused stream (503 when the worker is at its stream limit) is not retried
+                if (source.readyState === EventSource.CLOSED) { setInterval(poll, {{ poll_seconds * 1000 }}); }
+            };
+        } else {
+            setInterval(poll, {{ poll_seconds * 1000 }});
+        }
+    </script>
 </body>
 </html>
 """
 
-@app.route("/", methods=["GET"])
-def home():
+# Templates are compiled once at import; render_template_string re-parses its source on every call
+dashboard_env = jinja2.Environment(
+    loader=jinja2.DictLoader({"result_card.html": RESULT_CARD_TEMPLATE, "dashboard.html": HTML_TEMPLATE}),
+    autoescape=True
+)
+dashboard_env.globals["archive_enabled"] = event_archive is not None
+dashboard_env.globals["streamlit_url"] = STREAMLIT_APP_URL
+dashboard_env.globals["baseline_note_min_score"] = BASELINE_NOTE_MIN_SCORE
+dashboard_env.globals["anomaly_note_min_score"] = ANOMALY_NOTE_MIN_SCORE
+DASHBOARD_TEMPLATE = dashboard_env.get_template("dashboard.html")
+render_result_card = dashboard_env.get_template("result_card.html").module.result_card
+
+# Sample batch analyzed by /test-ai
+TEST_LOGS = """
+    {
+        "timestamp": "2024-01-15T02:30:00Z",
+        "user": "john.doe",
+        "action": "file_access",
+        "file_path": "/sensitive/financial_data.xlsx",
+        "source_ip": "192.168.1.100",
+        "department": "IT",
+        "access_time": "02:30:00",
+        "status": "success",
+        "unusual_activity": "accessing sensitive files outside business hours",
+        "failed_attempts": 3,
+        "escalated_privileges": true
+    }
+    """
+
+# Route logic shared by the Flask app and the ASGI app in log_api_asgi.py.
+# Helpers return plain payloads (or (payload, status, headers)) so each
+# framework only has to read the request and serialize the response.
+
+def home_message():
     status = "✅ AI-Powered Cribl Log Relay API is running"
     if gemini_available:
         status += " with Gemini AI"
     else:
         status += " (Gemini AI unavailable)"
-    return status, 200
+    return status
 
-@app.route("/health", methods=["GET"])
-def health_check():
-    """Health check endpoint with API status"""
-    return jsonify({
+def health_payload(queue, coalescer, client, workers=ANALYSIS_WORKERS):
+    """Health check body for a given queue, coalescer and LLM client"""
+    return {
         "status": "healthy",
         "gemini_ai": "available" if gemini_available else "unavailable",
+        "analysis_queue": {
+            "depth": queue.depth(),
+            "active": queue.active(),
+            "reserved": queue.reserved(),
+            "workers": workers,
+            "max_depth": queue.max_depth,
+            "coalescing_groups": coalescer.pending()[0] if coalescer is not None else 0
+        },
+        "result_store": {
+            "backend": type(analysis_results).__name__,
+            "size": len(analysis_results)
+        },
+        "llm_client": client.snapshot() if client is not None else "unavailable",
+        "llm_cache": llm_cache.snapshot() if llm_cache is not None else "disabled",
+        "event_archive": event_archive.snapshot() if event_archive is not None else "disabled",
+        "hot_store": hot_store.snapshot() if hot_store is not None else "disabled",
+        "retrieval_index": retrieval_index.snapshot() if retrieval_index is not None else "disabled",
+        "entity_baselines": entity_baselines.snapshot() if entity_baselines is not None else "disabled",
         "timestamp": datetime.now().isoformat()
-    })
+    }
 
-@app.route("/dashboard", methods=["GET"])
-def dashboard():
-    """Dashboard to view analysis results with AI insights"""
-    webhook_url = request.url_root.rstrip('/')
-    return render_template_string(HTML_TEMPLATE,
-                                results=analysis_results,
-                                webhook_url=webhook_url,
-                                streamlit_url=STREAMLIT_APP_URL,
-                                gemini_available=gemini_available)
+def parse_time_arg(value):
+    """Epoch seconds from an epoch number or an ISO-8601 / datetime-local string (server local time)"""
+    try:
+        return float(value)
+    except ValueError:
+        return datetime.fromisoformat(value).timestamp()
 
-@app.route("/log-to-chatbot", methods=["GET", "POST", "PUT"])
-def receive_log():
-    """Enhanced webhook endpoint with AI analysis"""
+def _arg_values(args, name):
+    """All values of a repeatable, comma-separated query argument"""
+    return [value.strip() for raw in args.getlist(name) for value in raw.split(",") if value.strip()]
+
+def parse_result_filters(args, strict=False):
+    """
+    Result-store filters from query arguments (threat_level, status, start, end).
+    Unparsable times raise ValueError when strict, otherwise they are ignored.
+    """
+    filters = {
+        "threat_levels": [level.upper() for level in _arg_values(args, "threat_level")] or None,
+        "statuses": [status.lower() for status in _arg_values(args, "status")] or None,
+        "start": None,
+        "end": None
+    }
+    for name in ("start", "end"):
+        value = args.get(name, "").strip()
+        if not value:
+            continue
+        try:
+            filters[name] = parse_time_arg(value)
+        except ValueError:
+            if strict:
+                raise ValueError(f"Invalid '{name}' time: {value}")
+    return filters
+
+def _int_arg(args, name, default, low, high):
+    try:
+        value = int(args.get(name, default))
+    except (TypeError, ValueError):
+        value = default
+    return max(low, min(high, value))
+
+def dashboard_context(url_root, args):
+    """Template variables for one filtered page of the dashboard"""
+    filters = parse_result_filters(args)
+    page = _int_arg(args, "page", 1, 1, 1000000)
+    per_page = _int_arg(args, "per_page", DASHBOARD_PAGE_SIZE, 1, DASHBOARD_MAX_PAGE_SIZE)
     
-    logger.info(f"📥 Received {request.method} request to /log-to-chatbot")
+    # Read the cursor first so changes racing with the page query are picked up by the next poll
+    cursor = analysis_results.revision()
+    total, results = analysis_results.query(offset=(page - 1) * per_page, limit=per_page, **filters)
+    pages = max(1, math.ceil(total / per_page))
     
-    if request.method == "GET":
-        return jsonify({
-            "message": "AI-Powered Webhook endpoint is active",
-            "expected_method": "POST or PUT",
-            "ai_analysis": "Available" if gemini_available else "Unavailable (check API key)",
-            "dashboard_url": f"{request.url_root}dashboard"
-        })
+    filter_args = {name: args.get(name, "") for name in ("threat_level", "status", "start", "end")}
+    link_args = {name: value for name, value in filter_args.items() if value}
+    page_url = lambda number: "?" + urllib.parse.urlencode(dict(link_args, per_page=per_page, page=number))
     
-    # Process the log data
+    return {
+        "results": results,
+        "total": total,
+        "page": page,
+        "pages": pages,
+        "per_page": per_page,
+        "max_page_size": DASHBOARD_MAX_PAGE_SIZE,
+        "prev_url": page_url(page - 1) if page > 1 else None,
+        "next_url": page_url(page + 1) if page < pages else None,
+        "filters": {key: value or [] for key, value in filters.items()},
+        "filter_args": filter_args,
+        "threat_level_options": THREAT_LEVEL_OPTIONS,
+        "status_options": STATUS_OPTIONS,
+        "cursor": cursor,
+        "delta_url": f"{url_root}api/results?" + urllib.parse.urlencode(dict(link_args, html=1)),
+        "stream_url": f"{url_root}api/results/stream?" + urllib.parse.urlencode(dict(link_args, html=1)),
+        "poll_seconds": DASHBOARD_POLL_SECONDS,
+        "webhook_url": url_root.rstrip('/'),
+        "gemini_available": gemini_available
+    }
+
+def render_dashboard(url_root, args):
+    """Dashboard page HTML"""
+    return DASHBOARD_TEMPLATE.render(**dashboard_context(url_root, args))
+
+def results_delta_payload(args):
+    """
+    Results added or changed since the `since` cursor, with the same filters
+    as the dashboard; `html=1` adds each result's pre-rendered dashboard card
+    """
     try:
-        raw_data = request.get_data()
-        
-        if request.headers.get('Content-Encoding') == 'gzip':
-            logger.info("🗜️ Decompressing GZIP data...")
-            decompressed_data = gzip.decompress(raw_data)
-            data_text = decompressed_data.decode('utf-8')
-        else:
-            data_text = raw_data.decode('utf-8')
-        
-        # Parse data based on content type
-        if request.content_type and 'application/json' in request.content_type:
-            try:
-                data = json.loads(data_text)
-                if isinstance(data, list):
-                    logs = '\n'.join([json.dumps(entry, indent=2) if isinstance(entry, dict) else str(entry) for entry in data])
-                elif isinstance(data, dict):
-                    logs = json.dumps(data, indent=2)
-                else:
-                    logs = str(data)
-            except json.JSONDecodeError:
-                logs = data_text
-        else:
-            logs = data_text
-            
-        if not logs or logs.strip() == "":
-            return jsonify({"status": "error", "message": "No log data received"}), 400
-            
-    except Exception as e:
-        logger.error(f"❌ Error parsing request data: {str(e)}")
-        return jsonify({"status": "error", "message": f"Error parsing request data: {str(e)}"}), 400
+        since = int(args.get("since", 0))
+    except ValueError:
+        raise ValueError(f"Invalid 'since' cursor: {args.get('since')}")
+    limit = _int_arg(args, "limit", 100, 1, RESULTS_DELTA_MAX_LIMIT)
+    with_html = args.get("html", "").lower() in ("1", "true")
+    
+    cursor, changed, has_more = analysis_results.changes(since, limit, **parse_result_filters(args, strict=True))
+    results = [result_item(analysis_id, record, with_html) for analysis_id, record in changed]
+    return {"cursor": cursor, "has_more": has_more, "results": results}
+
+def result_item(analysis_id, record, with_html=False):
+    """One changed result as sent by the delta API and the result stream"""
+    item = {"analysis_id": analysis_id, "result": record}
+    if with_html:
+        item["html"] = str(render_result_card(analysis_id, record))
+    return item
+
+def sse_message(data, event=None, event_id=None):
+    """Format one Server-Sent Events message"""
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+def result_stream_params(args, last_event_id=None):
+    """
+    Starting cursor, filters and html flag of a result stream. The cursor is
+    the Last-Event-ID of a reconnecting client, else `since`, else "now".
+    """
+    since = last_event_id or args.get("since")
+    if since in (None, ""):
+        since = analysis_results.revision()
+    try:
+        since = int(since)
+    except ValueError:
+        raise ValueError(f"Invalid 'since' cursor: {since}")
+    with_html = args.get("html", "").lower() in ("1", "true")
+    return since, parse_result_filters(args, strict=True), with_html
+
+def result_stream_events(since, filters, with_html):
+    """
+    Read the changes after `since` as SSE text, one `result` event per
+    change; the last event carries the new cursor as its id, so a client
+    that reconnects resumes from there. Returns (cursor, text, has_more).
+    """
+    cursor, changed, has_more = analysis_results.changes(since, RESULT_STREAM_BATCH, **filters)
+    messages = [
+        sse_message(result_item(analysis_id, record, with_html), event="result",
+                    event_id=cursor if i == len(changed) - 1 else None)
+        for i, (analysis_id, record) in enumerate(changed)
+    ]
+    return cursor, "".join(messages), has_more
+
+def stream_results(since, filters, with_html):
+    """
+    Body of /api/results/stream: push result changes as they happen, with
+    keep-alive comments, until RESULT_STREAM_MAX_SECONDS (the client reconnects)
+    """
+    yield f"retry: {RESULT_STREAM_RETRY_MS}\n\n"
+    deadline = time.monotonic() + RESULT_STREAM_MAX_SECONDS
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        latest = result_broadcaster.wait(since, min(RESULT_STREAM_HEARTBEAT, remaining))
+        if latest <= since:
+            yield ": keep-alive\n\n"
+            continue
+        has_more = True
+        while has_more:
+            since, text, has_more = result_stream_events(since, filters, with_html)
+            if text:
+                yield text
+
+def result_streams_busy_payload():
+    """503 body for a stream refused because this worker is at RESULT_STREAM_MAX_CLIENTS"""
+    logger.warning(f"⚠️ Refusing result stream: {RESULT_STREAM_MAX_CLIENTS} already open in this worker")
+    return {
+        "status": "error",
+        "message": f"Too many open result streams ({RESULT_STREAM_MAX_CLIENTS} per worker); "
+                   f"poll /api/results or retry later",
+        "retry_after": ANALYSIS_RETRY_AFTER
+    }
+
+def webhook_info_payload(url_root):
+    """Body returned for GET /log-to-chatbot"""
+    return {
+        "message": "AI-Powered Webhook endpoint is active",
+        "expected_method": "POST or PUT",
+        "ai_analysis": "Available" if gemini_available else "Unavailable (check API key)",
+        "dashboard_url": f"{url_root}dashboard"
+    }
+
+def parse_request_events(byte_chunks, content_type):
+    """
+    Decode body byte chunks into a list of log events (parsed JSON values, or one raw text block)
+    and the number of decoded characters read
+    """
+    data_length = 0
+    
+    def counted(chunks):
+        nonlocal data_length
+        for chunk in chunks:
+            data_length += len(chunk)
+            yield chunk
+    
+    text_chunks = counted(iter_body_text(byte_chunks))
     
+    # Parse data based on content type
+    content_type = content_type or ''
+    if 'application/json' not in content_type and 'ndjson' not in content_type:
+        events = [''.join(text_chunks)]
+    else:
+        events = list(iter_json_events(text_chunks))
+    return events, data_length
+
+def read_request_events():
+    """
+    Stream the request body into a list of log events and the number of decoded characters read
+    """
+    gzipped = request.headers.get('Content-Encoding') == 'gzip'
+    if gzipped:
+        logger.info("🗜️ Decompressing GZIP data...")
+    
+    byte_chunks = iter_body_bytes(request.stream, gzipped=gzipped, max_bytes=MAX_DECOMPRESSED_BYTES)
+    return parse_request_events(byte_chunks, request.content_type)
+
+def build_log_preview(events, limit=1000):
+    """First `limit` characters of the encoded events, encoding only as many as needed"""
+    parts = []
+    size = 0
+    for event in events:
+        part = encode_event(event, PROMPT_FORMAT if PROMPT_FORMAT != "table" else "json")
+        parts.append(part)
+        size += len(part) + 1
+        if size >= limit:
+            break
+    return '\n'.join(parts)[:limit]
+
+def accept_log_batch(events, data_length, meta, url_root, queue, coalescer):
+    """
+    Pre-filter, coalesce or queue a parsed webhook batch.
+
+    `meta` carries the request's content_type, method and coalescing
+    group_key. Returns (payload, status, headers) for the response.
+    """
     analysis_id = f"cribl_{str(uuid.uuid4())[:8]}"
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
-    logger.info(f"📥 Processing log analysis request #{analysis_id}")
+    debug_info = {
+        "content_type": meta["content_type"],
+        "data_length": data_length,
+        "events": len(events),
+        "method": meta["method"],
+        "gemini_available": gemini_available
+    }
+    
+    # Benign batches are answered locally without queueing an LLM call
+    verdict, anomalies = prefilter_verdict(events, analysis_id)
+    if verdict is not None and not verdict["escalate"]:
+        ai_analysis = local_prefilter_analysis(verdict)
+        analysis_results.put(analysis_id, {
+            "timestamp": timestamp,
+            "log_preview": build_log_preview(events),
+            "status": "success",
+            "ai_analysis": ai_analysis,
+            "error": None,
+            "debug_info": debug_info
+        })
+        record_events(analysis_id, events)
+        if entity_baselines is not None:
+            # Benign batches are the baseline (learned off the request thread); queued ones are learned when scored
+            entity_baselines.observe_later(events)
+        logger.info(f"🟢 Pre-filter scored #{analysis_id} at {verdict['score']:g}, skipping LLM")
+        ANALYSES.inc(outcome="prefiltered")
+        return {
+            "status": "success",
+            "analysis_id": analysis_id,
+            "message": f"Log analysis #{analysis_id} completed by local pre-filter",
+            "ai_summary": ai_analysis["summary"],
+            "threat_level": ai_analysis["threat_level"],
+            "dashboard_url": f"{url_root}dashboard",
+            "chatbot_url": chatbot_url(analysis_id),
+            "gemini_available": gemini_available,
+            "instructions": "Check the dashboard for detailed AI analysis"
+        }, 200, {}
+    
+    # Coalesce small batches from the same source into one analysis job
+    if coalescer is not None:
+        def open_coalesced(first_events):
+            # The window's job is guaranteed a queue slot, so batches acknowledged
+            # with 202 are never dropped when it flushes
+            queue.reserve()
+            try:
+                analysis_results.put(analysis_id, {
+                    "timestamp": timestamp,
+                    "log_preview": build_log_preview(first_events),
+                    "status": "queued",
+                    "ai_analysis": None,
+                    "error": None,
+                    "debug_info": debug_info
+                })
+                job_journal.save(analysis_id, None)
+            except Exception:
+                queue.release()
+                raise
+            return analysis_id
+        
+        try:
+            target_id = coalescer.add(meta["group_key"], events, open_coalesced)
+        except QueueFullError as e:
+            return queue_full_payload(str(e))
+        record_events(target_id, events)
+        logger.info(f"🧺 Coalesced {len(events)} events into #{target_id}")
+        return accepted_payload(target_id, f"Log batch merged into analysis #{target_id}", url_root, queue)
+    
+    logger.info(f"📥 Queueing log analysis request #{analysis_id}")
     
     # Store initial result
-    analysis_results[analysis_id] = {
+    analysis_results.put(analysis_id, {
         "timestamp": timestamp,
-        "log_preview": logs[:1000],  # Store preview
-        "status": "processing",
+        "log_preview": build_log_preview(events),  # Store preview
+        "status": "queued",
         "ai_analysis": None,
         "error": None,
-        "debug_info": {
-            "content_type": request.content_type,
-            "data_length": len(logs),
-            "method": request.method,
-            "gemini_available": gemini_available
-        }
-    }
+        "debug_info": debug_info
+    })
     
-    # Perform AI analysis
-    logger.info(f"🤖 Starting AI analysis for {analysis_id}")
-    ai_analysis = analyze_logs_with_llm(logs, analysis_id)
+    # Hand the batch to the background workers
+    job = {"events": events, "anomalies": anomalies}
+    job_journal.save(analysis_id, job)
+    try:
+        queue.submit(analysis_id, job)
+    except QueueFullError as e:
+        job_journal.finish(analysis_id)
+        analysis_results.delete(analysis_id)
+        return queue_full_payload(str(e))
     
-    # Update result with AI analysis
-    analysis_results[analysis_id]["ai_analysis"] = ai_analysis
-    analysis_results[analysis_id]["status"] = "success" if ai_analysis["status"] == "success" else "error"
+    record_events(analysis_id, events)
+    return accepted_payload(analysis_id, f"Log analysis #{analysis_id} queued", url_root, queue)
+
+def record_events(analysis_id, events):
+    """
+    Add an accepted batch to the event archive and the hot store
+    (rejected batches are retried by the sender)
+    """
+    if event_archive is not None:
+        event_archive.append(analysis_id, events)
+    if hot_store is not None:
+        try:
+            hot_store.append(analysis_id, events)
+        except Exception as e:
+            logger.warning(f"⚠️ Could not add batch #{analysis_id} to the hot store: {str(e)}")
+    if retrieval_follower is not None:
+        retrieval_follower.start()
+    if retrieval_index is not None and event_archive is None:
+        # Without the shared archive to follow, each worker indexes the batches it accepted
+        ingested_at = time.time()
+        for event in events:
+            retrieval_index.add_event(analysis_id, event, ingested_at)
+
+def accepted_payload(analysis_id, message, url_root, queue):
+    """202 response pointing the caller at the analysis status URL"""
+    return {
+        "status": "accepted",
+        "analysis_id": analysis_id,
+        "message": message,
+        "status_url": f"{url_root}analysis/{analysis_id}",
+        "dashboard_url": f"{url_root}dashboard",
+        "chatbot_url": chatbot_url(analysis_id),
+        "queue_depth": queue.depth(),
+        "gemini_available": gemini_available,
+        "instructions": "Poll the status URL or check the dashboard for detailed AI analysis"
+    }, 202, {}
+
+def chatbot_url(analysis_id):
+    """Streamlit chatbot link showing an analysis by reference, or None without a chatbot"""
+    if not STREAMLIT_APP_URL:
+        return None
+    return f"{STREAMLIT_APP_URL}/?" + urllib.parse.urlencode({"analysis_id": analysis_id})
+
+def queue_full_payload(message):
+    """429 response asking the caller (Cribl) to retry later"""
+    logger.warning(f"⚠️ Rejecting request: {message}")
+    ANALYSES.inc(outcome="rejected")
+    return {
+        "status": "error",
+        "message": message,
+        "retry_after": ANALYSIS_RETRY_AFTER
+    }, 429, {"Retry-After": str(ANALYSIS_RETRY_AFTER)}
+
+def analysis_status_payload(analysis_id, queue):
+    """Progress and results for a single analysis as (payload, status)"""
+    result = analysis_results.get(analysis_id)
+    if result is None:
+        return {"status": "error", "message": f"Analysis {analysis_id} not found"}, 404
     
-    if ai_analysis["status"] == "error":
-        analysis_results[analysis_id]["error"] = ai_analysis.get("error", "AI analysis failed")
+    return {
+        "analysis_id": analysis_id,
+        "status": result["status"],
+        "timestamp": result["timestamp"],
+        "log_preview": result.get("log_preview"),
+        "ai_analysis": result["ai_analysis"],
+        "error": result["error"],
+        "queue_depth": queue.depth()
+    }, 200
+
+def archive_query_payload(args):
+    """
+    Archived raw events matching analysis_id, user, source_ip and a start/end
+    time range, as (payload, status); only index-matched frames are read
+    """
+    if event_archive is None:
+        return {"status": "error", "message": "Event archive is disabled"}, 404
+    filters = {name: args.get(name, "").strip() or None for name in ("analysis_id", "user", "source_ip")}
+    for name in ("start", "end"):
+        value = args.get(name, "").strip()
+        try:
+            filters[name] = parse_time_arg(value) if value else None
+        except ValueError:
+            return {"status": "error", "message": f"Invalid '{name}' time: {value}"}, 400
+    limit = _int_arg(args, "limit", ARCHIVE_QUERY_DEFAULT_LIMIT, 1, ARCHIVE_QUERY_MAX_LIMIT)
     
-    logger.info(f"✅ Analysis #{analysis_id} completed")
+    with ARCHIVE_QUERY_SECONDS.time():
+        found = event_archive.query(limit=limit, **filters)
+    return dict(found, count=len(found["events"])), 200
+
+def hot_events_payload(args):
+    """
+    Recent events from the columnar hot store as (payload, status): filters
+    on any string column (analysis_id, user, source_ip, action, host, status),
+    a start/end time range or `last` seconds, plus optional `group_by`
+    column counts and an `interval`-second histogram
+    """
+    if hot_store is None:
+        return {"status": "error", "message": "Hot store is disabled"}, 404
+    filters = {name: args.get(name, "").strip() or None for name in STRING_COLUMNS}
+    times = {}
+    for name in ("start", "end", "last"):
+        value = args.get(name, "").strip()
+        try:
+            times[name] = (float(value) if name == "last" else parse_time_arg(value)) if value else None
+        except ValueError:
+            return {"status": "error", "message": f"Invalid '{name}' time: {value}"}, 400
+    if times["last"] is not None:
+        times["start"] = time.time() - times["last"]
+    try:
+        interval = float(args["interval"]) if args.get("interval") else None
+    except ValueError:
+        return {"status": "error", "message": f"Invalid 'interval': {args.get('interval')}"}, 400
+    if interval is not None and interval <= 0:
+        return {"status": "error", "message": "'interval' must be positive"}, 400
+    limit = _int_arg(args, "limit", HOT_QUERY_DEFAULT_LIMIT, 0, HOT_QUERY_MAX_LIMIT)
     
-    return jsonify({
-        "status": "success",
-        "analysis_id": analysis_id,
-        "message": f"Log analysis #{analysis_id} completed",
-        "ai_summary": ai_analysis.get("summary", "Analysis completed"),
-        "threat_level": ai_analysis.get("threat_level", "UNKNOWN"),
-        "dashboard_url": f"{request.url_root}dashboard",
-        "gemini_available": gemini_available,
-        "instructions": "Check the dashboard for detailed AI analysis"
-    }), 200
+    try:
+        with HOT_QUERY_SECONDS.time():
+            found = hot_store.query(filters, start=times["start"], end=times["end"], limit=limit,
+                                    group_by=args.get("group_by") or None, interval=interval)
+    except ValueError as e:
+        return {"status": "error", "message": str(e)}, 400
+    return found, 200
 
-# Test endpoint for AI analysis
-@app.route("/test-ai", methods=["POST"])
-def test_ai_analysis():
-    """Test AI analysis with sample data"""
-    test_logs = """
-    {
-        "timestamp": "2024-01-15T02:30:00Z",
-        "user": "john.doe",
-        "action": "file_access",
-        "file_path": "/sensitive/financial_data.xlsx",
-        "source_ip": "192.168.1.100",
-        "department": "IT",
-        "access_time": "02:30:00",
-        "status": "success",
-        "unusual_activity": "accessing sensitive files outside business hours",
-        "failed_attempts": 3,
-        "escalated_privileges": true
-    }
+def search_payload(args):
     """
+    Ingested events and past analyses most relevant to the `q` question as
+    (payload, status), best first; `context` packs the hits into `max_tokens`
+    of prompt text, `kind` limits them to events or analyses
+    """
+    if retrieval_index is None:
+        return {"status": "error", "message": "Retrieval index is disabled"}, 404
+    query = args.get("q", "").strip()
+    if not query:
+        return {"status": "error", "message": "Missing 'q' query"}, 400
+    kinds = set(_arg_values(args, "kind")) or None
+    if kinds is not None and not kinds <= {"event", "analysis"}:
+        return {"status": "error", "message": "'kind' must be 'event' or 'analysis'"}, 400
+    k = _int_arg(args, "k", RETRIEVAL_DEFAULT_K, 1, RETRIEVAL_MAX_K)
+    max_tokens = _int_arg(args, "max_tokens", RETRIEVAL_CONTEXT_TOKENS, 0, 100000)
     
+    # The follower catches up in the background; a fresh worker answers from what it has indexed so far
+    retrieval_follower.start()
+    with RETRIEVAL_SEARCH_SECONDS.time():
+        hits = retrieval_index.search(query, k, kinds)
+    context, used = pack_context(hits, max_tokens)
+    return {
+        "query": query,
+        "hits": hits,
+        "context": context,
+        "context_hits": len(used),
+        "documents": retrieval_index.snapshot()["documents"],
+    }, 200
+
+def start_test_analysis():
+    """Store the initial record for a /test-ai run and return its analysis_id"""
     analysis_id = f"test_ai_{str(uuid.uuid4())[:8]}"
     timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     
     # Store initial result
-    analysis_results[analysis_id] = {
+    analysis_results.put(analysis_id, {
         "timestamp": timestamp,
-        "log_preview": test_logs,
+        "log_preview": TEST_LOGS,
         "status": "processing",
         "ai_analysis": None,
         "error": None,
         "debug_info": {"test": True, "gemini_available": gemini_available}
-    }
-    
-    # Perform AI analysis
+    })
     logger.info(f"🧪 Testing AI analysis for {analysis_id}")
-    ai_analysis = analyze_logs_with_llm(test_logs, analysis_id)
-    
-    # Update with results
-    analysis_results[analysis_id]["ai_analysis"] = ai_analysis
-    analysis_results[analysis_id]["status"] = "success" if ai_analysis["status"] == "success" else "error"
+    return analysis_id
+
+def finish_test_analysis(analysis_id, ai_analysis, url_root):
+    """Record a /test-ai result and build the response body"""
+    analysis_results.update(analysis_id,
+                            ai_analysis=ai_analysis,
+                            status="success" if ai_analysis["status"] == "success" else "error")
     
-    return jsonify({
+    return {
         "status": "success",
         "analysis_id": analysis_id,
         "ai_analysis": ai_analysis,
-        "dashboard_url": f"{request.url_root}dashboard",
+        "dashboard_url": f"{url_root}dashboard",
         "gemini_available": gemini_available
-    })
+    }
+
+def record_request(endpoint, method, status, seconds):
+    """Count a finished HTTP request and observe its latency"""
+    endpoint = endpoint or "unmatched"
+    HTTP_REQUESTS.inc(endpoint=endpoint, method=method, status=status)
+    HTTP_REQUEST_SECONDS.observe(seconds, endpoint=endpoint)
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    recover_pending_jobs(analysis_queue)
+
+@app.after_request
+def count_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        record_request(request.endpoint, request.method, response.status_code, time.perf_counter() - started)
+    return response
+
+@app.route("/", methods=["GET"])
+def home():
+    return home_message(), 200
+
+@app.route("/health", methods=["GET"])
+def health_check():
+    """Health check endpoint with API status"""
+    return jsonify(health_payload(analysis_queue, batch_coalescer, llm_client))
+
+@app.route("/metrics", methods=["GET"])
+def metrics_endpoint():
+    """Prometheus metrics for all workers"""
+    return Response(metrics.render(), content_type=METRICS_CONTENT_TYPE)
+
+@app.route("/dashboard", methods=["GET"])
+def dashboard():
+    """Dashboard to view analysis results with AI insights"""
+    return render_dashboard(request.url_root, request.args)
+
+@app.route("/api/results", methods=["GET"])
+def results_delta():
+    """Results added or changed since a cursor (incremental dashboard updates)"""
+    try:
+        return jsonify(results_delta_payload(request.args))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+@app.route("/api/results/stream", methods=["GET"])
+def results_stream():
+    """Server-Sent Events stream of new and updated results"""
+    try:
+        since, filters, with_html = result_stream_params(request.args, request.headers.get("Last-Event-ID"))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    if result_stream_slots is None:
+        return Response(stream_results(since, filters, with_html), mimetype="text/event-stream", headers=SSE_HEADERS)
+    if not result_stream_slots.acquire(blocking=False):
+        return jsonify(result_streams_busy_payload()), 503, {"Retry-After": str(ANALYSIS_RETRY_AFTER)}
+    try:
+        response = Response(stream_results(since, filters, with_html), mimetype="text/event-stream",
+                            headers=SSE_HEADERS)
+        response.call_on_close(result_stream_slots.release)
+    except Exception:
+        result_stream_slots.release()
+        raise
+    return response
+
+@app.route("/log-to-chatbot", methods=["GET", "POST", "PUT"])
+def receive_log():
+    """Enhanced webhook endpoint with AI analysis"""
+    
+    logger.info(f"📥 Received {request.method} request to /log-to-chatbot")
+    
+    if request.method == "GET":
+        return jsonify(webhook_info_payload(request.url_root))
+    
+    # Process the log data
+    try:
+        with REQUEST_PARSE_SECONDS.time():
+            events, data_length = read_request_events()
+            
+        if not any(str(event).strip() for event in events):
+            return jsonify({"status": "error", "message": "No log data received"}), 400
+            
+    except PayloadTooLargeError as e:
+        logger.warning(f"⚠️ Rejecting oversized request: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 413
+    except Exception as e:
+        logger.error(f"❌ Error parsing request data: {str(e)}")
+        return jsonify({"status": "error", "message": f"Error parsing request data: {str(e)}"}), 400
+    
+    group_key = request.headers.get(COALESCE_GROUP_HEADER) if COALESCE_GROUP_HEADER else None
+    meta = {
+        "content_type": request.content_type,
+        "method": request.method,
+        "group_key": group_key or request.remote_addr
+    }
+    payload, status, headers = accept_log_batch(events, data_length, meta, request.url_root,
+                                                analysis_queue, batch_coalescer)
+    return jsonify(payload), status, headers
+
+@app.route("/api/archive", methods=["GET"])
+def archive_search():
+    """Raw archived events by analysis_id, user, source_ip and time range"""
+    payload, status = archive_query_payload(request.args)
+    return jsonify(payload), status
+
+@app.route("/api/events", methods=["GET"])
+def hot_events():
+    """Recent events by user, source_ip, action, host, status, analysis_id and time, with aggregates"""
+    payload, status = hot_events_payload(request.args)
+    return jsonify(payload), status
+
+@app.route("/api/search", methods=["GET"])
+def search():
+    """Ingested events and analyses relevant to a question, ranked by BM25"""
+    payload, status = search_payload(request.args)
+    return jsonify(payload), status
+
+@app.route("/analysis/<analysis_id>", methods=["GET"])
+def analysis_status(analysis_id):
+    """Report progress and results for a single analysis"""
+    payload, status = analysis_status_payload(analysis_id, analysis_queue)
+    return jsonify(payload), status
+
+# Test endpoint for AI analysis
+@app.route("/test-ai", methods=["POST"])
+def test_ai_analysis():
+    """Test AI analysis with sample data"""
+    analysis_id = start_test_analysis()
+    
+    # Perform AI analysis
+    ai_analysis = analyze_logs_with_llm(TEST_LOGS, analysis_id)
+    
+    return jsonify(finish_test_analysis(analysis_id, ai_analysis, request.url_root))
 
 # Error handlers
 @app.errorhandler(404)
@@ -526,6 +1749,8 @@ def internal_error(error):
     return jsonify({"error": "Internal server error"}), 500
 
 if __name__ == "__main__":
+    clear_metrics_directory()  # drop snapshots of earlier runs; gunicorn does this in gunicorn.conf.py
+    release_pending_jobs()
     port = int(os.environ.get("PORT", 5000))
     debug_mode = os.environ.get("FLASK_DEBUG", "True").lower() == "true"
     app.run(host="0.0.0.0", port=port, debug=debug_mode)
\ No newline at end of file
@@ -0,0 +1,544 @@
+"""
+Async (ASGI) serving mode for the webhook API.
+
+Exposes the same routes and response shapes as log_api.py on Quart, with
+request bodies read from the ASGI receive loop, LLM calls made through
+AsyncGeminiClient and blocking work (result store, cache, parsing,
+pre-filter) pushed to the default thread pool. Analyses run as
+asyncio tasks, so one process can keep hundreds of them in flight while
+they wait on Gemini.
+
+    hypercorn log_api_asgi:app --bind 0.0.0.0:5000
+
+Configuration, storage, the pre-filter, the LLM cache and all payload
+helpers are shared with log_api.py.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import queue
+import threading
+import time
+
+from quart import Quart, Response, g, jsonify, request
+
+import log_api
+from analysis_queue import AsyncAnalysisQueue
+from job_journal import release_pending_jobs
+from llm_client import AsyncGeminiClient
+from log_api import (
+    ANALYSES,
+    ANALYSIS_PROMPT_TEMPLATE,
+    ANALYSIS_QUEUE_MAX,
+    COALESCE_GROUP_HEADER,
+    GEMINI_MODEL_NAME,
+    LLM_CHUNK_CONCURRENCY,
+    LLM_LATENCY_SECONDS,
+    LLM_REDUCE_STRATEGY,
+    LLM_RESPONSE_SCHEMA,
+    LLM_STREAMING,
+    MAX_DECOMPRESSED_BYTES,
+    METRICS_CONTENT_TYPE,
+    REDUCE_PROMPT_TEMPLATE,
+    REQUEST_PARSE_SECONDS,
+    RESULT_STREAM_HEARTBEAT,
+    RESULT_STREAM_MAX_SECONDS,
+    RESULT_STREAM_RETRY_MS,
+    SSE_HEADERS,
+    TEST_LOGS,
+    analysis_results,
+    logger,
+    metrics,
+    result_broadcaster,
+)
+from log_chunking import estimate_tokens, format_chunk_findings, merge_analyses
+from log_ingest import BodyDecoder, PayloadTooLargeError
+from metrics import clear_metrics_directory
+
+app = Quart(__name__)
+# Size limits are enforced by BodyDecoder (MAX_DECOMPRESSED_BYTES), as in the Flask app
+app.config["MAX_CONTENT_LENGTH"] = None
+
+# Number of analyses a single process keeps in flight
+ASYNC_ANALYSIS_CONCURRENCY = int(os.environ.get("ASYNC_ANALYSIS_CONCURRENCY", 100))
+# Decoded body chunks buffered between the ASGI receive loop and the parser thread
+BODY_QUEUE_CHUNKS = 16
+
+
+def to_thread(func, *args, **kwargs):
+    """
+    Run func in the loop's default thread pool with the caller's context;
+    asyncio.to_thread without requiring Python 3.9
+    """
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return asyncio.get_running_loop().run_in_executor(None, call)
+
+
+async_llm_client = None
+if log_api.gemini_available:
+    settings = log_api.llm_client_settings()
+    # One connection per in-flight analysis; quotas are still enforced by the token buckets
+    settings["pool_size"] = max(settings["pool_size"], ASYNC_ANALYSIS_CONCURRENCY)
+    try:
+        async_llm_client = AsyncGeminiClient(
+            log_api.GEMINI_API_KEY.strip(), GEMINI_MODEL_NAME, **settings
+        )
+    except Exception as e:
+        logger.error(f"❌ Failed to initialize async Gemini client: {str(e)}")
+
+
+async def stream_llm_response_async(prompt, analysis_id, on_partial):
+    """Async counterpart of log_api.stream_llm_response"""
+    parser = log_api.create_stream_parser(analysis_id)
+    async for fragment in async_llm_client.generate_stream(
+        prompt, response_schema=LLM_RESPONSE_SCHEMA
+    ):
+        partial = parser.feed(fragment)
+        if partial is not None:
+            await to_thread(on_partial, partial)
+    return parser.text
+
+
+async def analyze_logs_with_llm_async(
+    log_data, analysis_id, prompt_template=ANALYSIS_PROMPT_TEMPLATE, on_partial=None
+):
+    """
+    Async counterpart of log_api.analyze_logs_with_llm
+    """
+    if not async_llm_client:
+        return log_api.unavailable_llm_analysis()
+
+    cache_key, cached = await to_thread(
+        log_api.lookup_cached_analysis, log_data, analysis_id, prompt_template
+    )
+    if cached is not None:
+        return cached
+
+    try:
+        prompt = prompt_template.format(log_data=log_data)
+        log_api.observe_prompt(prompt)
+
+        started = time.perf_counter()
+        try:
+            if LLM_STREAMING and on_partial is not None:
+                analysis_text = await stream_llm_response_async(
+                    prompt, analysis_id, on_partial
+                )
+            else:
+                analysis_text = await async_llm_client.generate(
+                    prompt, response_schema=LLM_RESPONSE_SCHEMA
+                )
+        except Exception:
+            LLM_LATENCY_SECONDS.observe(time.perf_counter() - started, outcome="error")
+            raise
+        LLM_LATENCY_SECONDS.observe(time.perf_counter() - started, outcome="success")
+        return await to_thread(
+            log_api.build_llm_analysis, analysis_text, analysis_id, cache_key
+        )
+    except Exception as e:
+        return log_api.failed_llm_analysis(e, analysis_id)
+
+
+async def analyze_prompt_chunks_async(chunks, analysis_id, on_partial=None):
+    """
+    Analyze prompt chunks concurrently (at most LLM_CHUNK_CONCURRENCY at a time)
+    and reduce them into one result
+    """
+    if len(chunks) <= 1:
+        return await analyze_logs_with_llm_async(
+            chunks[0] if chunks else "", analysis_id, on_partial=on_partial
+        )
+
+    logger.info(
+        f"✂️ Split {analysis_id} into {len(chunks)} chunks "
+        f"(~{sum(estimate_tokens(c) for c in chunks)} tokens)"
+    )
+    semaphore = asyncio.Semaphore(LLM_CHUNK_CONCURRENCY)
+
+    async def analyze_chunk(chunk, chunk_id):
+        async with semaphore:
+            return await analyze_logs_with_llm_async(chunk, chunk_id)
+
+    chunk_analyses = await asyncio.gather(
+        *(
+            analyze_chunk(chunk, f"{analysis_id}#{i + 1}")
+            for i, chunk in enumerate(chunks)
+        )
+    )
+    merged = merge_analyses(chunk_analyses)
+
+    if LLM_REDUCE_STRATEGY == "llm" and merged["status"] == "success":
+        reduced = await analyze_logs_with_llm_async(
+            format_chunk_findings(chunk_analyses),
+            f"{analysis_id}#reduce",
+            prompt_template=REDUCE_PROMPT_TEMPLATE,
+        )
+        if reduced["status"] == "success":
+            reduced["chunks"] = merged["chunks"]
+            return reduced
+        logger.warning(
+            f"⚠️ LLM reduce failed for {analysis_id}, using merged chunk results"
+        )
+
+    return merged
+
+
+async def analyze_log_batch_async(events, analysis_id, on_partial=None, anomalies=None):
+    """
+    Async counterpart of log_api.analyze_log_batch
+    """
+    events_received = len(events)
+    anomalies, anomaly_note = await to_thread(
+        log_api.assess_anomalies, events, analysis_id, anomalies
+    )
+    deviations, baseline_note = await to_thread(
+        log_api.assess_baselines, events, analysis_id
+    )
+    events, note = await to_thread(log_api.condense_log_batch, events, analysis_id)
+    note = (
+        "\n".join(part for part in (anomaly_note, baseline_note, note) if part) or None
+    )
+    chunks = await to_thread(log_api.build_prompt_chunks, events, note)
+
+    analysis = await analyze_prompt_chunks_async(chunks, analysis_id, on_partial)
+    analysis["events_received"] = events_received
+    analysis["events_analyzed"] = len(events)
+    if anomalies is not None:
+        analysis["anomaly_evidence"] = anomalies
+    if deviations is not None:
+        analysis["baseline_deviations"] = deviations
+    return analysis
+
+
+async def run_analysis_job_async(analysis_id, job):
+    """
+    Worker-task job: run the LLM analysis for a queued batch and store the outcome
+    (see log_api.run_analysis_job for `job`)
+    """
+    try:
+        if (
+            await to_thread(analysis_results.update, analysis_id, status="processing")
+            is None
+        ):
+            logger.warning(
+                f"⚠️ Result record for {analysis_id} was evicted before processing"
+            )
+            return
+
+        logger.info(f"🤖 Starting AI analysis for {analysis_id}")
+        try:
+            ai_analysis = await analyze_log_batch_async(
+                job["events"],
+                analysis_id,
+                log_api.partial_analysis_publisher(analysis_id),
+                job.get("anomalies"),
+            )
+        except Exception as e:
+            ai_analysis = log_api.failed_llm_analysis(e, analysis_id)
+        await to_thread(
+            analysis_results.update,
+            analysis_id,
+            **log_api.job_result_fields(ai_analysis),
+        )
+        ANALYSES.inc(outcome=ai_analysis["status"])
+
+        logger.info(f"✅ Analysis #{analysis_id} completed")
+    finally:
+        await to_thread(log_api.job_journal.finish, analysis_id)
+
+
+analysis_queue = AsyncAnalysisQueue(
+    run_analysis_job_async,
+    concurrency=ASYNC_ANALYSIS_CONCURRENCY,
+    max_depth=ANALYSIS_QUEUE_MAX,
+)
+
+batch_coalescer = log_api.create_batch_coalescer(analysis_queue)
+log_api.instrument_runtime(analysis_queue, async_llm_client)
+
+
+@app.before_serving
+async def start_workers():
+    # One hypercorn worker per process tree: its start is the server's start
+    clear_metrics_directory()
+    release_pending_jobs()
+    await analysis_queue.start()
+    if log_api.retrieval_follower is not None:
+        log_api.retrieval_follower.start()
+
+
+@app.after_serving
+async def stop_workers():
+    await analysis_queue.stop()
+    if async_llm_client is not None:
+        await async_llm_client.aclose()
+
+
+@app.before_request
+async def start_request_timer():
+    g.request_started = time.perf_counter()
+    if time.monotonic() >= log_api.job_recovery["next"]:
+        await to_thread(log_api.recover_pending_jobs, analysis_queue)
+
+
+@app.after_request
+async def count_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        log_api.record_request(
+            request.endpoint,
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+        )
+    return response
+
+
+@app.route("/", methods=["GET"])
+async def home():
+    return log_api.home_message(), 200
+
+
+@app.route("/health", methods=["GET"])
+async def health_check():
+    """Health check endpoint with API status"""
+    return jsonify(
+        await to_thread(
+            log_api.health_payload,
+            analysis_queue,
+            batch_coalescer,
+            async_llm_client,
+            ASYNC_ANALYSIS_CONCURRENCY,
+        )
+    )
+
+
+@app.route("/metrics", methods=["GET"])
+async def metrics_endpoint():
+    """Prometheus metrics for all workers"""
+    return Response(await to_thread(metrics.render), content_type=METRICS_CONTENT_TYPE)
+
+
+@app.route("/dashboard", methods=["GET"])
+async def dashboard():
+    """Dashboard to view analysis results with AI insights"""
+    return await to_thread(log_api.render_dashboard, request.url_root, request.args)
+
+
+@app.route("/api/results", methods=["GET"])
+async def results_delta():
+    """Results added or changed since a cursor (incremental dashboard updates)"""
+    try:
+        return jsonify(await to_thread(log_api.results_delta_payload, request.args))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+
+async def stream_results_async(since, filters, with_html):
+    """Async counterpart of log_api.stream_results; waiting streams hold no thread"""
+    yield f"retry: {RESULT_STREAM_RETRY_MS}\n\n"
+    deadline = time.monotonic() + RESULT_STREAM_MAX_SECONDS
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return
+        latest = await result_broadcaster.wait_async(
+            since, min(RESULT_STREAM_HEARTBEAT, remaining)
+        )
+        if latest <= since:
+            yield ": keep-alive\n\n"
+            continue
+        has_more = True
+        while has_more:
+            since, text, has_more = await to_thread(
+                log_api.result_stream_events, since, filters, with_html
+            )
+            if text:
+                yield text
+
+
+@app.route("/api/results/stream", methods=["GET"])
+async def results_stream():
+    """Server-Sent Events stream of new and updated results"""
+    try:
+        since, filters, with_html = await to_thread(
+            log_api.result_stream_params,
+            request.args,
+            request.headers.get("Last-Event-ID"),
+        )
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    response = Response(
+        stream_results_async(since, filters, with_html),
+        mimetype="text/event-stream",
+        headers=SSE_HEADERS,
+    )
+    # Streams end on their own after RESULT_STREAM_MAX_SECONDS
+    response.timeout = None
+    return response
+
+
+async def read_request_events_async():
+    """
+    Read the request body from the ASGI stream, inflating it as it arrives, and
+    parse it into log events in a worker thread that consumes the decoded
+    chunks through a bounded queue, so the body is never held in memory whole
+    """
+    gzipped = request.headers.get("Content-Encoding") == "gzip"
+    if gzipped:
+        logger.info("🗜️ Decompressing GZIP data...")
+
+    decoder = BodyDecoder(gzipped=gzipped, max_bytes=MAX_DECOMPRESSED_BYTES)
+    chunks = queue.Queue(maxsize=BODY_QUEUE_CHUNKS)
+    aborted = threading.Event()
+
+    def queued_chunks():
+        while True:
+            try:
+                chunk = chunks.get(timeout=0.1)
+            except queue.Empty:
+                if aborted.is_set():
+                    return
+                continue
+            if chunk is None:
+                return
+            yield chunk
+
+    parsing = to_thread(
+        log_api.parse_request_events, queued_chunks(), request.content_type
+    )
+
+    async def put(chunk):
+        while not parsing.done():
+            try:
+                chunks.put_nowait(chunk)
+                return
+            except queue.Full:
+                # The parser is behind; wait for it without blocking the loop
+                await asyncio.wait([parsing], timeout=0.005)
+
+    try:
+        async for body_chunk in request.body:
+            for chunk in decoder.feed(body_chunk):
+                await put(chunk)
+        for chunk in decoder.close():
+            await put(chunk)
+        await put(None)
+    except BaseException:
+        aborted.set()
+        parsing.cancel()
+        raise
+    return await parsing
+
+
+@app.route("/log-to-chatbot", methods=["GET", "POST", "PUT"])
+async def receive_log():
+    """Enhanced webhook endpoint with AI analysis"""
+
+    logger.info(f"📥 Received {request.method} request to /log-to-chatbot")
+
+    if request.method == "GET":
+        return jsonify(log_api.webhook_info_payload(request.url_root))
+
+    # Process the log data
+    try:
+        with REQUEST_PARSE_SECONDS.time():
+            events, data_length = await read_request_events_async()
+
+        if not any(str(event).strip() for event in events):
+            return jsonify({"status": "error", "message": "No log data received"}), 400
+
+    except PayloadTooLargeError as e:
+        logger.warning(f"⚠️ Rejecting oversized request: {str(e)}")
+        return jsonify({"status": "error", "message": str(e)}), 413
+    except Exception as e:
+        logger.error(f"❌ Error parsing request data: {str(e)}")
+        return (
+            jsonify(
+                {"status": "error", "message": f"Error parsing request data: {str(e)}"}
+            ),
+            400,
+        )
+
+    group_key = (
+        request.headers.get(COALESCE_GROUP_HEADER) if COALESCE_GROUP_HEADER else None
+    )
+    meta = {
+        "content_type": request.content_type,
+        "method": request.method,
+        "group_key": group_key or request.remote_addr,
+    }
+    payload, status, headers = await to_thread(
+        log_api.accept_log_batch,
+        events,
+        data_length,
+        meta,
+        request.url_root,
+        analysis_queue,
+        batch_coalescer,
+    )
+    return jsonify(payload), status, headers
+
+
+@app.route("/api/archive", methods=["GET"])
+async def archive_search():
+    """Raw archived events by analysis_id, user, source_ip and time range"""
+    payload, status = await to_thread(log_api.archive_query_payload, request.args)
+    return jsonify(payload), status
+
+
+@app.route("/api/events", methods=["GET"])
+async def hot_events():
+    """Recent events by user, source_ip, action, host, status, analysis_id and time, with aggregates"""
+    payload, status = await to_thread(log_api.hot_events_payload, request.args)
+    return jsonify(payload), status
+
+
+@app.route("/api/search", methods=["GET"])
+async def search():
+    """Ingested events and analyses relevant to a question, ranked by BM25"""
+    payload, status = await to_thread(log_api.search_payload, request.args)
+    return jsonify(payload), status
+
+
+@app.route("/analysis/<analysis_id>", methods=["GET"])
+async def analysis_status(analysis_id):
+    """Report progress and results for a single analysis"""
+    payload, status = await to_thread(
+        log_api.analysis_status_payload, analysis_id, analysis_queue
+    )
+    return jsonify(payload), status
+
+
+# Test endpoint for AI analysis
+@app.route("/test-ai", methods=["POST"])
+async def test_ai_analysis():
+    """Test AI analysis with sample data"""
+    analysis_id = await to_thread(log_api.start_test_analysis)
+
+    # Perform AI analysis
+    ai_analysis = await analyze_logs_with_llm_async(TEST_LOGS, analysis_id)
+
+    return jsonify(
+        await to_thread(
+            log_api.finish_test_analysis, analysis_id, ai_analysis, request.url_root
+        )
+    )
+
+
+# Error handlers
+@app.errorhandler(404)
+async def not_found(error):
+    return jsonify({"error": "Endpoint not found"}), 404
+
+
+@app.errorhandler(500)
+async def internal_error(error):
+    return jsonify({"error": "Internal server error"}), 500
+
+
+if __name__ == "__main__":
+    port = int(os.environ.get("PORT", 5000))
+    app.run(host="0.0.0.0", port=port)
@@ -0,0 +1,165 @@
+"""
+Token-budgeted chunking of log batches and merging of per-chunk analyses.
+
+Large batches are split on event boundaries into chunks that fit a token
+budget; each chunk is analyzed separately (map) and the structured
+results are combined into a single analysis (reduce).
+"""
+
+import re
+
+# Rough chars-per-token ratio for Gemini tokenizers on log-style text
+CHARS_PER_TOKEN = 4
+
+THREAT_LEVELS = ["LOW", "MEDIUM", "HIGH", "CRITICAL"]
+
+
+def estimate_tokens(text):
+    """Cheap token estimate used for budgeting prompts"""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _split_oversized(entry, max_chars):
+    """Split a single entry that does not fit the budget, by lines then by characters"""
+    pieces = []
+    current = []
+    current_len = 0
+    for line in entry.split("\n"):
+        if len(line) > max_chars and current:
+            pieces.append("\n".join(current))
+            current = []
+            current_len = 0
+        while len(line) > max_chars:
+            pieces.append(line[:max_chars])
+            line = line[max_chars:]
+        if current and current_len + len(line) + 1 > max_chars:
+            pieces.append("\n".join(current))
+            current = []
+            current_len = 0
+        current.append(line)
+        current_len += len(line) + 1
+    if current:
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def chunk_entries(entries, max_tokens):
+    """
+    Greedily pack log entries into newline-joined chunks of at most max_tokens.
+
+    Entries are never reordered; an entry larger than the budget on its
+    own is split across chunks.
+    """
+    max_chars = max(1, max_tokens * CHARS_PER_TOKEN)
+    chunks = []
+    current = []
+    current_len = 0
+
+    for entry in entries:
+        pieces = (
+            [entry] if len(entry) <= max_chars else _split_oversized(entry, max_chars)
+        )
+        for piece in pieces:
+            if current and current_len + len(piece) + 1 > max_chars:
+                chunks.append("\n".join(current))
+                current = []
+                current_len = 0
+            current.append(piece)
+            current_len += len(piece) + 1
+
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def normalize_threat_level(value):
+    """Map free-form model output like '**HIGH** - lateral movement' to a known level"""
+    text = str(value or "").upper()
+    found = [level for level in THREAT_LEVELS if re.search(r"\b%s\b" % level, text)]
+    if not found:
+        return "UNKNOWN"
+    return max(found, key=THREAT_LEVELS.index)
+
+
+def normalize_risk_score(value):
+    """Extract the integer risk score from model output, or None"""
+    match = re.search(r"\d+", str(value or ""))
+    return int(match.group(0)) if match else None
+
+
+def _merge_text(values):
+    """Concatenate section texts, dropping exact duplicate lines"""
+    seen = set()
+    lines = []
+    for value in values:
+        for line in str(value or "").split("\n"):
+            key = line.strip()
+            if key and key not in seen:
+                seen.add(key)
+                lines.append(line)
+    return "\n".join(lines)
+
+
+def merge_analyses(analyses):
+    """
+    Reduce per-chunk analyses into one structured result.
+
+    The threat level and risk score take the worst chunk; text sections
+    are concatenated with duplicate lines removed.
+    """
+    succeeded = [a for a in analyses if a.get("status") == "success"]
+    if not succeeded:
+        merged = dict(analyses[0]) if analyses else {"status": "error"}
+        merged["chunks"] = len(analyses)
+        return merged
+
+    levels = [normalize_threat_level(a.get("threat_level")) for a in succeeded]
+    known = [level for level in levels if level in THREAT_LEVELS]
+    scores = [
+        s
+        for s in (normalize_risk_score(a.get("risk_score")) for a in succeeded)
+        if s is not None
+    ]
+
+    summaries = [
+        f"[Chunk {i + 1}/{len(analyses)}] {a.get('summary', '')}"
+        for i, a in enumerate(analyses)
+        if a.get("status") == "success"
+    ]
+
+    merged = {
+        "status": "success",
+        "threat_level": max(known, key=THREAT_LEVELS.index) if known else "UNKNOWN",
+        "risk_score": str(max(scores)) if scores else "N/A",
+        "summary": "\n".join(summaries),
+        "key_findings": _merge_text(a.get("key_findings") for a in succeeded),
+        "immediate_actions": _merge_text(a.get("immediate_actions") for a in succeeded),
+        "recommendations": _merge_text(a.get("recommendations") for a in succeeded),
+        "full_response": "\n\n".join(
+            f"--- Chunk {i + 1} ---\n{a.get('full_response', '')}"
+            for i, a in enumerate(succeeded)
+        ),
+        "chunks": len(analyses),
+    }
+    failed = len(analyses) - len(succeeded)
+    if failed:
+        merged["failed_chunks"] = failed
+    return merged
+
+
+def format_chunk_findings(analyses):
+    """Render per-chunk results as input for an LLM reduce step"""
+    blocks = []
+    for i, a in enumerate(analyses):
+        if a.get("status") != "success":
+            continue
+        blocks.append(
+            f"CHUNK {i + 1}:\n"
+            f"THREAT_LEVEL: {a.get('threat_level')}\n"
+            f"RISK_SCORE: {a.get('risk_score')}\n"
+            f"SUMMARY: {a.get('summary')}\n"
+            f"KEY_FINDINGS: {a.get('key_findings')}\n"
+            f"IMMEDIATE_ACTIONS: {a.get('immediate_actions')}\n"
+            f"RECOMMENDATIONS: {a.get('recommendations')}"
+        )
+    return "\n\n".join(blocks)
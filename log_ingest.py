@@ -0,0 +1,183 @@
+"""
+Streaming ingestion of webhook request bodies.
+
+The body is read from the WSGI stream in fixed-size chunks (or pushed
+chunk by chunk from an ASGI server), inflated
+through an incremental zlib decompressor when gzip-encoded, decoded as
+UTF-8 incrementally and, for JSON payloads, split into individual events
+without ever holding the compressed and decompressed body at once.
+"""
+
+import codecs
+import json
+import logging
+import zlib
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = " \t\r\n"
+
+
+class PayloadTooLargeError(Exception):
+    """Raised when a (decompressed) body exceeds the configured size limit"""
+
+
+class BodyDecoder:
+    """
+    Push-mode body decoder: feed() raw chunks as they arrive (e.g. from an
+    ASGI receive loop) and get back inflated byte chunks.
+
+    Raises PayloadTooLargeError as soon as more than max_bytes of
+    (decompressed) data has been produced, which stops gzip bombs before
+    they are fully expanded.
+    """
+
+    def __init__(
+        self, gzipped=False, max_bytes=50 * 1024 * 1024, chunk_size=CHUNK_SIZE
+    ):
+        self.max_bytes = max_bytes
+        self.chunk_size = chunk_size
+        self.total = 0
+        self._decompressor = (
+            zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+        )
+
+    def _account(self, data):
+        self.total += len(data)
+        if self.max_bytes and self.total > self.max_bytes:
+            raise PayloadTooLargeError(
+                f"Request body exceeds {self.max_bytes} bytes after decompression"
+            )
+        return data
+
+    def feed(self, chunk):
+        """Yield the decoded bytes for one raw chunk"""
+        if self._decompressor is None:
+            if chunk:
+                yield self._account(chunk)
+            return
+        data = self._decompressor.decompress(chunk, self.chunk_size)
+        while data:
+            yield self._account(data)
+            data = self._decompressor.decompress(
+                self._decompressor.unconsumed_tail, self.chunk_size
+            )
+
+    def close(self):
+        """Yield whatever the decompressor still buffers once the body has ended"""
+        if self._decompressor is not None:
+            data = self._decompressor.flush()
+            if data:
+                yield self._account(data)
+
+
+def iter_body_bytes(
+    stream, gzipped=False, max_bytes=50 * 1024 * 1024, chunk_size=CHUNK_SIZE
+):
+    """
+    Yield the request body as raw byte chunks, inflating gzip on the fly
+    (see BodyDecoder for the size limit)
+    """
+    decoder = BodyDecoder(gzipped, max_bytes, chunk_size)
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield from decoder.feed(chunk)
+    yield from decoder.close()
+
+
+def iter_body_text(byte_chunks):
+    """Decode UTF-8 byte chunks incrementally into text chunks"""
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    for chunk in byte_chunks:
+        text = decoder.decode(chunk)
+        if text:
+            yield text
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+class RawText(str):
+    """Unparsable remainder of a JSON body, passed through verbatim"""
+
+
+def iter_json_events(text_chunks):
+    """
+    Incrementally parse a JSON array, a single JSON value or NDJSON.
+
+    Yields each array element (or each top-level value for NDJSON). If the
+    body stops being valid JSON, the unparsed remainder is yielded once as
+    a RawText string so callers can fall back to the raw text.
+    """
+    decoder = json.JSONDecoder()
+    chunks = iter(text_chunks)
+    buffer = ""
+    pos = 0
+    final = False
+    in_array = None
+
+    def fill(size=0):
+        """Read at least one more chunk, and until `size` characters from pos are buffered"""
+        nonlocal buffer, pos, final
+        parts = [buffer[pos:]]
+        length = len(parts[0])
+        while True:
+            try:
+                parts.append(next(chunks))
+            except StopIteration:
+                final = True
+                break
+            length += len(parts[-1])
+            if length >= size:
+                break
+        buffer = "".join(parts)
+        pos = 0
+
+    while True:
+        while pos < len(buffer) and buffer[pos] in _WHITESPACE:
+            pos += 1
+        if pos >= len(buffer):
+            if final:
+                return
+            fill()
+            continue
+
+        if in_array is None:
+            in_array = buffer[pos] == "["
+            if in_array:
+                pos += 1
+            continue
+
+        if in_array and buffer[pos] == ",":
+            pos += 1
+            continue
+        if in_array and buffer[pos] == "]":
+            pos += 1
+            in_array = False
+            continue
+
+        try:
+            value, end = decoder.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            if not final:
+                # An incomplete value is parsed again from its start only once the buffer
+                # has doubled, so a large value costs linear rather than quadratic time
+                fill(2 * (len(buffer) - pos))
+                continue
+            yield RawText(buffer[pos:])
+            return
+
+        if end == len(buffer) and not final:
+            # A trailing scalar may continue in the next chunk
+            fill()
+            continue
+
+        pos = end
+        yield value
+        if not final and pos > CHUNK_SIZE:
+            buffer = buffer[pos:]
+            pos = 0
@@ -0,0 +1,460 @@
+"""
+Prometheus-style metrics with cross-process aggregation.
+
+Counters, histograms and gauges are kept in memory and updated under a
+single lock, so instrumenting the hot path costs a dict lookup and a few
+additions. Every process periodically writes a JSON snapshot of its
+metrics to ``<directory>/<pid>.json``; rendering reads all snapshots and
+merges them, so a scrape of any gunicorn worker reports the totals of
+all workers:
+
+* counters and histograms are summed over every snapshot, including
+  those of processes that have exited (their totals still happened);
+* gauges are summed (or maxed) over processes that are still alive.
+
+Without a directory the registry reports the current process only.
+The directory is cleared when the server starts (``clear_metrics_directory``,
+called from gunicorn's ``on_starting`` hook in ``gunicorn.conf.py``), so
+exited workers only count for the current boot; snapshots left by a
+previous process with a recycled pid are kept as exited.
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Latency buckets in seconds, from sub-millisecond parsing to slow LLM calls
+LATENCY_BUCKETS = (
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+# Size buckets for prompt bytes/tokens
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+
+def _label_key(labelnames, labels):
+    if set(labels) != set(labelnames):
+        raise ValueError(f"Expected labels {labelnames}, got {tuple(labels)}")
+    return tuple(str(labels[name]) for name in labelnames)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, registry, name, help_text, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._function = None
+
+    def set_function(self, function):
+        """Read the value from function() whenever metrics are collected"""
+        self._function = function
+
+
+class Counter(_Metric):
+    """Monotonic counter"""
+
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        self.registry._ensure_started()
+        key = _label_key(self.labelnames, labels)
+        with self.registry.lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _collect(self):
+        if self._function is not None:
+            # function() returns {label tuple: value} for labelled counters, else a number
+            value = self._function()
+            return dict(value) if isinstance(value, dict) else {(): value}
+        with self.registry.lock:
+            return dict(self._values)
+
+
+class Gauge(_Metric):
+    """
+    Point-in-time value; `mode` is how processes are combined ("sum" or "max")
+    """
+
+    kind = "gauge"
+
+    def __init__(self, registry, name, help_text, labelnames=(), mode="sum"):
+        super().__init__(registry, name, help_text, labelnames)
+        self.mode = mode
+
+    def set(self, value, **labels):
+        self.registry._ensure_started()
+        key = _label_key(self.labelnames, labels)
+        with self.registry.lock:
+            self._values[key] = value
+
+    def _collect(self):
+        if self._function is not None:
+            return {(): self._function()}
+        with self.registry.lock:
+            return dict(self._values)
+
+
+class _Timer:
+    __slots__ = ("histogram", "labels", "start")
+
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class Histogram(_Metric):
+    """Cumulative-bucket histogram"""
+
+    kind = "histogram"
+
+    def __init__(
+        self, registry, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS
+    ):
+        super().__init__(registry, name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        self.registry._ensure_started()
+        key = _label_key(self.labelnames, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.registry.lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][index] += 1
+            state[1] += value
+            state[2] += 1
+
+    def time(self, **labels):
+        """Context manager observing the elapsed wall time in seconds"""
+        return _Timer(self, labels)
+
+    def _collect(self):
+        with self.registry.lock:
+            return {
+                key: [list(counts), total, count]
+                for key, (counts, total, count) in self._values.items()
+            }
+
+
+class MetricsRegistry:
+    """
+    Named metrics of one process plus the snapshot files shared with its siblings
+    """
+
+    def __init__(self, directory=None, flush_interval=1.0, prefix=""):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self._metrics = {}
+        self._ratios = []
+        self._pid = None
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _register(self, metric):
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(self, self.prefix + name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=(), mode="sum"):
+        return self._register(
+            Gauge(self, self.prefix + name, help_text, labelnames, mode)
+        )
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(
+            Histogram(self, self.prefix + name, help_text, labelnames, buckets)
+        )
+
+    def ratio(self, name, help_text, numerator, denominators):
+        """
+        Gauge computed after merging: the sum of counter `numerator` over the
+        sum of counters `denominators`, so ratios are correct across processes
+        """
+        self._ratios.append(
+            (
+                self.prefix + name,
+                help_text,
+                self.prefix + numerator,
+                [self.prefix + d for d in denominators],
+            )
+        )
+
+    def _ensure_started(self):
+        """Start the snapshot flusher thread once per process (gunicorn workers fork after import)"""
+        if not self.directory or self._pid == os.getpid():
+            return
+        with self.lock:
+            if self._pid == os.getpid():
+                return
+            self._retire_stale_snapshot()
+            threading.Thread(
+                target=self._run, name="metrics-flusher", daemon=True
+            ).start()
+            self._pid = os.getpid()
+
+    def _retire_stale_snapshot(self):
+        """Keep the totals of an exited process whose pid this process reuses, as an exited process"""
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            data["pid"] = None
+            with open(
+                os.path.join(
+                    self.directory, f"exited-{os.getpid()}-{time.time_ns()}.json"
+                ),
+                "w",
+                encoding="utf-8",
+            ) as f:
+                json.dump(data, f)
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError) as e:
+            logger.warning(
+                f"⚠️ Could not retire stale metrics snapshot {path}: {str(e)}"
+            )
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"❌ Failed to write metrics snapshot: {str(e)}")
+
+    def collect(self):
+        """Snapshot of this process: {name: {"type", "labels", "samples": [[labels, value]]}}"""
+        self._ensure_started()
+        snapshot = {}
+        for metric in list(self._metrics.values()):
+            try:
+                values = metric._collect()
+            except Exception as e:
+                logger.warning(f"⚠️ Could not collect metric {metric.name}: {str(e)}")
+                continue
+            entry = {
+                "type": metric.kind,
+                "help": metric.help,
+                "labels": list(metric.labelnames),
+                "samples": [[list(key), value] for key, value in values.items()],
+            }
+            if metric.kind == "histogram":
+                entry["buckets"] = list(metric.buckets)
+            if metric.kind == "gauge":
+                entry["mode"] = metric.mode
+            snapshot[metric.name] = entry
+        return snapshot
+
+    def flush(self):
+        """Write this process's snapshot for the other workers to read"""
+        if not self.directory:
+            return
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"pid": os.getpid(), "metrics": self.collect()}, f)
+        os.replace(tmp_path, path)
+
+    def _snapshots(self):
+        """Snapshots of every process as (alive, metrics), this process first and fresh"""
+        own = self.collect()
+        snapshots = [(True, own)]
+        if not self.directory:
+            return snapshots
+        try:
+            self.flush()
+            names = os.listdir(self.directory)
+        except OSError as e:
+            logger.warning(
+                f"⚠️ Could not read metrics directory {self.directory}: {str(e)}"
+            )
+            return snapshots
+        for filename in names:
+            if not filename.endswith(".json") or filename == f"{os.getpid()}.json":
+                continue
+            try:
+                with open(
+                    os.path.join(self.directory, filename), "r", encoding="utf-8"
+                ) as f:
+                    data = json.load(f)
+            except (OSError, ValueError):
+                continue
+            snapshots.append((_pid_alive(data.get("pid")), data.get("metrics", {})))
+        return snapshots
+
+    def merged(self):
+        """Metrics of all processes combined: {name: entry with merged samples}"""
+        merged = {}
+        for alive, snapshot in self._snapshots():
+            for name, entry in snapshot.items():
+                if entry["type"] == "gauge" and not alive:
+                    continue
+                target = merged.setdefault(name, dict(entry, samples={}))
+                samples = target["samples"]
+                for labels, value in entry["samples"]:
+                    key = tuple(labels)
+                    if value is None:
+                        continue
+                    if key not in samples:
+                        samples[key] = (
+                            [list(value[0]), value[1], value[2]]
+                            if entry["type"] == "histogram"
+                            else value
+                        )
+                    elif entry["type"] == "histogram":
+                        if len(value[0]) != len(samples[key][0]):
+                            continue
+                        samples[key][0] = [
+                            a + b for a, b in zip(samples[key][0], value[0])
+                        ]
+                        samples[key][1] += value[1]
+                        samples[key][2] += value[2]
+                    elif entry["type"] == "gauge" and entry.get("mode") == "max":
+                        samples[key] = max(samples[key], value)
+                    else:
+                        samples[key] += value
+        return merged
+
+    def render(self):
+        """All processes' metrics in the Prometheus text exposition format"""
+        merged = self.merged()
+        for name, help_text, numerator, denominators in self._ratios:
+            num = sum(merged.get(numerator, {}).get("samples", {}).values())
+            den = sum(
+                sum(merged.get(d, {}).get("samples", {}).values()) for d in denominators
+            )
+            merged[name] = {
+                "type": "gauge",
+                "help": help_text,
+                "labels": [],
+                "samples": {(): num / den if den else 0.0},
+            }
+
+        lines = []
+        for name in sorted(merged):
+            entry = merged[name]
+            lines.append(f"# HELP {name} {entry['help']}")
+            lines.append(f"# TYPE {name} {entry['type']}")
+            labelnames = entry["labels"]
+            for key in sorted(entry["samples"]):
+                value = entry["samples"][key]
+                pairs = list(zip(labelnames, key))
+                if entry["type"] != "histogram":
+                    lines.append(
+                        f"{name}{_format_labels(pairs)} {_format_value(value)}"
+                    )
+                    continue
+                counts, total, count = value
+                cumulative = 0
+                for bound, bucket_count in zip(
+                    list(entry["buckets"]) + [float("inf")], counts
+                ):
+                    cumulative += bucket_count
+                    lines.append(
+                        f"{name}_bucket{_format_labels(pairs + [('le', _format_value(bound))])} {cumulative}"
+                    )
+                lines.append(
+                    f"{name}_sum{_format_labels(pairs)} {_format_value(total)}"
+                )
+                lines.append(f"{name}_count{_format_labels(pairs)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+def _pid_alive(pid):
+    if not isinstance(pid, int):
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def clear_metrics_directory(directory=None):
+    """
+    Remove every snapshot in METRICS_DIR; call once when the server starts,
+    before any worker writes (live processes rewrite theirs on the next flush)
+    """
+    if directory is None:
+        directory = os.environ.get(
+            "METRICS_DIR", os.path.join("logs", "metrics")
+        ).strip()
+    if not directory or not os.path.isdir(directory):
+        return
+    for filename in os.listdir(directory):
+        if filename.endswith((".json", ".tmp")):
+            try:
+                os.remove(os.path.join(directory, filename))
+            except OSError as e:
+                logger.warning(
+                    f"⚠️ Could not remove metrics snapshot {filename}: {str(e)}"
+                )
+
+
+def create_metrics():
+    """Build the registry from METRICS_DIR and METRICS_FLUSH_INTERVAL"""
+    directory = os.environ.get("METRICS_DIR", os.path.join("logs", "metrics")).strip()
+    flush_interval = float(os.environ.get("METRICS_FLUSH_INTERVAL", 1))
+    try:
+        return MetricsRegistry(directory or None, flush_interval, prefix="cribl_")
+    except OSError as e:
+        logger.warning(
+            f"⚠️ Metrics directory {directory} unavailable ({str(e)}); reporting this process only"
+        )
+        return MetricsRegistry(None, flush_interval, prefix="cribl_")
@@ -0,0 +1,247 @@
+"""
+Local rule-based pre-filter that decides whether a batch needs the LLM.
+
+Rules are loaded from a JSON file, compiled once into predicate
+closures and re-loaded automatically when the file changes. Each event
+scores the sum of the rules it matches; the batch scores its worst
+event. Batches below ``escalate_score`` get a locally computed LOW
+result instead of an LLM call.
+
+Rule file format::
+
+    {
+      "escalate_score": 5,
+      "escalate_unparsed": true,
+      "rules": [
+        {"name": "repeated_failures", "field": "failed_attempts", "op": "gt", "value": 2, "score": 5},
+        {"name": "sensitive_path", "field": "file_path", "op": "regex", "value": ["^/sensitive/"], "score": 4},
+        {"name": "off_hours", "field": "timestamp", "op": "hour_between", "value": [22, 6], "score": 3}
+      ]
+    }
+
+Supported ops: eq, ne, gt, gte, lt, lte, in, not_in, exists, regex
+(a list of patterns compiled into one alternation, matched against the
+lower-cased value unless "case_sensitive" is set, so write patterns in
+lower case) and hour_between
+(start/end hour, wrapping past midnight). The field "*" matches against
+every string value of the event, which is also how raw (non-JSON)
+events are tested.
+"""
+
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+_COMPARISONS = {
+    "eq": lambda a, b: a == b,
+    "ne": lambda a, b: a != b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+    "in": lambda a, b: a in b,
+    "not_in": lambda a, b: a not in b,
+}
+
+_CLOCK_RE = re.compile(r"(?:T|\s|^)(\d{1,2}):\d{2}")
+
+
+def _event_text(event):
+    """Scalar values of a (possibly nested) event joined into one searchable string"""
+    parts = []
+    stack = [event]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+        elif isinstance(value, str):
+            parts.append(value)
+    return "\n".join(parts)
+
+
+def _lookup(event, field):
+    """Resolve a dotted field path in an event, or _MISSING"""
+    if field == "*":
+        return event if isinstance(event, str) else _event_text(event)
+    if not isinstance(event, dict):
+        return _MISSING
+    value = event
+    for part in field.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def extract_hour(value):
+    """Hour of day (0-23, UTC for epochs) from an epoch, ISO timestamp or HH:MM clock string"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        seconds = value / 1000 if value > 1e11 else value
+        try:
+            return datetime.fromtimestamp(seconds, tz=timezone.utc).hour
+        except (ValueError, OverflowError, OSError):
+            return None  # nan, inf or out of range
+    match = _CLOCK_RE.search(str(value))
+    if match:
+        hour = int(match.group(1))
+        return hour if hour < 24 else None
+    return None
+
+
+def _compile_rule(rule):
+    """Turn a rule dict into (name, score, predicate)"""
+    name = rule.get("name") or f"{rule.get('field')}_{rule.get('op')}"
+    field = rule["field"]
+    op = rule["op"]
+    expected = rule.get("value")
+    score = float(rule.get("score", 1))
+
+    if op == "exists":
+
+        def predicate(event):
+            return _lookup(event, field) is not _MISSING
+
+    elif op == "regex":
+        patterns = expected if isinstance(expected, list) else [expected]
+        regex = re.compile("|".join(f"(?:{p})" for p in patterns))
+        # re.IGNORECASE is several times slower than lower-casing the subject
+        fold = str if rule.get("case_sensitive") else (lambda value: str(value).lower())
+
+        def predicate(event):
+            value = _lookup(event, field)
+            return value is not _MISSING and regex.search(fold(value)) is not None
+
+    elif op == "hour_between":
+        start, end = int(expected[0]), int(expected[1])
+
+        def predicate(event):
+            value = _lookup(event, field)
+            hour = extract_hour(value) if value is not _MISSING else None
+            if hour is None:
+                return False
+            return start <= hour < end if start <= end else hour >= start or hour < end
+
+    elif op in _COMPARISONS:
+        compare = _COMPARISONS[op]
+        if op in ("in", "not_in"):
+            expected = set(expected)
+
+        def predicate(event):
+            value = _lookup(event, field)
+            if value is _MISSING:
+                return False
+            try:
+                return compare(value, expected)
+            except TypeError:
+                return False
+
+    else:
+        raise ValueError(f"Unknown operator '{op}' in rule '{name}'")
+
+    return name, score, predicate
+
+
+class RuleSet:
+    """A compiled set of pre-filter rules"""
+
+    def __init__(self, config):
+        self.escalate_score = float(config.get("escalate_score", 5))
+        self.escalate_unparsed = bool(config.get("escalate_unparsed", True))
+        self.rules = [_compile_rule(rule) for rule in config.get("rules", [])]
+
+    def evaluate(self, events):
+        """
+        Score a batch. Returns a dict with the batch score, whether it must
+        be escalated to the LLM, and how many events matched each rule.
+        """
+        batch_score = 0.0
+        matches = {}
+        unparsed = False
+        for event in events:
+            if not isinstance(event, dict):
+                unparsed = True
+            event_score = 0.0
+            for name, score, predicate in self.rules:
+                if predicate(event):
+                    event_score += score
+                    matches[name] = matches.get(name, 0) + 1
+            batch_score = max(batch_score, event_score)
+
+        escalate = batch_score >= self.escalate_score or (
+            unparsed and self.escalate_unparsed
+        )
+        return {
+            "score": batch_score,
+            "threshold": self.escalate_score,
+            "escalate": escalate,
+            "matched_rules": matches,
+            "events": len(events),
+        }
+
+
+class RuleEngine:
+    """
+    RuleSet loaded from a file and hot-reloaded when the file's mtime changes.
+
+    The file is checked at most every `reload_interval` seconds; a file
+    that fails to parse keeps the previously loaded rules active.
+    """
+
+    def __init__(self, path, reload_interval=5.0):
+        self.path = path
+        self.reload_interval = reload_interval
+        self._ruleset = RuleSet({"escalate_score": 0})
+        self._mtime = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self._maybe_reload(force=True)
+
+    def _maybe_reload(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._checked_at < self.reload_interval:
+            return
+        with self._lock:
+            self._checked_at = now
+            try:
+                mtime = os.path.getmtime(self.path)
+            except OSError:
+                if self._mtime is not None or force:
+                    logger.warning(
+                        f"⚠️ Pre-filter rules file {self.path} not found; escalating every batch"
+                    )
+                self._ruleset = RuleSet({"escalate_score": 0})
+                self._mtime = None
+                return
+            if mtime == self._mtime:
+                return
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    ruleset = RuleSet(json.load(f))
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.error(
+                    f"❌ Failed to load pre-filter rules from {self.path}: {str(e)}"
+                )
+                self._mtime = mtime
+                return
+            self._ruleset = ruleset
+            self._mtime = mtime
+            logger.info(
+                f"📜 Loaded {len(ruleset.rules)} pre-filter rules from {self.path}"
+            )
+
+    def evaluate(self, events):
+        """Score a batch with the current rules, reloading them first if the file changed"""
+        self._maybe_reload()
+        return self._ruleset.evaluate(events)
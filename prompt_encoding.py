@@ -0,0 +1,82 @@
+"""
+Encoding of log events into prompt text.
+
+Formats:
+
+* ``pretty`` - indented JSON, one block per event (legacy behaviour)
+* ``json``   - compact single-line JSON per event
+* ``table``  - CSV-style rows under a single header line, so keys shared
+  by every event are emitted once per chunk instead of once per event
+
+Noisy fields can be dropped before encoding in every format.
+"""
+
+import csv
+import io
+import json
+
+PROMPT_FORMATS = ("pretty", "json", "table")
+
+
+def _strip_fields(event, drop_fields):
+    if drop_fields and isinstance(event, dict):
+        return {k: v for k, v in event.items() if k not in drop_fields}
+    return event
+
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, separators=(",", ":"))
+    return str(value)
+
+
+def _csv_line(values):
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="").writerow(values)
+    return buffer.getvalue()
+
+
+def encode_event(event, fmt="json"):
+    """Encode a single event (dict, scalar or raw text) for the json/pretty formats"""
+    if isinstance(event, dict):
+        if fmt == "pretty":
+            return json.dumps(event, indent=2)
+        return json.dumps(event, separators=(",", ":"), ensure_ascii=False)
+    return str(event)
+
+
+def encode_events(events, fmt="json", drop_fields=()):
+    """
+    Encode events for a prompt.
+
+    Returns (header, rows): rows hold one string per event, header is a
+    line that must precede any subset of the rows ('' when not needed).
+    """
+    if fmt not in PROMPT_FORMATS:
+        raise ValueError(
+            f"Unknown prompt format '{fmt}', expected one of {PROMPT_FORMATS}"
+        )
+    drop_fields = set(drop_fields)
+    events = [_strip_fields(event, drop_fields) for event in events]
+
+    if fmt != "table":
+        return "", [encode_event(event, fmt) for event in events]
+
+    columns = {}
+    for event in events:
+        if isinstance(event, dict):
+            for key in event:
+                columns.setdefault(key, None)
+    columns = list(columns)
+    if not columns:
+        return "", [str(event) for event in events]
+
+    rows = []
+    for event in events:
+        if isinstance(event, dict):
+            rows.append(_csv_line([_cell(event.get(column)) for column in columns]))
+        else:
+            rows.append(str(event))
+    return _csv_line(columns), rows
@@ -0,0 +1,131 @@
+"""
+Fan-out of result-store changes to long-lived stream subscribers.
+
+Subscribers (the Server-Sent Events responses) block in ``wait`` or
+``await wait_async`` until the store's revision passes their cursor and
+then read the changes themselves with ``store.changes``, so one wake-up
+serves any number of streams with their own filters.
+
+Writes made by this process wake subscribers immediately through a store
+listener. When the store is shared with other processes (SQLite), one
+watcher thread per process also polls the single-row revision counter
+while anyone is subscribed, so results finished by any gunicorn worker
+reach the streams of every worker within ``poll_interval`` seconds.
+"""
+
+import asyncio
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _resolve(future, revision):
+    if not future.done():
+        future.set_result(revision)
+
+
+class ResultBroadcaster:
+    """
+    Wakes stream subscribers when the result store's revision advances
+    """
+
+    def __init__(self, store, poll_interval=0.25):
+        self.store = store
+        self.poll_interval = poll_interval if store.shared else 0
+        self._condition = threading.Condition()
+        self._revision = store.revision()
+        self._subscribers = 0
+        self._waiters = set()  # (loop, future) of async subscribers
+        self._pid = None
+        store.add_listener(self.publish)
+
+    @property
+    def subscribers(self):
+        return self._subscribers
+
+    def publish(self, revision):
+        """Record that the store reached `revision` and wake everyone waiting for it"""
+        with self._condition:
+            if revision <= self._revision:
+                return
+            self._revision = revision
+            self._condition.notify_all()
+            waiters, self._waiters = self._waiters, set()
+        for loop, future in waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve, future, revision)
+            except RuntimeError:
+                pass  # the subscriber's event loop has been closed
+
+    def refresh(self):
+        """Pick up writes made by other processes"""
+        if self.store.shared:
+            self.publish(self.store.revision())
+
+    def _subscribe(self, delta):
+        with self._condition:
+            self._subscribers += delta
+        if delta > 0:
+            self._ensure_watcher()
+
+    def _ensure_watcher(self):
+        """Start the revision watcher once per process (gunicorn workers fork after import)"""
+        if not self.poll_interval or self._pid == os.getpid():
+            return
+        with self._condition:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(
+                target=self._watch, name="result-broadcast", daemon=True
+            ).start()
+            self._pid = os.getpid()
+
+    def _watch(self):
+        while True:
+            time.sleep(self.poll_interval)
+            if not self._subscribers:
+                continue
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.warning(f"⚠️ Could not read result store revision: {str(e)}")
+
+    def wait(self, since, timeout):
+        """
+        Block until the revision passes `since` or `timeout` seconds elapse;
+        returns the latest revision seen
+        """
+        self._subscribe(1)
+        try:
+            self.refresh()
+            with self._condition:
+                self._condition.wait_for(lambda: self._revision > since, timeout)
+                return self._revision
+        finally:
+            self._subscribe(-1)
+
+    async def wait_async(self, since, timeout):
+        """Async counterpart of wait() that does not tie up a thread while waiting"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        waiter = (loop, future)
+        self._subscribe(1)
+        try:
+            if self.store.shared:
+                await loop.run_in_executor(None, self.refresh)
+            with self._condition:
+                if self._revision > since:
+                    return self._revision
+                self._waiters.add(waiter)
+            try:
+                return await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                with self._condition:
+                    return self._revision
+        finally:
+            with self._condition:
+                self._waiters.discard(waiter)
+            self._subscribe(-1)
@@ -0,0 +1,542 @@
+"""
+Bounded storage backends for analysis results.
+
+Two interchangeable backends are provided:
+
+* ``MemoryResultStore`` - in-process LRU with TTL eviction (single worker / dev)
+* ``SQLiteResultStore`` - SQLite database in WAL mode, shared by every
+  gunicorn worker that points at the same file
+
+Both keep at most ``max_items`` results and drop results older than
+``ttl_seconds`` (0 disables TTL eviction). Every put/update stamps the
+record with an increasing revision number, which backs the paginated,
+filtered ``query`` and the ``changes`` delta feed used by the dashboard.
+Listeners registered with ``add_listener`` are called with the new
+revision after every put/update made in this process.
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ResultStore:
+    """Interface shared by all result store backends"""
+
+    # True when other processes write to the same store
+    shared = False
+    _listeners = ()
+
+    def add_listener(self, callback):
+        """Call callback(revision) after every put or update made by this process"""
+        self._listeners = self._listeners + (callback,)
+
+    def _notify(self, revision):
+        for callback in self._listeners:
+            try:
+                callback(revision)
+            except Exception as e:
+                logger.warning(f"⚠️ Result store listener failed: {str(e)}")
+
+    def get(self, analysis_id):
+        """Return the stored record for analysis_id, or None"""
+        raise NotImplementedError
+
+    def put(self, analysis_id, record):
+        """Insert or replace the record for analysis_id"""
+        raise NotImplementedError
+
+    def update(self, analysis_id, **fields):
+        """Merge fields into an existing record; returns the new record or None"""
+        raise NotImplementedError
+
+    def delete(self, analysis_id):
+        """Remove a record if present"""
+        raise NotImplementedError
+
+    def items(self, limit=None):
+        """Return (analysis_id, record) pairs, newest first"""
+        raise NotImplementedError
+
+    def query(
+        self,
+        offset=0,
+        limit=50,
+        threat_levels=None,
+        statuses=None,
+        start=None,
+        end=None,
+    ):
+        """
+        One page of results, newest first, matching the filters (threat
+        levels, statuses, created_at epoch range). Returns (total, page)
+        where page is a list of (analysis_id, record) pairs.
+        """
+        raise NotImplementedError
+
+    def changes(self, since=0, limit=100, **filters):
+        """
+        Results put or updated after revision `since`, oldest change first.
+        Returns (cursor, changes, has_more); pass cursor back as `since`.
+        """
+        raise NotImplementedError
+
+    def revision(self):
+        """Latest revision number, the cursor for "everything so far\" """
+        raise NotImplementedError
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def __contains__(self, analysis_id):
+        return self.get(analysis_id) is not None
+
+
+def record_threat_level(record):
+    """Threat level of a stored record, None until it has been analyzed"""
+    return (record.get("ai_analysis") or {}).get("threat_level")
+
+
+def _matches(
+    created_at, record, threat_levels=None, statuses=None, start=None, end=None
+):
+    if threat_levels and record_threat_level(record) not in threat_levels:
+        return False
+    if statuses and record.get("status") not in statuses:
+        return False
+    if start is not None and created_at < start:
+        return False
+    if end is not None and created_at > end:
+        return False
+    return True
+
+
+class MemoryResultStore(ResultStore):
+    """In-process LRU store with TTL eviction"""
+
+    def __init__(self, max_items=500, ttl_seconds=86400):
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._data = (
+            OrderedDict()
+        )  # analysis_id -> [created_at, record, revision], least recently used first
+        self._created = (
+            OrderedDict()
+        )  # analysis_id -> created_at, oldest first (puts only)
+        self._revision = 0
+        self._lock = threading.Lock()
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds and now - created_at > self.ttl_seconds
+
+    def _remove(self, analysis_id):
+        self._data.pop(analysis_id, None)
+        self._created.pop(analysis_id, None)
+
+    def _evict(self, now):
+        while len(self._data) > self.max_items:
+            analysis_id, _ = self._data.popitem(last=False)
+            del self._created[analysis_id]
+        # Expire from the oldest end and stop at the first live result
+        while self._created:
+            analysis_id, created_at = next(iter(self._created.items()))
+            if not self._expired(created_at, now):
+                break
+            self._remove(analysis_id)
+
+    def _next_revision(self):
+        self._revision += 1
+        return self._revision
+
+    def get(self, analysis_id):
+        with self._lock:
+            entry = self._data.get(analysis_id)
+            if entry is None:
+                return None
+            if self._expired(entry[0], time.time()):
+                self._remove(analysis_id)
+                return None
+            self._data.move_to_end(analysis_id)
+            return entry[1]
+
+    def put(self, analysis_id, record):
+        with self._lock:
+            now = time.time()
+            revision = self._next_revision()
+            self._data[analysis_id] = [now, record, revision]
+            self._data.move_to_end(analysis_id)
+            self._created[analysis_id] = now
+            self._created.move_to_end(analysis_id)
+            self._evict(now)
+        self._notify(revision)
+
+    def update(self, analysis_id, **fields):
+        with self._lock:
+            entry = self._data.get(analysis_id)
+            if entry is None:
+                return None
+            entry[1].update(fields)
+            entry[2] = revision = self._next_revision()
+            self._data.move_to_end(analysis_id)
+        self._notify(revision)
+        return entry[1]
+
+    def delete(self, analysis_id):
+        with self._lock:
+            self._remove(analysis_id)
+
+    def _entries(self):
+        with self._lock:
+            self._evict(time.time())
+            return [
+                (analysis_id, entry[0], entry[1], entry[2])
+                for analysis_id, entry in self._data.items()
+            ]
+
+    def items(self, limit=None):
+        entries = sorted(self._entries(), key=lambda entry: entry[1], reverse=True)
+        if limit is not None:
+            entries = entries[:limit]
+        return [(analysis_id, record) for analysis_id, _, record, _ in entries]
+
+    def query(self, offset=0, limit=50, **filters):
+        matching = [
+            entry
+            for entry in self._entries()
+            if _matches(entry[1], entry[2], **filters)
+        ]
+        matching.sort(key=lambda entry: entry[1], reverse=True)
+        return len(matching), [
+            (analysis_id, record)
+            for analysis_id, _, record, _ in matching[offset : offset + limit]
+        ]
+
+    def changes(self, since=0, limit=100, **filters):
+        latest = self.revision()
+        matching = sorted(
+            (
+                entry
+                for entry in self._entries()
+                if since < entry[3] <= latest
+                and _matches(entry[1], entry[2], **filters)
+            ),
+            key=lambda entry: entry[3],
+        )
+        has_more = len(matching) > limit
+        page = matching[:limit]
+        cursor = page[-1][3] if has_more else latest
+        return (
+            cursor,
+            [(analysis_id, record) for analysis_id, _, record, _ in page],
+            has_more,
+        )
+
+    def revision(self):
+        with self._lock:
+            return self._revision
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SQLiteResultStore(ResultStore):
+    """
+    Result store backed by a SQLite file in WAL mode.
+
+    Every process opens its own connection (one per thread), so all
+    gunicorn workers see the same set of results.
+    """
+
+    shared = True
+
+    def __init__(self, path, max_items=500, ttl_seconds=86400):
+        self.path = path
+        self.max_items = max_items
+        self.ttl_seconds = ttl_seconds
+        self._local = threading.local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._connect()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS analysis_results (
+                analysis_id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                record TEXT NOT NULL
+            )
+        """)
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS result_revision (id INTEGER PRIMARY KEY CHECK (id = 1), value INTEGER NOT NULL)"
+        )
+        self._migrate(conn)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_results_created ON analysis_results (created_at)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_results_revision ON analysis_results (revision)"
+        )
+
+    def _migrate(self, conn):
+        """Add the revision/status/threat_level columns to databases created before they existed"""
+        columns = {
+            row[1] for row in conn.execute("PRAGMA table_info(analysis_results)")
+        }
+        if {"revision", "status", "threat_level"} <= columns:
+            return
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            columns = {
+                row[1] for row in conn.execute("PRAGMA table_info(analysis_results)")
+            }
+            if {"revision", "status", "threat_level"} <= columns:
+                # Another worker migrated while we waited for the lock
+                conn.execute("ROLLBACK")
+                return
+            for column, kind in (
+                ("revision", "INTEGER"),
+                ("status", "TEXT"),
+                ("threat_level", "TEXT"),
+            ):
+                if column not in columns:
+                    conn.execute(
+                        f"ALTER TABLE analysis_results ADD COLUMN {column} {kind}"
+                    )
+            rows = conn.execute(
+                "SELECT analysis_id, record FROM analysis_results ORDER BY created_at"
+            ).fetchall()
+            for revision, (analysis_id, record) in enumerate(rows, start=1):
+                record = json.loads(record)
+                conn.execute(
+                    "UPDATE analysis_results SET revision = ?, status = ?, threat_level = ? WHERE analysis_id = ?",
+                    (
+                        revision,
+                        record.get("status"),
+                        record_threat_level(record),
+                        analysis_id,
+                    ),
+                )
+            conn.execute(
+                "INSERT OR REPLACE INTO result_revision (id, value) VALUES (1, ?)",
+                (len(rows),),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None and self._local.pid == os.getpid():
+            return conn
+        conn = sqlite3.connect(
+            self.path, timeout=10, isolation_level=None, check_same_thread=False
+        )
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        self._local.conn = conn
+        self._local.pid = os.getpid()
+        return conn
+
+    def _evict(self, conn, now):
+        if self.ttl_seconds:
+            conn.execute(
+                "DELETE FROM analysis_results WHERE created_at < ?",
+                (now - self.ttl_seconds,),
+            )
+        conn.execute(
+            """
+            DELETE FROM analysis_results WHERE created_at < (
+                SELECT created_at FROM analysis_results
+                ORDER BY created_at DESC LIMIT 1 OFFSET ?
+            )
+        """,
+            (self.max_items - 1,),
+        )
+
+    def _next_revision(self, conn):
+        # Callers hold the write lock (BEGIN IMMEDIATE), so this is race-free across processes.
+        # A counter row rather than MAX(revision)+1 so deleted rows never get their revision reused.
+        conn.execute("INSERT OR IGNORE INTO result_revision (id, value) VALUES (1, 0)")
+        conn.execute("UPDATE result_revision SET value = value + 1 WHERE id = 1")
+        return conn.execute(
+            "SELECT value FROM result_revision WHERE id = 1"
+        ).fetchone()[0]
+
+    def get(self, analysis_id):
+        row = (
+            self._connect()
+            .execute(
+                "SELECT created_at, record FROM analysis_results WHERE analysis_id = ?",
+                (analysis_id,),
+            )
+            .fetchone()
+        )
+        if row is None:
+            return None
+        if self.ttl_seconds and time.time() - row[0] > self.ttl_seconds:
+            return None
+        return json.loads(row[1])
+
+    def put(self, analysis_id, record):
+        conn = self._connect()
+        now = time.time()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            revision = self._next_revision(conn)
+            conn.execute(
+                "INSERT OR REPLACE INTO analysis_results "
+                "(analysis_id, created_at, record, revision, status, threat_level) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (
+                    analysis_id,
+                    now,
+                    json.dumps(record),
+                    revision,
+                    record.get("status"),
+                    record_threat_level(record),
+                ),
+            )
+            self._evict(conn, now)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._notify(revision)
+
+    def update(self, analysis_id, **fields):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT record FROM analysis_results WHERE analysis_id = ?",
+                (analysis_id,),
+            ).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            record = json.loads(row[0])
+            record.update(fields)
+            revision = self._next_revision(conn)
+            conn.execute(
+                "UPDATE analysis_results SET record = ?, revision = ?, status = ?, threat_level = ? "
+                "WHERE analysis_id = ?",
+                (
+                    json.dumps(record),
+                    revision,
+                    record.get("status"),
+                    record_threat_level(record),
+                    analysis_id,
+                ),
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._notify(revision)
+        return record
+
+    def delete(self, analysis_id):
+        self._connect().execute(
+            "DELETE FROM analysis_results WHERE analysis_id = ?", (analysis_id,)
+        )
+
+    def items(self, limit=None):
+        sql = "SELECT analysis_id, record FROM analysis_results WHERE created_at >= ? ORDER BY created_at DESC"
+        params = [time.time() - self.ttl_seconds if self.ttl_seconds else 0]
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        rows = self._connect().execute(sql, params).fetchall()
+        return [(analysis_id, json.loads(record)) for analysis_id, record in rows]
+
+    def _where(self, threat_levels=None, statuses=None, start=None, end=None):
+        """SQL conditions and parameters for the query filters (TTL included)"""
+        clauses = ["created_at >= ?"]
+        params = [time.time() - self.ttl_seconds if self.ttl_seconds else 0]
+        if threat_levels:
+            clauses.append(f"threat_level IN ({','.join('?' * len(threat_levels))})")
+            params.extend(threat_levels)
+        if statuses:
+            clauses.append(f"status IN ({','.join('?' * len(statuses))})")
+            params.extend(statuses)
+        if start is not None:
+            clauses.append("created_at >= ?")
+            params.append(start)
+        if end is not None:
+            clauses.append("created_at <= ?")
+            params.append(end)
+        return " AND ".join(clauses), params
+
+    def query(self, offset=0, limit=50, **filters):
+        where, params = self._where(**filters)
+        conn = self._connect()
+        total = conn.execute(
+            f"SELECT COUNT(*) FROM analysis_results WHERE {where}", params
+        ).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT analysis_id, record FROM analysis_results WHERE {where} "
+            "ORDER BY created_at DESC LIMIT ? OFFSET ?",
+            params + [limit, offset],
+        ).fetchall()
+        return total, [
+            (analysis_id, json.loads(record)) for analysis_id, record in rows
+        ]
+
+    def changes(self, since=0, limit=100, **filters):
+        latest = self.revision()
+        where, params = self._where(**filters)
+        rows = (
+            self._connect()
+            .execute(
+                f"SELECT analysis_id, record, revision FROM analysis_results "
+                f"WHERE revision > ? AND revision <= ? AND {where} ORDER BY revision LIMIT ?",
+                [since, latest] + params + [limit + 1],
+            )
+            .fetchall()
+        )
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        cursor = rows[-1][2] if has_more else latest
+        return (
+            cursor,
+            [(analysis_id, json.loads(record)) for analysis_id, record, _ in rows],
+            has_more,
+        )
+
+    def revision(self):
+        row = (
+            self._connect()
+            .execute("SELECT value FROM result_revision WHERE id = 1")
+            .fetchone()
+        )
+        return row[0] if row else 0
+
+    def __len__(self):
+        return (
+            self._connect()
+            .execute("SELECT COUNT(*) FROM analysis_results")
+            .fetchone()[0]
+        )
+
+
+def create_result_store():
+    """Build the result store selected by the RESULT_STORE environment variable"""
+    backend = os.environ.get("RESULT_STORE", "memory").lower()
+    max_items = int(os.environ.get("RESULT_STORE_MAX_ITEMS", 500))
+    ttl_seconds = int(os.environ.get("RESULT_STORE_TTL", 86400))
+
+    if backend == "sqlite":
+        path = os.environ.get("RESULT_STORE_PATH", "logs/analysis_results.db")
+        logger.info(f"🗄️ Using SQLite result store at {path}")
+        return SQLiteResultStore(path, max_items=max_items, ttl_seconds=ttl_seconds)
+
+    if backend != "memory":
+        logger.warning(f"⚠️ Unknown RESULT_STORE '{backend}', falling back to memory")
+    return MemoryResultStore(max_items=max_items, ttl_seconds=ttl_seconds)
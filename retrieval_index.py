@@ -0,0 +1,444 @@
+"""
+Local retrieval over ingested events and past analyses.
+
+Chatbot questions such as "analyze recent login patterns" are answered
+from the model's general knowledge unless the relevant logs are in the
+prompt. ``RetrievalIndex`` keeps an in-memory BM25 inverted index of
+recent events and finished analyses so a question can be sent with only
+the few documents that match it, packed into a token budget.
+
+Documents live in segments of ``max_docs / 8`` documents; once the index
+holds more than ``max_docs`` the oldest segment is dropped as a whole,
+so eviction never has to edit postings. A re-indexed analysis hides its
+previous version until that version's segment goes.
+
+With ``embeddings`` on, every document also gets a hashed
+byte trigram vector (computed locally with NumPy, no model involved), and
+BM25 and vector rankings are merged by reciprocal rank fusion, which
+helps with near-miss spellings of user names, hosts and paths.
+
+``IndexFollower`` keeps an index current with the event archive and the
+result store, which every worker shares, so each process can answer
+searches over all workers' batches.
+"""
+
+import heapq
+import logging
+import math
+import os
+import re
+import threading
+import time
+from array import array
+from collections import Counter
+from functools import lru_cache
+
+import numpy as np
+
+from event_archive import TIME_FIELDS
+from log_chunking import estimate_tokens
+from prompt_encoding import encode_event
+from result_store import record_threat_level
+
+logger = logging.getLogger(__name__)
+
+# Words, IPs, paths, e-mail addresses and host names stay whole; their parts are indexed too
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9_.:/@\-]*[a-z0-9]|[a-z0-9]")
+PART_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and any are as at be by can do does for from has have how i in is it me my of on or our "
+    "show that the their there these this to was were what when where which who why will with you "
+    "analyze analyse find give list tell".split()
+)
+MAX_DOCUMENT_CHARS = 1000
+EMBEDDING_DIMENSIONS = 256
+RRF_K = 60
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def _term(token):
+    """Plural words share a term with their singular ('logins' -> 'login')"""
+    if (
+        len(token) > 3
+        and token.endswith("s")
+        and not token.endswith("ss")
+        and token.isalpha()
+    ):
+        return token[:-1]
+    return token
+
+
+@lru_cache(maxsize=65536)
+def _token_terms(token):
+    terms = []
+    if token not in STOPWORDS and not (token.isdigit() and len(token) > 8):
+        terms.append(_term(token))
+    parts = PART_PATTERN.findall(token)
+    if len(parts) > 1:
+        terms.extend(
+            _term(part) for part in parts if part not in STOPWORDS and len(part) <= 8
+        )
+    return tuple(terms)
+
+
+def tokenize(text):
+    """
+    Lower-cased terms of `text`: whole tokens plus their alphanumeric parts,
+    without stopwords and long numbers (IDs, epoch times)
+    """
+    terms = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        terms.extend(_token_terms(token))
+    return terms
+
+
+def embed(text):
+    """Unit-length hashed byte trigram vector of `text`"""
+    data = np.frombuffer(f" {text.lower()} ".encode("utf-8"), dtype=np.uint8).astype(
+        np.uint32
+    )
+    if len(data) < 3:
+        return np.zeros(EMBEDDING_DIMENSIONS, dtype=np.float32)
+    hashes = (data[:-2] * 961 + data[1:-1] * 31 + data[2:]) * 2654435761 >> 16
+    vector = np.bincount(
+        hashes % EMBEDDING_DIMENSIONS, minlength=EMBEDDING_DIMENSIONS
+    ).astype(np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+class _Segment:
+    """Postings and documents of up to `capacity` documents"""
+
+    __slots__ = ("base", "postings", "lengths", "documents", "vectors")
+
+    def __init__(self, base, capacity, embeddings):
+        self.base = base  # document number of the first document
+        self.postings = (
+            {}
+        )  # term -> (array of local document numbers, array of term frequencies)
+        self.lengths = array("I")
+        self.documents = []
+        self.vectors = (
+            np.zeros((capacity, EMBEDDING_DIMENSIONS), dtype=np.float32)
+            if embeddings
+            else None
+        )
+
+
+class RetrievalIndex:
+    """
+    BM25 index of events and analyses bounded to `max_docs` documents
+    """
+
+    def __init__(self, max_docs=50000, embeddings=False):
+        self.max_docs = max_docs
+        self.segment_docs = max(1, max_docs // 8)
+        self.embeddings = embeddings
+        self._segments = []
+        self._next = 0
+        self._total_length = 0
+        self._live = 0
+        self._latest = (
+            {}
+        )  # analysis document key -> document number of its newest version
+        self._lock = threading.Lock()
+        self.stats = {"events": 0, "analyses": 0, "evicted": 0}
+
+    def _add(self, document, key=None, indexed_text=None):
+        text = document["text"]
+        terms = tokenize(indexed_text if indexed_text is not None else text)
+        with self._lock:
+            segment = self._segments[-1] if self._segments else None
+            if segment is None or len(segment.documents) >= self.segment_docs:
+                segment = _Segment(self._next, self.segment_docs, self.embeddings)
+                self._segments.append(segment)
+                if len(self._segments) > 8:
+                    self._drop(self._segments.pop(0))
+            number = self._next
+            local = number - segment.base
+            for term, count in Counter(terms).items():
+                postings = segment.postings.get(term)
+                if postings is None:
+                    postings = segment.postings[term] = (array("I"), array("H"))
+                postings[0].append(local)
+                postings[1].append(count if count < 0xFFFF else 0xFFFF)
+            segment.lengths.append(len(terms))
+            segment.documents.append(document)
+            if segment.vectors is not None:
+                segment.vectors[local] = embed(text)
+            self._total_length += len(terms)
+            self._live += 1
+            self._next += 1
+            if key is not None:
+                if key in self._latest:
+                    self._live -= 1  # the previous version stays in its segment but is no longer returned
+                self._latest[key] = number
+
+    def _drop(self, segment):
+        self._total_length -= sum(segment.lengths)
+        for local, document in enumerate(segment.documents):
+            key = document.get("key")
+            if key is None:
+                self._live -= 1
+            elif self._latest.get(key) == segment.base + local:
+                del self._latest[key]
+                self._live -= 1
+        self.stats["evicted"] += len(segment.documents)
+
+    def add_event(self, analysis_id, event, ingested_at=None):
+        """Index one ingested event"""
+        # Values are indexed without field names (in every event) and timestamps (nearly all new terms)
+        indexed = event
+        if isinstance(event, dict):
+            indexed = " ".join(
+                str(value) for name, value in event.items() if name not in TIME_FIELDS
+            )
+        self._add(
+            {
+                "kind": "event",
+                "analysis_id": analysis_id,
+                "time": ingested_at,
+                "text": encode_event(event)[:MAX_DOCUMENT_CHARS],
+            },
+            indexed_text=str(indexed)[:MAX_DOCUMENT_CHARS],
+        )
+        self.stats["events"] += 1
+
+    def add_analysis(self, analysis_id, record):
+        """Index (or re-index) a finished analysis from the result store"""
+        ai_analysis = record.get("ai_analysis") or {}
+        parts = [
+            f"Analysis {analysis_id} ({record.get('timestamp')}): threat level "
+            f"{record_threat_level(record) or 'UNKNOWN'}, risk score {ai_analysis.get('risk_score', 'N/A')}"
+        ]
+        for name in ("summary", "key_findings", "immediate_actions"):
+            if ai_analysis.get(name):
+                parts.append(
+                    f"{name.replace('_', ' ').capitalize()}: {ai_analysis[name]}"
+                )
+        key = f"analysis:{analysis_id}"
+        self._add(
+            {
+                "kind": "analysis",
+                "analysis_id": analysis_id,
+                "time": record.get("timestamp"),
+                "text": "\n".join(parts)[:MAX_DOCUMENT_CHARS],
+                "key": key,
+            },
+            key=key,
+        )
+        self.stats["analyses"] += 1
+
+    def _visible(self, segment, local):
+        key = segment.documents[local].get("key")
+        return key is None or self._latest.get(key) == segment.base + local
+
+    def _bm25(self, terms):
+        """{(segment, local): score} over every document matching a query term"""
+        documents = sum(len(segment.documents) for segment in self._segments)
+        average = self._total_length / documents if documents else 0.0
+        scores = {}
+        for term in set(terms):
+            postings = [
+                (segment, segment.postings[term])
+                for segment in self._segments
+                if term in segment.postings
+            ]
+            frequency = sum(len(docs) for _, (docs, _) in postings)
+            if not frequency:
+                continue
+            idf = math.log(1 + (documents - frequency + 0.5) / (frequency + 0.5))
+            for segment, (docs, tfs) in postings:
+                lengths = segment.lengths
+                for local, tf in zip(docs, tfs):
+                    norm = (
+                        BM25_K1 * (1 - BM25_B + BM25_B * lengths[local] / average)
+                        if average
+                        else BM25_K1
+                    )
+                    key = (segment, local)
+                    scores[key] = scores.get(key, 0.0) + idf * tf * (BM25_K1 + 1) / (
+                        tf + norm
+                    )
+        return scores
+
+    def _nearest(self, query, count):
+        """The `count` documents whose vectors are closest to the query's"""
+        vector = embed(query)
+        candidates = []
+        for segment in self._segments:
+            size = len(segment.documents)
+            similarity = segment.vectors[:size] @ vector
+            for local in np.argsort(-similarity)[:count].tolist():
+                candidates.append(
+                    (float(similarity[local]), segment.base + local, segment, local)
+                )
+        return [
+            (segment, local)
+            for _, _, segment, local in heapq.nlargest(count, candidates)
+        ]
+
+    def search(self, query, k=20, kinds=None):
+        """
+        The `k` most relevant documents for `query`, best first, as
+        dicts with kind, analysis_id, time, text and score
+        """
+        terms = tokenize(query)
+        with self._lock:
+            scores = self._bm25(terms)
+            ranked = heapq.nlargest(
+                4 * k,
+                (
+                    (score, segment.base + local, segment, local)
+                    for (segment, local), score in scores.items()
+                    if self._visible(segment, local)
+                    and (kinds is None or segment.documents[local]["kind"] in kinds)
+                ),
+            )
+            if self.embeddings and query.strip():
+                # Reciprocal rank fusion of the BM25 and vector rankings (newer documents win ties)
+                fused = {}
+                for rank, (_, number, segment, local) in enumerate(ranked):
+                    fused[number] = [1 / (RRF_K + rank), segment, local]
+                nearest = [
+                    (segment, local)
+                    for segment, local in self._nearest(query, 4 * k)
+                    if self._visible(segment, local)
+                    and (kinds is None or segment.documents[local]["kind"] in kinds)
+                ]
+                for rank, (segment, local) in enumerate(nearest):
+                    entry = fused.setdefault(
+                        segment.base + local, [0.0, segment, local]
+                    )
+                    entry[0] += 1 / (RRF_K + rank)
+                ranked = sorted(
+                    (
+                        (score, number, segment, local)
+                        for number, (score, segment, local) in fused.items()
+                    ),
+                    reverse=True,
+                )
+            hits = []
+            for score, _, segment, local in ranked[:k]:
+                document = segment.documents[local]
+                hits.append(
+                    {
+                        "kind": document["kind"],
+                        "analysis_id": document["analysis_id"],
+                        "time": document["time"],
+                        "text": document["text"],
+                        "score": round(score, 4),
+                    }
+                )
+        return hits
+
+    def snapshot(self):
+        with self._lock:
+            return dict(
+                self.stats,
+                documents=self._live,
+                segments=len(self._segments),
+                terms=sum(len(segment.postings) for segment in self._segments),
+            )
+
+
+class IndexFollower:
+    """
+    Brings an index up to date with the event archive and the result store
+    (both shared by all workers), at most every `interval` seconds. start()
+    does this on a background thread so searches never wait for a catch-up.
+    """
+
+    def __init__(self, index, archive=None, results=None, interval=2.0):
+        self.index = index
+        self.archive = archive
+        self.results = results
+        self.interval = interval
+        self._positions = None
+        self._cursor = 0
+        self._refreshed = None
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        """Start the follower thread once per process (gunicorn workers fork after import)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            threading.Thread(
+                target=self._run, name="retrieval-follower", daemon=True
+            ).start()
+            self._pid = os.getpid()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh(force=True)
+            except Exception as e:
+                logger.warning(f"⚠️ Could not update the retrieval index: {str(e)}")
+            time.sleep(self.interval)
+
+    def refresh(self, force=False):
+        """Index what was archived and analyzed since the last refresh"""
+        with self._lock:
+            now = time.monotonic()
+            if (
+                not force
+                and self._refreshed is not None
+                and now - self._refreshed < self.interval
+            ):
+                return
+            self._refreshed = now
+            if self.archive is not None:
+                records, self._positions = self.archive.read_new(
+                    self._positions, max_events=self.index.max_docs
+                )
+                for record in records:
+                    self.index.add_event(
+                        record["analysis_id"], record["event"], record["ingested_at"]
+                    )
+            if self.results is not None:
+                has_more = True
+                while has_more:
+                    self._cursor, changed, has_more = self.results.changes(
+                        self._cursor, 500
+                    )
+                    for analysis_id, record in changed:
+                        if record.get("status") in ("success", "error") and record.get(
+                            "ai_analysis"
+                        ):
+                            self.index.add_analysis(analysis_id, record)
+
+
+def pack_context(hits, max_tokens):
+    """Search hits, best first, packed into `max_tokens` of prompt text: (text, hits used)"""
+    lines = []
+    used = []
+    budget = max_tokens
+    for hit in hits:
+        line = f"[{hit['kind']} {hit['analysis_id']}] {hit['text']}"
+        tokens = estimate_tokens(line) + 1
+        if tokens > budget:
+            continue
+        lines.append(line)
+        used.append(hit)
+        budget -= tokens
+    return "\n".join(lines), used
+
+
+def create_retrieval_index():
+    """Build the index from the RETRIEVAL_* environment variables, or None when disabled"""
+    if os.environ.get("RETRIEVAL_ENABLED", "True").lower() != "true":
+        return None
+    index = RetrievalIndex(
+        max_docs=int(os.environ.get("RETRIEVAL_MAX_DOCS", 50000)),
+        embeddings=os.environ.get("RETRIEVAL_EMBEDDINGS", "False").lower() == "true",
+    )
+    logger.info(
+        f"🔎 Retrieval index of up to {index.max_docs} events and analyses"
+        f"{' with trigram embeddings' if index.embeddings else ''}"
+    )
+    return index
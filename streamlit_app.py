@@ -1,14 +1,20 @@
 import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
 import streamlit as st
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_community.chat_message_histories import StreamlitChatMessageHistory
-from langchain.memory import ConversationBufferMemory
 from langchain_core.runnables.history import RunnableWithMessageHistory
 from langchain_core.prompts import ChatPromptTemplate
-import urllib.parse
 import json
-from datetime import datetime
-import re
+import urllib.parse
+
+from chat_memory import create_chat_memory
+from llm_response import parse_analysis
+from llm_streaming import StreamingAnalysisParser
 
 # Load Gemini API key from secrets
 gemini_key = st.secrets.get("GEMINI_API_KEY")
@@ -18,11 +24,20 @@ if not gemini_key:
 
 os.environ["GOOGLE_API_KEY"] = gemini_key
 
-# Initialize analysis results storage in session state
-if "analysis_results" not in st.session_state:
-    st.session_state.analysis_results = {}
+# Flask API (log_api.py) that analyzes webhook batches and stores the results
+LOG_API_URL = (st.secrets.get("LOG_API_URL") or os.environ.get("LOG_API_URL", "http://localhost:5000")).rstrip("/")
+LOG_API_TIMEOUT = float(os.environ.get("LOG_API_TIMEOUT", 10))
+# Seconds a fetched result list is reused by every session before asking the API for changes
+RESULTS_CACHE_TTL = int(os.environ.get("RESULTS_CACHE_TTL", 15))
+RESULTS_MAX_ITEMS = int(os.environ.get("RESULTS_MAX_ITEMS", 500))
+ANALYSIS_POLL_SECONDS = float(os.environ.get("ANALYSIS_POLL_SECONDS", 3))
+RESULTS_PAGE_SIZE = 500  # the API's largest delta page
+# Tokens of relevant ingested events and analyses sent with each question, 0 to disable
+CHAT_RETRIEVAL_TOKENS = int(os.environ.get("CHAT_RETRIEVAL_TOKENS", 1500))
+PENDING_STATUSES = ("queued", "processing")
+THREAT_LEVEL_BADGES = {"LOW": "🟢", "MEDIUM": "🟡", "HIGH": "🟠", "CRITICAL": "🔴"}
 
-# Initialize processed webhooks tracking
+# Analyses already added to this session's chat history
 if "processed_webhooks" not in st.session_state:
     st.session_state.processed_webhooks = set()
 
@@ -35,11 +50,18 @@ def get_llm(model_name):
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = StreamlitChatMessageHistory()
 
-# Create memory object
-memory = ConversationBufferMemory(
-    chat_memory=st.session_state.chat_history, 
-    return_messages=True
-)
+# Token-bounded view of the history sent to the model (None with CHAT_MEMORY=full)
+if "chat_memory" not in st.session_state:
+    st.session_state.chat_memory = create_chat_memory(st.session_state.chat_history)
+chat_memory = st.session_state.chat_memory
+
+def model_history(session_id):
+    """History the model sees: the bounded view, or every message with CHAT_MEMORY=full"""
+    return chat_memory or st.session_state.chat_history
+
+def history_summary():
+    """Summary of older turns for the system prompt"""
+    return chat_memory.summary_prompt() if chat_memory else ""
 
 # Enhanced system prompt for log analysis
 system_prompt = """You are an expert cybersecurity analyst specializing in insider threat detection and log analysis. 
@@ -68,7 +90,7 @@ STRUCTURED RESPONSE FORMAT:
 Focus on behavioral indicators, technical monitoring, anomaly detection, and actionable security recommendations."""
 
 prompt_template = ChatPromptTemplate.from_messages([
-    ("system", system_prompt),
+    ("system", system_prompt + "{summary}{context}"),
     ("placeholder", "{history}"),
     ("human", "{input}")
 ])
@@ -161,66 +183,215 @@ st.markdown("""
 
 st.markdown('<p class="subtitle">Automated log analysis with predictive and prescriptive insights</p>', unsafe_allow_html=True)
 
-# Function to extract analysis ID from webhook prompt
-def extract_analysis_id(prompt_text):
-    """Extract analysis ID from webhook prompt"""
-    patterns = [
-        r"Analysis ID:\s*([a-zA-Z0-9-]+)",
-        r"REQUEST #([a-zA-Z0-9-]+)",
-        r"analysis request #([a-zA-Z0-9-]+)"
+class ResultFeed:
+    """
+    Analysis results mirrored from the API's /api/results delta endpoint.
+
+    One feed is shared by every browser session; each refresh only asks for
+    results added or changed after the last cursor, and the oldest results
+    beyond RESULTS_MAX_ITEMS are dropped.
+    """
+
+    def __init__(self, api_url, max_items=RESULTS_MAX_ITEMS):
+        self.api_url = api_url
+        self.max_items = max_items
+        self.cursor = 0
+        self.results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _fetch_page(self):
+        response = requests.get(f"{self.api_url}/api/results",
+                                params={"since": self.cursor, "limit": RESULTS_PAGE_SIZE},
+                                timeout=LOG_API_TIMEOUT)
+        response.raise_for_status()
+        return response.json()
+
+    def refresh(self):
+        """Fetch changes since the last cursor and return {analysis_id: result}"""
+        with self._lock:
+            has_more = True
+            while has_more:
+                page = self._fetch_page()
+                if page["cursor"] < self.cursor:
+                    # The API restarted with a fresh store; start over from its first revision
+                    self.cursor = 0
+                    self.results.clear()
+                    continue
+                for item in page["results"]:
+                    self.results.pop(item["analysis_id"], None)
+                    self.results[item["analysis_id"]] = item["result"]
+                while len(self.results) > self.max_items:
+                    self.results.popitem(last=False)
+                self.cursor = page["cursor"]
+                has_more = page["has_more"]
+            return dict(self.results)
+
+
+@st.cache_resource
+def get_result_feed(api_url):
+    return ResultFeed(api_url)
+
+
+@st.cache_data(ttl=RESULTS_CACHE_TTL, show_spinner=False)
+def fetch_results(api_url):
+    """All known analysis results, refreshed incrementally at most once per TTL"""
+    return get_result_feed(api_url).refresh()
+
+
+@st.cache_data(ttl=ANALYSIS_POLL_SECONDS, show_spinner=False)
+def fetch_analysis(api_url, analysis_id):
+    """Status and result of one analysis, or None when the API does not know it"""
+    response = requests.get(f"{api_url}/analysis/{analysis_id}", timeout=LOG_API_TIMEOUT)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    return response.json()
+
+
+@st.cache_data(ttl=3600, show_spinner=False)
+def submit_logs(api_url, log_text):
+    """Hand raw log text to the API once (per hour) and return its analysis ID"""
+    response = requests.post(f"{api_url}/log-to-chatbot", data=log_text.encode("utf-8"),
+                             headers={"Content-Type": "text/plain; charset=utf-8"},
+                             timeout=LOG_API_TIMEOUT)
+    response.raise_for_status()
+    return response.json()["analysis_id"]
+
+
+@st.cache_data(ttl=RESULTS_CACHE_TTL, show_spinner=False)
+def fetch_context(api_url, question, max_tokens):
+    """(prompt text, hit count) of the ingested events and analyses most relevant to `question`"""
+    response = requests.get(f"{api_url}/api/search", params={"q": question, "max_tokens": max_tokens},
+                            timeout=LOG_API_TIMEOUT)
+    if response.status_code == 404:
+        return "", 0  # retrieval is disabled in the API
+    response.raise_for_status()
+    payload = response.json()
+    return payload["context"], payload["context_hits"]
+
+
+def retrieval_context(question):
+    """System prompt block with the logs relevant to `question` ("" without any) and its hit count"""
+    if not CHAT_RETRIEVAL_TOKENS:
+        return "", 0
+    try:
+        context, hits = fetch_context(LOG_API_URL, question, CHAT_RETRIEVAL_TOKENS)
+    except (requests.RequestException, KeyError, ValueError):
+        return "", 0
+    if not context:
+        return "", 0
+    return ("\n\nRELEVANT INGESTED LOGS AND PAST ANALYSES (retrieved from the log API for this question, "
+            "best match first; cite analysis IDs, and say so when they do not answer the question):\n"
+            f"{context}"), hits
+
+
+def analysis_markdown(ai_analysis):
+    """Markdown rendering of a structured analysis from the API"""
+    if not ai_analysis:
+        return "_No analysis available yet._"
+    sections = [
+        ("🚨 *THREAT LEVEL*", ai_analysis.get("threat_level")),
+        ("📊 *RISK SCORE*", ai_analysis.get("risk_score")),
+        ("📝 *SUMMARY*", ai_analysis.get("summary")),
+        ("🔍 *KEY FINDINGS*", ai_analysis.get("key_findings")),
+        ("⚡ *IMMEDIATE ACTIONS*", ai_analysis.get("immediate_actions")),
+        ("🛡 *RECOMMENDATIONS*", ai_analysis.get("recommendations")),
     ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, prompt_text, re.IGNORECASE)
-        if match:
-            return match.group(1)
-    return None
-
-# Function to store analysis result
-def store_analysis_result(analysis_id, prompt, response_content, status="completed"):
-    """Store analysis result in session state"""
-    if analysis_id:
-        st.session_state.analysis_results[analysis_id] = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "prompt": prompt,
-            "response": response_content,
-            "status": status,
-            "log_preview": prompt[:500] if len(prompt) > 500 else prompt
-        }
-
-# Function to create webhook hash for duplicate detection
-def get_webhook_hash(prompt):
-    """Create a simple hash of the webhook prompt to detect duplicates"""
-    import hashlib
-    return hashlib.md5(prompt.encode()).hexdigest()[:8]
-
-# Check for webhook prompt parameter
+    return "\n\n".join(f"{title}: {value}" for title, value in sections if value)
+
+
+def threat_header(fields):
+    """THREAT LEVEL / RISK SCORE banner from the header fields known so far ("" before either arrives)"""
+    parts = []
+    if fields.get("threat_level"):
+        level = fields["threat_level"]
+        parts.append(f"{THREAT_LEVEL_BADGES.get(level, '⚪')} **THREAT LEVEL: {level}**")
+    if fields.get("risk_score") and fields["risk_score"] != "N/A":
+        parts.append(f"📊 **RISK SCORE: {fields['risk_score']}/10**")
+    return " · ".join(parts)
+
+
+def chunk_text(chunk):
+    """Text of a streamed message chunk (plain or a list of content parts)"""
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in chunk.content)
+
+
+def stream_response(chain_input, session_id="default"):
+    """
+    Render the model's answer as it streams, with the threat level and risk
+    score shown as soon as they are written; returns the complete text
+    """
+    parser = StreamingAnalysisParser(parse_analysis)
+    header = st.empty()
+    body = st.empty()
+    body.markdown("🔍 _Analyzing security concerns..._")
+    for chunk in chat_chain.stream(chain_input, config={"configurable": {"session_id": session_id}}):
+        text = chunk_text(chunk)
+        if not text:
+            continue
+        parser.feed(text)
+        if parser.fields:
+            header.markdown(threat_header(parser.fields))
+        body.markdown(parser.text + "▌")
+    body.markdown(parser.text)
+    return parser.text
+
+
+def add_analysis_to_history(analysis_id, analysis):
+    """Add a finished analysis to the chat history once, so follow-up questions can refer to it"""
+    if analysis_id in st.session_state.processed_webhooks:
+        return
+    st.session_state.processed_webhooks.add(analysis_id)
+    ai_analysis = analysis.get("ai_analysis") or {}
+    st.session_state.chat_history.add_user_message(
+        f"🔗 Webhook log analysis #{analysis_id}:\n{analysis.get('log_preview') or ''}"
+    )
+    st.session_state.chat_history.add_ai_message(
+        ai_analysis.get("full_response") or analysis_markdown(ai_analysis)
+    )
+
+
+# Webhook requests link here by analysis ID; the logs themselves stay in the API
 query_params = st.query_params
-webhook_prompt = None
-analysis_id = None
-is_webhook_request = False
+analysis_id = query_params.get("analysis_id")
+api_error = None
 
-if "prompt" in query_params:
+if "prompt" in query_params and not analysis_id:
+    # Legacy links carry the logs in the URL: hand them to the API, then switch to the ID
     try:
-        webhook_prompt = urllib.parse.unquote_plus(query_params["prompt"])
-        analysis_id = extract_analysis_id(webhook_prompt)
-        is_webhook_request = True
-        
-        # Create webhook hash for duplicate detection
-        webhook_hash = get_webhook_hash(webhook_prompt)
-        
-        st.markdown(f"""
-        <div class="webhook-status">
-            <strong>🔗 Webhook Request Received</strong><br>
-            Analysis ID: <code>{analysis_id or 'Auto-generated'}</code><br>
-            Processing log analysis request from Cribl Stream...<br>
-            <small>Hash: {webhook_hash}</small>
-        </div>
-        """, unsafe_allow_html=True)
-        
-    except Exception as e:
-        st.error(f"Error processing webhook prompt: {str(e)}")
-        webhook_prompt = None
+        analysis_id = submit_logs(LOG_API_URL, urllib.parse.unquote_plus(query_params["prompt"]))
+        st.query_params.clear()
+        st.query_params["analysis_id"] = analysis_id
+    except (requests.RequestException, KeyError, ValueError) as e:
+        st.error(f"Error submitting webhook logs to {LOG_API_URL}: {str(e)}")
+
+is_webhook_request = analysis_id is not None
+webhook_analysis = None
+
+if is_webhook_request:
+    try:
+        webhook_analysis = fetch_analysis(LOG_API_URL, analysis_id)
+    except (requests.RequestException, ValueError) as e:
+        api_error = str(e)
+    
+    st.markdown(f"""
+    <div class="webhook-status">
+        <strong>🔗 Webhook Analysis</strong><br>
+        Analysis ID: <code>{analysis_id}</code><br>
+        Status: {webhook_analysis["status"] if webhook_analysis else "unknown"}
+    </div>
+    """, unsafe_allow_html=True)
+
+try:
+    analysis_results = fetch_results(LOG_API_URL)
+except (requests.RequestException, KeyError, ValueError) as e:
+    analysis_results = {}
+    api_error = api_error or str(e)
+
+if api_error:
+    st.warning(f"⚠️ Could not reach the analysis API at {LOG_API_URL}: {api_error}")
 
 # Sidebar with enhanced options
 with st.sidebar:
@@ -234,41 +405,49 @@ with st.sidebar:
     
     # Get LLM instance
     llm = get_llm(model_choice)
+    if chat_memory:
+        chat_memory.summarize = lambda prompt: llm.invoke(prompt).content
     
     # Create conversation chain
     chat_chain = RunnableWithMessageHistory(
         prompt_template | llm,
-        get_session_history=lambda session_id: st.session_state.chat_history,
+        get_session_history=model_history,
         input_messages_key="input",
         history_messages_key="history"
     )
     
     st.markdown('<h3 class="sidebar-header">⚙ Options</h3>', unsafe_allow_html=True)
     if st.button("🗑 Clear Chat History", use_container_width=True):
-        st.session_state.chat_history.clear()
+        model_history("default").clear()
         st.session_state.processed_webhooks.clear()
         st.rerun()
     
-    if st.button("🧹 Clear Analysis Results", use_container_width=True):
-        st.session_state.analysis_results.clear()
+    if chat_memory and st.session_state.chat_history.messages:
+        usage = chat_memory.usage()
+        st.caption(f"🧠 Context: {usage['window_messages']} of {usage['messages']} messages "
+                   f"(~{usage['window_tokens']} tokens) + summary (~{usage['summary_tokens']} tokens), "
+                   f"budget {chat_memory.max_tokens} tokens")
+    
+    if st.button("🔄 Refresh Analysis Results", use_container_width=True):
+        fetch_results.clear()
+        fetch_analysis.clear()
         st.rerun()
     
     # Webhook status
     st.markdown('<h3 class="sidebar-header">🔗 Webhook Status</h3>', unsafe_allow_html=True)
     if is_webhook_request:
-        st.success("✅ Webhook request active")
-        st.info(f"Analyzing {len(webhook_prompt)} characters")
-        if analysis_id:
-            st.code(f"ID: {analysis_id}")
-        else:
-            st.code(f"Hash: {get_webhook_hash(webhook_prompt) if webhook_prompt else 'N/A'}")
+        st.success("✅ Webhook analysis linked")
+        st.code(f"ID: {analysis_id}")
+        if webhook_analysis:
+            st.info(f"Status: {webhook_analysis['status']}")
     else:
         st.info("⏳ Waiting for webhook requests")
+    st.caption(f"Analysis API: {LOG_API_URL}")
     
     # Results summary
-    if st.session_state.analysis_results:
+    if analysis_results:
         st.markdown('<h3 class="sidebar-header">📊 Analysis Results</h3>', unsafe_allow_html=True)
-        st.info(f"Total analyses: {len(st.session_state.analysis_results)}")
+        st.info(f"Total analyses: {len(analysis_results)}")
         
         if st.button("📋 View All Results", use_container_width=True):
             st.session_state.show_results = True
@@ -296,16 +475,16 @@ if hasattr(st.session_state, 'show_results') and st.session_state.show_results:
         del st.session_state.show_results
         st.rerun()
     
-    if st.session_state.analysis_results:
+    if analysis_results:
         # Sort results by timestamp (newest first)
         sorted_results = sorted(
-            st.session_state.analysis_results.items(),
+            analysis_results.items(),
             key=lambda x: x[1]['timestamp'],
             reverse=True
         )
         
         for result_id, result in sorted_results:
-            status_color = "🟢" if result['status'] == 'completed' else "🔴"
+            status_color = {"success": "🟢", "error": "🔴"}.get(result['status'], "🟡")
             
             with st.expander(f"{status_color} Analysis {result_id} - {result['timestamp']}"):
                 col1, col2 = st.columns([3, 1])
@@ -313,7 +492,7 @@ if hasattr(st.session_state, 'show_results') and st.session_state.show_results:
                 with col1:
                     st.markdown(f"*Status:* {result['status']}")
                     st.markdown("*Log Preview:*")
-                    st.code(result.get('log_preview', 'N/A'), language="text")
+                    st.code(result.get('log_preview') or 'N/A', language="text")
                 
                 with col2:
                     st.download_button(
@@ -325,117 +504,98 @@ if hasattr(st.session_state, 'show_results') and st.session_state.show_results:
                     )
                 
                 st.markdown("*Analysis Response:*")
-                st.markdown(result['response'])
+                st.markdown(analysis_markdown(result.get('ai_analysis')))
+                if result.get('error'):
+                    st.error(result['error'])
     else:
         st.info("No analysis results available yet.")
 
 else:
     # Regular chat interface
+    user_input = None
     
     # Display chat messages
     for message in st.session_state.chat_history.messages:
         with st.chat_message(message.type):
             st.write(message.content)
 
-    # Handle webhook prompt automatically
-    if webhook_prompt:
-        webhook_hash = get_webhook_hash(webhook_prompt)
-        
-        # Check if this webhook was already processed
-        if webhook_hash not in st.session_state.processed_webhooks:
-            st.session_state.processed_webhooks.add(webhook_hash)
-            
-            # If no analysis_id, generate one
-            if not analysis_id:
-                analysis_id = f"auto_{webhook_hash}"
+    # Show the linked webhook analysis; the API has already run (or is running) it
+    if is_webhook_request and analysis_id not in st.session_state.processed_webhooks:
+        if webhook_analysis is None:
+            if not api_error:
+                st.info(f"🔍 Analysis {analysis_id} was not found. It may have expired from the result store.")
+        elif webhook_analysis["status"] in PENDING_STATUSES:
+            with st.chat_message("assistant"):
+                st.markdown(f"🔍 Analysis {analysis_id} is {webhook_analysis['status']}...")
+                partial = webhook_analysis.get("ai_analysis")
+                if partial:
+                    # Streaming analyses publish the threat level before the rest of the answer
+                    if threat_header(partial):
+                        st.markdown(threat_header(partial))
+                    st.markdown(analysis_markdown(partial))
+            time.sleep(ANALYSIS_POLL_SECONDS)
+            st.rerun()
+        else:
+            add_analysis_to_history(analysis_id, webhook_analysis)
             
-            # Display webhook prompt as user message
             with st.chat_message("user"):
                 st.write("🔗 *Webhook Log Analysis Request:*")
-                if analysis_id:
-                    st.write(f"*Analysis ID:* {analysis_id}")
-                
-                # Show log preview in a nice format
+                st.write(f"*Analysis ID:* {analysis_id}")
                 st.markdown("*Log Data:*")
-                st.markdown('<div class="log-preview">' + webhook_prompt + '</div>', unsafe_allow_html=True)
+                st.code(webhook_analysis.get("log_preview") or "N/A", language="text")
             
-            # Generate and display bot response
             with st.chat_message("assistant"):
-                with st.spinner("🔍 Performing predictive and prescriptive log analysis..."):
-                    try:
-                        response = chat_chain.invoke(
-                            {"input": webhook_prompt},
-                            config={"configurable": {"session_id": f"webhook_{analysis_id}"}}
-                        )
-                        st.write(response.content)
-                        
-                        # Store the result
-                        store_analysis_result(analysis_id, webhook_prompt, response.content, "completed")
-                        
-                        # Show success message
-                        st.markdown(f"""
-                        <div class="analysis-result">
-                            <strong>✅ Analysis Complete</strong><br>
-                            Analysis ID: <code>{analysis_id}</code><br>
-                            Results stored and available in the dashboard.
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                    except Exception as e:
-                        error_msg = str(e)
-                        st.markdown(f"""
-                        <div class="error-result">
-                            <strong>❌ Analysis Error</strong><br>
-                            {error_msg}
-                        </div>
-                        """, unsafe_allow_html=True)
-                        
-                        # Store error result
-                        store_analysis_result(analysis_id, webhook_prompt, f"Error: {error_msg}", "error")
-        else:
-            st.info(f"🔄 This webhook request (Hash: {webhook_hash}) has already been processed. Check the results dashboard.")
+                st.markdown(analysis_markdown(webhook_analysis.get("ai_analysis")))
+                if webhook_analysis["status"] == "error":
+                    st.markdown(f"""
+                    <div class="error-result">
+                        <strong>❌ Analysis Error</strong><br>
+                        {webhook_analysis.get("error") or "Unknown error"}
+                    </div>
+                    """, unsafe_allow_html=True)
+                else:
+                    st.markdown(f"""
+                    <div class="analysis-result">
+                        <strong>✅ Analysis Complete</strong><br>
+                        Analysis ID: <code>{analysis_id}</code><br>
+                        Ask follow-up questions about this analysis below.
+                    </div>
+                    """, unsafe_allow_html=True)
 
     # Handle quick question selection
-    elif hasattr(st.session_state, 'selected_question'):
+    if hasattr(st.session_state, 'selected_question'):
         user_input = st.session_state.selected_question
         delattr(st.session_state, 'selected_question')
-    else:
-        user_input = None
 
     # Chat input
-    if is_webhook_request:
-        st.chat_input("Webhook request is being processed...", disabled=True)
-    else:
-        if prompt := st.chat_input("Ask about insider threats or paste logs for analysis..."):
-            user_input = prompt
+    if prompt := st.chat_input("Ask about insider threats or paste logs for analysis..."):
+        user_input = prompt
 
-    # Process regular user input (non-webhook)
-    if user_input and not is_webhook_request:
+    # Process regular user input
+    if user_input:
         # Display user message
         with st.chat_message("user"):
             st.write(user_input)
         
         # Generate and display bot response
         with st.chat_message("assistant"):
-            with st.spinner("Analyzing security concerns..."):
-                try:
-                    response = chat_chain.invoke(
-                        {"input": user_input},
-                        config={"configurable": {"session_id": "default"}}
-                    )
-                    st.write(response.content)
-                except Exception as e:
-                    error_msg = str(e)
-                    if "404" in error_msg or "not found" in error_msg.lower():
-                        st.error("❌ Model not found. Try selecting a different model from the sidebar.")
-                    elif "api key" in error_msg.lower():
-                        st.error("❌ API key issue. Please check your GEMINI_API_KEY in secrets.toml")
-                    else:
-                        st.error(f"Error generating response: {error_msg}")
+            context, hits = retrieval_context(user_input)
+            if hits:
+                st.caption(f"📎 Using {hits} relevant events and analyses from the log API")
+            try:
+                stream_response({"input": user_input, "summary": history_summary(), "context": context})
+            except Exception as e:
+                error_msg = str(e)
+                if "404" in error_msg or "not found" in error_msg.lower():
+                    st.error("❌ Model not found. Try selecting a different model from the sidebar.")
+                elif "api key" in error_msg.lower():
+                    st.error("❌ API key issue. Please check your GEMINI_API_KEY in secrets.toml")
+                else:
+                    st.error(f"Error generating response: {error_msg}")
 
     # Display welcome message for new users
     if len(st.session_state.chat_history.messages) == 0 and not is_webhook_request:
-        st.markdown("""
+        st.markdown(f"""
         <div style="background: linear-gradient(135deg, #e6fffa 0%, #f0fdfa 100%); 
                     padding: 2rem; 
                     border-radius: 15px; 
@@ -455,8 +615,9 @@ else:
                     <li>🔎 Investigating suspicious activities and anomalies</li>
                     <li>⚡ Real-time log analysis and threat assessment</li>
                 </ul>
-                <p><strong>🔗 Webhook Integration Active:</strong> Ready to receive and analyze logs from Cribl Stream</p>
-                <p><strong>Current Webhook URL:</strong> <code>https://criblchatbot-ksbwyaufrk8t2lt6dmhdgc.streamlit.app/?prompt=YOUR_LOG_DATA</code></p>
+                <p><strong>🔗 Webhook Integration Active:</strong> Cribl Stream posts logs to the analysis API, which links here by analysis ID</p>
+                <p><strong>Cribl Webhook URL:</strong> <code>{LOG_API_URL}/log-to-chatbot</code></p>
+                <p><strong>Open an analysis:</strong> <code>?analysis_id=ANALYSIS_ID</code></p>
                 <p><strong>Ask me a question, use quick questions, or send logs via webhook!</strong></p>
             </div>
         </div>
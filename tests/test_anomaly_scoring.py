@@ -0,0 +1,79 @@
+import math
+
+import pytest
+
+from anomaly_scoring import AnomalyScorer, evidence_note
+
+START = 1_700_000_000
+
+
+def batch(count=30, **extra):
+    return [
+        {
+            "user": "alice",
+            "action": "login",
+            "bytes": 100 + i % 7,
+            "_time": START + 60 * i,
+            **extra,
+        }
+        for i in range(count)
+    ]
+
+
+def test_numeric_outlier_is_reported():
+    events = batch()
+    events[5]["bytes"] = 1_000_000
+    report = AnomalyScorer().score(events)
+    assert [finding["field"] for finding in report["numeric"]] == ["bytes"]
+    assert report["numeric"][0]["values"] == [1_000_000]
+    assert report["score"] > 0
+    assert "bytes: 1 outlier(s)" in evidence_note(report, 0)
+
+
+def test_burst_is_reported():
+    events = batch(60)
+    for event in events[20:50]:
+        event["_time"] = START + 60 * 20 + 1
+    report = AnomalyScorer().score(events)
+    assert len(report["bursts"]) == 1
+    assert report["bursts"][0]["events"] == 30
+    assert report["anomalous_events"] >= 30
+
+
+def test_quiet_batch_scores_zero():
+    assert AnomalyScorer().score(batch())["score"] == 0
+
+
+@pytest.mark.parametrize(
+    "outlier", [math.inf, -math.inf, math.nan, 1e300, -1e12, 10**400]
+)
+def test_invalid_event_times_are_ignored(outlier):
+    events = batch()
+    events[-1]["_time"] = outlier
+    report = AnomalyScorer().score(events)
+    assert report["bursts"] == []
+
+
+@pytest.mark.parametrize("outlier", [0, 1e12, 4e10, 253402300799])
+def test_widely_spread_event_times_are_cheap(outlier):
+    events = batch()
+    events[-1]["_time"] = outlier
+    report = AnomalyScorer().score(events)
+    assert report["events"] == 30
+
+
+def test_spread_batch_with_a_dense_cluster_is_scored_without_a_dense_histogram():
+    events = batch(40)
+    for event in events[:20]:
+        event["_time"] = START
+    events[-1]["_time"] = START + 60 * 500_000
+    report = AnomalyScorer().score(events)
+    assert report["bursts"][0]["events"] == 20
+
+
+@pytest.mark.parametrize("value", [math.inf, math.nan, 10**400])
+def test_non_finite_numeric_values_are_missing(value):
+    events = batch()
+    events[3]["bytes"] = value
+    report = AnomalyScorer().score(events)
+    assert report["numeric"] == []
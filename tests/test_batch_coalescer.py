@@ -0,0 +1,52 @@
+import threading
+
+import pytest
+
+from analysis_queue import AnalysisQueue, QueueFullError
+from batch_coalescer import BatchCoalescer
+
+
+def test_reserved_slot_survives_a_full_queue():
+    release = threading.Event()
+    queue = AnalysisQueue(
+        lambda analysis_id, payload: release.wait(5), workers=1, max_depth=2
+    )
+    queue.reserve()
+    queue.submit("a", [])
+    with pytest.raises(QueueFullError):
+        queue.submit("b", [])
+    with pytest.raises(QueueFullError):
+        queue.reserve()
+    queue.submit("c", [], reserved=True)
+    assert queue.reserved() == 0
+    release.set()
+
+
+def test_size_flush_runs_on_the_flusher_thread():
+    flushed = []
+    done = threading.Event()
+
+    def handler(analysis_id, events, requests):
+        flushed.append(
+            (analysis_id, len(events), requests, threading.current_thread().name)
+        )
+        done.set()
+
+    coalescer = BatchCoalescer(handler, window_seconds=60, max_events=3)
+    assert coalescer.add("src", [{"n": 1}, {"n": 2}], lambda events: "job-1") == "job-1"
+    assert coalescer.add("src", [{"n": 3}], lambda events: "unused") == "job-1"
+    assert done.wait(5)
+    assert flushed == [("job-1", 3, 2, "batch-coalescer")]
+
+
+def test_window_is_not_opened_when_the_queue_is_full():
+    queue = AnalysisQueue(lambda analysis_id, payload: None, workers=1, max_depth=0)
+    coalescer = BatchCoalescer(lambda *args: None, window_seconds=60, max_events=10)
+
+    def open_group(events):
+        queue.reserve()
+        return "job-1"
+
+    with pytest.raises(QueueFullError):
+        coalescer.add("src", [{"n": 1}], open_group)
+    assert coalescer.pending() == (0, 0)
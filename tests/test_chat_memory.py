@@ -0,0 +1,109 @@
+import time
+
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.chat_history import BaseChatMessageHistory  # noqa: E402
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+
+from chat_memory import BoundedChatHistory, compact_content  # noqa: E402
+
+
+class ListHistory(BaseChatMessageHistory):
+    """Plain list store, like the Streamlit session history"""
+
+    def __init__(self):
+        self.messages = []
+
+    def add_message(self, message):
+        self.messages.append(message)
+
+    def clear(self):
+        self.messages = []
+
+
+def conversation(turns, size=100):
+    store = ListHistory()
+    for i in range(turns):
+        store.add_message(HumanMessage(content=f"q{i} ".ljust(size, "q")))
+        store.add_message(AIMessage(content=f"a{i} ".ljust(size, "a")))
+    return store
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_window_keeps_recent_turns_within_budget_and_opens_with_the_analyst():
+    # 80 tokens for messages of 25 tokens: three fit, the leading assistant reply is dropped
+    history = BoundedChatHistory(conversation(3), max_tokens=100, summary_tokens=20)
+    window = history.messages
+    assert [message.content[:2] for message in window] == ["q2", "a2"]
+    usage = history.usage()
+    assert (
+        usage["messages"] == 6
+        and usage["window_messages"] == 2
+        and usage["window_tokens"] == 50
+    )
+
+
+def test_older_turns_stand_in_for_the_summary_until_one_is_written():
+    history = BoundedChatHistory(conversation(3), max_tokens=200, summary_tokens=120)
+    prompt = history.summary_prompt()
+    assert prompt.startswith("\n\nSUMMARY OF THE EARLIER CONVERSATION:\nAnalyst: q0")
+    assert "Assistant: a1" in prompt and "q2" not in prompt
+
+
+def test_background_summary_replaces_the_summarized_turns():
+    prompts = []
+
+    def summarize(prompt):
+        prompts.append(prompt)
+        return "analyst asked about q0 and q1"
+
+    history = BoundedChatHistory(
+        conversation(3), summarize=summarize, max_tokens=100, summary_tokens=20
+    )
+    history.messages
+    wait_for(lambda: history.summarized == 4)
+    assert (
+        "Analyst: q0" in prompts[0]
+        and "Assistant: a1" in prompts[0]
+        and "q2" not in prompts[0]
+    )
+    assert history.summary_prompt().endswith("\nanalyst asked about q0 and q1")
+    assert history.usage()["summarized_messages"] == 4
+
+
+def test_failed_summary_keeps_the_fallback_and_clear_resets():
+    def summarize(prompt):
+        raise RuntimeError("quota")
+
+    history = BoundedChatHistory(
+        conversation(3), summarize=summarize, max_tokens=200, summary_tokens=120
+    )
+    history.messages
+    wait_for(lambda: not history._pending)
+    assert history.summarized == 0 and "Analyst: q0" in history.summary_prompt()
+
+    history.clear()
+    assert history.messages == [] and history.summary_prompt() == ""
+
+
+def test_large_payloads_are_cut_to_their_first_lines_with_a_reference():
+    dump = "\n".join(f"line {i} from cribl_abc-123" for i in range(200))
+    compacted = compact_content(dump, 100)
+    assert compacted.startswith("line 0 from") and len(compacted) < 100 * 4 + 100
+    assert compacted.endswith("omitted; analysis cribl_abc-123]")
+    assert compact_content("short", 100) == "short"
+    assert "sha1 " in compact_content("x" * 1000, 50)
+
+    store = ListHistory()
+    store.add_message(HumanMessage(content=dump))
+    (message,) = BoundedChatHistory(store, payload_tokens=100).messages
+    assert isinstance(message, HumanMessage) and message.content == compacted
+    assert store.messages[0].content == dump
@@ -0,0 +1,101 @@
+import math
+
+from entity_baselines import EntityBaselines
+from event_archive import event_time
+
+BAD_TIMES = [math.nan, math.inf, -math.inf, 1e300, -5, "NaN", "9999999999999"]
+
+
+def test_event_time_skips_unusable_values():
+    for value in BAD_TIMES:
+        assert event_time({"_time": value}, 42.0) == 42.0
+    assert (
+        event_time({"_time": math.nan, "timestamp": "2024-01-15T10:00:00Z"}, 0)
+        == 1705312800.0
+    )
+
+
+def test_assess_accepts_unusable_timestamps():
+    baselines = EntityBaselines(min_events=1)
+    events = [
+        {"user": "alice", "action": "login", "_time": value} for value in BAD_TIMES
+    ]
+    baselines.assess(events)
+    reports = baselines.assess(events)
+    assert reports[0]["entity"] == "user:alice"
+    assert reports[0]["score"] is not None
+
+
+def history(day):
+    base = 1705312800 + day * 86400
+    return [
+        {
+            "user": "alice",
+            "host": "srv-01",
+            "action": "login",
+            "status": "success",
+            "file_path": f"/home/alice/{i % 3}.txt",
+            "source_ip": "10.0.0.5",
+            "_time": base + i * 60,
+        }
+        for i in range(40)
+    ]
+
+
+UNUSUAL = [
+    {
+        "user": "alice",
+        "host": "srv-01",
+        "action": "login",
+        "status": "failure",
+        "file_path": "/etc/shadow",
+        "source_ip": "203.0.113.9",
+        "_time": 1705312800 + 30 * 86400 + i,
+    }
+    for i in range(20)
+]
+
+
+def scores(reports):
+    return {report["entity"]: report["score"] for report in reports}
+
+
+def test_sqlite_store_matches_memory_and_is_shared(tmp_path):
+    from entity_baselines import SQLiteEntityBaselines
+
+    path = str(tmp_path / "baselines.db")
+    memory = EntityBaselines()
+    worker_a = SQLiteEntityBaselines(path)
+    worker_b = SQLiteEntityBaselines(path)
+    for day in range(3):
+        memory.observe(history(day))
+        (worker_a if day % 2 else worker_b).observe(history(day))
+
+    expected = scores(memory.assess(UNUSUAL))
+    assert expected["user:alice"] > 0
+    assert scores(worker_a.assess(UNUSUAL)) == expected
+
+    # A restarted worker keeps the history, including the batch just learned
+    restarted = SQLiteEntityBaselines(path)
+    assert restarted.snapshot()["entities"] == 2
+    memory.observe(history(4))
+    restarted.observe(history(4))
+    assert scores(restarted.assess(UNUSUAL)) == scores(memory.assess(UNUSUAL))
+
+
+def test_observe_later_learns_on_the_writer_thread(tmp_path):
+    import time
+
+    from entity_baselines import SQLiteEntityBaselines
+
+    memory = EntityBaselines()
+    shared = SQLiteEntityBaselines(str(tmp_path / "baselines.db"))
+    for day in range(3):
+        memory.observe(history(day))
+        shared.observe_later(history(day))
+    deadline = time.monotonic() + 10
+    while shared.snapshot()["batches"] < 3:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+    assert shared.snapshot()["events"] == 120
+    assert scores(shared.assess(UNUSUAL)) == scores(memory.assess(UNUSUAL))
@@ -0,0 +1,52 @@
+from event_aggregation import aggregate_events
+
+
+def test_exact_repeats_apart_from_time_collapse_in_order_of_first_appearance():
+    events = [
+        {"user": "alice", "action": "login", "_time": 30},
+        "raw line",
+        {"user": "bob", "action": "login", "_time": 5},
+        {"user": "alice", "action": "login", "_time": 10},
+        {"user": "alice", "action": "login", "_time": 20},
+    ]
+    assert aggregate_events(events) == [
+        {
+            "user": "alice",
+            "action": "login",
+            "event_count": 3,
+            "first_seen": 10,
+            "last_seen": 30,
+        },
+        "raw line",
+        {"user": "bob", "action": "login", "_time": 5},
+    ]
+
+
+def test_key_fields_group_differing_events_and_sample_their_values():
+    events = [
+        {
+            "user": "alice",
+            "src_ip": f"10.0.0.{i}",
+            "bytes": [i],
+            "timestamp": f"2024-01-15T10:0{i}:00Z",
+        }
+        for i in range(5)
+    ]
+    (record,) = aggregate_events(events, key_fields=["user"], max_samples=2)
+    assert record["user"] == "alice" and record["event_count"] == 5
+    assert record["sample_values"] == {
+        "src_ip": ["10.0.0.0", "10.0.0.1"],
+        "bytes": [[0], [1]],
+    }
+    assert (record["first_seen"], record["last_seen"]) == (
+        "2024-01-15T10:00:00Z",
+        "2024-01-15T10:04:00Z",
+    )
+
+
+def test_mixed_time_types_do_not_break_the_bounds():
+    (record,) = aggregate_events([{"a": 1, "_time": 5}, {"a": 1, "_time": "later"}])
+    assert record["event_count"] == 2 and {
+        record["first_seen"],
+        record["last_seen"],
+    } == {5, "later"}
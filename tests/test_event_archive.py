@@ -0,0 +1,71 @@
+import glob
+import os
+import time
+
+from event_archive import EventArchive
+
+START = 1_700_000_000
+
+
+def archived(archive, batches):
+    deadline = time.monotonic() + 10
+    while archive.snapshot()["batches"] < batches:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def make_archive(tmp_path):
+    archive = EventArchive(str(tmp_path), frame_events=10, fsync_interval=0.01)
+    archive.append(
+        "batch-1",
+        [
+            {"user": "alice", "src_ip": "10.0.0.1", "_time": START + i}
+            for i in range(20)
+        ],
+    )
+    archive.append(
+        "batch-2",
+        [
+            {"user": "bob", "src_ip": "10.0.0.2", "_time": START + 100 + i}
+            for i in range(5)
+        ],
+    )
+    archived(archive, 2)
+    return archive
+
+
+def test_query_filters_and_orders_newest_frames_first(tmp_path):
+    archive = make_archive(tmp_path)
+    found = archive.query(user="alice", limit=100)
+    assert len(found["events"]) == 20
+    assert found["frames_total"] == 3
+    assert found["frames_scanned"] == 2  # bob's frame is ruled out by its index entry
+    assert archive.query(limit=5)["events"][0]["analysis_id"] == "batch-2"
+    assert len(archive.query(start=START + 15, end=START + 102)["events"]) == 8
+
+
+def test_read_new_returns_only_what_was_added(tmp_path):
+    archive = make_archive(tmp_path)
+    records, positions = archive.read_new(max_events=5)
+    assert [record["analysis_id"] for record in records] == ["batch-2"] * 5
+    archive.append("batch-3", [{"user": "carol"}])
+    archived(archive, 3)
+    records, positions = archive.read_new(positions)
+    assert [record["event"]["user"] for record in records] == ["carol"]
+    assert archive.read_new(positions)[0] == []
+
+
+def test_corrupt_frame_is_skipped(tmp_path):
+    archive = make_archive(tmp_path)
+    (segment,) = glob.glob(os.path.join(str(tmp_path), "segment-*.ndjson.gz"))
+    with open(segment, "r+b") as f:
+        f.seek(20)
+        f.write(b"\xff" * 16)  # inside the first frame's deflate stream
+    found = archive.query(limit=100)
+    assert found["frames_scanned"] == 2
+    assert {record["analysis_id"] for record in found["events"]} == {
+        "batch-1",
+        "batch-2",
+    }
+    records, _ = archive.read_new()
+    assert len(records) == 15
@@ -0,0 +1,69 @@
+import multiprocessing
+import os
+
+from hot_store import ColumnarHotStore, _layout
+
+SEGMENT_ROWS = 64
+
+
+def batch(user, rows):
+    return [
+        {"user": user, "action": "login", "_time": 1700000000 + i} for i in range(rows)
+    ]
+
+
+def other_worker(directory, commands, done):
+    store = ColumnarHotStore(
+        directory, segment_rows=SEGMENT_ROWS, retention_seconds=0, max_bytes=0
+    )
+    while True:
+        command = commands.get()
+        if command is None:
+            return
+        store.append("worker-b", batch("bob", command))
+        done.put(True)
+
+
+def test_byte_budget_spares_another_live_process_segment(tmp_path):
+    context = multiprocessing.get_context("fork")
+    commands, done = context.Queue(), context.Queue()
+    worker = context.Process(target=other_worker, args=(str(tmp_path), commands, done))
+    worker.start()
+    try:
+        commands.put(10)
+        assert done.get(timeout=10)
+
+        # Room for two segments: every rollover of this process prunes the oldest ones
+        budget = 2 * _layout(SEGMENT_ROWS)[1]
+        store = ColumnarHotStore(
+            str(tmp_path),
+            segment_rows=SEGMENT_ROWS,
+            retention_seconds=0,
+            max_bytes=budget,
+        )
+        for _ in range(5):
+            store.append("worker-a", batch("alice", SEGMENT_ROWS))
+
+        commands.put(5)
+        assert done.get(timeout=10)
+        assert store.query({"user": "bob"})["total"] == 15
+        owners = {
+            os.path.basename(path).split("-")[2]
+            for path in os.listdir(tmp_path)
+            if path.endswith(".seg")
+        }
+        assert str(worker.pid) in owners
+    finally:
+        commands.put(None)
+        worker.join(10)
+
+
+def test_writer_reopens_a_segment_deleted_under_it(tmp_path):
+    store = ColumnarHotStore(
+        str(tmp_path), segment_rows=SEGMENT_ROWS, retention_seconds=0, max_bytes=0
+    )
+    store.append("a", batch("alice", 3))
+    os.remove(store._writer.path)
+    os.remove(f"{store._writer.path}.dict")
+    store.append("b", batch("bob", 2))
+    assert store.query({"user": "bob"})["total"] == 2
@@ -0,0 +1,49 @@
+import multiprocessing
+
+from job_journal import MAX_ATTEMPTS, SQLiteJobJournal
+
+
+def save_and_exit(path, analysis_id, job):
+    SQLiteJobJournal(path).save(analysis_id, job)
+
+
+def saved_by_stopped_worker(path, analysis_id, job):
+    worker = multiprocessing.get_context("fork").Process(
+        target=save_and_exit, args=(path, analysis_id, job)
+    )
+    worker.start()
+    worker.join()
+
+
+def test_live_jobs_are_not_recovered_and_finished_jobs_are_gone(tmp_path):
+    journal = SQLiteJobJournal(str(tmp_path / "results.db"))
+    journal.save("a", {"events": [1]})
+    journal.save("b", {"events": [2]})
+    journal.finish("b")
+    assert journal.recover(10) == ([], [])
+    journal.release()
+    assert journal.recover(10) == ([("a", {"events": [1]})], [])
+
+
+def test_jobs_of_a_stopped_worker_are_recovered_up_to_the_limit(tmp_path):
+    path = str(tmp_path / "results.db")
+    for analysis_id in ("a", "b", "c"):
+        saved_by_stopped_worker(path, analysis_id, {"events": [analysis_id]})
+    saved_by_stopped_worker(path, "window", None)
+
+    journal = SQLiteJobJournal(path)
+    jobs, abandoned = journal.recover(2)
+    assert [analysis_id for analysis_id, _ in jobs] == ["a", "b"]
+    assert abandoned == ["window"]
+    # Claimed by this (live) process now; the rest waits for room in the queue
+    assert journal.recover(2) == ([("c", {"events": ["c"]})], [])
+
+
+def test_job_is_abandoned_after_repeated_recoveries(tmp_path):
+    journal = SQLiteJobJournal(str(tmp_path / "results.db"))
+    journal.save("a", {"events": []})
+    for _ in range(MAX_ATTEMPTS):
+        journal.release()
+        assert journal.recover(10)[0] == [("a", {"events": []})]
+    journal.release()
+    assert journal.recover(10) == ([], ["a"])
@@ -0,0 +1,69 @@
+from llm_cache import LLMResponseCache, cache_key
+
+PAYLOAD = '{"user": "alice", "_time": "2024-01-15T10:00:00Z"}\n{"user": "bob", "_time": "2024-01-15T10:00:01Z"}'
+
+
+def test_key_ignores_whitespace_and_volatile_fields_but_not_prompt_or_model():
+    key = cache_key(PAYLOAD, "template", "model", ignore_fields=("_time",))
+    reformatted = (
+        "\n  " + PAYLOAD.replace("10:00:0", "11:30:0").replace("\n", "\n\n   ") + "  \n"
+    )
+    assert cache_key(reformatted, "template", "model", ignore_fields=("_time",)) == key
+    assert cache_key(reformatted, "template", "model") != cache_key(
+        PAYLOAD, "template", "model"
+    )
+    assert (
+        cache_key(PAYLOAD, "other template", "model", ignore_fields=("_time",)) != key
+    )
+    assert (
+        cache_key(PAYLOAD, "template", "other model", ignore_fields=("_time",)) != key
+    )
+
+
+def test_disk_tier_is_shared_and_fills_the_memory_tier(tmp_path):
+    path = str(tmp_path / "cache.db")
+    worker_a = LLMResponseCache(disk_path=path)
+    worker_b = LLMResponseCache(disk_path=path)
+    worker_a.set("k", {"threat_level": "LOW"})
+    assert worker_b.get("k") == {"threat_level": "LOW"}
+    assert worker_b.get("k") == {"threat_level": "LOW"}
+    stats = worker_b.snapshot()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["hit_ratio"]) == (1, 1, 1.0)
+    assert worker_b.get("missing") is None
+    assert worker_b.snapshot()["misses"] == 1
+
+
+def test_memory_tier_is_bounded_by_bytes_least_recently_used_first():
+    cache = LLMResponseCache(max_bytes=100)
+    value = {"summary": "x" * 30}  # about 45 bytes as JSON
+    cache.set("a", value)
+    cache.set("b", value)
+    cache.get("a")
+    cache.set("c", value)
+    assert (
+        cache.get("a") == value and cache.get("c") == value and cache.get("b") is None
+    )
+    assert cache.snapshot()["memory_bytes"] <= 100
+
+
+def test_expired_entries_are_misses_in_both_tiers(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("llm_cache.time.time", lambda: clock[0])
+    cache = LLMResponseCache(ttl_seconds=60, disk_path=str(tmp_path / "cache.db"))
+    cache.set("k", {"threat_level": "HIGH"})
+    clock[0] += 61
+    assert cache.get("k") is None
+    assert LLMResponseCache(ttl_seconds=60, disk_path=cache.disk_path).get("k") is None
+
+
+def test_disk_tier_drops_the_oldest_entries_past_its_budget(tmp_path, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("llm_cache.time.time", lambda: clock[0])
+    path = str(tmp_path / "cache.db")
+    cache = LLMResponseCache(disk_path=path, disk_max_bytes=100, ttl_seconds=0)
+    for key in "abc":
+        clock[0] += 1
+        cache.set(key, {"summary": "x" * 30})
+    fresh = LLMResponseCache(disk_path=path, ttl_seconds=0)
+    assert fresh.get("a") is None
+    assert fresh.get("b") is not None and fresh.get("c") is not None
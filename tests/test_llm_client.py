@@ -0,0 +1,117 @@
+import io
+import json
+import time
+
+import pytest
+import requests
+
+from llm_client import GeminiClient, LLMError, LLMRateLimitedError, LLMUnavailableError
+
+RESET = 0.05
+OK_BODY = {"candidates": [{"content": {"parts": [{"text": "THREAT_LEVEL: LOW"}]}}]}
+
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.text = "" if status_code == 200 else f"status {status_code}"
+        self.headers = {}
+
+    def json(self):
+        return OK_BODY
+
+
+def make_client(statuses, **kwargs):
+    """Client whose session answers with `statuses` in turn (an exception class is raised)"""
+    client = GeminiClient(
+        "key",
+        "model",
+        max_retries=0,
+        breaker_threshold=1,
+        breaker_reset=RESET,
+        **kwargs,
+    )
+    answers = iter(statuses)
+
+    def post(url, **_):
+        answer = next(answers)
+        if isinstance(answer, type):
+            raise answer("boom")
+        return FakeResponse(answer)
+
+    client.session.post = post
+    return client
+
+
+def open_breaker(client):
+    with pytest.raises(LLMError):
+        client.generate("prompt")
+    assert client.breaker.state == "open"
+    with pytest.raises(LLMUnavailableError):
+        client.generate("prompt")
+    time.sleep(RESET * 1.5)
+    assert client.breaker.state == "half_open"
+
+
+def test_successful_trial_closes_the_breaker():
+    client = make_client([500, 200])
+    open_breaker(client)
+    assert client.generate("prompt") == "THREAT_LEVEL: LOW"
+    assert client.breaker.state == "closed"
+
+
+def test_failed_trial_reopens_the_breaker():
+    client = make_client([500, 503])
+    open_breaker(client)
+    with pytest.raises(LLMError):
+        client.generate("prompt")
+    assert client.breaker.state == "open"
+
+
+def test_client_error_on_trial_closes_the_breaker():
+    client = make_client([500, 400, 200])
+    open_breaker(client)
+    with pytest.raises(LLMError):
+        client.generate("prompt")
+    assert client.breaker.state == "closed"
+    assert client.generate("prompt") == "THREAT_LEVEL: LOW"
+
+
+def test_rate_limited_trial_is_released_and_refunded():
+    client = make_client([500, 200], requests_per_minute=1, max_queue_wait=0)
+    open_breaker(client)
+    tokens = client.request_bucket.tokens
+    with pytest.raises(LLMRateLimitedError):
+        client.generate("prompt")
+    assert client.request_bucket.tokens >= tokens
+    assert client.breaker.state == "half_open"
+    client.request_bucket.tokens = 1
+    assert client.generate("prompt") == "THREAT_LEVEL: LOW"
+    assert client.breaker.state == "closed"
+
+
+def test_unexpected_error_on_trial_releases_it():
+    client = make_client([500, ValueError, 200])
+    open_breaker(client)
+    with pytest.raises(ValueError):
+        client.generate("prompt")
+    assert client.breaker.state == "half_open"
+    assert client.generate("prompt") == "THREAT_LEVEL: LOW"
+    assert client.breaker.state == "closed"
+
+
+def test_stream_without_charset_is_decoded_as_utf8():
+    text = "Zugriff für Müller verweigert – 攻撃"
+    chunk = {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+    response = requests.Response()
+    response.status_code = 200
+    response.headers["Content-Type"] = "text/event-stream"
+    response.encoding = requests.utils.get_encoding_from_headers(
+        response.headers
+    )  # as the adapter sets it
+    response.raw = io.BytesIO(
+        f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8")
+    )
+    client = make_client([])
+    client.session.post = lambda url, **_: response
+    assert "".join(client.generate_stream("prompt")) == text
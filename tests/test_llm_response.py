@@ -0,0 +1,90 @@
+import json
+
+import pytest
+
+from llm_response import (
+    DEFAULT_ANALYSIS,
+    parse_analysis,
+    parse_json_analysis,
+    parse_text_analysis,
+)
+
+
+def test_text_sections_parse_in_any_order_with_markdown_headers():
+    text = """## Summary
+Brute force against the VPN.
+
+**THREAT_LEVEL:** **HIGH** - lateral movement
+🚨 *Risk Score*: 8/10
+
+### Key Findings
+- 40 failed logins
+- Recommendations: rotate keys soon
+
+Immediate Actions:
+Block 10.0.0.5
+RECOMMENDATIONS:
+Enforce MFA
+"""
+    parsed = parse_text_analysis(text)
+    assert parsed["threat_level"] == "HIGH" and parsed["risk_score"] == "8"
+    assert parsed["summary"] == "Brute force against the VPN."
+    assert (
+        parsed["key_findings"]
+        == "- 40 failed logins\n- Recommendations: rotate keys soon"
+    )
+    assert parsed["immediate_actions"] == "Block 10.0.0.5"
+    assert parsed["recommendations"] == "Enforce MFA"
+
+
+def test_missing_text_sections_keep_their_defaults():
+    parsed = parse_text_analysis("threat level: critical\nno other headers here")
+    assert parsed["threat_level"] == "CRITICAL"
+    assert parsed["risk_score"] == DEFAULT_ANALYSIS["risk_score"]
+    assert parsed["recommendations"] == DEFAULT_ANALYSIS["recommendations"]
+
+
+def test_json_analysis_is_validated_and_lists_become_bullets():
+    payload = {
+        "threat_level": "medium",
+        "risk_score": "5",
+        "summary": " Port scan ",
+        "key_findings": ["scan from 1.2.3.4", " "],
+        "immediate_actions": [],
+        "recommendations": None,
+    }
+    parsed = parse_json_analysis("```json\n" + json.dumps(payload) + "\n```")
+    assert parsed["threat_level"] == "MEDIUM" and parsed["risk_score"] == "5"
+    assert parsed["summary"] == "Port scan"
+    assert parsed["key_findings"] == "- scan from 1.2.3.4"
+    assert parsed["immediate_actions"] == DEFAULT_ANALYSIS["immediate_actions"]
+    assert parsed["recommendations"] == DEFAULT_ANALYSIS["recommendations"]
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        "[1, 2]",
+        '{"threat_level": "HIGH"}',
+        '{"threat_level": "SEVERE", "risk_score": 5}',
+        '{"threat_level": "HIGH", "risk_score": 11}',
+        '{"threat_level": "HIGH", "risk_score": true}',
+        '{"threat_level": "HIGH", "risk_score": 5, "summary": {"nested": 1}}',
+        "no json at all",
+    ],
+)
+def test_nonconforming_json_is_rejected(payload):
+    with pytest.raises(ValueError):
+        parse_json_analysis(payload)
+
+
+def test_parse_analysis_records_which_parser_succeeded():
+    as_json = json.dumps({"threat_level": "LOW", "risk_score": 2})
+    assert parse_analysis(as_json)["response_format"] == "json"
+    assert parse_analysis(as_json, output_format="json")["response_format"] == "json"
+    fallback = parse_analysis("THREAT_LEVEL: LOW\nRISK_SCORE: 2", output_format="json")
+    assert (
+        fallback["response_format"] == "text_fallback"
+        and fallback["threat_level"] == "LOW"
+    )
+    assert parse_analysis("THREAT_LEVEL: LOW")["response_format"] == "text"
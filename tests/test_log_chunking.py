@@ -0,0 +1,71 @@
+from log_chunking import (
+    CHARS_PER_TOKEN,
+    chunk_entries,
+    format_chunk_findings,
+    merge_analyses,
+    normalize_risk_score,
+    normalize_threat_level,
+)
+
+
+def test_chunks_fit_the_budget_and_keep_entry_order():
+    entries = [f"event {i} " + "x" * (i * 7 % 40) for i in range(200)]
+    chunks = chunk_entries(entries, max_tokens=50)
+    assert all(len(chunk) <= 50 * CHARS_PER_TOKEN for chunk in chunks)
+    assert "\n".join(chunks).split("\n") == entries
+
+
+def test_oversized_entry_is_split_by_lines_then_characters():
+    entry = "short line\n" + "y" * 500
+    chunks = chunk_entries(["before", entry, "after"], max_tokens=25)
+    assert all(len(chunk) <= 100 for chunk in chunks)
+    assert "".join(chunks).replace("\n", "") == ("before" + entry + "after").replace(
+        "\n", ""
+    )
+
+
+def test_threat_level_and_risk_score_are_read_from_free_text():
+    assert normalize_threat_level("**HIGH** - lateral movement") == "HIGH"
+    assert normalize_threat_level("MEDIUM to CRITICAL") == "CRITICAL"
+    assert normalize_threat_level("highway") == "UNKNOWN"
+    assert normalize_risk_score("Risk: 7/10") == 7
+    assert normalize_risk_score("n/a") is None
+
+
+def test_merge_takes_the_worst_chunk_and_deduplicates_sections():
+    chunks = [
+        {
+            "status": "success",
+            "threat_level": "LOW",
+            "risk_score": "3",
+            "summary": "logins",
+            "key_findings": "- failed logins\n- new IP",
+            "immediate_actions": "",
+            "recommendations": "- MFA",
+        },
+        {"status": "error", "error": "timeout"},
+        {
+            "status": "success",
+            "threat_level": "HIGH",
+            "risk_score": "8/10",
+            "summary": "shadow read",
+            "key_findings": "- new IP\n- /etc/shadow read",
+            "immediate_actions": "- lock root",
+            "recommendations": "- MFA",
+        },
+    ]
+    merged = merge_analyses(chunks)
+    assert (merged["threat_level"], merged["risk_score"]) == ("HIGH", "8")
+    assert merged["key_findings"] == "- failed logins\n- new IP\n- /etc/shadow read"
+    assert merged["recommendations"] == "- MFA"
+    assert merged["summary"] == "[Chunk 1/3] logins\n[Chunk 3/3] shadow read"
+    assert (merged["chunks"], merged["failed_chunks"]) == (3, 1)
+    assert "CHUNK 3:\nTHREAT_LEVEL: HIGH" in format_chunk_findings(chunks)
+    assert "CHUNK 2" not in format_chunk_findings(chunks)
+
+
+def test_merge_of_failed_chunks_reports_the_first_error():
+    merged = merge_analyses(
+        [{"status": "error", "error": "quota"}, {"status": "error", "error": "timeout"}]
+    )
+    assert merged == {"status": "error", "error": "quota", "chunks": 2}
@@ -0,0 +1,63 @@
+import gzip
+import io
+import json
+import time
+
+import pytest
+
+from log_ingest import (
+    PayloadTooLargeError,
+    RawText,
+    iter_body_bytes,
+    iter_body_text,
+    iter_json_events,
+)
+
+
+def split(text, size):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize("size", [1, 3, 64 * 1024])
+def test_array_ndjson_and_single_value(size):
+    events = [{"user": "alice", "n": 1}, {"user": "bob", "n": 22}, 333]
+    assert list(iter_json_events(split(json.dumps(events), size))) == events
+    assert (
+        list(iter_json_events(split("\n".join(map(json.dumps, events)), size)))
+        == events
+    )
+    assert list(iter_json_events(split(json.dumps(events[0]), size))) == [events[0]]
+
+
+def test_invalid_remainder_is_passed_through():
+    parsed = list(iter_json_events(split('[{"a": 1}, {oops}]', 4)))
+    assert parsed[0] == {"a": 1}
+    assert isinstance(parsed[1], RawText) and parsed[1].startswith("{oops}")
+
+
+def test_large_single_object_is_parsed_in_linear_time():
+    value = {
+        "events": [{"message": "x" * 100, "n": i} for i in range(80000)]
+    }  # about 10 MB
+    chunks = split(json.dumps(value), 64 * 1024)
+    started = time.monotonic()
+    parsed = list(iter_json_events(chunks))
+    assert time.monotonic() - started < 1
+    assert parsed == [value]
+
+
+def test_gzip_body_is_inflated_incrementally_and_bounded():
+    body = json.dumps([{"message": "é" * 10}] * 100).encode()
+    chunks = iter_body_bytes(
+        io.BytesIO(gzip.compress(body)), gzipped=True, chunk_size=100
+    )
+    assert "".join(iter_body_text(chunks)) == body.decode()
+    with pytest.raises(PayloadTooLargeError):
+        list(
+            iter_body_bytes(
+                io.BytesIO(gzip.compress(body)),
+                gzipped=True,
+                max_bytes=1000,
+                chunk_size=100,
+            )
+        )
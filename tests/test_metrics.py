@@ -0,0 +1,52 @@
+import json
+import os
+
+from metrics import MetricsRegistry, clear_metrics_directory
+
+
+def write_snapshot(directory, filename, pid, requests, workers):
+    with open(os.path.join(directory, filename), "w") as f:
+        json.dump(
+            {
+                "pid": pid,
+                "metrics": {
+                    "requests_total": {
+                        "type": "counter",
+                        "help": "",
+                        "labels": [],
+                        "samples": [[[], requests]],
+                    },
+                    "workers": {
+                        "type": "gauge",
+                        "help": "",
+                        "labels": [],
+                        "samples": [[[], workers]],
+                        "mode": "sum",
+                    },
+                },
+            },
+            f,
+        )
+
+
+def make_registry(directory):
+    registry = MetricsRegistry(str(directory), flush_interval=60)
+    requests = registry.counter("requests_total", "")
+    workers = registry.gauge("workers", "")
+    requests.inc()
+    workers.set(1)
+    return registry
+
+
+def test_clear_drops_snapshots_of_earlier_runs(tmp_path):
+    write_snapshot(tmp_path, "1234.json", 1234, 500, 1)
+    clear_metrics_directory(str(tmp_path))
+    assert os.listdir(tmp_path) == []
+    assert "requests_total 1\n" in make_registry(tmp_path).render()
+
+
+def test_recycled_pid_snapshot_counts_as_exited(tmp_path):
+    write_snapshot(tmp_path, f"{os.getpid()}.json", os.getpid(), 5, 3)
+    text = make_registry(tmp_path).render()
+    assert "requests_total 6\n" in text
+    assert "workers 1\n" in text
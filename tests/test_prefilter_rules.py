@@ -0,0 +1,146 @@
+import json
+import os
+
+from prefilter_rules import RuleEngine, RuleSet, extract_hour
+
+RULES = {
+    "escalate_score": 5,
+    "rules": [
+        {
+            "name": "repeated_failures",
+            "field": "failed_attempts",
+            "op": "gt",
+            "value": 2,
+            "score": 5,
+        },
+        {
+            "name": "sensitive_path",
+            "field": "file.path",
+            "op": "regex",
+            "value": ["^/sensitive/"],
+            "score": 4,
+        },
+        {
+            "name": "admin",
+            "field": "user",
+            "op": "in",
+            "value": ["root", "admin"],
+            "score": 1,
+        },
+        {
+            "name": "off_hours",
+            "field": "timestamp",
+            "op": "hour_between",
+            "value": [22, 6],
+            "score": 3,
+        },
+        {
+            "name": "raw_denied",
+            "field": "*",
+            "op": "regex",
+            "value": "denied",
+            "score": 5,
+        },
+    ],
+}
+
+
+def test_batch_scores_its_worst_event_and_counts_rule_matches():
+    result = RuleSet(RULES).evaluate(
+        [
+            {
+                "user": "admin",
+                "file": {"path": "/SENSITIVE/keys"},
+                "timestamp": "2024-01-15T12:00:00Z",
+            },
+            {"user": "alice", "failed_attempts": "many"},
+            {"user": "root", "timestamp": "2024-01-15T03:10:00Z"},
+        ]
+    )
+    assert result["score"] == 5.0 and result["escalate"]
+    assert result["matched_rules"] == {"sensitive_path": 1, "admin": 2, "off_hours": 1}
+    assert result["events"] == 3
+
+
+def test_benign_batch_stays_below_the_threshold():
+    result = RuleSet(RULES).evaluate(
+        [{"user": "alice", "failed_attempts": 1, "timestamp": "2024-01-15T09:00:00Z"}]
+    )
+    assert result == {
+        "score": 0.0,
+        "threshold": 5.0,
+        "escalate": False,
+        "matched_rules": {},
+        "events": 1,
+    }
+
+
+def test_raw_events_match_the_star_field_and_escalate_when_unparsed():
+    assert RuleSet(RULES).evaluate(["sshd: access denied for bob"])[
+        "matched_rules"
+    ] == {"raw_denied": 1}
+    quiet = {**RULES, "escalate_unparsed": False}
+    assert RuleSet(quiet).evaluate(["ok"])["escalate"] is False
+    assert RuleSet(RULES).evaluate(["ok"])["escalate"] is True
+
+
+def test_hour_between_wraps_past_midnight():
+    ruleset = RuleSet({"rules": [RULES["rules"][3]]})
+    matched = [
+        hour
+        for hour in range(24)
+        if ruleset.evaluate([{"timestamp": f"2024-01-15T{hour:02d}:30:00Z"}])["score"]
+    ]
+    assert matched == [0, 1, 2, 3, 4, 5, 22, 23]
+
+
+def test_extract_hour_reads_epochs_iso_and_clock_strings():
+    assert extract_hour(0) == 0
+    assert (
+        extract_hour(1_700_000_000) == extract_hour(1_700_000_000_000) == 22
+    )  # seconds and milliseconds
+    assert extract_hour("07:45") == 7
+    assert extract_hour("2024-01-15 23:01:00") == 23
+    assert (
+        extract_hour(float("nan")) is None
+        and extract_hour(True) is None
+        and extract_hour("25:00") is None
+    )
+
+
+def test_unknown_operator_is_rejected():
+    try:
+        RuleSet({"rules": [{"field": "a", "op": "like", "value": 1}]})
+    except ValueError as e:
+        assert "like" in str(e)
+    else:
+        raise AssertionError("expected ValueError")
+
+
+def test_engine_reloads_the_file_and_keeps_old_rules_on_a_bad_edit(tmp_path):
+    path = tmp_path / "rules.json"
+    path.write_text(
+        json.dumps(
+            {"escalate_score": 1, "rules": [{"field": "a", "op": "exists", "score": 1}]}
+        )
+    )
+    engine = RuleEngine(str(path), reload_interval=0)
+    assert engine.evaluate([{"a": 1}])["escalate"]
+
+    path.write_text(
+        json.dumps(
+            {"escalate_score": 1, "rules": [{"field": "b", "op": "exists", "score": 1}]}
+        )
+    )
+    os.utime(path, (1, 1))
+    assert not engine.evaluate([{"a": 1}])["escalate"]
+    assert engine.evaluate([{"b": 1}])["escalate"]
+
+    path.write_text("{not json")
+    os.utime(path, (2, 2))
+    assert engine.evaluate([{"b": 1}])["escalate"]
+
+
+def test_engine_without_a_rules_file_escalates_everything(tmp_path):
+    engine = RuleEngine(str(tmp_path / "missing.json"))
+    assert engine.evaluate([{"a": 1}])["escalate"]
@@ -0,0 +1,36 @@
+import csv
+import io
+import json
+
+import pytest
+
+from prompt_encoding import encode_event, encode_events
+
+EVENTS = [
+    {"user": "alice", "action": "login", "meta": {"ip": "10.0.0.1"}, "debug": "x"},
+    {"user": "bob, jr.", "status": "failed", "debug": "y"},
+    "raw syslog line",
+]
+
+
+def test_json_rows_are_compact_and_round_trip():
+    header, rows = encode_events(EVENTS, "json", drop_fields=("debug",))
+    assert header == ""
+    assert rows[0] == '{"user":"alice","action":"login","meta":{"ip":"10.0.0.1"}}'
+    assert json.loads(rows[1]) == {"user": "bob, jr.", "status": "failed"}
+    assert rows[2] == "raw syslog line"
+
+
+def test_table_emits_shared_keys_once_and_quotes_cells():
+    header, rows = encode_events(EVENTS, "table", drop_fields=("debug",))
+    assert header == "user,action,meta,status"
+    parsed = list(csv.reader(io.StringIO("\n".join([header] + rows[:2]))))
+    assert parsed[1] == ["alice", "login", '{"ip":"10.0.0.1"}', ""]
+    assert parsed[2] == ["bob, jr.", "", "", "failed"]
+    assert rows[2] == "raw syslog line"
+
+
+def test_pretty_keeps_the_legacy_layout_and_unknown_formats_fail():
+    assert encode_event(EVENTS[0], "pretty") == json.dumps(EVENTS[0], indent=2)
+    with pytest.raises(ValueError):
+        encode_events(EVENTS, "yaml")
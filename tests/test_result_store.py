@@ -0,0 +1,109 @@
+import json
+import sqlite3
+import time
+
+import pytest
+
+from result_store import MemoryResultStore, SQLiteResultStore
+
+
+def test_expired_results_go_from_the_oldest_end(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("result_store.time.time", lambda: clock[0])
+    store = MemoryResultStore(max_items=10, ttl_seconds=100)
+    store.put("old", {"status": "success"})
+    clock[0] += 60
+    store.put("new", {"status": "success"})
+    assert store.get("old") is not None  # recently used, but still the oldest result
+    clock[0] += 50
+    store.put("newest", {"status": "queued"})
+    assert [analysis_id for analysis_id, _ in store.items()] == ["newest", "new"]
+    assert len(store) == 2
+
+
+def test_least_recently_used_result_is_evicted_first():
+    store = MemoryResultStore(max_items=2, ttl_seconds=0)
+    store.put("a", {})
+    store.put("b", {})
+    store.get("a")
+    store.put("c", {})
+    assert "a" in store and "c" in store and "b" not in store
+    store.delete("a")
+    store.put("d", {})
+    assert len(store) == 2
+
+
+@pytest.mark.parametrize("ttl", [0, 86400])
+def test_put_cost_does_not_grow_with_the_store(ttl):
+    store = MemoryResultStore(max_items=100000, ttl_seconds=ttl)
+    started = time.monotonic()
+    for i in range(20000):
+        store.put(str(i), {})
+    assert time.monotonic() - started < 2
+    assert len(store) == 20000
+
+
+def analyzed(level, status="success"):
+    return {"status": status, "ai_analysis": {"threat_level": level} if level else None}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def store(request, tmp_path):
+    if request.param == "memory":
+        return MemoryResultStore(max_items=100, ttl_seconds=0)
+    return SQLiteResultStore(str(tmp_path / "results.db"), max_items=100, ttl_seconds=0)
+
+
+def test_changes_feed_pages_through_puts_and_updates(store):
+    for i in range(5):
+        store.put(f"r{i}", analyzed(None, "queued"))
+    cursor, changed, has_more = store.changes(0, limit=3)
+    assert [analysis_id for analysis_id, _ in changed] == [
+        "r0",
+        "r1",
+        "r2",
+    ] and has_more
+    cursor, changed, has_more = store.changes(cursor, limit=3)
+    assert [analysis_id for analysis_id, _ in changed] == ["r3", "r4"] and not has_more
+
+    store.update("r1", **analyzed("HIGH"))
+    cursor, changed, _ = store.changes(cursor)
+    assert changed == [("r1", analyzed("HIGH"))]
+    assert store.changes(cursor) == (cursor, [], False)
+    assert store.changes(0, threat_levels={"HIGH"})[1] == [("r1", analyzed("HIGH"))]
+
+
+def test_query_filters_and_pages_newest_first(store, monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr("result_store.time.time", lambda: clock[0])
+    for i, level in enumerate(["LOW", "HIGH", "LOW", "CRITICAL"]):
+        clock[0] += 10
+        store.put(f"r{i}", analyzed(level))
+    total, page = store.query(offset=0, limit=2)
+    assert total == 4 and [analysis_id for analysis_id, _ in page] == ["r3", "r2"]
+    total, page = store.query(threat_levels={"LOW"}, start=1025)
+    assert total == 1 and page[0][0] == "r2"
+
+
+def test_sqlite_store_is_shared_and_migrates_old_databases(tmp_path):
+    path = str(tmp_path / "results.db")
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE analysis_results (analysis_id TEXT PRIMARY KEY, created_at REAL NOT NULL, "
+        "record TEXT NOT NULL)"
+    )
+    conn.execute(
+        "INSERT INTO analysis_results VALUES ('legacy', ?, ?)",
+        (time.time(), json.dumps(analyzed("MEDIUM"))),
+    )
+    conn.commit()
+    conn.close()
+
+    worker_a = SQLiteResultStore(path)
+    worker_b = SQLiteResultStore(path)
+    assert worker_a.revision() == 1
+    assert worker_b.query(threat_levels={"MEDIUM"})[1] == [
+        ("legacy", analyzed("MEDIUM"))
+    ]
+    worker_a.put("new", analyzed(None, "queued"))
+    assert worker_b.changes(1)[1] == [("new", analyzed(None, "queued"))]
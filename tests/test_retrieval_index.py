@@ -0,0 +1,103 @@
+import time
+
+from event_archive import EventArchive
+from result_store import MemoryResultStore
+from retrieval_index import IndexFollower, RetrievalIndex, pack_context, tokenize
+
+
+def analysis(level, summary, timestamp="2024-01-15T10:00:00Z"):
+    return {
+        "status": "success",
+        "timestamp": timestamp,
+        "ai_analysis": {"threat_level": level, "risk_score": "7", "summary": summary},
+    }
+
+
+def test_tokenize_keeps_identifiers_whole_and_indexes_their_parts():
+    terms = tokenize("Show failed logins from 10.0.0.5 for bob@corp.com at 1700000000")
+    assert terms[:3] == ["failed", "login", "10.0.0.5"]
+    assert {"bob@corp.com", "bob", "corp", "com"} <= set(terms)
+    assert "show" not in terms and "1700000000" not in terms
+
+
+def test_rare_terms_rank_first_and_kinds_filter():
+    index = RetrievalIndex(max_docs=100)
+    for i in range(10):
+        index.add_event(
+            "batch-1", {"user": "alice", "action": "login", "host": f"ws-{i}"}
+        )
+    index.add_event("batch-2", {"user": "mallory", "action": "login", "host": "db-1"})
+    index.add_analysis(
+        "batch-2", analysis("HIGH", "mallory logged in to db-1 at night")
+    )
+
+    hits = index.search("login mallory", k=3)
+    assert [hit["analysis_id"] for hit in hits[:2]] == ["batch-2", "batch-2"]
+    assert hits[0]["score"] >= hits[1]["score"] >= hits[2]["score"]
+    (only,) = index.search("mallory", kinds={"analysis"})
+    assert only["kind"] == "analysis" and "threat level HIGH" in only["text"]
+    assert index.search("nobody") == []
+
+
+def test_reindexed_analysis_hides_its_previous_version():
+    index = RetrievalIndex(max_docs=100)
+    index.add_analysis("a1", analysis("LOW", "routine backup traffic"))
+    index.add_analysis(
+        "a1", analysis("CRITICAL", "exfiltration disguised as backup traffic")
+    )
+    (hit,) = index.search("backup")
+    assert "CRITICAL" in hit["text"]
+    assert index.snapshot()["documents"] == 1 and index.snapshot()["analyses"] == 2
+
+
+def test_oldest_segment_is_evicted_past_max_docs():
+    index = RetrievalIndex(max_docs=16)  # segments of 2 documents
+    for i in range(20):
+        index.add_event(f"batch-{i}", {"user": f"user{i}", "action": "logon"})
+    snapshot = index.snapshot()
+    assert (
+        snapshot["segments"] == 8
+        and snapshot["documents"] == 16
+        and snapshot["evicted"] == 4
+    )
+    assert index.search("user0") == [] and index.search("user3") == []
+    assert [hit["analysis_id"] for hit in index.search("user4")] == ["batch-4"]
+    assert len(index.search("logon", k=100)) == 16
+
+
+def test_embeddings_find_near_miss_spellings():
+    index = RetrievalIndex(max_docs=100, embeddings=True)
+    index.add_event("b1", {"user": "jsmith", "host": "finance-share"})
+    index.add_event("b2", {"user": "akumar", "host": "build-runner"})
+    assert index.search("j.smiht finanse")[0]["analysis_id"] == "b1"
+    assert RetrievalIndex(max_docs=100).search("j.smiht finanse") == []
+
+
+def test_pack_context_skips_hits_over_the_budget():
+    hits = [
+        {"kind": "event", "analysis_id": "a", "text": "x" * 400},
+        {"kind": "event", "analysis_id": "b", "text": "short"},
+    ]
+    text, used = pack_context(hits, max_tokens=50)
+    assert text == "[event b] short" and used == hits[1:]
+
+
+def test_follower_indexes_archived_events_and_finished_analyses(tmp_path):
+    archive = EventArchive(str(tmp_path), fsync_interval=0.01)
+    results = MemoryResultStore()
+    index = RetrievalIndex(max_docs=100)
+    follower = IndexFollower(index, archive=archive, results=results, interval=60)
+
+    archive.append("batch-1", [{"user": "eve", "action": "sudo"}])
+    results.put("batch-1", analysis("MEDIUM", "eve escalated privileges"))
+    results.put("batch-2", {"status": "queued"})
+    deadline = time.monotonic() + 10
+    while archive.snapshot()["batches"] < 1:
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+    follower.refresh()
+    assert sorted(hit["kind"] for hit in index.search("eve")) == ["analysis", "event"]
+    follower.refresh()  # throttled
+    follower.refresh(force=True)  # nothing new
+    assert index.snapshot()["events"] == 1 and index.snapshot()["analyses"] == 1
@@ -0,0 +1,198 @@
+import json
+import os
+import tempfile
+import threading
+import time
+
+import pytest
+
+# log_api reads its configuration at import time
+_state = tempfile.mkdtemp(prefix="cribl-test-")
+for _name, _value in {
+    "ARCHIVE_DIR": "archive",
+    "HOT_STORE_DIR": "hot_store",
+    "METRICS_DIR": "metrics",
+    "LLM_CACHE_PATH": "llm_cache.db",
+    "BASELINE_PATH": "baselines.db",
+}.items():
+    os.environ[_name] = os.path.join(_state, _value)
+os.environ["GEMINI_API_KEY"] = ""
+os.environ["RESULT_STORE"] = "memory"
+
+import log_api  # noqa: E402
+from analysis_queue import AnalysisQueue  # noqa: E402
+from batch_coalescer import BatchCoalescer  # noqa: E402
+from job_journal import SQLiteJobJournal  # noqa: E402
+
+
+def post(events):
+    return log_api.app.test_client().post(
+        "/log-to-chatbot", data=json.dumps(events), content_type="application/json"
+    )
+
+
+def wait_until_done(analysis_id):
+    deadline = time.monotonic() + 10
+    while log_api.analysis_results.get(analysis_id)["status"] in (
+        "queued",
+        "processing",
+    ):
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+    return log_api.analysis_results.get(analysis_id)
+
+
+def test_prefiltered_batch_with_nan_and_infinite_times():
+    response = post(
+        [
+            {"user": "alice", "action": "login", "_time": float("nan")},
+            {"user": "alice", "action": "logout", "timestamp": float("inf")},
+        ]
+    )
+    assert response.status_code == 200
+    assert response.get_json()["status"] == "success"
+
+
+def test_queued_batch_with_out_of_range_time_finishes():
+    response = post(
+        [
+            {
+                "user": "root",
+                "action": "privilege_change",
+                "escalated_privileges": True,
+                "failed_attempts": 12,
+                "_time": 1e300,
+            }
+        ]
+    )
+    assert response.status_code == 202
+    assert (
+        wait_until_done(response.get_json()["analysis_id"])["status"] == "error"
+    )  # no Gemini key
+
+
+def test_anomaly_escalated_batch_is_scored_once(monkeypatch):
+    scorer = log_api.anomaly_scorer
+    calls = []
+    score = scorer.score
+    monkeypatch.setattr(
+        scorer, "score", lambda events: calls.append(len(events)) or score(events)
+    )
+    monkeypatch.setattr(log_api, "ANOMALY_ESCALATE_SCORE", 0)
+
+    events = [
+        {"user": "alice", "action": "login", "status": "success", "bytes": 100 + i}
+        for i in range(30)
+    ]
+    response = post(events)
+    assert response.status_code == 202
+    result = wait_until_done(response.get_json()["analysis_id"])
+    assert calls == [30]
+    assert result["ai_analysis"]["anomaly_evidence"]["events"] == 30
+
+
+def test_search_does_not_wait_for_index_catch_up(monkeypatch):
+    follower = log_api.retrieval_follower
+    caught_up = threading.Event()
+    refresh = follower.refresh
+    monkeypatch.setattr(
+        follower, "refresh", lambda force=False: caught_up.wait(10) and refresh(force)
+    )
+    monkeypatch.setattr(follower, "interval", 0.05)
+
+    post(
+        [{"user": "mallory", "action": "login", "status": "success", "host": "vault-7"}]
+    )
+    client = log_api.app.test_client()
+    started = time.monotonic()
+    response = client.get("/api/search?q=vault-7")
+    assert response.status_code == 200
+    assert time.monotonic() - started < 5
+
+    caught_up.set()
+    deadline = time.monotonic() + 10
+    while not client.get("/api/search?q=vault-7").get_json()["hits"]:
+        assert time.monotonic() < deadline
+        time.sleep(0.05)
+
+
+def test_journaled_job_of_a_stopped_worker_is_analyzed(monkeypatch, tmp_path):
+    journal = SQLiteJobJournal(str(tmp_path / "results.db"))
+    monkeypatch.setattr(log_api, "job_journal", journal)
+    monkeypatch.setitem(log_api.job_recovery, "next", 0.0)
+    log_api.analysis_results.put(
+        "cribl_lost", {"status": "processing", "ai_analysis": None}
+    )
+    journal.save(
+        "cribl_lost", {"events": [{"user": "root", "action": "privilege_change"}]}
+    )
+    journal.release()
+
+    log_api.app.test_client().get("/health")
+    assert wait_until_done("cribl_lost")["status"] == "error"  # no Gemini key
+    assert journal.recover(10) == ([], [])
+
+
+def test_result_streams_per_worker_are_capped(monkeypatch):
+    monkeypatch.setattr(log_api, "result_stream_slots", threading.BoundedSemaphore(1))
+    client = log_api.app.test_client()
+    first = client.get("/api/results/stream")
+    assert first.status_code == 200
+    refused = client.get("/api/results/stream")
+    assert refused.status_code == 503
+    assert refused.headers["Retry-After"] == str(log_api.ANALYSIS_RETRY_AFTER)
+    first.close()
+    second = client.get("/api/results/stream")
+    assert second.status_code == 200
+    second.close()
+
+
+ESCALATED = [
+    {
+        "user": "root",
+        "action": "privilege_change",
+        "escalated_privileges": True,
+        "failed_attempts": 12,
+    }
+]
+META = {"content_type": "application/json", "method": "POST", "group_key": "10.0.0.9"}
+
+
+def coalescing_queue():
+    queue = AnalysisQueue(lambda analysis_id, job: None, workers=1, max_depth=1)
+    return queue, BatchCoalescer(
+        log_api.make_flush_handler(queue), window_seconds=0.05, max_events=1000
+    )
+
+
+def test_failed_window_setup_gives_its_slot_back(monkeypatch):
+    queue, coalescer = coalescing_queue()
+
+    def broken_put(analysis_id, record):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(log_api.analysis_results, "put", broken_put)
+    with pytest.raises(OSError):
+        log_api.accept_log_batch(ESCALATED, 1, META, "http://test/", queue, coalescer)
+    assert queue.reserved() == 0
+    assert not queue.is_full()
+
+
+def test_failed_flush_gives_its_slot_back(monkeypatch):
+    queue, coalescer = coalescing_queue()
+    monkeypatch.setattr(
+        log_api.job_journal,
+        "save",
+        lambda analysis_id, job: None if job is None else 1 / 0,
+    )
+    payload, status, _ = log_api.accept_log_batch(
+        ESCALATED, 1, META, "http://test/", queue, coalescer
+    )
+    assert status == 202
+    deadline = time.monotonic() + 10
+    while log_api.analysis_results.get(payload["analysis_id"])["status"] == "queued":
+        assert time.monotonic() < deadline
+        time.sleep(0.02)
+    assert log_api.analysis_results.get(payload["analysis_id"])["status"] == "error"
+    assert queue.reserved() == 0
+    assert not queue.is_full()